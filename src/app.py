@@ -2,76 +2,178 @@ import streamlit as st
 # Must be the first Streamlit command
 st.set_page_config(page_title="STM32L475 Monitor", page_icon="📊", layout="wide")
 
-import serial
-import serial.tools.list_ports
+import functools
 import time
-import threading
-import os
-import platform
-import json
-from datetime import datetime
-
-# Force page refresh using HTML meta tag
-st.markdown(
-    """
-    <meta http-equiv="refresh" content="3">
-    """,
-    unsafe_allow_html=True
-)
-
-# Store data in a file so it persists between Streamlit refreshes
-DATA_FILE = "serial_data.json"
-
-# Initialize or load state from disk
-if os.path.exists(DATA_FILE):
-    try:
-        with open(DATA_FILE, 'r') as f:
-            data = json.load(f)
-            buffer = data.get('buffer', [])
-            is_connected = data.get('is_connected', False)
-            error_message = data.get('error_message', None)
-            tremor_count = data.get('tremor_count', 0)
-            dyskinesia_count = data.get('dyskinesia_count', 0)
-            normal_count = data.get('normal_count', 0)
-            last_updated = data.get('last_updated', str(datetime.now()))
-    except Exception as e:
-        # If the file is corrupted, start fresh
-        print(f"Error loading data: {e}")
-        buffer = []
-        is_connected = False
-        error_message = None
-        tremor_count = 0
-        dyskinesia_count = 0
-        normal_count = 0
-        last_updated = str(datetime.now())
-else:
-    # Initial state
-    buffer = []
-    is_connected = False
-    error_message = None
-    tremor_count = 0
-    dyskinesia_count = 0
-    normal_count = 0
-    last_updated = str(datetime.now())
-
-# Global flag for stopping the thread
-stop_thread = False
-
-# Function to save state to disk
-def save_state():
-    data = {
-        'buffer': buffer,
-        'is_connected': is_connected,
-        'error_message': error_message,
-        'tremor_count': tremor_count,
-        'dyskinesia_count': dyskinesia_count,
-        'normal_count': normal_count,
-        'last_updated': str(datetime.now())
+from datetime import datetime, time as day_time, timedelta
+import numpy as np
+
+from console_view import ConsoleBuffer, draw_console
+from daemon_client import DaemonClient, DaemonError, live_snapshot, spawn_daemon
+import line_parser
+from metrics import metrics
+from rerun_profiler import profiler, requested_mode
+
+page_start = time.perf_counter()
+# Opt-in: STM32_PROFILE=sample|cprofile|sections, or ?profile=... on the page
+PROFILE = requested_mode(st.query_params.get("profile"))
+profiler.begin("app", PROFILE)
+
+# Reading, parsing and storage run in ingest_daemon.py; this script only asks it
+# for what it draws, so a rerun never touches a serial port or a database file.
+# The live panel reads status, counters and new lines from the daemon's shared
+# memory and only makes requests for what changed
+
+# The console and statistics refresh themselves in a fragment instead of reloading the page
+REFRESH_SECONDS = 1.0
+METRICS_SECONDS = 2.0
+# Session statistics and the history chart are fetched again when lines were published, and at
+# least this often for the ages and rates that change with time alone
+STATS_SECONDS = 5.0
+# This server's own share of the lag: drawing the page and its live parts
+RENDER_SECONDS = metrics.histogram("dashboard_render_seconds", "Running a part of the dashboard script", ("part",))
+
+# The firmware's BufferedSerial runs at 115200
+BAUD_RATES = [115200, 9600, 57600, 38400, 19200, 4800]
+# Upper bound on "Auto-detect"; every port is probed at once
+PROBE_SECONDS = 15.0
+
+@st.cache_resource
+def get_client():
+    """One client per Streamlit server; it keeps a connection per thread"""
+    client = DaemonClient()
+    if not client.alive():
+        # No daemon yet: start one that keeps recording after this server exits
+        spawn_daemon(client.url)
+    return client
+
+@st.cache_resource
+def get_live():
+    """The daemon's live state block, mapped once per Streamlit server"""
+    return get_client().live_state()
+
+def daemon_lost(e):
+    """Report a daemon that stopped answering and forget it, so the next rerun starts a new one"""
+    st.error(f"Lost the ingest daemon: {e}")
+    get_client.clear()
+    get_live.clear()
+
+def shows_daemon_errors(fn):
+    """A fragment whose daemon went away shows why in place, and recovers on its next refresh"""
+    @functools.wraps(fn)
+    def wrapper(*args, **kwargs):
+        try:
+            return fn(*args, **kwargs)
+        except DaemonError as e:
+            daemon_lost(e)
+    return wrapper
+
+profiler.mark("client")
+try:
+    client = get_client()
+except DaemonError as e:
+    st.error(f"The ingest daemon is not running and could not be started: {e}")
+    st.stop()
+
+@profiler.section("read_state")
+def read_state():
+    """Status and counters of the ingest daemon"""
+    status = client.status()
+    counts = status["counts"]
+    return {
+        "is_connected": status["connected"],
+        "monitoring": status["monitoring"],
+        "stopping": status["stopping"],
+        "error_message": status["error_message"],
+        "tremor_count": counts["tremor"],
+        "dyskinesia_count": counts["dyskinesia"],
+        "normal_count": counts["normal"],
+        "dropped": status["dropped"],
+        "last_updated": str(datetime.fromtimestamp(status["last_updated"])) if status["last_updated"] else "never",
+        "status": status,
     }
-    with open(DATA_FILE, 'w') as f:
-        json.dump(data, f)
+
+@profiler.section("read_live")
+def read_live():
+    """Status, counters and the lines published since this session's last rerun, from shared memory"""
+    return live_snapshot(get_live(), since=st.session_state.live_cursor)
+
+# Each session keeps its own scrollback, fed incrementally from the live block
+if "console" not in st.session_state:
+    st.session_state.console = ConsoleBuffer()
+    st.session_state.live_cursor = None  # live block head the console has caught up to
+    st.session_state.verdicts = line_parser.parse_lines([])
+
+# Verdicts shown in the magnitude chart
+VERDICT_HISTORY = 200
+VERDICT_KINDS = (line_parser.KIND_TREMOR, line_parser.KIND_DYSKINESIA, line_parser.KIND_NORMAL)
+# Points per series in the history chart, about one per pixel of its width
+CHART_POINTS = 800
+CHART_VIEWS = {"5 min": 300, "1 h": 3600, "6 h": 6 * 3600, "Session": None}
+
+@profiler.section("sync_console")
+def sync_console(snap):
+    """Append the lines published since the last rerun; reloads when the live block no longer holds them"""
+    console = st.session_state.console
+    cursor = st.session_state.live_cursor
+    if cursor is None or snap.missed:
+        reload_console()
+        return
+    if snap.start > cursor:
+        # Cleared since the last rerun; the snapshot only holds lines published after the clear
+        console.clear()
+        st.session_state.verdicts = st.session_state.verdicts[:0]
+    if len(snap.records):
+        lines = snap.lines()
+        console.extend(lines)
+        # Numbers parsed from the new verdict lines, for the magnitude chart
+        records = line_parser.parse_lines(lines, snap.records["ts"])
+        verdicts = records[np.isin(records["kind"], VERDICT_KINDS)]
+        if len(verdicts):
+            st.session_state.verdicts = np.concatenate([st.session_state.verdicts, verdicts])[-VERDICT_HISTORY:]
+    st.session_state.live_cursor = snap.head
+
+@profiler.section("reload_console")
+def reload_console():
+    """Read the console from the event store, then follow the live block from where the rows end"""
+    console = st.session_state.console
+    console.clear()
+    cursor = 0
+    while True:
+        page = client.events(since=cursor)
+        rows = page["rows"]
+        if rows:
+            console.extend([row[3] for row in rows])
+            cursor = rows[-1][0]
+        if len(rows) < page["limit"]:
+            break
+    st.session_state.live_cursor = page["live_head"]
+    recent = client.records(limit=VERDICT_HISTORY * 3)
+    st.session_state.verdicts = recent[np.isin(recent["kind"], VERDICT_KINDS)][-VERDICT_HISTORY:]
+
+def fetch_when_changed(key, head, fetch):
+    """``fetch()``, reused while nothing was published and the last result is younger than STATS_SECONDS"""
+    now = time.monotonic()
+    cached = st.session_state.get(key)
+    if cached is None or cached[0] != head or now - cached[1] > STATS_SECONDS:
+        cached = st.session_state[key] = (head, now, fetch())
+    return cached[2]
+
+profiler.mark("state")
+try:
+    state = read_state()
+except DaemonError as e:
+    daemon_lost(e)
+    # The rerun of the click starts a new daemon
+    st.button("Reconnect")
+    st.stop()
+is_connected = state["is_connected"]
+error_message = state["error_message"]
+last_updated = state["last_updated"]
+# Every tab sees the same daemon, so a second tab cannot start another reader
+monitoring = state["monitoring"]
 
 # --- Styling ---
+profiler.mark("styling")
 st.markdown("""
 <style>
 .main-header {
@@ -97,72 +199,34 @@ st.markdown("""
 
 st.markdown('<h1 class="main-header">📊 STM32L475 Movement Disorder Monitor</h1>', unsafe_allow_html=True)
 
-# The monitor thread that runs in the background independently from Streamlit
-def serial_monitor_process(port, baud_rate):
-    global buffer, is_connected, error_message, tremor_count, dyskinesia_count, normal_count, stop_thread
-    
-    try:
-        print(f"Opening serial port {port} at {baud_rate} baud")
-        with serial.Serial(port, baud_rate, timeout=1) as ser:
-            is_connected = True
-            buffer.append(f"✅ Connected to {port} at {baud_rate} baud")
-            save_state()
-            
-            print("Connection successful, starting reading loop")
-            
-            while not stop_thread:
-                if ser.in_waiting > 0:
-                    raw_data = ser.readline()
-                    if raw_data:
-                        line = raw_data.decode("utf-8", "ignore").strip()
-                        if line:
-                            print(f"Data received: {line}")
-                            buffer.append(line)
-                            
-                            # Update counts based on the line content
-                            if "Tremor detected" in line:
-                                tremor_count += 1
-                            elif "Dyskinesia detected" in line:
-                                dyskinesia_count += 1
-                            elif "No movement disorder detected" in line:
-                                normal_count += 1
-                            
-                            # Keep buffer at a reasonable size
-                            if len(buffer) > 100:
-                                buffer = buffer[-100:]
-                            
-                            # Save state after each new data
-                            save_state()
-                            
-                time.sleep(0.1)
-    
-    except Exception as e:
-        error_message = f"Serial Error: {e}"
-        print(f"Error in serial thread: {e}")
-        save_state()
-    
-    finally:
-        is_connected = False
-        buffer.append("Disconnected from serial port")
-        save_state()
-        print("Serial thread exited")
-
 # --- Get Serial Ports ---
+@profiler.section("ports")
 def get_available_ports():
-    return list(serial.tools.list_ports.comports())
+    # Enumerated by the daemon, which caches the list until /dev changes
+    return client.ports()
 
 def is_stm32_device(port):
-    return 'STM' in port.description or 'STLink' in port.description or 'ST-LINK' in port.description
+    # ST-LINK USB IDs, so renamed or localised descriptions still match
+    return port["stlink"]
 
 # --- Sidebar UI ---
+profiler.mark("sidebar")
 st.sidebar.header("Connection Settings")
 
 ports = get_available_ports()
 stm32_ports = [p for p in ports if is_stm32_device(p)]
 
+# Listens on every port at each candidate baud rate and picks the one printing firmware lines
+if st.sidebar.button("Auto-detect Port and Baud", disabled=monitoring or not ports):
+    with st.spinner("Listening on serial ports..."):
+        st.session_state.detected = client.probe(PROBE_SECONDS)
+    if st.session_state.detected is None:
+        st.sidebar.warning("No port is sending firmware output")
+detected = st.session_state.get("detected")
+
 if stm32_ports:
     st.sidebar.markdown(
-        f'<div class="status-ok">STM32 device detected:<br/><strong>{stm32_ports[0].device}</strong></div>', 
+        f'<div class="status-ok">STM32 device detected:<br/><strong>{stm32_ports[0]["device"]}</strong></div>', 
         unsafe_allow_html=True
     )
 else:
@@ -172,13 +236,15 @@ else:
     )
 
 # Port selection
-port_options = [p.device for p in ports]
+port_options = [p["device"] for p in ports]
 if port_options:
-    port_labels = [f"{p.device} ({p.description})" for p in ports]
+    port_labels = [f"{p['device']} ({p['description']})" for p in ports]
     default_index = 0
-    if stm32_ports:
+    if detected is not None and detected[0] in port_options:
+        default_index = port_options.index(detected[0])
+    elif stm32_ports:
         try:
-            default_index = port_options.index(stm32_ports[0].device)
+            default_index = port_options.index(stm32_ports[0]["device"])
         except ValueError:
             pass
     
@@ -192,86 +258,160 @@ else:
     st.sidebar.error("No serial ports available")
     selected_port = None
 
-baud_rate = st.sidebar.selectbox("Baud Rate", [115200, 9600, 57600, 38400, 19200, 4800], index=0)
+baud_rate = st.sidebar.selectbox("Baud Rate", BAUD_RATES,
+                                 index=BAUD_RATES.index(detected[1]) if detected and detected[1] in BAUD_RATES else 0)
 
 if st.sidebar.button("Clear Console"):
-    buffer.clear()
-    tremor_count = 0
-    dyskinesia_count = 0
-    normal_count = 0
-    save_state()
+    client.clear()
     st.rerun()
 
+def format_age(seconds):
+    if seconds is None:
+        return "never"
+    if seconds < 60:
+        return f"{seconds:.0f} s ago"
+    if seconds < 3600:
+        return f"{seconds / 60:.0f} min ago"
+    return f"{seconds / 3600:.1f} h ago"
+
+def session_panel(snap):
+    st.subheader("This Session")
+    rate_col1, rate_col2 = st.columns(2)
+    rates = snap["rates_per_min"]
+    rate_col1.metric("Tremor / min (1 min)", f"{rates['1 min']['tremor']:.1f}",
+                     f"{rates['1 min']['tremor'] - rates['15 min']['tremor']:+.1f} vs 15 min")
+    rate_col2.metric("Dyskinesia / min (1 min)", f"{rates['1 min']['dyskinesia']:.1f}",
+                     f"{rates['1 min']['dyskinesia'] - rates['15 min']['dyskinesia']:+.1f} vs 15 min")
+    st.metric("Last Tremor", format_age(snap["since_last"]["tremor"]))
+    for label, key in (("T", "tremor_mag"), ("D", "dysk_mag")):
+        m = snap[key]
+        if m["n"]:
+            std = f" ± {m['std']:.0f}" if m["std"] is not None else ""
+            st.caption(f"{label} at rest: {m['mean']:.0f}{std} (min {m['min']:.0f}, max {m['max']:.0f}, n={m['n']})")
+    hist = snap["freq_hist"]
+    if sum(hist["tremor"]) or sum(hist["dyskinesia"]):
+        # Only the bins the firmware can report: 3-7 Hz
+        keep = [i for i, f in enumerate(snap["freq_bins_hz"]) if 2.5 <= f <= 7.5]
+        st.bar_chart({
+            "Hz": [f"{snap['freq_bins_hz'][i]:.1f}" for i in keep],
+            "Tremor": [hist["tremor"][i] for i in keep],
+            "Dyskinesia": [hist["dyskinesia"][i] for i in keep],
+        }, x="Hz")
+
+@profiler.section("history_chart")
+def history_chart(head):
+    """T and D magnitudes over the chosen view, downsampled by the daemon to about CHART_POINTS per series"""
+    st.subheader("Magnitude History")
+    view = st.radio("View", list(CHART_VIEWS), horizontal=True, key="history_view", label_visibility="collapsed")
+    chart = fetch_when_changed(f"chart {view}", head, lambda: client.chart(points=CHART_POINTS, last=CHART_VIEWS[view]))
+    if chart["range"] is None:
+        st.caption("No verdicts yet.")
+        return
+    bands = {"tremor_mag": "Tremor band", "dysk_mag": "Dyskinesia band"}
+    data = {"time": [], "magnitude": [], "band": []}
+    for series in chart["series"]:
+        data["time"].extend(datetime.fromtimestamp(ts) for ts in series["t"])
+        data["magnitude"].extend(series["v"])
+        data["band"].extend([bands[series["column"]]] * len(series["t"]))
+    st.line_chart(data, x="time", y="magnitude", color="band")
+
 # --- Main Layout ---
-col1, col2 = st.columns([7, 3])
+profiler.mark("main")
 
-with col1:
-    if is_connected:
-        st.success(f"Connected and receiving data")
-    else:
-        st.info("Not connected to any device")
+@st.fragment(run_every=REFRESH_SECONDS)
+@profiler.run("live_panel", PROFILE)
+@shows_daemon_errors
+def live_panel():
+    # Reruns only this part of the page; new lines are appended, not re-read
+    started = time.perf_counter()
+    snap = read_live()
+    sync_console(snap)
+    tremor_count = snap.tremor_count
+    dyskinesia_count = snap.dyskinesia_count
+    normal_count = snap.normal_count
     
-    if error_message:
-        st.error(error_message)
+    col1, col2 = st.columns([7, 3])
     
-    st.subheader("Serial Monitor")
+    with col1:
+        if snap.connected:
+            st.success(f"Connected and receiving data")
+        else:
+            st.info("Not connected to any device")
+        
+        if snap.error:
+            st.error(snap.error)
+        
+        if snap.dropped:
+            st.warning(f"{snap.dropped} lines dropped while storage fell behind "
+                       f"(status lines first)")
+        
+        st.subheader("Serial Monitor")
+        
+        # Only the visible page of the scrollback is sent to the browser
+        with profiler.section("console"):
+            draw_console(st.session_state.console, key="raw_output", label="Raw Output", page_lines=100,
+                         empty_message="No data received yet. Start monitoring to view data.")
+        
+        history_chart(snap.head)
     
-    # Display buffer content
-    if buffer:
-        st.text_area("Raw Output", "\n".join(buffer), height=400, disabled=True)
-    else:
-        st.info("No data received yet. Start monitoring to view data.")
+    with col2:
+        st.subheader("Detection Statistics")
+        
+        # Statistics cards
+        st.metric("Tremor Events", tremor_count)
+        st.metric("Dyskinesia Events", dyskinesia_count)
+        st.metric("Normal Readings", normal_count)
+        
+        # Simple bar chart
+        if tremor_count > 0 or dyskinesia_count > 0 or normal_count > 0:
+            chart_data = {
+                "Tremor": tremor_count,
+                "Dyskinesia": dyskinesia_count, 
+                "Normal": normal_count
+            }
+            st.bar_chart(chart_data)
+        
+        # Rates, magnitudes and frequencies of the running session, kept up to date per event
+        with profiler.section("session_stats"):
+            session = fetch_when_changed("session_stats", snap.head, client.stats)["session"]
+            if session is not None:
+                session_panel(session)
+        
+        # Band peak magnitudes of recent verdicts, straight from the parsed columns
+        verdicts = st.session_state.verdicts
+        if len(verdicts):
+            st.line_chart({
+                "Tremor band": verdicts["tremor_mag"],
+                "Dyskinesia band": verdicts["dysk_mag"],
+            })
+            detections = verdicts[verdicts["kind"] != line_parser.KIND_NORMAL]
+            if len(detections):
+                st.caption(f"Last detection: {detections['freq'][-1]:.1f} Hz "
+                           f"at {datetime.fromtimestamp(detections['ts'][-1]):%H:%M:%S}")
+    RENDER_SECONDS.labels("live_panel").observe(time.perf_counter() - started)
 
-with col2:
-    st.subheader("Detection Statistics")
-    
-    # Statistics cards
-    st.metric("Tremor Events", tremor_count)
-    st.metric("Dyskinesia Events", dyskinesia_count)
-    st.metric("Normal Readings", normal_count)
-    
-    # Simple bar chart
-    if tremor_count > 0 or dyskinesia_count > 0 or normal_count > 0:
-        chart_data = {
-            "Tremor": tremor_count,
-            "Dyskinesia": dyskinesia_count, 
-            "Normal": normal_count
-        }
-        st.bar_chart(chart_data)
+live_panel()
 
 # --- Monitoring Controls ---
-if not is_connected:
+profiler.mark("controls")
+if not monitoring:
     if st.button("Start Monitoring", type="primary", use_container_width=True):
         if selected_port:
-            # Reset global variables
-            error_message = None
-            stop_thread = False
+            # The daemon opens the port and records until it is told to stop
+            client.start(selected_port, baud_rate)
             
-            # Start monitoring thread
-            buffer.append(f"Starting connection to {selected_port}...")
-            save_state()
-            
-            # Create and start thread
-            thread = threading.Thread(
-                target=serial_monitor_process,
-                args=(selected_port, baud_rate)
-            )
-            thread.daemon = True
-            thread.start()
-            
-            # Wait a moment for the thread to start
+            # Wait a moment for the port to open
             time.sleep(1)
             st.rerun()
         else:
             st.error("Please select a serial port")
 else:
     if st.button("Stop Monitoring", type="secondary", use_container_width=True):
-        stop_thread = True
-        buffer.append("Stopping monitoring...")
-        save_state()
+        client.stop()
         st.rerun()
 
 # --- About Section ---
+profiler.mark("about")
 st.markdown("---")
 st.subheader("About STM32L475 Movement Disorder Monitor")
 st.markdown("""
@@ -284,25 +424,138 @@ using accelerometer data. The device samples motion at 104Hz and uses FFT analys
 The STM32 processes data in real-time and sends detection results through the serial port.
 """)
 
-# --- Debugging Tools ---
-with st.expander("Debug Info", expanded=True):
-    st.write("Connected:", is_connected)
-    st.write("Error:", error_message)
-    st.write("Selected Port:", selected_port)
-    st.write("Baud Rate:", baud_rate)
-    st.write("Data Count:", len(buffer))
-    st.write("Last Updated:", last_updated)
-    st.write("Stop Flag:", stop_thread)
+# --- Session History ---
+profiler.mark("session_history")
+with st.expander("Session History"):
+    history_devices = state["status"]["archive_devices"]
+    if not history_devices:
+        st.write("No archived events yet.")
+    else:
+        h_col1, h_col2, h_col3 = st.columns(3)
+        with h_col1:
+            history_device = st.selectbox("Device", history_devices)
+            history_kind = st.selectbox("Event Type", ["tremor", "dyskinesia", "normal"])
+        with h_col2:
+            history_day = st.date_input("Day", value=datetime.now().date())
+        with h_col3:
+            history_from = st.time_input("From", value=day_time(0, 0))
+            history_to = st.time_input("To (inclusive)", value=day_time(23, 59))
+        # The query end is exclusive: the end of the "To" minute, the next midnight by default.
+        # The daemon reads only the segments overlapping the range
+        history_end = datetime.combine(history_day, history_to) + timedelta(minutes=1)
+        rows = client.history(history_kind, history_device,
+                              datetime.combine(history_day, history_from).timestamp(),
+                              history_end.timestamp())["rows"]
+        st.caption(f"{len(rows)} events (the archive is written once a minute)")
+        if len(rows):
+            st.line_chart({
+                "Tremor band": rows["tremor_mag"],
+                "Dyskinesia band": rows["dysk_mag"],
+            })
+
+# --- Pipeline Metrics ---
+def metric_total(snap, name):
+    return sum(row["value"] for row in snap.get(name, ()) if row["value"] == row["value"])
+
+def latency_rows(snap, names):
+    """One table row per histogram series that has observations, in milliseconds"""
+    rows = []
+    for name in names:
+        for row in snap.get(name, ()):
+            if row["count"]:
+                rows.append({
+                    "metric": name.replace("_seconds", ""),
+                    "series": ", ".join(row["labels"].values()),
+                    "count": row["count"],
+                    "p50 ms": round(row["p50"] * 1000, 3),
+                    "p99 ms": round(row["p99"] * 1000, 3),
+                    "mean ms": round(row["mean"] * 1000, 3),
+                })
+    return rows
+
+@st.fragment(run_every=METRICS_SECONDS)
+@profiler.run("metrics_panel", PROFILE)
+@shows_daemon_errors
+def metrics_panel():
+    """Throughput, latency per stage and error counters of the daemon, plus this app's own timings"""
+    snap = client.metrics()
+    now = time.monotonic()
+    prev = st.session_state.get("metrics_prev")
+    st.session_state.metrics_prev = (now, snap)
+    
+    def rate(name):
+        if prev is None or now <= prev[0]:
+            return "–"
+        return f"{(metric_total(snap, name) - metric_total(prev[1], name)) / (now - prev[0]):,.1f}"
+    
+    m_col = st.columns(6)
+    m_col[0].metric("Lines / s", rate("serial_lines_total"))
+    m_col[1].metric("Bytes / s", rate("serial_bytes_total"))
+    m_col[2].metric("Queue Depth", f"{metric_total(snap, 'ingest_queue_depth'):.0f}")
+    m_col[3].metric("Dropped Lines", f"{metric_total(snap, 'ingest_queue_dropped'):.0f}")
+    m_col[4].metric("Decode Errors", f"{metric_total(snap, 'serial_decode_errors_total'):.0f}")
+    m_col[5].metric("Reconnects", f"{metric_total(snap, 'serial_port_reconnects_total'):.0f}")
+    
+    rows = latency_rows(snap, ("serial_decode_seconds", "ingest_stage_seconds", "ingest_lag_seconds",
+                               "state_write_seconds", "api_request_seconds"))
+    rows += latency_rows(metrics.snapshot(), ("client_request_seconds", "dashboard_render_seconds"))
+    if rows:
+        st.dataframe(rows, hide_index=True, use_container_width=True)
+    st.caption(f"Prometheus text format at {client.url}/metrics")
+    
+    state = read_state()
+    st.write("Connected:", state["is_connected"], " Error:", state["error_message"])
+    st.write("Selected Port:", selected_port, " Baud Rate:", baud_rate)
+    st.write("Data Count:", len(st.session_state.console), " Last Updated:", state["last_updated"])
+    st.write("Stop Flag:", state["stopping"])
+    st.write("Ingest Daemon:", {"url": client.url, "pid": state["status"]["pid"],
+                                "uptime_s": round(state["status"]["uptime"]), "requests": state["status"]["requests"]})
+    st.write("Shared Readers:", state["status"]["readers"])
+    st.write("Finished Sessions:", client.stats()["finished"]["counts"])
+
+profiler.mark("metrics")
+with st.expander("Pipeline Metrics", expanded=True):
+    metrics_panel()
     
     if st.button("Force Refresh"):
         st.rerun()
     
     if st.button("Inject Test Data"):
-        buffer.extend([
+        client.append([
             "TEST: Collecting samples...",
             "TEST: Analyzing data...",
             "TEST: No movement disorder detected (T: 123, D: 456)"
         ])
-        normal_count += 1
-        save_state()
-        st.rerun()
\ No newline at end of file
+        st.rerun()
+
+# --- Rerun Profile ---
+if PROFILE:
+    profiler.mark("profile")
+    with st.expander("Rerun Profile"):
+        names = profiler.names()
+        if not names:
+            st.write("No reruns recorded yet; this one is added when it ends.")
+        else:
+            profile_name = st.selectbox("Script or Fragment", names, index=names.index("app") if "app" in names else 0)
+            records = [r for r in profiler.records(profile_name) if not r["interrupted"]]
+            st.caption(f"Mode: {PROFILE}. Last {len(records)} reruns; history and flamegraph input in "
+                       f"{profiler.directory}/")
+            st.line_chart({"Rerun ms": [r["seconds"] * 1000 for r in records]})
+            st.dataframe([{
+                "section": row["section"],
+                "count": row["count"],
+                "p50 ms": round(row["p50"] * 1000, 2),
+                "p99 ms": round(row["p99"] * 1000, 2),
+                "mean ms": round(row["mean"] * 1000, 2),
+                "share %": round(row["share"] * 100, 1),
+            } for row in profiler.summary(profile_name)], hide_index=True, use_container_width=True)
+            p_col1, p_col2 = st.columns(2)
+            # Folded stacks: flamegraph.pl, inferno-flamegraph or speedscope.app
+            p_col1.download_button("Sections (folded, us)", profiler.folded(profile_name),
+                                   file_name=f"{profile_name}.sections.folded")
+            samples = profiler.folded(profile_name, "samples")
+            if samples:
+                p_col2.download_button("Sampled Stacks (folded)", samples, file_name=f"{profile_name}.samples.folded")
+
+RENDER_SECONDS.labels("page").observe(time.perf_counter() - page_start)
+profiler.end()
@@ -0,0 +1,339 @@
+"""Asyncio ingestion of many serial devices from one process.
+
+The dashboards read every port on a blocking thread of its own
+(``port_registry.PortReader``). ``AsyncIngest`` runs one event loop that
+watches the non-blocking file descriptor of every device with
+``loop.add_reader``. A readable port is drained in one ``os.read`` and split
+into lines, and the batch goes into that device's bounded queue. A single
+consumer takes the queued batches of all devices in arrival order. Then
+``line_parser.parse_lines`` parses them and ``on_batch`` receives them on one
+worker thread, so parsing and SQLite writes never stall the readers.
+
+When a device's queue is full its reader is paused. The bytes wait in the
+kernel's tty buffer until the consumer catches up.
+
+Ports without a pollable descriptor (pyserial URLs such as ``loop://``,
+Windows COM ports) are read with ``SerialLineReader`` on an executor thread
+instead.
+
+    python async_ingest.py /dev/ttyACM0 /dev/ttyACM1 --db "serial_data_{device}.db"
+"""
+import argparse
+import asyncio
+import io
+import os
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import serial
+
+from event_store import EventStore
+from line_parser import parse_lines
+from serial_reader import LineSplitter, SerialLineReader
+
+
+class Device:
+    """One port watched by the engine"""
+
+    def __init__(self, port, baud, queue_batches):
+        self.port = port
+        self.baud = baud
+        # Usable in file names: "/dev/ttyACM0" -> "ttyACM0", "loop://" -> "loop_"
+        self.name = re.sub(r"[^\w.-]+", "_", os.path.basename(port.rstrip("/")) or port)
+        self.serial = None
+        self.fd = None
+        self.task = None
+        self.splitter = LineSplitter()
+        self.queue = asyncio.Queue(queue_batches)
+        self.paused = False
+        self.connected = False
+        self.closed = False
+        self.error = None
+
+        self.bytes_read = 0
+        self.lines_read = 0
+        self.lines_processed = 0
+        self.pauses = 0
+
+    def stats(self):
+        return {
+            "port": self.port,
+            "connected": self.connected,
+            "error": self.error,
+            "bytes_read": self.bytes_read,
+            "lines_read": self.lines_read,
+            "lines_processed": self.lines_processed,
+            "queued_batches": self.queue.qsize(),
+            "paused": self.paused,
+            "pauses": self.pauses,
+        }
+
+
+class AsyncIngest:
+    """Many serial devices on one event loop, feeding one parse-and-persist consumer
+
+    ``on_batch(device, lines, records)`` is called on a single worker thread
+    with the lines a device delivered since the last call and their
+    ``EVENT_DTYPE`` records (``records["ts"]`` holds each line's receive time).
+    The public methods may be called from any thread.
+    """
+
+    def __init__(self, on_batch=None, queue_batches=256, max_read=65536):
+        self.on_batch = on_batch
+        self.queue_batches = queue_batches
+        self.max_read = max_read
+        self.devices = {}
+        self.loop = None
+        self.batches_processed = 0
+        self.sink_errors = 0
+        self._thread = None
+        self._ready = None
+        self._consumer = None
+        self._worker = ThreadPoolExecutor(max_workers=1, thread_name_prefix="ingest-sink")
+
+    # --- Control (any thread) ---
+
+    def start(self):
+        """Run the event loop on a background thread"""
+        started = threading.Event()
+
+        def run():
+            self.loop = asyncio.new_event_loop()
+            asyncio.set_event_loop(self.loop)
+            self._ready = asyncio.Queue()
+            self._consumer = self.loop.create_task(self._consume())
+            self.loop.call_soon(started.set)
+            self.loop.run_forever()
+            self.loop.close()
+
+        self._thread = threading.Thread(target=run, name="async-ingest", daemon=True)
+        self._thread.start()
+        started.wait()
+        return self
+
+    def _call(self, coro, timeout=10.0):
+        return asyncio.run_coroutine_threadsafe(coro, self.loop).result(timeout)
+
+    def add(self, port, baud=115200):
+        """Open ``port`` and start reading it; raises ``serial.SerialException`` if it cannot be opened"""
+        return self._call(self._add(port, baud))
+
+    def remove(self, port):
+        self._call(self._remove(port))
+
+    def stats(self):
+        devices = [d.stats() for d in list(self.devices.values())]
+        return {
+            "devices": devices,
+            "lines_read": sum(d["lines_read"] for d in devices),
+            "lines_processed": sum(d["lines_processed"] for d in devices),
+            "batches_processed": self.batches_processed,
+            "sink_errors": self.sink_errors,
+        }
+
+    def stop(self):
+        """Close every device, let the consumer finish what was queued and stop the loop"""
+        if self.loop is None or not self.loop.is_running():
+            return
+        self._call(self._shutdown(), timeout=30.0)
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self._thread.join()
+        close = getattr(self.on_batch, "close", None)
+        if close is not None:
+            # Sinks hold per-thread resources (SQLite connections), so they close on the worker
+            self._worker.submit(close).result()
+        self._worker.shutdown()
+
+    def __enter__(self):
+        if self.loop is None:
+            self.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    # --- Event loop ---
+
+    async def _add(self, port, baud):
+        if port in self.devices and not self.devices[port].closed:
+            raise serial.SerialException(f"{port} is already being read")
+        device = Device(port, baud, self.queue_batches)
+        device.serial = serial.serial_for_url(port, baud, timeout=0)
+        try:
+            device.fd = device.serial.fileno()
+            os.set_blocking(device.fd, False)
+            self.loop.add_reader(device.fd, self._on_readable, device)
+        except (AttributeError, io.UnsupportedOperation, NotImplementedError):
+            # No descriptor the loop can watch: block on a thread instead
+            device.fd = None
+            device.serial.timeout = 0.2
+            device.task = self.loop.create_task(self._poll(device))
+        device.connected = True
+        self.devices[port] = device
+        return device
+
+    async def _remove(self, port):
+        device = self.devices.pop(port, None)
+        if device is not None:
+            self._close(device)
+
+    async def _shutdown(self):
+        for device in list(self.devices.values()):
+            self._close(device)
+        # Whatever is still queued is processed before the loop stops
+        self._ready.put_nowait(None)
+        await self._consumer
+
+    def _close(self, device, error=None):
+        if device.closed:
+            return
+        device.closed = True
+        device.connected = False
+        if error is not None:
+            device.error = str(error)
+            print(f"Error reading {device.port}: {error}")
+        if device.fd is not None and not device.paused:
+            self.loop.remove_reader(device.fd)
+        if device.task is not None:
+            device.task.cancel()
+        try:
+            device.serial.close()
+        except Exception:
+            pass
+
+    def _on_readable(self, device):
+        try:
+            data = os.read(device.fd, self.max_read)
+        except BlockingIOError:
+            return
+        except OSError as e:
+            self._close(device, e)
+            return
+        if not data:
+            self._close(device, "device disconnected")
+            return
+        self._deliver(device, time.time(), data)
+
+    async def _poll(self, device):
+        reader = SerialLineReader(device.serial, self.max_read)
+        try:
+            while not device.closed:
+                # Waits for the consumer when the queue is full instead of pausing a reader
+                while device.queue.full():
+                    await asyncio.sleep(0.01)
+                ts, lines = await self.loop.run_in_executor(None, reader.read_batch)
+                device.bytes_read = reader.bytes_read
+                if lines:
+                    self._queue(device, ts, lines)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            self._close(device, e)
+
+    def _deliver(self, device, ts, data):
+        device.bytes_read += len(data)
+        lines = device.splitter.feed(data)
+        if lines:
+            self._queue(device, ts, lines)
+        if device.queue.full() and device.fd is not None and not device.paused:
+            # Stop reading until the consumer makes room
+            self.loop.remove_reader(device.fd)
+            device.paused = True
+            device.pauses += 1
+
+    def _queue(self, device, ts, lines):
+        device.lines_read += len(lines)
+        device.queue.put_nowait((ts, lines))
+        self._ready.put_nowait(device)
+
+    async def _consume(self):
+        while True:
+            device = await self._ready.get()
+            # Everything that is ready goes to the worker in one hop, grouped by device
+            ready = [device]
+            while not self._ready.empty():
+                ready.append(self._ready.get_nowait())
+            stop = None in ready
+            work = []
+            for device in dict.fromkeys(d for d in ready if d is not None):
+                batches = []
+                while not device.queue.empty():
+                    batches.append(device.queue.get_nowait())
+                if batches:
+                    work.append((device, batches))
+                if device.paused and not device.closed:
+                    self.loop.add_reader(device.fd, self._on_readable, device)
+                    device.paused = False
+            if work:
+                await self.loop.run_in_executor(self._worker, self._process, work)
+            if stop:
+                return
+
+    # --- Worker thread ---
+
+    def _process(self, work):
+        for device, batches in work:
+            lines = [line for _, batch in batches for line in batch]
+            ts = np.repeat([t for t, _ in batches], [len(batch) for _, batch in batches])
+            records = parse_lines(lines, ts)
+            if self.on_batch is not None:
+                try:
+                    self.on_batch(device, lines, records)
+                except Exception as e:
+                    self.sink_errors += 1
+                    print(f"Error storing lines from {device.port}: {e}")
+            device.lines_processed += len(lines)
+            self.batches_processed += len(batches)
+
+
+class EventStoreSink:
+    """``on_batch`` appending each device's lines to an ``EventStore``
+
+    ``path`` may contain ``{device}`` (the port's base name) to give every
+    device its own database. Called only from the engine's worker thread.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.stores = {}
+
+    def __call__(self, device, lines, records):
+        path = self.path.format(device=device.name)
+        store = self.stores.get(path)
+        if store is None:
+            store = self.stores[path] = EventStore(path)
+        store.append(records["ts"], lines, records)
+
+    def close(self):
+        for store in self.stores.values():
+            store.close()
+        self.stores.clear()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Read many STM32 boards into event stores from one event loop")
+    parser.add_argument("ports", nargs="+")
+    parser.add_argument("--baud", type=int, default=115200)
+    parser.add_argument("--db", default="serial_data_{device}.db", help="event store path; {device} is the port name")
+    parser.add_argument("--interval", type=float, default=5.0, help="seconds between status lines")
+    args = parser.parse_args()
+
+    with AsyncIngest(on_batch=EventStoreSink(args.db)) as engine:
+        for port in args.ports:
+            engine.add(port, args.baud)
+            print(f"Reading {port} at {args.baud} baud")
+        try:
+            while True:
+                time.sleep(args.interval)
+                for device in engine.stats()["devices"]:
+                    status = device["error"] or ("paused" if device["paused"] else "reading")
+                    print(f"{device['port']}: {device['lines_processed']} lines stored, {status}")
+        except KeyboardInterrupt:
+            pass
+
+
+if __name__ == "__main__":
+    main()
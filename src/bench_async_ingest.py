@@ -0,0 +1,176 @@
+"""Asyncio ingestion against one thread per port, with 1, 16 and 64 emulated boards.
+
+Saturated emulated boards (``emulator.EmulatedBoard``, speed 0, 115200 baud)
+run in a child process so their CPU time is not charged to the readers. Both
+modes parse every batch with ``line_parser.parse_lines`` and append it to one
+``EventStore`` per board in a temporary directory:
+
+* threads: one thread per port running ``SerialLineReader.read_batch`` ->
+  parse -> append, the shape of ``serial_monitor_process``
+* asyncio: one ``AsyncIngest`` event loop for all ports, with one worker
+  thread for parse and append
+
+Reported per run: lines persisted per second, share of the UART line rate
+the boards got out (with flow control a slow reader throttles them), verdict
+lines persisted against verdicts sent, send-to-persist latency, reader-side
+CPU and thread count.
+
+    python bench_async_ingest.py --boards 1 16 64 --seconds 5
+"""
+import argparse
+import multiprocessing
+import os
+import resource
+import sys
+import tempfile
+import threading
+import time
+
+import numpy as np
+import serial
+
+from async_ingest import AsyncIngest, EventStoreSink
+from bench_utils import latency_summary
+from emulator import EmulatedBoard, EmulatorHub
+from event_store import EventStore
+from line_parser import KIND_DYSKINESIA, KIND_NORMAL, KIND_TREMOR, parse_lines
+from serial_reader import SerialLineReader
+
+BAUD = 115200
+VERDICT_KINDS = (KIND_TREMOR, KIND_DYSKINESIA, KIND_NORMAL)
+
+
+def emulator_main(n_boards, seed, paths, go, halt, done, results):
+    boards = [EmulatedBoard(scenario="mixed", speed=0, baud=BAUD, seed=seed + i) for i in range(n_boards)]
+    paths.put([b.path for b in boards])
+    hub = EmulatorHub(boards)
+    go.wait()
+    hub.start()
+    halt.wait()
+    hub.stop()
+    results.put({b.path: {"verdict_times": [t for t, _ in b.verdicts], "bytes_sent": b.bytes_sent}
+                 for b in boards})
+    # Keep the ptys open until the readers have let go of them
+    done.wait()
+    hub.close()
+
+
+class PersistLog:
+    """Time at which each verdict line of each port was persisted, in order"""
+
+    def __init__(self):
+        self.times = {}
+        self.lines = 0
+
+    def record(self, port, records):
+        now = time.perf_counter()
+        n = int(np.isin(records["kind"], VERDICT_KINDS).sum())
+        self.times.setdefault(port, []).extend([now] * n)
+        self.lines += len(records)
+
+
+def thread_reader(port, db_path, log, stop):
+    store = EventStore(db_path)
+    with serial.serial_for_url(port, BAUD, timeout=0.2) as ser:
+        reader = SerialLineReader(ser)
+        while not stop.is_set():
+            ts, lines = reader.read_batch()
+            if lines:
+                records = parse_lines(lines, ts)
+                store.append(ts, lines, records)
+                log.record(port, records)
+    store.close()
+
+
+def run_threads(paths, workdir, log):
+    stop = threading.Event()
+    threads = [threading.Thread(target=thread_reader, args=(p, os.path.join(workdir, f"{i}.db"), log, stop),
+                                daemon=True) for i, p in enumerate(paths)]
+    for t in threads:
+        t.start()
+    yield
+    stop.set()
+    for t in threads:
+        t.join()
+
+
+def run_asyncio(paths, workdir, log):
+    sink = EventStoreSink(os.path.join(workdir, "{device}.db"))
+
+    def on_batch(device, lines, records):
+        sink(device, lines, records)
+        log.record(device.port, records)
+
+    on_batch.close = sink.close
+    engine = AsyncIngest(on_batch=on_batch).start()
+    for p in paths:
+        engine.add(p, BAUD)
+    yield
+    engine.stop()
+
+
+MODES = {"threads": run_threads, "asyncio": run_asyncio}
+
+
+def bench(mode, n_boards, seconds):
+    ctx = multiprocessing.get_context("spawn")
+    paths_q, results = ctx.Queue(), ctx.Queue()
+    go, halt, done = ctx.Event(), ctx.Event(), ctx.Event()
+    child = ctx.Process(target=emulator_main, args=(n_boards, 100, paths_q, go, halt, done, results))
+    child.start()
+    try:
+        paths = paths_q.get(timeout=30)
+        log = PersistLog()
+        with tempfile.TemporaryDirectory() as workdir:
+            runner = MODES[mode](paths, workdir, log)
+            next(runner)
+            usage = resource.getrusage(resource.RUSAGE_SELF)
+            start = time.perf_counter()
+            go.set()
+            time.sleep(seconds)
+            n_threads = threading.active_count()
+            halt.set()
+            sent = results.get(timeout=30)
+            elapsed = time.perf_counter() - start
+            # What is already in the ptys still gets read
+            time.sleep(0.5)
+            next(runner, None)
+            end_usage = resource.getrusage(resource.RUSAGE_SELF)
+        done.set()
+        child.join(30)
+    finally:
+        if child.is_alive():
+            child.terminate()
+
+    cpu = (end_usage.ru_utime - usage.ru_utime) + (end_usage.ru_stime - usage.ru_stime)
+    n_sent = sum(len(s["verdict_times"]) for s in sent.values())
+    n_persisted = sum(len(log.times.get(p, [])) for p in sent)
+    latencies = []
+    for port, s in sent.items():
+        persisted = log.times.get(port, [])
+        latencies.extend(b - a for a, b in zip(s["verdict_times"], persisted))
+    lat = latency_summary(latencies)
+    utilisation = sum(s["bytes_sent"] for s in sent.values()) / (n_boards * BAUD / 10.0 * elapsed)
+    print(f"  {mode:8s} {n_boards:3d} boards  {log.lines / elapsed:8,.0f} lines/s  UART {utilisation:4.0%}  "
+          f"verdicts {n_persisted}/{n_sent}  latency p50 {lat['p50_ms']:6.1f} ms p99 {lat['p99_ms']:7.1f} ms  "
+          f"cpu {100 * cpu / elapsed:5.1f}%  {n_threads:3d} threads")
+    return n_persisted == n_sent
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--boards", type=int, nargs="+", default=[1, 16, 64])
+    parser.add_argument("--seconds", type=float, default=5.0)
+    parser.add_argument("--modes", nargs="+", choices=list(MODES), default=list(MODES))
+    args = parser.parse_args()
+
+    ok = True
+    for n in args.boards:
+        print(f"{n} boards:")
+        for mode in args.modes:
+            ok &= bench(mode, n, args.seconds)
+    return 0 if ok else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,90 @@
+"""Rerun cost and bytes per console update, before and after ConsoleBuffer.
+
+Before, every update rebuilt the console text from the whole buffer:
+
+* ``app.py``: a full page reload every 3 s, joining the last 100 lines
+* ``stm32_monitor.py``: a full rerun every 100 ms, joining up to 500 lines
+* with no cap, the same join over the whole session history
+
+After, a fragment refreshes every 0.25 s (``stm32_monitor.py``, 200-line
+page) or 1 s (``app.py``, 100-line page), appends only the new lines and joins
+one page, reusing the text of full blocks and of an unchanged page.
+
+Bytes are the console text handed to Streamlit per update; the protobuf
+framing around it is the same in both cases and is not counted. Neither is
+what the fragments save beyond the console: the old ``app.py`` reload also
+re-ran the whole script and rebuilt every element on the page.
+
+    python bench_console_view.py --rate 250
+"""
+import argparse
+import sys
+import time
+
+from bench_utils import latency_summary
+from console_view import PAGE_LINES, ConsoleBuffer
+
+
+def make_lines(start, n):
+    return [f"{i} Tremor detected at 4.7 Hz (mag: {1000 + i % 9000})" for i in range(start, start + n)]
+
+
+def before(history, rate, interval, keep, updates=200):
+    """Per-update join of the last ``keep`` lines of a list (``keep=None``: everything)"""
+    data = make_lines(0, history)
+    per_update = max(0, int(rate * interval))
+    incoming = [make_lines(history + i * per_update, per_update) for i in range(updates)]
+    times, sizes = [], []
+    for new in incoming:
+        start = time.perf_counter()
+        data.extend(new)
+        if keep is not None and len(data) > keep:
+            data = data[-keep:]
+        text = "\n".join(data)
+        times.append(time.perf_counter() - start)
+        sizes.append(len(text.encode("utf-8")))
+    return times, sizes
+
+
+def after(history, rate, interval, page_lines=PAGE_LINES, updates=200):
+    """Per-update append of the new lines plus one page of text"""
+    console = ConsoleBuffer(max_lines=max(history, 100000))
+    console.extend(make_lines(0, history))
+    per_update = max(0, int(rate * interval))
+    incoming = [make_lines(history + i * per_update, per_update) for i in range(updates)]
+    times, sizes = [], []
+    for new in incoming:
+        start = time.perf_counter()
+        console.extend(new)
+        text = console.text(*console.page_range(0, page_lines))
+        times.append(time.perf_counter() - start)
+        sizes.append(len(text.encode("utf-8")))
+    return times, sizes
+
+
+def report(name, interval, times, sizes):
+    lat = latency_summary(times)
+    per_update = sum(sizes) / len(sizes)
+    print(f"  {name:41s} {lat['p50_ms']:8.3f} ms p50 {lat['p99_ms']:8.3f} ms p99 "
+          f"{per_update / 1024:8.1f} KiB/update {per_update / interval / 1024:9.1f} KiB/s")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rate", type=float, default=250.0, help="incoming lines per second")
+    parser.add_argument("--history", type=int, nargs="+", default=[500, 10000, 100000])
+    args = parser.parse_args()
+
+    for history in args.history:
+        print(f"history {history:,} lines, {args.rate:g} lines/s:")
+        report("before: app.py reload (3 s, 100 lines)", 3.0, *before(history, args.rate, 3.0, 100))
+        report("before: stm32_monitor (0.1 s, 500)", 0.1, *before(history, args.rate, 0.1, 500))
+        report("before: uncapped join (0.1 s)", 0.1, *before(history, args.rate, 0.1, None, updates=20))
+        report("after:  stm32_monitor fragment (0.25 s)", 0.25, *after(history, args.rate, 0.25))
+        report("after:  app.py fragment (1 s, 100 lines)", 1.0, *after(history, args.rate, 1.0, 100))
+        report("after:  idle refresh (no new lines)", 0.25, *after(history, 0, 0.25))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
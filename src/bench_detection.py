@@ -0,0 +1,163 @@
+"""Parity checks and throughput benchmark for the host detection engine.
+
+The parity stage compares ``detection.run_detection`` against a plain float64
+transcription of ``runDetection()`` (one window at a time, explicit DFT) and
+against known vectors whose verdict follows from the firmware logic. It exits
+non-zero on any mismatch, so it can gate changes to ``detection.py``.
+
+    python bench_detection.py               # parity + throughput
+    python bench_detection.py --parity-only
+"""
+import argparse
+import math
+import sys
+import time
+
+import numpy as np
+
+import detection
+from detection import (FFT_SIZE, SAMPLE_RATE_HZ, VERDICT_DYSKINESIA, VERDICT_NONE,
+                       VERDICT_TREMOR)
+
+BIN_HZ = SAMPLE_RATE_HZ / FFT_SIZE
+
+
+def reference_detection(samples):
+    """Straight float64 transcription of runDetection() for one window"""
+    n = len(samples)
+    x = [samples[i] * 0.5 * (1.0 - math.cos(2.0 * math.pi * i / (n - 1))) for i in range(n)]
+    k = np.arange(n // 2 + 1)[:, None]
+    spectrum = np.exp(-2j * np.pi * k * np.arange(n)[None, :] / n) @ np.asarray(x)
+    mag = np.abs(spectrum[: n // 2])
+    mag[0] = math.hypot(spectrum[0].real, spectrum[n // 2].real) * 0.1
+
+    t0, t1 = int(3.0 * n / SAMPLE_RATE_HZ), int(5.0 * n / SAMPLE_RATE_HZ)
+    d0, d1 = int(5.0 * n / SAMPLE_RATE_HZ), int(7.0 * n / SAMPLE_RATE_HZ)
+    idx_t = int(np.argmax(mag[t0:t1 + 1]))
+    idx_d = int(np.argmax(mag[d0:d1 + 1]))
+    max_t, max_d = mag[t0 + idx_t], mag[d0 + idx_d]
+    threshold = sum(mag[1:11]) / 10 * 10.0
+
+    if max_t > max_d and max_t > threshold:
+        verdict = VERDICT_TREMOR
+    elif max_d > max_t and max_d > threshold:
+        verdict = VERDICT_DYSKINESIA
+    else:
+        verdict = VERDICT_NONE
+    return verdict, mag, max_t, max_d, threshold
+
+
+def sine(freq_hz, amplitude, offset=0.0, n=FFT_SIZE):
+    t = np.arange(n) / SAMPLE_RATE_HZ
+    return np.round(offset + amplitude * np.sin(2 * np.pi * freq_hz * t)).astype(np.int16)
+
+
+# (name, samples, expected verdict, expected printed frequency or None)
+KNOWN_VECTORS = [
+    ("silence", np.zeros(FFT_SIZE, np.int16), VERDICT_NONE, None),
+    ("gravity only", np.full(FFT_SIZE, 16393, np.int16), VERDICT_NONE, None),
+    # Bin 12 belongs to both bands, so the two peaks tie and neither wins
+    ("bin 12 shared by both bands", sine(12 * BIN_HZ, 2000), VERDICT_NONE, None),
+    ("tremor bin 11", sine(11 * BIN_HZ, 2000), VERDICT_TREMOR, "4.5"),
+    ("dyskinesia bin 15", sine(15 * BIN_HZ, 2000), VERDICT_DYSKINESIA, "6.1"),
+    ("dyskinesia bin 17", sine(17 * BIN_HZ, 2000), VERDICT_DYSKINESIA, "6.9"),
+    # Bins 7-10 sit inside the 1-10 baseline, so the peak raises its own threshold
+    ("tremor bin 10 (masked by baseline)", sine(10 * BIN_HZ, 2000), VERDICT_NONE, None),
+    ("1 Hz drift", sine(1.0, 4000), VERDICT_NONE, None),
+    ("12 Hz out of band", sine(12.0, 4000), VERDICT_NONE, None),
+]
+
+
+def check_parity(n_random=2000, seed=1):
+    failures = []
+
+    def fail(msg):
+        failures.append(msg)
+        print(f"FAIL: {msg}")
+
+    # Constants derived exactly as the firmware derives them
+    if detection.TREMOR_BINS != (7, 12) or detection.DYSK_BINS != (12, 17):
+        fail(f"band bins {detection.TREMOR_BINS} {detection.DYSK_BINS}")
+    ref_window = 0.5 * (1 - np.cos(2 * np.pi * np.arange(FFT_SIZE) / (FFT_SIZE - 1)))
+    if np.max(np.abs(detection.HANN - ref_window)) > 1e-6:
+        fail("Hann window differs from reference")
+
+    for name, samples, verdict, freq in KNOWN_VECTORS:
+        row = detection.run_detection(samples)[0]
+        line = detection.format_verdict(row)
+        ref_verdict = reference_detection(samples.astype(np.float64))[0]
+        if row["verdict"] != verdict or ref_verdict != verdict:
+            fail(f"{name}: got {row['verdict']}, reference {ref_verdict}, expected {verdict} ({line})")
+        elif freq is not None and f"at {freq} Hz" not in line:
+            fail(f"{name}: expected {freq} Hz in {line!r}")
+        else:
+            print(f"ok   {name:<36} {line}")
+
+    # Random mixtures: magnitudes to float32 rounding, verdicts wherever the margin allows
+    rng = np.random.default_rng(seed)
+    t = np.arange(FFT_SIZE) / SAMPLE_RATE_HZ
+    freqs = rng.uniform(0.5, 10.0, size=(n_random, 2))
+    amps = rng.uniform(0, 3000, size=(n_random, 2))
+    windows = (amps[:, :1] * np.sin(2 * np.pi * freqs[:, :1] * t)
+               + amps[:, 1:] * np.sin(2 * np.pi * freqs[:, 1:] * t)
+               + rng.normal(0, 50, size=(n_random, FFT_SIZE))
+               + rng.uniform(-500, 500, size=(n_random, 1)))
+    windows = np.clip(np.round(windows), -32768, 32767).astype(np.int16)
+
+    results = detection.run_detection(windows)
+    mags = detection.magnitudes(windows)
+    band = detection.band_magnitudes(windows)
+    worst = 0.0
+    mismatched = 0
+    for i in range(n_random):
+        verdict, ref_mag, max_t, max_d, threshold = reference_detection(windows[i].astype(np.float64))
+        scale = max(ref_mag.max(), 1.0)
+        worst = max(worst, float(np.max(np.abs(mags[i] - ref_mag)) / scale),
+                    float(np.max(np.abs(band[i] - ref_mag[:detection.DECISION_BINS])) / scale))
+        margin = min(abs(max_t - threshold), abs(max_d - threshold), abs(max_t - max_d)) / scale
+        if results[i]["verdict"] != verdict and margin > 1e-5:
+            mismatched += 1
+    print(f"random windows: {n_random}, worst magnitude error {worst:.2e} of peak, "
+          f"{mismatched} verdict mismatches outside rounding margin")
+    if worst > 1e-5:
+        fail(f"magnitude error {worst:.2e}")
+    if mismatched:
+        fail(f"{mismatched} verdict mismatches")
+    return not failures
+
+
+def bench_throughput(n_windows=1_000_000, repeats=3):
+    rng = np.random.default_rng(0)
+    windows = rng.integers(-2000, 2000, size=(n_windows, FFT_SIZE), dtype=np.int16)
+    detection.run_detection(windows[:1000])  # warm up
+
+    best = float("inf")
+    for _ in range(repeats):
+        start = time.perf_counter()
+        detection.run_detection(windows)
+        best = min(best, time.perf_counter() - start)
+    print(f"batched: {n_windows} windows in {best:.3f} s -> {n_windows / best:,.0f} windows/s")
+
+    # For comparison: one call per window, as a naive port would do it
+    n_single = 20_000
+    start = time.perf_counter()
+    for i in range(n_single):
+        detection.run_detection(windows[i])
+    elapsed = time.perf_counter() - start
+    print(f"per-window calls: {n_single / elapsed:,.0f} windows/s")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--parity-only", action="store_true")
+    parser.add_argument("--windows", type=int, default=1_000_000)
+    args = parser.parse_args()
+
+    ok = check_parity()
+    if not args.parity_only:
+        bench_throughput(args.windows)
+    return 0 if ok else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
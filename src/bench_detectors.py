@@ -0,0 +1,219 @@
+"""Accuracy and throughput of every host-side detector on a labelled synthetic corpus.
+
+The corpus comes from ``synthetic_motion``: rest, voluntary movement, tremor,
+dyskinesia and mixtures under gravity, drift, noise and saturation. Each
+detector runs over the whole signal as it would in use, and each decision is
+scored against the label of the segment its window lies in (windows across
+a segment boundary are skipped):
+
+* ``runDetection``: ``detection.run_detection``, one window every 256 samples
+* ``FFT + classify``: full spectrum and ``detection.classify``, the same windows
+* ``StreamingSTFT``: a decision every 32 samples, fed in 32-sample frames
+* ``BandTracker``: a decision after every sample, fed in 32-sample frames
+* ``process_window``: the band powers of signal.cpp (no window, bins fully
+  inside each band). It has no threshold, so it is only scored on motion
+  windows as "larger band wins"
+
+Throughput is decisions per second and how many times faster than real time
+the signal is consumed. The run fails if a fast path stops agreeing with
+``run_detection`` on the windows they share, or with ``--check`` if any
+detector's accuracy, recall of any class or accuracy on level segments drops
+below a baseline written by ``--record``. Overall accuracy alone hides a lost
+class: runDetection barely detects tremor here, so losing it entirely moves
+accuracy by about 0.01.
+
+    python bench_detectors.py --hours 2 --record detector_baseline.json
+    python bench_detectors.py --hours 2 --check detector_baseline.json
+"""
+import argparse
+import json
+import sys
+import time
+
+import numpy as np
+
+import detection
+import synthetic_motion
+from band_tracker import BandTracker
+from detection import FFT_SIZE, SAMPLE_RATE_HZ, VERDICT_DYSKINESIA, VERDICT_NONE, VERDICT_TREMOR
+from stft import StreamingSTFT, power_bins
+
+# Samples per RAW frame from the firmware
+FRAME = 32
+# Share of shared windows on which a fast path must match run_detection. The
+# tracker's periodic Hann window differs slightly from the firmware's.
+AGREEMENT = {"FFT + classify": 0.999, "StreamingSTFT": 0.999, "BandTracker": 0.99}
+BOXCAR = np.ones(FFT_SIZE, dtype=np.float32)
+
+
+def run_detection(samples):
+    windows = detection.sample_windows(samples)
+    return (np.arange(len(windows)) + 1) * FFT_SIZE, detection.run_detection(windows)["verdict"]
+
+
+def fft_classify(samples):
+    windows = detection.sample_windows(samples)
+    verdicts = [detection.classify(detection.magnitudes(windows[i:i + 4096]))["verdict"]
+                for i in range(0, len(windows), 4096)]
+    return (np.arange(len(windows)) + 1) * FFT_SIZE, np.concatenate(verdicts)
+
+
+def streamed(detector, samples):
+    rows = [detector.push(samples[i:i + FRAME]) for i in range(0, len(samples), FRAME)]
+    rows = np.concatenate(rows)
+    return rows["sample"], rows["verdict"]
+
+
+def process_window(samples):
+    windows = detection.sample_windows(samples)
+    (t0, t1), (d0, d1) = power_bins(3.0, 5.0), power_bins(5.0, 7.0)
+    tp, dp = [], []
+    for i in range(0, len(windows), 4096):
+        mags = detection.magnitudes(windows[i:i + 4096], BOXCAR)
+        tp.append(mags[:, t0:t1 + 1].sum(axis=1))
+        dp.append(mags[:, d0:d1 + 1].sum(axis=1))
+    verdict = np.where(np.concatenate(tp) > np.concatenate(dp), VERDICT_TREMOR, VERDICT_DYSKINESIA)
+    return (np.arange(len(windows)) + 1) * FFT_SIZE, verdict.astype(np.uint8)
+
+
+DETECTORS = {
+    "runDetection": run_detection,
+    "FFT + classify": fft_classify,
+    "StreamingSTFT": lambda samples: streamed(StreamingSTFT(hop=32), samples),
+    "BandTracker": lambda samples: streamed(BandTracker(), samples),
+    "process_window": process_window,
+}
+MOTION_ONLY = ("process_window",)
+
+
+def conditions(segments):
+    """Named boolean masks over segments for the per-condition breakdown"""
+    masks = {name: segments["condition"] == i for i, name in enumerate(synthetic_motion.CONDITIONS)}
+    motion = segments["label"] != VERDICT_NONE
+    masks["saturated"] = segments["saturated"]
+    masks["faint"] = motion & (segments["amp_g"] < 0.02)
+    masks["level"] = np.abs(segments["gravity_g"]) < 0.1
+    return masks
+
+
+def score(ends, verdicts, segments, seg_of, motion_only=False):
+    """Confusion matrix and per-condition accuracy of decisions for windows ending before ``ends``"""
+    first = ends - FFT_SIZE
+    keep = (first >= 0) & (seg_of[np.maximum(first, 0)] == seg_of[ends - 1])
+    seg = seg_of[ends[keep] - 1]
+    truth = segments["label"][seg]
+    got = verdicts[keep]
+    if motion_only:
+        moving = truth != VERDICT_NONE
+        seg, truth, got = seg[moving], truth[moving], got[moving]
+    confusion = np.zeros((3, 3), dtype=np.int64)
+    np.add.at(confusion, (truth, got), 1)
+    correct = truth == got
+    by_condition = {}
+    for name, mask in conditions(segments).items():
+        m = mask[seg]
+        by_condition[name] = float(correct[m].mean()) if m.any() else None
+    return {"decisions": int(len(got)), "accuracy": float(correct.mean()),
+            "confusion": confusion.tolist(), "conditions": by_condition}
+
+
+def recall(confusion):
+    """Share of each true class detected as itself, ``None`` for a class with no windows"""
+    confusion = np.asarray(confusion)
+    return [float(confusion[i, i] / confusion[i].sum()) if confusion[i].sum() else None for i in range(3)]
+
+
+def checked(r):
+    """The figures --check holds against the baseline"""
+    values = {"accuracy": r["accuracy"], "level": r["conditions"].get("level")}
+    values.update((f"{name} recall", v) for name, v in zip(synthetic_motion.LABELS, recall(r["confusion"])))
+    return values
+
+
+def agreement(ends, verdicts, reference):
+    """Share of run_detection windows on which ``verdicts`` matches, by window end"""
+    ref_ends, ref_verdicts = reference
+    pos = np.searchsorted(ends, ref_ends)
+    pos = np.minimum(pos, len(ends) - 1)
+    shared = ends[pos] == ref_ends
+    return float(np.mean(verdicts[pos[shared]] == ref_verdicts[shared])), int(shared.sum())
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--hours", type=float, default=2.0, help="length of the synthetic signal")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--record", help="write accuracy and throughput to this JSON file")
+    parser.add_argument("--check", help="fail if accuracy or recall drops below this baseline JSON file")
+    parser.add_argument("--tolerance", type=float, default=0.002, help="allowed drop of each figure in --check")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    samples, segments = synthetic_motion.corpus(args.hours, seed=args.seed)
+    generate_s = time.perf_counter() - start
+    seg_of = synthetic_motion.segment_index(segments)
+    labels = np.bincount(segments["label"], minlength=3)
+    print(f"corpus: {len(samples) / SAMPLE_RATE_HZ / 3600:.2f} h, {len(segments)} segments "
+          f"({', '.join(f'{n} {name}' for n, name in zip(labels, synthetic_motion.LABELS))}, "
+          f"{int(segments['saturated'].sum())} saturated), generated at {len(samples) / generate_s / 1e6:.1f} M samples/s")
+
+    results, outputs = {}, {}
+    for name, fn in DETECTORS.items():
+        start = time.perf_counter()
+        ends, verdicts = fn(samples)
+        seconds = time.perf_counter() - start
+        outputs[name] = ends, verdicts
+        result = score(ends, verdicts, segments, seg_of, motion_only=name in MOTION_ONLY)
+        result["windows_per_s"] = len(verdicts) / seconds
+        result["realtime"] = len(samples) / SAMPLE_RATE_HZ / seconds
+        results[name] = result
+
+    print(f"\n{'detector':<16}{'decisions':>10}{'windows/s':>12}{'x realtime':>12}{'accuracy':>10}"
+          f"{'none':>8}{'tremor':>8}{'dysk':>8}")
+    for name, r in results.items():
+        note = " (motion windows only)" if name in MOTION_ONLY else ""
+        print(f"{name:<16}{r['decisions']:>10}{r['windows_per_s']:>12,.0f}{r['realtime']:>12,.0f}{r['accuracy']:>10.3f}"
+              + "".join("       -" if v is None else f"{v:>8.3f}" for v in recall(r["confusion"])) + note)
+
+    names = list(conditions(segments))
+    print(f"\naccuracy by condition\n{'detector':<16}" + "".join(f"{n:>11}" for n in names))
+    for name, r in results.items():
+        cells = ["-" if r["conditions"][n] is None else f"{r['conditions'][n]:.3f}" for n in names]
+        print(f"{name:<16}" + "".join(f"{c:>11}" for c in cells))
+
+    ok = True
+    print()
+    for name, floor in AGREEMENT.items():
+        share, shared = agreement(*outputs[name], outputs["runDetection"])
+        ok &= share >= floor
+        print(f"{name} matches runDetection on {share * 100:.2f}% of {shared} shared windows (needs {floor * 100:g}%)")
+
+    if args.check:
+        with open(args.check) as f:
+            baseline = json.load(f)
+        if (baseline["hours"], baseline["seed"]) != (args.hours, args.seed):
+            ok = False
+            print(f"baseline was recorded with --hours {baseline['hours']} --seed {baseline['seed']}, not comparable")
+            baseline = {}
+        for name, r in results.items():
+            before = baseline.get(name)
+            if before is None:
+                continue
+            now, then = checked(r), checked(before)
+            dropped = [key for key, v in now.items()
+                       if v is not None and then[key] is not None and v < then[key] - args.tolerance]
+            ok &= not dropped
+            print(f"{name}: accuracy {r['accuracy']:.4f} vs {before['accuracy']:.4f}, "
+                  f"{r['windows_per_s'] / before['windows_per_s']:.2f}x baseline throughput"
+                  + "".join(f" - {key.upper()} DROPPED ({now[key]:.4f} vs {then[key]:.4f})" for key in dropped))
+    if args.record:
+        with open(args.record, "w") as f:
+            json.dump({"hours": args.hours, "seed": args.seed, **results}, f, indent=1)
+        print(f"baseline written to {args.record}")
+
+    print(f"fast paths agree with runDetection and accuracy holds: {ok}")
+    return 0 if ok else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
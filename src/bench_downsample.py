@@ -0,0 +1,97 @@
+"""Query latency and fidelity of the chart pyramids against plotting raw history.
+
+A long session of verdicts (T and D magnitudes every ~0.3 s from one device,
+with rare spikes) goes through ``ChartHistory.update`` in reader-sized
+batches. Then, for views from the whole session down to five minutes:
+
+* what the chart would receive without downsampling: every point in range,
+  and the size of that payload as JSON
+* ``ChartHistory.query`` with a pixel budget, reduced by min/max and by LTTB
+* ``lttb`` and ``minmax`` run over the raw slice on every rerun
+
+The min/max views must keep the extremes of their range, so a spike is never
+hidden at any zoom; LTTB keeps the shape and may smooth a lone spike away.
+
+    python bench_downsample.py --hours 48
+"""
+import argparse
+import json
+import sys
+import time
+
+import numpy as np
+
+from downsample import ChartHistory, lttb, minmax
+from line_parser import EVENT_DTYPE, KIND_NORMAL
+
+
+def session(hours, period=0.3, seed=0):
+    rng = np.random.default_rng(seed)
+    n = int(hours * 3600 / period)
+    rows = np.empty(n, dtype=EVENT_DTYPE)
+    rows["ts"] = 1714550400.0 + np.arange(n) * period
+    rows["kind"] = KIND_NORMAL
+    rows["freq"] = np.nan
+    drift = 2000 + 800 * np.sin(np.arange(n) * period * 2 * np.pi / 3600)
+    rows["tremor_mag"] = drift + rng.gamma(2.0, 300.0, n)
+    rows["dysk_mag"] = drift + rng.gamma(2.0, 250.0, n)
+    spikes = rng.choice(n, max(1, n // 50000), replace=False)
+    rows["tremor_mag"][spikes] = 60000
+    return rows
+
+
+def timed(fn, repeats=5):
+    best = float("inf")
+    for _ in range(repeats):
+        start = time.perf_counter()
+        result = fn()
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+def keeps_extremes(v, raw):
+    return len(v) > 0 and v.max() == raw.max() and v.min() == raw.min()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--hours", type=float, default=48)
+    parser.add_argument("--points", type=int, default=800, help="pixel budget of the chart")
+    args = parser.parse_args()
+
+    rows = session(args.hours)
+    history = ChartHistory()
+    start = time.perf_counter()
+    for i in range(0, len(rows), 3):
+        history.update("ttyACM0", rows[i:i + 3])
+    elapsed = time.perf_counter() - start
+    print(f"{len(rows):,} verdicts ({args.hours:g} h): update {elapsed / len(rows) * 1e6:.2f} us/event "
+          f"for {len(history.columns)} series")
+
+    t_all = rows["ts"]
+    v_all = rows["tremor_mag"].astype(np.float64)
+    end_ts = float(t_all[-1]) + 1
+    ok = True
+    print(f"{'view':>10} {'raw points':>11} {'raw json':>9} {'pyramid':>9} {'points':>6} {'pyr lttb':>9} "
+          f"{'lttb raw':>9} {'minmax raw':>10}  extremes kept (pyramid minmax/lttb, raw lttb/minmax)")
+    for label, span in (("session", None), ("6 h", 6 * 3600), ("1 h", 3600), ("5 min", 300)):
+        lo_ts = float(t_all[0]) if span is None else end_ts - span - 3600
+        hi_ts = end_ts if span is None else lo_ts + span
+        lo, hi = np.searchsorted(t_all, lo_ts), np.searchsorted(t_all, hi_ts)
+        raw_t, raw_v = t_all[lo:hi], v_all[lo:hi]
+        payload = len(json.dumps({"t": raw_t.tolist(), "v": raw_v.tolist()}))
+        t_pyr, (qt, qv) = timed(lambda: history.query("ttyACM0", "tremor_mag", lo_ts, hi_ts, args.points))
+        t_pyr_lttb, (_, lv) = timed(lambda: history.query("ttyACM0", "tremor_mag", lo_ts, hi_ts, args.points, "lttb"))
+        t_lttb, idx_lttb = timed(lambda: lttb(raw_t, raw_v, args.points), repeats=2)
+        t_mm, idx_mm = timed(lambda: minmax(raw_t, raw_v, args.points), repeats=2)
+        kept = (keeps_extremes(qv, raw_v), keeps_extremes(lv, raw_v),
+                keeps_extremes(raw_v[idx_lttb], raw_v), keeps_extremes(raw_v[idx_mm], raw_v))
+        ok &= kept[0] and len(qv) <= args.points and bool(np.all(np.diff(qt) >= 0))
+        print(f"{label:>10} {hi - lo:>11,} {payload / 2**20:>6.1f} MiB {t_pyr * 1000:>6.2f} ms {len(qv):>6} {t_pyr_lttb * 1000:>6.2f} ms "
+              f"{t_lttb * 1000:>6.1f} ms {t_mm * 1000:>7.1f} ms  {'/'.join('yes' if k else 'NO' for k in kept)}")
+    print(f"pyramid min/max views within budget and keeping extremes: {ok}")
+    return 0 if ok else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
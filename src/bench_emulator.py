@@ -0,0 +1,144 @@
+"""Hardware-free load test of the serial readers against emulated boards.
+
+* protocol: RAW_STREAM frames interleaved with text decode without CRC errors,
+  one frame per measurement cycle
+* verdicts: a saturated board read through ``port_registry`` (the path used by
+  ``serial_monitor_process`` and ``stm32_monitor.py``) delivers every verdict
+  line in order, parsing back to the emulator's detection results
+* port_fixer: ``monitor_port`` prints every line a fast board sends
+* scale: N saturated boards, one shared reader each; how much of the UART
+  line rate gets through and how far behind the readers fall
+
+    python bench_emulator.py --boards 1 16 64 --seconds 5
+"""
+import argparse
+import contextlib
+import io
+import sys
+import time
+
+import numpy as np
+import serial
+
+import detection
+import port_fixer
+from bench_utils import latency_summary
+from emulator import EmulatedBoard, EmulatorHub
+from frame_protocol import FrameParser
+from line_parser import KIND_DYSKINESIA, KIND_NORMAL, KIND_TREMOR, parse_lines
+from port_registry import PortRegistry
+
+BAUD = 115200
+VERDICT_KINDS = {KIND_NORMAL: detection.VERDICT_NONE, KIND_TREMOR: detection.VERDICT_TREMOR,
+                 KIND_DYSKINESIA: detection.VERDICT_DYSKINESIA}
+
+
+def check_protocol(seconds):
+    board = EmulatedBoard(scenario="mixed", speed=0, baud=BAUD, raw_stream=True, seed=1)
+    with EmulatorHub([board]):
+        parser = FrameParser()
+        n_frames = 0
+        with serial.Serial(board.path, BAUD, timeout=0.1) as ser:
+            end = time.perf_counter() + seconds
+            while time.perf_counter() < end:
+                seqs, _ = parser.readinto(ser)
+                n_frames += len(seqs)
+        stats = parser.stats()
+    ok = stats["crc_errors"] == 0 and stats["dropped_frames"] == 0 and abs(n_frames - board.cycles) <= 1
+    print(f"protocol: {board.cycles} cycles, {n_frames} frames decoded, {stats['crc_errors']} CRC errors, "
+          f"{stats['dropped_frames']} lost, {stats['skipped_bytes']:,} text bytes skipped: {'ok' if ok else 'FAIL'}")
+    return ok
+
+
+def check_verdicts(seconds):
+    board = EmulatedBoard(scenario="mixed", speed=0, baud=BAUD, seed=2)
+    registry = PortRegistry(idle_timeout=None)
+    received = []
+    # Subscribe before the board boots so no output waits in the pty for a reader
+    with registry.subscribe(board.path, BAUD) as sub:
+        sub.wait_connected()
+        with EmulatorHub([board]):
+            end = time.perf_counter() + seconds
+            while time.perf_counter() < end:
+                items = sub.read(timeout=0.1)
+                now = time.perf_counter()
+                received.extend((now, line) for _, line in items)
+            # Lines still in flight are checked for order but left out of the latency
+            timed = len(received)
+            time.sleep(0.3)
+            received.extend((time.perf_counter(), line) for _, line in sub.read())
+            sub.close()
+            sub.reader.join()
+    records = parse_lines([line for _, line in received])
+    is_verdict = np.isin(records["kind"], list(VERDICT_KINDS))
+    got = [line for (_, line), v in zip(received, is_verdict) if v]
+    sent = [line for _, line in board.verdicts]
+    truth = board.detection_results()
+    kinds = np.array([VERDICT_KINDS[k] for k in records["kind"][is_verdict]], dtype=np.uint8)
+    n = min(len(kinds), len(truth))
+    ok = got == sent and np.array_equal(kinds[:n], truth["verdict"][:n])
+    recv_times = [t for (t, _), v in zip(received[:timed], is_verdict[:timed]) if v]
+    lat = latency_summary([r - s for r, (s, _) in zip(recv_times, board.verdicts)])
+    print(f"verdicts: {len(sent)} sent, {len(got)} received in order: {got == sent}, "
+          f"kinds match detection: {np.array_equal(kinds[:n], truth['verdict'][:n])}, "
+          f"latency p50 {lat['p50_ms']:.1f} ms p99 {lat['p99_ms']:.1f} ms")
+    return ok
+
+
+def check_port_fixer(seconds):
+    board = EmulatedBoard(scenario="mixed", speed=20, baud=BAUD, seed=3)
+    with EmulatorHub([board]):
+        out = io.StringIO()
+        with contextlib.redirect_stdout(out):
+            ok = port_fixer.monitor_port(board.path, BAUD, duration=seconds)
+    printed = out.getvalue().count("\nData: ") + out.getvalue().startswith("Data: ")
+    # Lines still in flight when monitoring stopped are not printed
+    ok = ok and board.lines_sent - printed <= 3
+    print(f"port_fixer.monitor_port: board sent {board.lines_sent} lines, {printed} printed: "
+          f"{'ok' if ok else 'FAIL'}")
+    return ok
+
+
+def bench_scale(n_boards, seconds):
+    boards = [EmulatedBoard(scenario="mixed", speed=0, baud=BAUD, seed=100 + i) for i in range(n_boards)]
+    registry = PortRegistry(idle_timeout=None)
+    subs = [registry.subscribe(b.path, BAUD) for b in boards]
+    for sub in subs:
+        sub.wait_connected()
+    with EmulatorHub(boards):
+        start = time.perf_counter()
+        lines = 0
+        while time.perf_counter() - start < seconds:
+            for sub in subs:
+                lines += len(sub.read())
+            time.sleep(0.05)
+        elapsed = time.perf_counter() - start
+        backlog = sum(s.reader.buffer.head - s.cursor for s in subs)
+        sent = sum(b.bytes_sent for b in boards)
+        # Stop the readers before the hub closes the ptys under them
+        for sub in subs:
+            sub.close()
+        for sub in subs:
+            sub.reader.join()
+    line_rate = sent / (n_boards * BAUD / 10.0 * elapsed)
+    print(f"scale: {n_boards:3d} boards, {lines / elapsed:9,.0f} lines/s received, "
+          f"UART utilisation {line_rate:.0%}, reader backlog {backlog} lines")
+    return line_rate
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--boards", type=int, nargs="+", default=[1, 16, 64])
+    parser.add_argument("--seconds", type=float, default=5.0)
+    args = parser.parse_args()
+
+    ok = check_protocol(min(args.seconds, 3.0))
+    ok &= check_verdicts(args.seconds)
+    ok &= check_port_fixer(min(args.seconds, 3.0))
+    for n in args.boards:
+        bench_scale(n, args.seconds)
+    return 0 if ok else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
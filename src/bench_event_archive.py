@@ -0,0 +1,132 @@
+"""Write rate, size on disk and query time of the event archive at 10M events.
+
+Synthetic verdicts for 8 devices over 7 days go through ``ArchiveWriter``
+(hourly segments). A range query ("tremor events of one device between 10:00
+and 14:00 on day 3") is then timed three ways:
+
+* ``EventArchive.query``: index pruning plus binary search inside segments
+* a linear scan: every segment opened and filtered in full
+* the same filter over one flat in-memory array, as a lower bound for a scan
+
+Both archive reads must return exactly the rows of the in-memory filter.
+
+    python bench_event_archive.py --events 10000000
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+import numpy as np
+
+from event_archive import ARCHIVE_DTYPE, ArchiveWriter, EventArchive
+from line_parser import EVENT_DTYPE, KIND_DYSKINESIA, KIND_NORMAL, KIND_TREMOR
+
+DEVICES = [f"ttyACM{i}" for i in range(8)]
+
+
+def synthetic_hours(n_events, days, seed=0):
+    """Yield ``(device, EVENT_DTYPE rows)`` an hour at a time, time-ordered within each device"""
+    rng = np.random.default_rng(seed)
+    start = datetime(2024, 5, 1).timestamp()
+    hours = days * 24
+    per_hour = n_events // hours // len(DEVICES)
+    for h in range(hours):
+        for device in DEVICES:
+            rows = np.empty(per_hour, dtype=EVENT_DTYPE)
+            rows["ts"] = np.sort(start + h * 3600 + rng.uniform(0, 3600, per_hour))
+            rows["kind"] = rng.choice([KIND_NORMAL, KIND_TREMOR, KIND_DYSKINESIA], per_hour, p=[0.6, 0.25, 0.15])
+            rows["freq"] = rng.uniform(3, 7, per_hour).astype(np.float32)
+            rows["tremor_mag"] = rng.uniform(0, 50000, per_hour).astype(np.float32)
+            rows["dysk_mag"] = rng.uniform(0, 50000, per_hour).astype(np.float32)
+            rows["freq"][rows["kind"] == KIND_NORMAL] = np.nan
+            yield device, rows
+
+
+def linear_scan(root, kind, device_id, start_ts, end_ts):
+    parts = []
+    for name in sorted(os.listdir(root)):
+        if not name.endswith(".npz"):
+            continue
+        with np.load(os.path.join(root, name)) as columns:
+            rows = np.empty(len(columns["ts"]), dtype=ARCHIVE_DTYPE)
+            for col in ARCHIVE_DTYPE.names:
+                rows[col] = columns[col]
+        keep = (rows["kind"] == kind) & (rows["device"] == device_id) & (rows["ts"] >= start_ts) & (rows["ts"] < end_ts)
+        parts.append(rows[keep])
+    rows = np.concatenate(parts)
+    return rows[np.argsort(rows["ts"], kind="stable")]
+
+
+def timed(fn, repeats=3):
+    best = float("inf")
+    for _ in range(repeats):
+        start = time.perf_counter()
+        result = fn()
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--events", type=int, default=10000000)
+    parser.add_argument("--days", type=int, default=7)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as root:
+        writer = ArchiveWriter(root, flush_seconds=3600)
+        writer.start()
+        flat = []
+        start = time.perf_counter()
+        for device, rows in synthetic_hours(args.events, args.days):
+            writer.append(device, rows)
+            flat.append((writer.index["devices"].get(device), device, rows))
+        queued = time.perf_counter() - start
+        writer.close()
+        elapsed = time.perf_counter() - start
+        size = sum(os.path.getsize(os.path.join(root, n)) for n in os.listdir(root))
+        n = writer.events_written
+        print(f"wrote {n:,} events in {writer.segments_written} segments: {n / elapsed / 1e6:.2f} M events/s "
+              f"({queued:.1f} s on the caller, {elapsed:.1f} s total), {size / 2**20:.0f} MiB on disk "
+              f"({size / n:.1f} bytes/event, {ARCHIVE_DTYPE.itemsize} uncompressed)")
+
+        archive = EventArchive(root)
+        device_id = archive.index["devices"]["ttyACM3"]
+        all_rows = np.empty(n, dtype=ARCHIVE_DTYPE)
+        offset = 0
+        for _, device, rows in flat:
+            part = all_rows[offset:offset + len(rows)]
+            for col in rows.dtype.names:
+                part[col] = rows[col]
+            part["device"] = archive.index["devices"][device]
+            offset += len(rows)
+        del flat
+
+        day = datetime(2024, 5, 1) + timedelta(days=min(2, args.days - 1))
+        start_ts = (day + timedelta(hours=10)).timestamp()
+        end_ts = (day + timedelta(hours=14)).timestamp()
+        print(f"query: tremor events of ttyACM3 between 10:00 and 14:00 on {day:%Y-%m-%d}")
+
+        def in_memory():
+            keep = ((all_rows["kind"] == KIND_TREMOR) & (all_rows["device"] == device_id) &
+                    (all_rows["ts"] >= start_ts) & (all_rows["ts"] < end_ts))
+            rows = all_rows[keep]
+            return rows[np.argsort(rows["ts"], kind="stable")]
+
+        t_index, indexed = timed(lambda: archive.query("tremor", "ttyACM3", start_ts, end_ts))
+        t_scan, scanned = timed(lambda: linear_scan(root, KIND_TREMOR, device_id, start_ts, end_ts), repeats=1)
+        t_flat, expected = timed(in_memory)
+        touched = len(archive.segments("tremor", "ttyACM3", start_ts, end_ts))
+        print(f"  indexed query    {t_index * 1000:9.1f} ms  {len(indexed):,} rows from {touched} of "
+              f"{len(archive.index['segments'])} segments")
+        print(f"  linear scan      {t_scan * 1000:9.1f} ms  ({t_scan / t_index:,.0f}x slower)")
+        print(f"  in-memory filter {t_flat * 1000:9.1f} ms  (all {n:,} rows held in RAM)")
+        ok = np.array_equal(indexed, expected) and np.array_equal(scanned, expected)
+        print(f"results match: {ok}")
+    return 0 if ok else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
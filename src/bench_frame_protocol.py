@@ -0,0 +1,137 @@
+"""Benchmark and loss-detection checks for the raw-sample frame protocol.
+
+Encodes frames with the pure-Python encoder and decodes them:
+
+* from memory in serial-sized chunks (sustained decode throughput),
+* with dropped and corrupted frames (the counters must account for each),
+* through pyserial's ``loop://`` and a pseudo-terminal, using ``readinto``.
+
+    python bench_frame_protocol.py --frames 20000
+"""
+import argparse
+import io
+import os
+import sys
+import threading
+import time
+
+import numpy as np
+import serial
+
+from emulator import open_pty
+from frame_protocol import FrameParser, encode_frame
+
+FRAME_SAMPLES = 256
+
+
+def make_frames(n_frames, seed=0):
+    rng = np.random.default_rng(seed)
+    samples = rng.integers(-32768, 32767, size=(n_frames, FRAME_SAMPLES), dtype=np.int16)
+    frames = [encode_frame(i, samples[i]) for i in range(n_frames)]
+    return samples, frames
+
+
+def bench_decode(samples, frames, chunk=4096, repeats=3):
+    stream = b"".join(frames)
+    best = float("inf")
+    for _ in range(repeats):
+        parser = FrameParser()
+        start = time.perf_counter()
+        for i in range(0, len(stream), chunk):
+            parser.feed(stream[i:i + chunk])
+        best = min(best, time.perf_counter() - start)
+    mb = len(stream) / 1e6
+    print(f"feed():     {mb / best:8.1f} MB/s, {parser.samples / best:,.0f} samples/s "
+          f"({parser.frames} frames, {chunk} byte reads)")
+
+    best = float("inf")
+    for _ in range(repeats):
+        parser = FrameParser()
+        source = io.BytesIO(stream)
+        start = time.perf_counter()
+        while source.tell() < len(stream):
+            parser.readinto(source, max_bytes=chunk)
+        best = min(best, time.perf_counter() - start)
+    print(f"readinto(): {mb / best:8.1f} MB/s, {parser.samples / best:,.0f} samples/s")
+
+    # Real hardware: 104 samples/s in 256-sample frames
+    print(f"headroom over one board: {parser.samples / best / 104:,.0f}x")
+
+
+def check_loss_accounting(samples, frames):
+    drop = set(range(10, len(frames), 97))
+    corrupt = set(range(50, len(frames), 131)) - drop
+    stream = bytearray()
+    for i, frame in enumerate(frames):
+        if i in drop:
+            continue
+        if i % 7 == 0:
+            stream += b"Analyzing data...\r\n"  # text interleaved with frames
+        frame = bytearray(frame)
+        if i in corrupt:
+            frame[20] ^= 0x5A
+        stream += frame
+
+    parser = FrameParser()
+    got_seqs, got = [], []
+    rng = np.random.default_rng(1)
+    pos = 0
+    while pos < len(stream):
+        step = int(rng.integers(1, 3000))
+        seqs, decoded = parser.feed(stream[pos:pos + step])
+        got_seqs.append(seqs)
+        got.append(decoded)
+        pos += step
+
+    kept = [i for i in range(len(frames)) if i not in drop and i not in corrupt]
+    ok = (np.array_equal(np.concatenate(got_seqs), np.array(kept, dtype=np.uint16))
+          and np.array_equal(np.concatenate(got), samples[kept].ravel())
+          and parser.crc_errors == len(corrupt)
+          and parser.dropped_frames == len(drop) + len(corrupt))
+    print(f"loss accounting: {parser.stats()} -> {'ok' if ok else 'MISMATCH'}")
+    return ok
+
+
+def roundtrip(name, write, reader, samples, frames):
+    """Stream frames through a transport from a writer thread and decode with readinto()"""
+    parser = FrameParser()
+    got = []
+    writer = threading.Thread(target=lambda: [write(f) for f in frames], daemon=True)
+    start = time.perf_counter()
+    writer.start()
+    deadline = start + 30
+    while parser.frames < len(frames) and time.perf_counter() < deadline:
+        _, decoded = parser.readinto(reader, max_bytes=max(1, reader.in_waiting))
+        got.append(decoded)
+    elapsed = time.perf_counter() - start
+    writer.join(timeout=1)
+    ok = np.array_equal(np.concatenate(got), samples.ravel())
+    print(f"{name:>8}: {parser.frames} frames in {elapsed:.2f} s "
+          f"({parser.samples / elapsed:,.0f} samples/s) -> {'ok' if ok else 'MISMATCH'}")
+    return ok
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--frames", type=int, default=20000)
+    args = parser.parse_args()
+
+    samples, frames = make_frames(args.frames)
+    bench_decode(samples, frames)
+    ok = check_loss_accounting(samples, frames)
+
+    n = min(len(frames), 2000)
+    loop = serial.serial_for_url("loop://", timeout=0.05)
+    ok &= roundtrip("loop://", loop.write, loop, samples[:n], frames[:n])
+    loop.close()
+
+    master, slave, path = open_pty()
+    with serial.Serial(path, 115200, timeout=0.05) as ser:
+        ok &= roundtrip("pty", lambda f: os.write(master, f), ser, samples[:n], frames[:n])
+    os.close(master)
+    os.close(slave)
+    return 0 if ok else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
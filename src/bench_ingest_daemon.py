@@ -0,0 +1,259 @@
+"""Startup and query latency of the ingestion daemon, and what a dashboard rerun costs through it.
+
+* startup: seconds until a fresh ``ingest_daemon.py`` answers ``/status``, and the
+  import time of the daemon module against ``streamlit`` (when installed)
+* a rerun of the dashboard's live fragment as ``app.py`` does it: status,
+  counters and new lines from the daemon's shared-memory live state, plus
+  ``/stats`` and ``/chart`` only when lines were published. Timed with nothing
+  new and with a verdict published before every rerun
+* for comparison, the same fragment with every part requested over HTTP
+  (``/status``, ``/events``, ``/records``, ``/stats``, ``/chart``) over one
+  keep-alive connection and over a new connection per request, on TCP and on a
+  Unix socket; and the reads done directly on SQLite the way reruns used to
+* ingestion while being polled: an emulated board feeds the daemon while
+  reruns run at 10 Hz; every verdict the board sent must be counted, and the
+  console built from the live state must match the event store line for line
+
+    python bench_ingest_daemon.py --seconds 8
+"""
+import argparse
+import importlib.util
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+import numpy as np
+
+import line_parser
+from bench_utils import latency_summary
+from daemon_client import DaemonClient, live_snapshot
+from emulator import start_emulator
+from event_store import EventStore
+from ingest_daemon import IngestDaemon, make_server
+
+SRC = os.path.dirname(os.path.abspath(__file__))
+VERDICT_KINDS = (line_parser.KIND_TREMOR, line_parser.KIND_DYSKINESIA, line_parser.KIND_NORMAL)
+VERDICT_LINE = "No movement disorder detected (T: 123, D: 456)"
+
+
+def import_seconds(module):
+    code = f"import time; t = time.perf_counter(); import {module}; print(time.perf_counter() - t)"
+    out = subprocess.run([sys.executable, "-c", code], cwd=SRC, capture_output=True, text=True, check=True)
+    return float(out.stdout.strip().splitlines()[-1])
+
+
+def startup_seconds(workdir):
+    sock = os.path.join(workdir, "startup.sock")
+    start = time.perf_counter()
+    process = subprocess.Popen([sys.executable, os.path.join(SRC, "ingest_daemon.py"), "--unix", sock,
+                                "--live-state", f"bench_startup_{os.getpid()}"],
+                               cwd=workdir, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    client = DaemonClient(f"unix://{sock}")
+    try:
+        while not client.alive():
+            if time.perf_counter() - start > 10 or process.poll() is not None:
+                raise RuntimeError("ingest_daemon.py did not start")
+            time.sleep(0.005)
+        return time.perf_counter() - start
+    finally:
+        client.close()
+        process.terminate()
+        process.wait(5)
+
+
+class LiveSession:
+    """One dashboard session's live fragment, as ``app.py`` runs it (``STATS_SECONDS`` aside)"""
+
+    def __init__(self, client):
+        self.client = client
+        self.live = client.live_state()
+        self.console = []
+        self.verdicts = line_parser.parse_lines([])
+        self.cursor = None
+        self.head = None
+
+    def rerun(self):
+        snap = live_snapshot(self.live, since=self.cursor)
+        if self.cursor is None or snap.missed:
+            self.reload()
+        else:
+            if snap.start > self.cursor:
+                self.console.clear()
+                self.verdicts = self.verdicts[:0]
+            if len(snap.records):
+                lines = snap.lines()
+                self.console.extend(lines)
+                records = line_parser.parse_lines(lines, snap.records["ts"])
+                verdicts = records[np.isin(records["kind"], VERDICT_KINDS)]
+                self.verdicts = np.concatenate([self.verdicts, verdicts])[-200:]
+            self.cursor = snap.head
+        if snap.head != self.head:
+            self.head = snap.head
+            self.client.stats()
+            self.client.chart(points=800, last=300)
+
+    def reload(self):
+        self.console.clear()
+        cursor = 0
+        while True:
+            page = self.client.events(since=cursor)
+            rows = page["rows"]
+            if rows:
+                self.console.extend(row[3] for row in rows)
+                cursor = rows[-1][0]
+            if len(rows) < page["limit"]:
+                break
+        self.cursor = page["live_head"]
+        recent = self.client.records(limit=600)
+        self.verdicts = recent[np.isin(recent["kind"], VERDICT_KINDS)][-200:]
+
+    def close(self):
+        self.live.close()
+
+
+def rerun(client, cursor):
+    """The live fragment with every part requested over HTTP, as it was before the live state"""
+    client.status()
+    rows = client.events(since=cursor)["rows"]
+    client.records(limit=600)
+    client.stats()
+    client.chart(points=800, last=300)
+    return rows[-1][0] if rows else cursor
+
+
+def direct_rerun(path, cursor):
+    """The same reads done in the Streamlit process, as reruns did before the daemon"""
+    store = EventStore(path)
+    store.status()
+    store.counts()
+    rows = store.since(cursor, limit=5000)
+    store.records(limit=600)
+    store.close()
+    return rows[-1][0] if rows else cursor
+
+
+def timed_reruns(fn, n, before=None):
+    """Latency of ``n`` calls of ``fn(cursor)``; ``before()`` runs untimed ahead of each"""
+    times = []
+    cursor = 0
+    for _ in range(n):
+        if before is not None:
+            before()
+        start = time.perf_counter()
+        cursor = fn(cursor)
+        times.append(time.perf_counter() - start)
+    return latency_summary(times)
+
+
+def console_rows(client):
+    """Every console line in the event store, through /events"""
+    lines, cursor = [], 0
+    while True:
+        page = client.events(since=cursor)
+        lines.extend(row[3] for row in page["rows"])
+        if len(page["rows"]) < page["limit"]:
+            return lines
+        cursor = page["rows"][-1][0]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--seconds", type=float, default=8.0, help="emulated board run time")
+    parser.add_argument("--reruns", type=int, default=300)
+    args = parser.parse_args()
+
+    ok = True
+    with tempfile.TemporaryDirectory() as workdir:
+        daemon_import = import_seconds("ingest_daemon")
+        line = f"import ingest_daemon {daemon_import * 1000:.0f} ms"
+        if importlib.util.find_spec("streamlit") is not None:
+            line += f", import streamlit {import_seconds('streamlit') * 1000:.0f} ms"
+        else:
+            line += " (streamlit not installed here)"
+        print(line)
+        print(f"daemon answering /status {startup_seconds(workdir) * 1000:.0f} ms after launch")
+
+        db = os.path.join(workdir, "serial_data.db")
+        daemon = IngestDaemon(db, os.path.join(workdir, "archive"), os.path.join(workdir, "stats.json"),
+                              live_name=f"bench_ingest_daemon_{os.getpid()}")
+        tcp = make_server(daemon, port=0)
+        unix = make_server(daemon, unix_path=os.path.join(workdir, "daemon.sock"))
+        for server in (tcp, unix):
+            threading.Thread(target=server.serve_forever, daemon=True).start()
+        tcp_url = f"http://127.0.0.1:{tcp.server_address[1]}"
+        unix_url = f"unix://{unix.server_address}"
+
+        # Ingestion while a dashboard polls at 10 Hz
+        hub = start_emulator(1, scenario="mixed", speed=4.0)
+        board = hub.boards[0]
+        client = DaemonClient(tcp_url)
+        client.start(board.path, 115200)
+        session = LiveSession(client)
+        polls = []
+        end = time.monotonic() + args.seconds
+        while time.monotonic() < end:
+            start = time.perf_counter()
+            session.rerun()
+            polls.append(time.perf_counter() - start)
+            time.sleep(0.1)
+        hub.stop()
+        time.sleep(1.0)
+        counts = client.status()["counts"]
+        client.stop()
+        for device in daemon.running():
+            device.join(5)
+        session.rerun()
+        sent = len(board.verdicts)
+        counted = counts["tremor"] + counts["dyskinesia"] + counts["normal"]
+        same = session.console == console_rows(client)
+        ok &= sent > 0 and counted == sent and same
+        polled = latency_summary(polls)
+        print(f"ingesting {args.seconds:g} s of a 4x board: {sent} verdicts sent, {counted} counted; "
+              f"reruns while ingesting p50 {polled['p50_ms']:.2f} ms p99 {polled['p99_ms']:.2f} ms "
+              f"over {client.connects} connection(s); console from the live state matches the store: {same}")
+
+        print(f"{'live fragment rerun':<34} {'p50':>9} {'p99':>9}")
+        publish = lambda: daemon.append([VERDICT_LINE])
+        idle = timed_reruns(lambda c: session.rerun(), args.reruns)
+        busy = timed_reruns(lambda c: session.rerun(), args.reruns, before=publish)
+        print(f"{'live state, nothing new':<34} {idle['p50_ms']:>6.2f} ms {idle['p99_ms']:>6.2f} ms")
+        print(f"{'live state, a verdict per rerun':<34} {busy['p50_ms']:>6.2f} ms {busy['p99_ms']:>6.2f} ms")
+        session.close()
+
+        print(f"{'every part over HTTP (5 requests)':<34} {'p50':>9} {'p99':>9}")
+        for label, url in (("TCP", tcp_url), ("Unix socket", unix_url)):
+            kept = DaemonClient(url)
+            keep = timed_reruns(lambda c: rerun(kept, c), args.reruns)
+
+            def fresh(c):
+                # A new connection (and handler thread) for every request
+                one = DaemonClient(url)
+                requests = (one.status, lambda: one.events(since=c), lambda: one.records(limit=600),
+                            one.stats, lambda: one.chart(points=800, last=300))
+                results = []
+                for call in requests:
+                    results.append(call())
+                    one.close()
+                rows = results[1]["rows"]
+                return rows[-1][0] if rows else c
+            new = timed_reruns(fresh, args.reruns)
+            print(f"{label + ', keep-alive':<34} {keep['p50_ms']:>6.2f} ms {keep['p99_ms']:>6.2f} ms  ({kept.connects} connection)")
+            print(f"{label + ', connection per request':<34} {new['p50_ms']:>6.2f} ms {new['p99_ms']:>6.2f} ms")
+            kept.close()
+        direct = timed_reruns(lambda c: direct_rerun(db, c), args.reruns)
+        print(f"{'in-process SQLite (before)':<34} {direct['p50_ms']:>6.2f} ms {direct['p99_ms']:>6.2f} ms")
+
+        for server in (tcp, unix):
+            server.shutdown()
+            server.server_close()
+        daemon.close()
+        hub.close()
+    print(f"every verdict counted: {ok}")
+    return 0 if ok else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
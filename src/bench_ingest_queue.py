@@ -0,0 +1,112 @@
+"""Cost per line and drop accounting of IngestQueue against the old list truncation.
+
+The baseline ``app.py`` reader appended each line to a list and cut it back
+with ``buffer = buffer[-100:]``, copying the list on every line past the cap
+and keeping no record of what fell off. Here:
+
+* cost per line of that pattern and of ``IngestQueue.put`` + ``get`` for each
+  policy, with the queue kept full (the worst case for the old slice)
+* a reader thread playing firmware output (status, status, verdict) into each
+  policy while the consumer stalls every so often, as a slow disk would; the
+  counters must add up and the verdicts kept are reported
+
+    python bench_ingest_queue.py --lines 1000000
+"""
+import argparse
+import sys
+import threading
+import time
+
+from ingest_queue import BLOCK, COALESCE, POLICIES, IngestQueue
+from line_parser import KIND_STATUS, line_kind
+
+FIRMWARE = ["Collecting samples...", "Analyzing data...", "No movement disorder detected (T: {}, D: 0)"]
+
+
+def legacy_truncate(lines, cap):
+    buffer = []
+    for line in lines:
+        buffer.append(line)
+        if len(buffer) > cap:
+            buffer = buffer[-cap:]
+    return buffer
+
+
+def queue_full(lines, cap, policy, batch):
+    queue = IngestQueue(cap, policy, put_timeout=0)
+    for i in range(0, len(lines), batch):
+        queue.put(i, lines[i:i + batch])
+        if policy in (BLOCK, COALESCE) or len(queue) >= cap:
+            # Keep the queue at its cap, taking what the policy let in
+            queue.get(max_items=max(0, len(queue) - cap // 2))
+    return queue
+
+
+def timed(name, n, fn):
+    start = time.perf_counter()
+    fn()
+    elapsed = time.perf_counter() - start
+    print(f"  {name:36s} {elapsed * 1e9 / n:7.0f} ns/line")
+
+
+def slow_consumer(policy, n_windows, cap, stall_every, stall):
+    queue = IngestQueue(cap, policy)
+    kept = []
+
+    def consume():
+        taken = 0
+        while True:
+            items = queue.get(max_items=256, timeout=0.2)
+            if not items:
+                if queue.closed:
+                    return
+                continue
+            kept.extend(line for _, line in items)
+            taken += len(items)
+            if taken >= stall_every:
+                taken = 0
+                time.sleep(stall)
+
+    consumer = threading.Thread(target=consume)
+    consumer.start()
+    start = time.perf_counter()
+    for i in range(n_windows):
+        queue.put(time.time(), [line.format(i) for line in FIRMWARE])
+    queue.close()
+    producer_seconds = time.perf_counter() - start
+    consumer.join()
+    stats = queue.stats()
+    balanced = stats["enqueued"] == stats["dequeued"] + stats["queued"] + stats["dropped"]
+    verdicts = sum(1 for line in kept if line_kind(line) != KIND_STATUS)
+    print(f"  {policy:12s} kept {len(kept):7,d}/{stats['enqueued']:,} lines, {verdicts:6,d}/{n_windows:,} verdicts, "
+          f"dropped oldest {stats['dropped_oldest']:6,d} newest {stats['dropped_newest']:6,d} "
+          f"coalesced {stats['coalesced']:6,d}, high water {stats['high_water']:5,d}, "
+          f"reader blocked {stats['blocked_seconds']:.2f} of {producer_seconds:.2f} s, "
+          f"counters {'balance' if balanced else 'DO NOT BALANCE'}")
+    return balanced
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--lines", type=int, default=1000000)
+    parser.add_argument("--cap", type=int, default=100, help="buffer/queue length for the cost comparison")
+    parser.add_argument("--batch", type=int, default=16, help="lines per reader batch")
+    parser.add_argument("--windows", type=int, default=100000, help="firmware windows for the slow consumer run")
+    args = parser.parse_args()
+
+    lines = [FIRMWARE[i % 3].format(i) for i in range(args.lines)]
+    print(f"cost per line, {args.lines:,} lines, cap {args.cap}:")
+    for cap in (args.cap, 10000):
+        timed(f"list append + buffer[-{cap}:]", args.lines, lambda: legacy_truncate(lines, cap))
+        for policy in POLICIES:
+            timed(f"IngestQueue({cap}, {policy})", args.lines, lambda: queue_full(lines, cap, policy, args.batch))
+
+    print(f"slow consumer, {args.windows:,} windows into a 2,000-line queue:")
+    ok = True
+    for policy in POLICIES:
+        ok &= slow_consumer(policy, args.windows, 2000, stall_every=5000, stall=0.05)
+    return 0 if ok else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,110 @@
+"""Parse throughput of line_parser on a synthetic corpus of firmware output.
+
+The corpus mixes verdict lines in the exact firmware format (built with
+``detection.format_verdict``), the status lines printed around every window
+and a few unrelated lines. Compared per line:
+
+* the old substring classification (kind only, numbers discarded)
+* ``parse_line`` building one ``EventRecord`` per line
+* ``parse_lines`` filling an ``EVENT_DTYPE`` array per batch
+
+A round-trip check confirms every verdict parses back to the printed numbers.
+
+    python bench_line_parser.py --lines 2000000
+"""
+import argparse
+import sys
+import time
+
+import numpy as np
+
+import detection
+from line_parser import (EVENT_DTYPE, KIND_DYSKINESIA, KIND_NORMAL, KIND_TREMOR, kind_counts,
+                         parse_line, parse_lines)
+
+
+def synthetic_corpus(n_lines, seed=0):
+    """Firmware-like output: one verdict per three lines, with the verdict rows that produced it"""
+    rng = np.random.default_rng(seed)
+    n_verdicts = n_lines // 3
+    rows = np.zeros(n_verdicts, dtype=detection.DETECTION_DTYPE)
+    rows["verdict"] = rng.choice([detection.VERDICT_NONE, detection.VERDICT_TREMOR, detection.VERDICT_DYSKINESIA],
+                                 size=n_verdicts, p=[0.6, 0.25, 0.15])
+    rows["tremor_freq"] = rng.choice([2.8, 3.2, 3.7, 4.1, 4.5, 4.9], size=n_verdicts)
+    rows["dysk_freq"] = rng.choice([4.9, 5.3, 5.7, 6.1, 6.5], size=n_verdicts)
+    rows["tremor_mag"] = rng.uniform(0, 50000, n_verdicts).round()
+    rows["dysk_mag"] = rng.uniform(0, 50000, n_verdicts).round()
+    lines = []
+    for i, row in enumerate(rows):
+        lines.append("Collecting samples...")
+        lines.append("Analyzing data..." if i % 50 else "WHO_AM_I = 0x6A (expect 0x6A)")
+        lines.append(detection.format_verdict(row))
+    return lines, rows
+
+
+def legacy_classify(line):
+    """The substring checks the dashboard used before"""
+    if "Tremor detected" in line:
+        return "tremor"
+    if "Dyskinesia detected" in line:
+        return "dyskinesia"
+    if "No movement disorder detected" in line:
+        return "normal"
+    return "other"
+
+
+def check_round_trip(lines, rows):
+    records = parse_lines(lines)
+    verdicts = records[2::3]
+    ok = True
+    for code, verdict in ((KIND_TREMOR, detection.VERDICT_TREMOR), (KIND_DYSKINESIA, detection.VERDICT_DYSKINESIA),
+                          (KIND_NORMAL, detection.VERDICT_NONE)):
+        ok &= np.array_equal(verdicts["kind"] == code, rows["verdict"] == verdict)
+    tremor = rows["verdict"] == detection.VERDICT_TREMOR
+    dysk = rows["verdict"] == detection.VERDICT_DYSKINESIA
+    normal = rows["verdict"] == detection.VERDICT_NONE
+    # %.1f frequencies: compare the printed value, not the float32 bin frequency
+    ok &= np.allclose(verdicts["freq"][tremor], np.round(rows["tremor_freq"][tremor], 1), atol=0.051)
+    ok &= np.allclose(verdicts["freq"][dysk], np.round(rows["dysk_freq"][dysk], 1), atol=0.051)
+    ok &= np.array_equal(verdicts["tremor_mag"][tremor | normal], rows["tremor_mag"][tremor | normal])
+    ok &= np.array_equal(verdicts["dysk_mag"][dysk | normal], rows["dysk_mag"][dysk | normal])
+    ok &= bool(np.all(np.isnan(verdicts["freq"][normal])))
+    print(f"round trip over {len(rows):,} verdicts: {'ok' if ok else 'MISMATCH'}, "
+          f"kind counts {kind_counts(records).tolist()}")
+    return ok
+
+
+def timed(name, n, fn):
+    start = time.perf_counter()
+    result = fn()
+    elapsed = time.perf_counter() - start
+    print(f"  {name:34s} {n / elapsed / 1e6:6.2f} M lines/s ({elapsed * 1e9 / n:5.0f} ns/line)")
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--lines", type=int, default=2000000)
+    parser.add_argument("--batch", type=int, default=256, help="lines per parse_lines call")
+    args = parser.parse_args()
+
+    lines, rows = synthetic_corpus(args.lines)
+    n = len(lines)
+    ok = check_round_trip(lines[:300000], rows[:100000])
+
+    print(f"{n:,} lines:")
+    timed("legacy substring classify", n, lambda: [legacy_classify(line) for line in lines])
+    objects = timed("parse_line -> EventRecord", n, lambda: [parse_line(line) for line in lines])
+    timed(f"parse_lines, batches of {args.batch}", n,
+          lambda: [parse_lines(lines[i:i + args.batch]) for i in range(0, n, args.batch)])
+    records = timed("parse_lines, one call", n, lambda: parse_lines(lines))
+
+    text_bytes = sum(sys.getsizeof(line) for line in lines) + sys.getsizeof(lines)
+    object_bytes = sum(sys.getsizeof(r) for r in objects[:1000]) / 1000 * n + sys.getsizeof(objects)
+    print(f"memory: {text_bytes / 2**20:.0f} MiB as str, ~{object_bytes / 2**20:.0f} MiB as EventRecord, "
+          f"{records.nbytes / 2**20:.0f} MiB as EVENT_DTYPE ({EVENT_DTYPE.itemsize} bytes/record)")
+    return 0 if ok else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,204 @@
+"""Benchmark the shared-memory live state channel against the JSON state file.
+
+Two writer processes run side by side for the whole benchmark and publish
+the same firmware-like batches at the same rate: one into a shared-memory
+block, one rewriting a JSON file in place the way the old dashboard's
+``save_state()`` did. This process alternates short rounds of snapshots from
+each, so both are timed under the same load. The shared-memory block is read
+twice over: the last 100 lines, like the JSON file, and only the lines new
+since the previous read, which is what a dashboard rerun asks for.
+
+A read of the last 100 lines costs more than loading the small JSON file
+(decoding 100 fixed-width records against one C-level JSON parse); the block
+wins on consistency, since the file is often caught mid-rewrite, and on
+reruns that only need the new lines.
+
+Every read is checked: the per-kind counters must add up to the number of
+lines published and the buffer must hold the last ``min(100, published)``
+lines. A JSON read that fails to parse (the file caught mid-rewrite) counts
+as corrupt. The run fails if any shared-memory snapshot is inconsistent,
+which exercises the sequence lock under contention.
+
+    python bench_live_state.py --seconds 3 --rate 200
+"""
+import argparse
+import collections
+import json
+import multiprocessing
+import os
+import sys
+import tempfile
+import time
+
+from bench_utils import latency_summary
+from live_state import KIND_NORMAL, KIND_STATUS, LiveStateReader, LiveStateWriter
+
+NAME = "stm32_live_state_bench"
+BUFFER_LINES = 100
+ROUND_SECONDS = 0.25
+
+
+def firmware_batch(batch):
+    lines = ["Collecting samples...", "Analyzing data...", "No movement disorder detected (T: 123, D: 456)"] * (batch // 3)
+    kinds = [KIND_STATUS, KIND_STATUS, KIND_NORMAL] * (batch // 3)
+    return lines, kinds
+
+
+def paced(stop, rate, publish):
+    """Call ``publish`` ``rate`` times a second (as fast as possible for 0) until ``stop`` is set"""
+    period = 1.0 / rate if rate else 0.0
+    due = time.perf_counter()
+    while not stop.is_set():
+        publish()
+        if period:
+            due += period
+            delay = due - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            else:
+                due = time.perf_counter()
+
+
+def shm_writer_main(ready, stop, batch, rate):
+    writer = LiveStateWriter(NAME, capacity=1024)
+    writer.set_status(connected=True, error=None)
+    lines, kinds = firmware_batch(batch)
+    ready.set()
+    paced(stop, rate, lambda: writer.publish(time.time(), lines, kinds))
+    writer.close()
+
+
+def json_writer_main(ready, stop, batch, rate, path):
+    """The old path: keep the last lines and counters, and rewrite the whole file after every batch"""
+    lines, kinds = firmware_batch(batch)
+    buffer = collections.deque(maxlen=BUFFER_LINES)
+    state = {"head": 0, "status_count": 0, "normal_count": 0}
+
+    def publish():
+        buffer.extend(lines)
+        state["head"] += len(lines)
+        state["status_count"] += kinds.count(KIND_STATUS)
+        state["normal_count"] += kinds.count(KIND_NORMAL)
+        with open(path, "w") as f:
+            json.dump({"buffer": list(buffer), **state, "last_updated": time.time()}, f)
+
+    publish()
+    ready.set()
+    paced(stop, rate, publish)
+
+
+def read_shm(reader):
+    snap = reader.snapshot(limit=BUFFER_LINES)
+    lines = snap.lines()
+    return snap.head, int(snap.counts.sum()) == snap.head and len(lines) == min(BUFFER_LINES, snap.head)
+
+
+class IncrementalRead:
+    """What a dashboard rerun does: only the lines published since its previous snapshot"""
+
+    def __init__(self, reader):
+        self.reader = reader
+        self.cursor = None
+
+    def __call__(self):
+        snap = self.reader.snapshot(since=self.cursor)
+        lines = snap.lines()
+        expected = snap.head - max(snap.start, snap.head - len(self.reader.ring), self.cursor or 0)
+        self.cursor = snap.head
+        return snap.head, int(snap.counts.sum()) == snap.head and len(lines) == expected
+
+
+def read_json(path):
+    with open(path) as f:
+        data = json.load(f)
+    head = data["head"]
+    consistent = (data["status_count"] + data["normal_count"] == head
+                  and len(data["buffer"]) == min(BUFFER_LINES, head))
+    return head, consistent
+
+
+class Path:
+    """Timings and failed checks of one way of reading the live state"""
+
+    def __init__(self, name, read):
+        self.name = name
+        self.read = read
+        self.latencies = []
+        self.heads = []
+        self.inconsistent = 0
+        self.corrupt = 0
+        self.seconds = 0.0
+
+    def round(self, seconds):
+        start_round = time.perf_counter()
+        end = start_round + seconds
+        while time.perf_counter() < end:
+            start = time.perf_counter()
+            try:
+                head, consistent = self.read()
+            except ValueError:
+                # Empty or half-written file: the old dashboard started over from a blank state.
+                # Not timed, since failing on a truncated file is quicker than a real read
+                self.corrupt += 1
+                continue
+            self.latencies.append(time.perf_counter() - start)
+            self.heads.append((time.perf_counter(), head))
+            self.inconsistent += not consistent
+        self.seconds += time.perf_counter() - start_round
+
+    def report(self):
+        s = latency_summary(self.latencies)
+        (t0, h0), (t1, h1) = self.heads[0], self.heads[-1]
+        print(f"{self.name:<14}{s['count']:>9}{s['p50_ms'] * 1000:>10.1f}{s['p99_ms'] * 1000:>10.1f}"
+              f"{(h1 - h0) / (t1 - t0):>14,.0f}{self.inconsistent:>14}{self.corrupt:>9}")
+        return s
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--seconds", type=float, default=3.0, help="reading time per path")
+    parser.add_argument("--batch", type=int, default=30, help="lines per published batch")
+    parser.add_argument("--rate", type=float, default=200.0, help="batches per second per writer, 0 for flat out")
+    args = parser.parse_args()
+
+    fd, path = tempfile.mkstemp(suffix=".json")
+    os.close(fd)
+    ctx = multiprocessing.get_context("spawn")
+    stop = ctx.Event()
+    ready = [ctx.Event(), ctx.Event()]
+    procs = [ctx.Process(target=shm_writer_main, args=(ready[0], stop, args.batch, args.rate)),
+             ctx.Process(target=json_writer_main, args=(ready[1], stop, args.batch, args.rate, path))]
+    for proc in procs:
+        proc.start()
+    try:
+        for event in ready:
+            event.wait(10)
+        reader = LiveStateReader(NAME)
+        paths = [Path("shared memory", lambda: read_shm(reader)), Path("json file", lambda: read_json(path)),
+                 Path("new lines", IncrementalRead(reader))]
+        # Alternating rounds, so both paths see the same writers and the same machine noise
+        while paths[0].seconds < args.seconds:
+            for p in paths:
+                p.round(ROUND_SECONDS)
+    finally:
+        stop.set()
+        for proc in procs:
+            proc.join()
+    reader.close()
+    os.unlink(path)
+
+    print(f"two writers, each publishing {args.batch}-line batches "
+          + (f"{args.rate:g} times a second" if args.rate else "as fast as they can")
+          + f"; snapshots of the last {BUFFER_LINES} lines")
+    print(f"{'path':<14}{'reads':>9}{'p50 us':>10}{'p99 us':>10}{'lines/s seen':>14}{'inconsistent':>14}{'corrupt':>9}")
+    shm, js, new = (p.report() for p in paths)
+    print(f"p50 against the json file: last {BUFFER_LINES} lines {shm['p50_ms'] / js['p50_ms']:.2f}x, "
+          f"new lines only {new['p50_ms'] / js['p50_ms']:.2f}x; "
+          f"json reads that saw a torn or inconsistent file: {paths[1].corrupt + paths[1].inconsistent}")
+    ok = all(p.inconsistent == 0 and p.corrupt == 0 for p in (paths[0], paths[2]))
+    print(f"every shared-memory snapshot consistent: {ok}")
+    return 0 if ok else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,203 @@
+"""Overhead of the pipeline instrumentation, and the cost of a scrape.
+
+* the primitives: ``Counter.inc``, ``Histogram.observe``, a ``labels()`` lookup
+  and the ``perf_counter`` pair around a timed stage
+* the daemon's publishing path (parse, SQLite commit, archive, statistics,
+  chart pyramids) for reader-sized batches of firmware output, without and
+  with the stage timings, lag histogram and line counter ``DeviceIngest`` adds
+* the reader side: ``SerialLineReader`` on an in-memory port without and
+  with the decode timer of ``PortReader`` (its byte, line and decode-error
+  counters are read at scrape time and cost nothing here). With no system
+  calls in the loop the relative overhead is the worst case, so the budget
+  is the share of a core it takes at 1000 reads/s
+* ``render()`` and ``snapshot()`` of a registry holding the series of four
+  devices, and a check that every rendered sample line is well formed
+
+Runs alternate between the two variants and the median is kept, so drift on
+the machine affects both alike.
+
+    python bench_metrics.py --batches 3000
+"""
+import argparse
+import os
+import re
+import statistics
+import sys
+import tempfile
+import time
+
+from bench_line_parser import synthetic_corpus
+from downsample import ChartHistory
+from event_archive import ArchiveWriter
+from event_store import EventStore
+import line_parser
+from metrics import MetricsRegistry
+from serial_reader import SerialLineReader
+from session_stats import SessionStats
+
+SAMPLE_LINE = re.compile(r'^[a-zA-Z_:][a-zA-Z0-9_:]*(\{[a-zA-Z_][a-zA-Z0-9_]*="(?:[^"\\]|\\.)*"'
+                         r'(,[a-zA-Z_][a-zA-Z0-9_]*="(?:[^"\\]|\\.)*")*\})? (NaN|[+-]Inf|-?[0-9.e+-]+)$')
+
+
+def per_call_ns(fn, n=200000):
+    start = time.perf_counter()
+    for _ in range(n):
+        fn()
+    return (time.perf_counter() - start) / n * 1e9
+
+
+class Pipeline:
+    """The writers of one ``DeviceIngest``, with or without its instrumentation"""
+
+    def __init__(self, workdir, registry, instrumented):
+        self.store = EventStore(os.path.join(workdir, "events.db"))
+        self.archive = ArchiveWriter(os.path.join(workdir, "archive"))
+        self.archive.start()
+        self.stats = SessionStats()
+        self.chart = ChartHistory(columns=("tremor_mag", "dysk_mag"))
+        self.instrumented = instrumented
+        stages = registry.histogram("ingest_stage_seconds", "", ("device", "stage"))
+        self.stage = [stages.labels("bench", s) for s in ("parse", "store", "archive", "stats", "chart")]
+        self.lag = registry.histogram("ingest_lag_seconds", "", ("device",)).labels("bench")
+        self.lines = registry.counter("ingest_lines_total", "", ("device",)).labels("bench")
+
+    def publish(self, ts, lines):
+        if not self.instrumented:
+            records = line_parser.parse_lines(lines, ts)
+            self.store.append(ts, lines, records)
+            self.archive.append("bench", records)
+            self.stats.update(records)
+            self.chart.update("bench", records)
+            return
+        clock = time.perf_counter
+        t0 = clock()
+        records = line_parser.parse_lines(lines, ts)
+        t1 = clock()
+        self.store.append(ts, lines, records)
+        t2 = clock()
+        self.archive.append("bench", records)
+        t3 = clock()
+        self.stats.update(records)
+        t4 = clock()
+        self.chart.update("bench", records)
+        t5 = clock()
+        parse_s, store_s, archive_s, stats_s, chart_s = self.stage
+        parse_s.observe(t1 - t0)
+        store_s.observe(t2 - t1)
+        archive_s.observe(t3 - t2)
+        stats_s.observe(t4 - t3)
+        chart_s.observe(t5 - t4)
+        self.lag.observe(max(0.0, time.time() - ts))
+        self.lines.inc(len(lines))
+
+    def close(self):
+        self.store.close()
+        self.archive.close()
+
+
+class FakePort:
+    """Just enough of ``serial.Serial`` for ``SerialLineReader``"""
+
+    def __init__(self, chunks):
+        self.chunks = chunks
+        self.i = 0
+
+    @property
+    def in_waiting(self):
+        return len(self.chunks[self.i % len(self.chunks)])
+
+    def read(self, n):
+        chunk = self.chunks[self.i % len(self.chunks)]
+        self.i += 1
+        return chunk
+
+
+def read_loop(chunks, n, registry=None):
+    """``PortReader``'s loop body for ``n`` reads, with its counters when ``registry`` is given"""
+    if registry is None:
+        reader = SerialLineReader(FakePort(chunks))
+        start = time.perf_counter()
+        for _ in range(n):
+            reader.read_batch()
+        return time.perf_counter() - start
+    decode = registry.histogram("serial_decode_seconds", "", ("port",)).labels("bench")
+    reader = SerialLineReader(FakePort(chunks), decode_time=decode.observe)
+    # Byte, line and decode-error counters read the reader's totals at scrape time
+    registry.counter("serial_bytes_total", "", ("port",)).labels("bench").set_function(lambda: reader.bytes_read)
+    registry.counter("serial_lines_total", "", ("port",)).labels("bench").set_function(lambda: reader.lines_read)
+    start = time.perf_counter()
+    for _ in range(n):
+        reader.read_batch()
+    assert registry.snapshot()["serial_lines_total"][0]["value"] == reader.lines_read
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--batches", type=int, default=3000, help="reader batches per run")
+    parser.add_argument("--rounds", type=int, default=7)
+    args = parser.parse_args()
+
+    registry = MetricsRegistry()
+    counter = registry.counter("c_total").labels()
+    hist = registry.histogram("h_seconds", "", ("stage",))
+    series = hist.labels("parse")
+    clock = time.perf_counter
+    print(f"Counter.inc {per_call_ns(counter.inc):.0f} ns, Histogram.observe {per_call_ns(lambda: series.observe(3e-4)):.0f} ns, "
+          f"labels() lookup {per_call_ns(lambda: hist.labels('parse')):.0f} ns, "
+          f"perf_counter pair {per_call_ns(lambda: clock() - clock()):.0f} ns")
+
+    # Reader-sized batches: one firmware window (3 lines) per batch, as at the real line rate
+    corpus, _ = synthetic_corpus(args.batches * 3)
+    batches = [corpus[i:i + 3] for i in range(0, len(corpus), 3)]
+    times = {False: [], True: []}
+    with tempfile.TemporaryDirectory() as workdir:
+        for r in range(args.rounds):
+            for instrumented in (False, True):
+                run_dir = os.path.join(workdir, f"{r}-{instrumented}")
+                os.mkdir(run_dir)
+                pipeline = Pipeline(run_dir, MetricsRegistry(), instrumented)
+                start = time.perf_counter()
+                for lines in batches:
+                    pipeline.publish(time.time(), lines)
+                times[instrumented].append((time.perf_counter() - start) / len(batches))
+                pipeline.close()
+    base, inst = statistics.median(times[False]), statistics.median(times[True])
+    publish_overhead = (inst - base) / base * 100
+    print(f"publish per batch: {base * 1e6:.1f} us plain, {inst * 1e6:.1f} us instrumented "
+          f"({inst - base:+.2e} s, {publish_overhead:+.1f}%)")
+
+    chunks = [("\n".join(corpus[i:i + 12]) + "\n").encode() for i in range(0, min(len(corpus), 12000), 12)]
+    reads = args.batches * 10
+    plain = statistics.median(read_loop(chunks, reads) for _ in range(args.rounds))
+    counted = statistics.median(read_loop(chunks, reads, MetricsRegistry()) for _ in range(args.rounds))
+    read_cost = (counted - plain) / reads
+    print(f"reader per read of 12 lines: {plain / reads * 1e6:.2f} us plain, {counted / reads * 1e6:.2f} us "
+          f"instrumented ({read_cost * 1e6:+.2f} us, {read_cost * 1000 * 100:.2f}% of a core at 1000 reads/s)")
+
+    # A scrape of a daemon reading four devices
+    scrape = MetricsRegistry()
+    for d in range(4):
+        for name in ("serial_bytes_total", "serial_lines_total", "serial_decode_errors_total", "ingest_lines_total"):
+            scrape.counter(name, "", ("device",)).labels(f"/dev/ttyACM{d}").inc(1000)
+        for stage in ("parse", "store", "archive", "stats", "chart"):
+            h = scrape.histogram("ingest_stage_seconds", "", ("device", "stage")).labels(f"/dev/ttyACM{d}", stage)
+            for v in (2e-5, 3e-4, 0.002):
+                h.observe(v)
+        scrape.gauge("ingest_queue_depth", "", ("device",)).labels(f"/dev/ttyACM{d}").set_function(lambda: 0)
+    text = scrape.render()
+    render_ms = per_call_ns(scrape.render, 500) / 1e6
+    snapshot_ms = per_call_ns(scrape.snapshot, 500) / 1e6
+    samples = [line for line in text.splitlines() if line and not line.startswith("#")]
+    well_formed = all(SAMPLE_LINE.match(line) for line in samples)
+    print(f"scrape of {len(samples)} samples: render {render_ms:.3f} ms, snapshot {snapshot_ms:.3f} ms; "
+          f"well formed: {well_formed}")
+
+    # Left on in production: a few percent at most on the hot path
+    ok = well_formed and publish_overhead < 10 and read_cost * 1000 < 0.01
+    print(f"overhead within budget (publish < 10%, reader < 1% of a core): {ok}")
+    return 0 if ok else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,120 @@
+"""Parity and speed of the detection-parameter sweep.
+
+* parity: with the firmware's parameters, verdicts scored from cached spectra
+  must match ``detection.run_detection`` on the same windows
+* cache: a sweep with an empty spectra cache, the same sweep again with the
+  cache filled, and the cost per configuration of recomputing the FFTs for
+  every configuration instead
+* scaling: the scoring stage with one worker and with one per core (skipped
+  on a single-core machine)
+
+    python bench_param_sweep.py --minutes 60 --hop 32
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+import detection
+import param_sweep
+import synthetic_motion
+from raw_archive import RawArchive
+
+
+def naive_seconds(corpus, configs):
+    """Seconds per configuration when every configuration computes its own FFTs"""
+    start = time.perf_counter()
+    for config in configs:
+        for recording, segments in corpus.items():
+            archive = RawArchive(recording)
+            windows = archive.windows(hop=config["hop"], size=config["window"])
+            truth = param_sweep.window_labels(segments, len(windows), config["window"], config["hop"],
+                                              archive.sample_rate)
+            mags = detection.magnitudes(windows[truth >= 0], detection.hann_window(config["window"]), dc_scale=1.0)
+            param_sweep.classify(mags, config)
+    return (time.perf_counter() - start) / len(configs)
+
+
+def parity(corpus, cache_dir):
+    """Windows whose verdict from cached spectra differs from run_detection(), and the windows compared"""
+    config = dict(param_sweep.FIRMWARE)
+    size, hop = config["window"], config["hop"]
+    differ = total = 0
+    for recording, segments in corpus.items():
+        path = param_sweep.spectra_path(cache_dir, recording, size, hop)
+        if not os.path.exists(path):
+            param_sweep.compute_spectra(recording, size, hop, path)
+        cached = param_sweep.classify(np.load(path, mmap_mode="r"), config)
+        direct = detection.run_detection(RawArchive(recording).windows(hop=hop, size=size))["verdict"]
+        differ += int(np.count_nonzero(cached != direct))
+        total += len(direct)
+    return differ, total
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--recordings", type=int, default=4)
+    parser.add_argument("--minutes", type=float, default=60.0)
+    parser.add_argument("--hop", type=int, default=32, help="samples between windows in the swept grid")
+    args = parser.parse_args()
+
+    grid = {
+        "window": [256],
+        "hop": [args.hop],
+        "threshold": [3.0, 4.0, 5.0, 6.0, 8.0, 10.0],
+        "dc_scale": [0.1, 1.0],
+        "baseline": [(1, 11), (0, 11), (1, 6)],
+        "bands": [(3.0, 5.0, 7.0), (3.5, 5.0, 7.0), (3.0, 5.2, 7.5)],
+    }
+    cores = os.cpu_count() or 1
+    ok = True
+    with tempfile.TemporaryDirectory() as workdir:
+        labels = synthetic_motion.write_corpus(workdir, args.recordings, args.minutes)
+        corpus = param_sweep.load_corpus(labels)
+        samples = sum(RawArchive(r).committed for r in corpus)
+        print(f"corpus: {args.recordings} recordings, {samples / detection.SAMPLE_RATE_HZ / 3600:.1f} h of samples")
+
+        differ, total = parity(corpus, os.path.join(workdir, "parity"))
+        ok &= differ <= total * 0.001
+        print(f"parity with run_detection(): {differ} of {total} verdicts differ")
+
+        cache = os.path.join(workdir, "cache")
+        cold, cold_t = param_sweep.sweep(corpus, grid, cache, workers=1)
+        warm, warm_t = param_sweep.sweep(corpus, grid, cache, workers=1)
+        ok &= [r["confusion"] for r in cold] == [r["confusion"] for r in warm]
+        n = cold_t["configs"]
+        cold_s = cold_t["spectra_seconds"] + cold_t["evaluate_seconds"]
+        warm_s = warm_t["spectra_seconds"] + warm_t["evaluate_seconds"]
+        naive = naive_seconds(corpus, param_sweep.grid_configs(grid)[:4])
+        ok &= warm_s < cold_s and warm_s / n < naive / 5
+        windows = cold[0]["windows"]
+        print(f"{n} configurations over {windows} labelled windows (hop {args.hop}):")
+        print(f"  cold cache {cold_s:.2f} s ({cold_t['spectra']} spectra in {cold_t['spectra_seconds']:.2f} s), "
+              f"warm cache {warm_s:.2f} s")
+        print(f"  per configuration: {warm_s / n * 1000:.1f} ms from cached spectra, "
+              f"{naive * 1000:.1f} ms recomputing the FFTs ({naive / (warm_s / n):.0f}x)")
+
+        if cores > 1:
+            workers = min(cores, 8)
+            _, parallel_t = param_sweep.sweep(corpus, grid, cache, workers=workers)
+            speedup = warm_t["evaluate_seconds"] / parallel_t["evaluate_seconds"]
+            ok &= speedup >= 0.6 * workers
+            print(f"  scoring with {workers} workers: {parallel_t['evaluate_seconds']:.2f} s, "
+                  f"{speedup:.1f}x one worker")
+        else:
+            print("  single core: pool scaling not measured")
+
+        best = cold[0]
+        firmware = next(r for r in cold if r["config"]["threshold"] == 10.0 and r["config"]["dc_scale"] == 0.1
+                        and r["config"]["baseline"] == (1, 11) and r["config"]["bands"] == (3.0, 5.0, 7.0))
+        print(f"best accuracy {best['accuracy']:.3f} ({param_sweep.describe(best['config'])}), "
+              f"firmware parameters at hop {args.hop}: {firmware['accuracy']:.3f}")
+    print(f"parity and cache speedup hold: {ok}")
+    return 0 if ok else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
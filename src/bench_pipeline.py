@@ -0,0 +1,484 @@
+"""End-to-end latency and throughput of the dashboards' ingestion paths.
+
+Each app's path from the serial line to the screen is replayed outside
+Streamlit with the same modules, fed by a ``PacedWriter`` on a pty:
+
+* app: an ``IngestDaemon`` on a Unix socket reads the port (started without a
+  lease, like "Start Monitoring"); a 1 s fragment does what ``live_panel``
+  does: ``sync_console`` from the daemon's live state block (reloading from
+  ``/events`` on the first pass), ``/stats`` and ``/chart`` when something was
+  published, and one 100-line page of text
+* stm32_monitor: the same daemon with a leased port; a 0.25 s fragment does
+  what ``poll_serial`` does: the port's new lines from the live state block
+  into a ``ConsoleBuffer``, ``/status`` once a second, and one joined page
+* debug_app: the blocking ``read_lines(timeout=0.5)`` loop redrawing per batch
+
+Every line carries a sequence number, so each one is timestamped at write,
+read (the reader thread's batch time) and render (the first page of text that
+contains it); parsing and storage happen inside the daemon, whose own stage
+timings are on its ``/metrics``. Each (app, rate) run gets a fresh process, so
+its CPU time and peak RSS are its own; for the daemon paths they cover the
+daemon and the dashboard fragment together. The writer runs in the parent.
+
+The state-file section prices what the baseline ``app.py`` did per line and
+per rerun: ``save_state()`` dumping the whole buffer to JSON after every line,
+and the ``json.load`` at the top of the script, against the event store and
+shared-memory reads that replaced them, as the buffer grows.
+
+Results print as a table and, with ``--json``, are written for comparison
+across commits:
+
+    python bench_pipeline.py --rates 200 2000 20000 --seconds 5 --json before.json
+    python bench_pipeline.py --compare before.json after.json
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import platform
+import re
+import resource
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime
+from itertools import groupby
+from operator import itemgetter
+
+import numpy as np
+
+from bench_utils import PacedWriter, latency_summary
+from emulator import open_pty
+from console_view import PAGE_LINES, ConsoleBuffer
+from daemon_client import DaemonClient, live_snapshot
+from event_store import EventStore
+from ingest_daemon import IngestDaemon, make_server
+import line_parser
+from live_state import LiveStateReader, LiveStateWriter
+from port_registry import PortRegistry
+
+PATHS = ("app", "stm32_monitor", "debug_app")
+# Fragment intervals of the apps (debug_app redraws as soon as a batch arrives)
+REFRESH = {"app": 1.0, "stm32_monitor": 0.25, "debug_app": 0.0}
+# app.py fetches statistics at least this often; stm32_monitor.py asks for the device's status
+STATS_SECONDS = 5.0
+DEVICE_CHECK_SECONDS = 1.0
+STAGES = ("read", "render")
+READ_BAUD = 115200  # what the apps open the port with; a pty ignores it
+
+_SEQ = re.compile(r"(?:mag|T): (\d{8})")
+
+
+def make_line(seq):
+    """A verdict line in the firmware format carrying ``seq`` as its tremor magnitude"""
+    if seq % 4 == 3:
+        return f"Tremor detected at 4.5 Hz (mag: {seq:08d})\r\n".encode()
+    return f"No movement disorder detected (T: {seq:08d}, D: 0)\r\n".encode()
+
+
+# Fixed-width sequence numbers keep the mean line length constant, so the offered rate is exact
+LINE_BYTES = sum(len(make_line(seq)) for seq in range(4)) / 4.0
+
+
+def line_seqs(lines):
+    return np.array([int(m.group(1)) for m in map(_SEQ.search, lines) if m], dtype=np.int64)
+
+
+def mark(column, seqs, t):
+    """Stamp ``t`` on the lines with sequence numbers ``seqs``; a line shown again keeps its first stamp"""
+    seqs = seqs[(seqs >= 0) & (seqs < len(column))]
+    column[seqs] = np.fmin(column[seqs], t)
+
+
+def mark_shown(stamps, ts, lines, now, clock_offset):
+    """Stamp read (the reader's batch time ``ts`` of each line) and render on lines drawn at ``now``"""
+    for t, batch in groupby(zip(ts, lines), key=itemgetter(0)):
+        mark(stamps["read"], line_seqs([line for _, line in batch]), t - clock_offset)
+    mark(stamps["render"], line_seqs(lines), now)
+
+
+# --- Ingestion paths (run in a child process) ---
+
+def run_app(client, live_id, stamps, stop, render_ms, clock_offset):
+    """``live_panel`` every second; returns the lines it could not show"""
+    live = client.live_state()
+    console = ConsoleBuffer()
+    cursor = None
+    fetched = (None, 0.0)
+    while not stop.wait(REFRESH["app"]):
+        start = time.perf_counter()
+        # read_live() and sync_console()
+        snap = live_snapshot(live, since=cursor)
+        if cursor is None or snap.missed:
+            # reload_console(): the store's rows, then the live block from where they end
+            console.clear()
+            rows, row_id = [], 0
+            while True:
+                page = client.events(since=row_id)
+                rows.extend(page["rows"])
+                if page["rows"]:
+                    row_id = page["rows"][-1][0]
+                if len(page["rows"]) < page["limit"]:
+                    break
+            ts, lines = [row[1] for row in rows], [row[3] for row in rows]
+            console.extend(lines)
+            cursor = page["live_head"]
+            client.records(limit=600)
+        else:
+            if snap.start > cursor:
+                console.clear()
+            ts, lines = snap.records["ts"].tolist(), snap.lines()
+            console.extend(lines)
+            line_parser.parse_lines(lines, snap.records["ts"])
+            cursor = snap.head
+        # fetch_when_changed() for the session statistics and the history chart
+        now = time.monotonic()
+        if fetched[0] != snap.head or now - fetched[1] > STATS_SECONDS:
+            client.stats()
+            client.chart(points=800, last=300)
+            fetched = (snap.head, now)
+        console.text(*console.page_range(0, 100))
+        done = time.perf_counter()
+        render_ms.append((done - start) * 1000)
+        mark_shown(stamps, ts, lines, done, clock_offset)
+    live.close()
+    # Lines the live block no longer held were reloaded from the store
+    return 0
+
+
+def run_stm32_monitor(client, live_id, stamps, stop, render_ms, clock_offset):
+    """``poll_serial`` four times a second; returns the lines it skipped"""
+    live = client.live_state()
+    console = ConsoleBuffer(max_lines=100000)
+    cursor = live_snapshot(live, limit=0).head
+    checked = 0.0
+    skipped = 0
+    while not stop.wait(REFRESH["stm32_monitor"]):
+        start = time.perf_counter()
+        snap = live_snapshot(live, since=cursor)
+        skipped += snap.missed
+        records = snap.records[snap.records["device"] == live_id]
+        lines = snap.lines(live_id)
+        console.extend(lines)
+        cursor = snap.head
+        now = time.monotonic()
+        if now - checked > DEVICE_CHECK_SECONDS:
+            checked = now
+            client.status()
+        console.text(*console.page_range(0, PAGE_LINES))
+        done = time.perf_counter()
+        render_ms.append((done - start) * 1000)
+        mark_shown(stamps, records["ts"].tolist(), lines, done, clock_offset)
+    live.close()
+    return skipped
+
+
+def run_debug_app(sub, stamps, stop, render_ms, clock_offset):
+    console = ConsoleBuffer()
+    while not stop.is_set():
+        items = sub.read(timeout=0.5)
+        if not items:
+            continue
+        start = time.perf_counter()
+        lines = [line for _, line in items]
+        console.extend(lines)
+        console.text(*console.page_range(0))
+        now = time.perf_counter()
+        render_ms.append((now - start) * 1000)
+        mark_shown(stamps, [ts for ts, _ in items], lines, now, clock_offset)
+
+
+RUNNERS = {"app": run_app, "stm32_monitor": run_stm32_monitor}
+
+
+class Usage:
+    """CPU time and wall time of this process from creation to ``done()``"""
+
+    def __init__(self):
+        self.usage = resource.getrusage(resource.RUSAGE_SELF)
+        self.start = time.perf_counter()
+
+    def done(self):
+        self.elapsed = time.perf_counter() - self.start
+        end = resource.getrusage(resource.RUSAGE_SELF)
+        self.cpu = (end.ru_utime - self.usage.ru_utime) + (end.ru_stime - self.usage.ru_stime)
+        self.max_rss = end.ru_maxrss
+
+
+def child_main(path, tty_path, max_lines, ready, stop, results):
+    stamps = {stage: np.full(max_lines, np.nan) for stage in STAGES}
+    render_ms = []
+    # Reader batches are stamped with time.time(); perf_counter is the system-wide monotonic clock
+    clock_offset = time.time() - time.perf_counter()
+    with tempfile.TemporaryDirectory() as workdir:
+        if path == "debug_app":
+            registry = PortRegistry(idle_timeout=None)
+            with registry.subscribe(tty_path, READ_BAUD) as sub:
+                sub.wait_connected()
+                usage = Usage()
+                ready.set()
+                run_debug_app(sub, stamps, stop, render_ms, clock_offset)
+                usage.done()
+                missed = sub.missed
+                sub.close()
+                sub.reader.join()
+        else:
+            daemon = IngestDaemon(os.path.join(workdir, "serial_data.db"), os.path.join(workdir, "archive"),
+                                  os.path.join(workdir, "stats.json"), live_name=f"bench_pipeline_{os.getpid()}")
+            server = make_server(daemon, unix_path=os.path.join(workdir, "daemon.sock"))
+            threading.Thread(target=server.serve_forever, daemon=True).start()
+            client = DaemonClient(f"unix://{server.server_address}")
+            # The recording dashboard pins the port; a monitor session holds a lease on it
+            live_id = client.start(tty_path, READ_BAUD, lease=None if path == "app" else "bench")["live_id"]
+            while not client.status()["devices"][tty_path]["connected"]:
+                time.sleep(0.05)
+            usage = Usage()
+            ready.set()
+            skipped = RUNNERS[path](client, live_id, stamps, stop, render_ms, clock_offset)
+            usage.done()
+            # Lines the daemon's queue dropped never reached the store or the live block
+            missed = skipped + client.status()["dropped"]
+            client.close()
+            server.shutdown()
+            server.server_close()
+            daemon.close()
+    results.put({
+        "stamps": stamps,
+        "render_ms": render_ms,
+        "cpu_s": usage.cpu,
+        "elapsed_s": usage.elapsed,
+        "max_rss_mib": usage.max_rss / 1024.0,  # KiB on Linux
+        "missed": missed,
+    })
+
+
+# --- Driver ---
+
+def run_pipeline(path, rate, seconds):
+    """Run one ingestion path at ``rate`` lines/s for ``seconds``; returns a result row"""
+    ctx = multiprocessing.get_context("spawn")
+    master, slave, tty_path = open_pty()
+    max_lines = int(rate * seconds * 1.1) + 1000
+    ready, stop, results = ctx.Event(), ctx.Event(), ctx.Queue()
+    child = ctx.Process(target=child_main, args=(path, tty_path, max_lines, ready, stop, results))
+    child.start()
+    try:
+        if not ready.wait(30):
+            raise RuntimeError(f"{path}: reader did not start")
+        writer = PacedWriter(master, make_line, baud=rate * LINE_BYTES * 10, duration=seconds)
+        writer.start()
+        writer.join()
+        # Let the last lines reach the screen: one refresh plus the read timeout
+        time.sleep(REFRESH[path] + 1.0)
+        stop.set()
+        result = results.get(timeout=60)
+        child.join(30)
+    finally:
+        if child.is_alive():
+            child.terminate()
+        os.close(master)
+        os.close(slave)
+
+    written = np.array(writer.write_times)
+    n = len(written)
+    stamps = result["stamps"]
+    row = {
+        "path": path,
+        "rate": rate,
+        "seconds": seconds,
+        "written": n,
+        "writer_dropped": writer.dropped,
+        "reader_missed": result["missed"],
+    }
+    for stage in STAGES:
+        t = stamps[stage][:n]
+        ok = ~np.isnan(t)
+        if not ok.any():
+            continue
+        row[f"{stage}_latency"] = latency_summary((t[ok] - written[ok]).tolist())
+    rendered = int((~np.isnan(stamps["render"][:n])).sum())
+    row["rendered"] = rendered
+    row["lost"] = n - rendered
+    row["throughput_lps"] = rendered / seconds
+    row["render_pass"] = latency_summary([ms / 1000 for ms in result["render_ms"]])
+    row["cpu_percent"] = 100.0 * result["cpu_s"] / result["elapsed_s"]
+    row["max_rss_mib"] = result["max_rss_mib"]
+    # Keeping up: nothing lost and the slowest lines within a refresh plus half a second
+    row["sustained"] = bool(row["lost"] == 0 and
+                            row["render_latency"]["p99_ms"] <= (REFRESH[path] + 0.5) * 1000)
+    return row
+
+
+# --- Baseline state file vs event store ---
+
+def legacy_save_state(path, buffer):
+    """``save_state()`` from the baseline app.py, called after every received line"""
+    data = {
+        'buffer': buffer,
+        'is_connected': True,
+        'error_message': None,
+        'tremor_count': 0,
+        'dyskinesia_count': 0,
+        'normal_count': len(buffer),
+        'last_updated': str(datetime.now())
+    }
+    with open(path, 'w') as f:
+        json.dump(data, f)
+
+
+def legacy_load_state(path):
+    """The state load at the top of the baseline app.py, run on every rerun"""
+    with open(path, 'r') as f:
+        data = json.load(f)
+    return (data.get('buffer', []), data.get('is_connected', False), data.get('error_message', None),
+            data.get('tremor_count', 0), data.get('dyskinesia_count', 0), data.get('normal_count', 0),
+            data.get('last_updated', str(datetime.now())))
+
+
+def timed_median(fn, repeats):
+    times = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - start)
+    return float(np.median(times))
+
+
+def bench_state_file(sizes, repeats):
+    rows = []
+    with tempfile.TemporaryDirectory() as workdir:
+        for n in sizes:
+            buffer = [make_line(i).decode().strip() for i in range(n)]
+            json_path = os.path.join(workdir, f"state_{n}.json")
+            save = timed_median(lambda: legacy_save_state(json_path, buffer), repeats)
+            load = timed_median(lambda: legacy_load_state(json_path), repeats)
+
+            store = EventStore(os.path.join(workdir, f"events_{n}.db"))
+            now = time.time()
+            for i in range(0, n, 10000):
+                store.append(now, buffer[i:i + 10000])
+            append = timed_median(lambda: store.append(time.time(), buffer[:1]), repeats)
+            fallback = timed_median(lambda: (store.status(), store.counts()), repeats)
+            live = LiveStateWriter(f"bench_pipeline_state_{os.getpid()}")
+            live.publish(now, buffer[-1024:], [line_parser.KIND_NORMAL] * min(n, 1024))
+            reader = LiveStateReader(live.name)
+            snapshot = timed_median(lambda: reader.snapshot(limit=0), repeats)
+            reader.close()
+            live.close()
+            store.close()
+            rows.append({
+                "buffer_lines": n,
+                "json_bytes": os.path.getsize(json_path),
+                "save_state_ms": save * 1000,
+                "json_load_ms": load * 1000,
+                "save_state_max_lps": 1.0 / save,
+                "store_append_ms": append * 1000,
+                "store_read_state_ms": fallback * 1000,
+                "live_snapshot_ms": snapshot * 1000,
+            })
+    return rows
+
+
+# --- Reporting ---
+
+def git_revision():
+    try:
+        return subprocess.run(["git", "describe", "--always", "--dirty"], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__)), timeout=10).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+def print_pipeline(row):
+    lat = "  ".join(f"{stage} {row[stage + '_latency']['p50_ms']:7.1f}/{row[stage + '_latency']['p99_ms']:7.1f}"
+                    for stage in STAGES if stage + "_latency" in row)
+    print(f"  {row['path']:13s} {row['rate']:7,d} l/s  {row['throughput_lps']:9,.0f} rendered l/s  "
+          f"lost {row['lost']:6,d}  cpu {row['cpu_percent']:5.1f}%  rss {row['max_rss_mib']:5.0f} MiB  "
+          f"{'ok ' if row['sustained'] else 'LAG'}  p50/p99 ms: {lat}")
+
+
+def print_state_file(row):
+    print(f"  {row['buffer_lines']:8,d} lines {row['json_bytes'] / 1024:9,.0f} KiB  "
+          f"save_state {row['save_state_ms']:8.2f} ms (max {row['save_state_max_lps']:8,.0f} lines/s)  "
+          f"json load {row['json_load_ms']:8.2f} ms  |  store append {row['store_append_ms']:6.2f} ms  "
+          f"store read_state {row['store_read_state_ms']:6.2f} ms  live snapshot {row['live_snapshot_ms']:6.3f} ms")
+
+
+def compare(old_path, new_path):
+    with open(old_path) as f:
+        old = json.load(f)
+    with open(new_path) as f:
+        new = json.load(f)
+    print(f"{old['meta']['revision']} -> {new['meta']['revision']}")
+    before = {(r["path"], r["rate"]): r for r in old["pipeline"]}
+    for row in new["pipeline"]:
+        prev = before.get((row["path"], row["rate"]))
+        if prev is None:
+            continue
+        parts = []
+        for name, get in (("throughput", lambda r: r["throughput_lps"]),
+                          ("render p99", lambda r: r.get("render_latency", {}).get("p99_ms", float("nan"))),
+                          ("cpu", lambda r: r["cpu_percent"]),
+                          ("rss", lambda r: r["max_rss_mib"])):
+            a, b = get(prev), get(row)
+            parts.append(f"{name} {a:,.1f} -> {b:,.1f} ({b / a if a else float('nan'):.2f}x)")
+        print(f"  {row['path']:13s} {row['rate']:7,d} l/s  " + "  ".join(parts))
+    before = {r["buffer_lines"]: r for r in old.get("state_file", [])}
+    for row in new.get("state_file", []):
+        prev = before.get(row["buffer_lines"])
+        if prev is not None:
+            print(f"  state file {row['buffer_lines']:8,d} lines  "
+                  f"save_state {prev['save_state_ms']:.2f} -> {row['save_state_ms']:.2f} ms  "
+                  f"json load {prev['json_load_ms']:.2f} -> {row['json_load_ms']:.2f} ms")
+    return 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--paths", nargs="+", choices=PATHS, default=list(PATHS))
+    parser.add_argument("--rates", type=int, nargs="+", default=[200, 2000, 20000], help="offered lines per second")
+    parser.add_argument("--seconds", type=float, default=5.0)
+    parser.add_argument("--buffer-sizes", type=int, nargs="+", default=[100, 1000, 10000, 100000])
+    parser.add_argument("--repeats", type=int, default=20)
+    parser.add_argument("--skip-state-file", action="store_true")
+    parser.add_argument("--json", help="write the results to this file")
+    parser.add_argument("--compare", nargs=2, metavar=("OLD", "NEW"), help="compare two --json result files")
+    args = parser.parse_args()
+
+    if args.compare:
+        return compare(*args.compare)
+
+    results = {
+        "meta": {
+            "revision": git_revision(),
+            "time": datetime.now().isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpus": os.cpu_count(),
+            "args": vars(args),
+        },
+        "pipeline": [],
+        "state_file": [],
+    }
+    print(f"ingestion paths, {args.seconds:g} s per run ({LINE_BYTES:g} bytes per line):")
+    for path in args.paths:
+        for rate in args.rates:
+            row = run_pipeline(path, rate, args.seconds)
+            results["pipeline"].append(row)
+            print_pipeline(row)
+    if not args.skip_state_file:
+        print("state file (baseline save_state/json load) vs event store and live state:")
+        for row in bench_state_file(args.buffer_sizes, args.repeats):
+            results["state_file"].append(row)
+            print_state_file(row)
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+        print(f"results written to {args.json}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,110 @@
+"""Port section of a dashboard rerun: comports() every time against the cached inventory.
+
+Each rerun of ``app.py`` (every refresh) and ``stm32_monitor.py`` (about
+every 100 ms while connected) listed the ports, matched ST-LINK descriptions
+and built the selectbox labels. Here:
+
+* the cost of that section with ``comports()`` and with ``PortInventory``
+  (a cache hit, and a hit that runs the ``/dev`` change check)
+* enumerations per minute at the ``stm32_monitor.py`` rerun rate
+* how soon a new device shows up: a fake device directory is watched, a node
+  is added, and the time until ``ports()`` lists it is measured
+
+    python bench_port_inventory.py --reruns 2000
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+import serial.tools.list_ports
+from serial.tools.list_ports_common import ListPortInfo
+
+from bench_utils import latency_summary
+from port_inventory import PortInventory, is_stlink
+
+
+def legacy_section():
+    ports = list(serial.tools.list_ports.comports())
+    stm32 = [p for p in ports if 'STM' in p.description or 'STLink' in p.description or 'ST-LINK' in p.description]
+    labels = [f"{p.device} ({p.description})" for p in ports]
+    return ports, stm32, labels
+
+
+def cached_section(inventory):
+    ports = inventory.ports()
+    stm32 = [p for p in ports if is_stlink(p)]
+    labels = [f"{p.device} ({p.description})" for p in ports]
+    return ports, stm32, labels
+
+
+def timed_reruns(fn, n):
+    times = []
+    for _ in range(n):
+        start = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - start)
+    return latency_summary(times), sum(times) / n
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--reruns", type=int, default=2000)
+    args = parser.parse_args()
+
+    n_ports = len(serial.tools.list_ports.comports())
+    print(f"{n_ports} serial ports on this machine")
+    legacy, legacy_mean = timed_reruns(legacy_section, args.reruns)
+    inventory = PortInventory()
+    hit, hit_mean = timed_reruns(lambda: cached_section(inventory), args.reruns)
+    # check_interval=0: every call stats the watched directories
+    checking = PortInventory(check_interval=0)
+    checked, checked_mean = timed_reruns(lambda: cached_section(checking), args.reruns)
+    print(f"  comports() per rerun      p50 {legacy['p50_ms']:.3f} ms  p99 {legacy['p99_ms']:.3f} ms")
+    print(f"  inventory, cache hit      p50 {hit['p50_ms']:.3f} ms  p99 {hit['p99_ms']:.3f} ms")
+    print(f"  inventory, /dev check     p50 {checked['p50_ms']:.3f} ms  p99 {checked['p99_ms']:.3f} ms")
+    print(f"  saved per rerun: {(legacy_mean - hit_mean) * 1000:.3f} ms "
+          f"({legacy_mean / hit_mean:.0f}x); {checking.refreshes} enumerations in {checking.checks} checks")
+
+    # stm32_monitor.py while connected: a rerun every 100 ms for a minute
+    inventory = PortInventory()
+    start = time.monotonic()
+    clock = [start]
+    real_monotonic = time.monotonic
+    time.monotonic = lambda: clock[0]
+    try:
+        for i in range(600):
+            clock[0] = start + i * 0.1
+            inventory.ports()
+    finally:
+        time.monotonic = real_monotonic
+    print(f"one minute of 100 ms reruns: 600 enumerations before, {inventory.refreshes} now "
+          f"({inventory.checks} /dev checks)")
+
+    # A device node appears in a watched directory
+    with tempfile.TemporaryDirectory() as dev:
+        def fake_comports():
+            infos = []
+            for name in sorted(os.listdir(dev)):
+                info = ListPortInfo(os.path.join(dev, name))
+                info.vid, info.pid, info.description = 0x0483, 0x374B, "STM32 STLink"
+                infos.append(info)
+            return infos
+
+        watched = PortInventory(ttl=3600, check_interval=0.5, watch=(dev,), enumerate_ports=fake_comports)
+        before = len(watched.ports())
+        time.sleep(0.01)
+        open(os.path.join(dev, "ttyACM0"), "w").close()
+        added = time.perf_counter()
+        while not watched.ports():
+            time.sleep(0.01)
+        seen = time.perf_counter() - added
+        ok = before == 0 and len(watched.stlink_ports()) == 1
+        print(f"new device listed {seen * 1000:.0f} ms after its node appeared "
+              f"(check interval 500 ms, TTL 3600 s); recognised as ST-LINK by USB ID: {ok}")
+    return 0 if ok else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
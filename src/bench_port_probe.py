@@ -0,0 +1,106 @@
+"""Port and baud-rate auto-detection against emulated boards on ptys.
+
+Boards run with ``strict_baud``, so a reader at the wrong rate gets what a
+real UART would decode: garbage. The bench sets up:
+
+* boards at 115200 (the firmware's rate), one at 9600 and one at 57600
+* a silent pty (a port with nothing attached)
+* a pty with a chatty non-firmware device at 115200 (NMEA sentences)
+
+It checks that ``port_probe.probe`` names every board with its rate and
+rejects the other two. It also reports the wall time with one worker per
+port against a single worker walking the ports one at a time, as
+``port_fixer.py`` used to, and the time ``best_port`` takes to settle on
+one board.
+
+    python bench_port_probe.py --boards 4
+"""
+import argparse
+import os
+import sys
+import threading
+import time
+
+from emulator import EmulatedBoard, EmulatorHub, open_pty
+from port_probe import best_port, probe
+
+NMEA = b"$GPGGA,123519,4807.038,N,01131.000,E,1,08,0.9,545.4,M,46.9,M,,*47\r\n"
+
+
+class ChattyDevice(threading.Thread):
+    """Some other serial device that prints text lines at the right rate"""
+
+    def __init__(self):
+        super().__init__(name="nmea-device", daemon=True)
+        self.master, self.slave, self.path = open_pty()
+        os.set_blocking(self.master, False)
+        self.stopped = threading.Event()
+
+    def run(self):
+        while not self.stopped.wait(0.2):
+            try:
+                os.write(self.master, NMEA)
+            except BlockingIOError:
+                pass
+
+    def close(self):
+        self.stopped.set()
+        self.join()
+        os.close(self.master)
+        os.close(self.slave)
+
+
+def run(label, ports, expected, workers, timeout):
+    start = time.perf_counter()
+    results = probe(ports, timeout=timeout, workers=workers)
+    elapsed = time.perf_counter() - start
+    found = {}
+    for r in results:
+        if r.matched and r.port not in found:
+            found[r.port] = r.baud
+    ok = found == expected
+    wrong = {p: b for p, b in found.items() if expected.get(p) != b}
+    missed = [p for p in expected if p not in found]
+    print(f"  {label:22s} {elapsed:6.1f} s  {len(found)}/{len(expected)} boards found"
+          f"{', wrong: ' + str(wrong) if wrong else ''}{', missed: ' + str(missed) if missed else ''}"
+          f"  {sum(1 for r in results)} port/rate trials")
+    return ok, elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--boards", type=int, default=4, help="boards at 115200")
+    parser.add_argument("--timeout", type=float, default=60.0)
+    args = parser.parse_args()
+
+    rates = [115200] * args.boards + [9600, 57600]
+    boards = [EmulatedBoard(scenario="mixed", speed=1.0, baud=rate, seed=i, strict_baud=True)
+              for i, rate in enumerate(rates)]
+    silent_master, silent_slave, silent_path = open_pty()
+    chatty = ChattyDevice()
+    chatty.start()
+    hub = EmulatorHub(boards)
+    hub.start()
+    ports = [b.path for b in boards] + [silent_path, chatty.path]
+    expected = {b.path: rate for b, rate in zip(boards, rates)}
+    print(f"{len(boards)} emulated boards ({args.boards} at 115200, one at 9600, one at 57600), "
+          f"a silent port and a non-firmware device")
+    try:
+        ok_parallel, t_parallel = run("one worker per port", ports, expected, len(ports), args.timeout)
+        ok_serial, t_serial = run("one port at a time", ports, expected, 1, args.timeout * 4)
+        start = time.perf_counter()
+        best = best_port(ports, timeout=args.timeout)
+        ok_best = best is not None and expected.get(best[0]) == best[1]
+        print(f"  {'best_port':22s} {time.perf_counter() - start:6.1f} s  {best}")
+    finally:
+        hub.close()
+        chatty.close()
+        os.close(silent_master)
+        os.close(silent_slave)
+    print(f"parallel probe {t_serial / t_parallel:.1f}x faster; all boards identified at their rate: "
+          f"{ok_parallel and ok_serial and ok_best}")
+    return 0 if ok_parallel and ok_serial and ok_best else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,160 @@
+"""Load test for the shared port registry with many simulated dashboard sessions.
+
+A paced writer plays firmware output into a pty. Each simulated session is a
+thread that subscribes through ``port_registry`` and polls like a Streamlit
+rerun; a few "stalled" sessions subscribe and never read. Reported per run:
+
+* lines the writer had to drop because the reader fell behind (should be 0)
+* whether every polling session received every line, in order
+* delivery latency from the write to a session's read
+* lines the stalled sessions were told they missed
+
+For comparison, the old layout (every session opens the port itself) is run
+with a few sessions to show how the lines get split between them.
+
+    python bench_port_registry.py --sessions 1 10 100 --seconds 5
+"""
+import argparse
+import os
+import sys
+import threading
+import time
+
+import serial
+
+from bench_utils import PacedWriter, latency_summary
+from emulator import open_pty
+from port_registry import PortRegistry
+from serial_reader import SerialLineReader
+
+
+def make_line(seq):
+    return f"{seq} Tremor detected at 4.7 Hz (mag: {1000 + seq % 9000})\r\n".encode("ascii")
+
+
+def line_seq(line):
+    return int(line.split(" ", 1)[0])
+
+
+class Session(threading.Thread):
+    """A dashboard session: poll the subscription every ``interval`` seconds"""
+
+    def __init__(self, registry, path, baud, interval, stop, stalled=False):
+        super().__init__(daemon=True)
+        self.sub = registry.subscribe(path, baud)
+        self.interval = interval
+        self.stop = stop
+        self.stalled = stalled
+        self.received = []  # (seq, perf_counter at read)
+        self.in_order = True
+
+    def run(self):
+        if self.stalled:
+            self.stop.wait()
+            self.sub.read()  # catch up once at the end, counting what was missed
+            return
+        last = -1
+        while True:
+            stopping = self.stop.is_set()
+            now = time.perf_counter()
+            for _, line in self.sub.read():
+                seq = line_seq(line)
+                self.in_order &= seq == last + 1
+                last = seq
+                self.received.append((seq, now))
+            if stopping:
+                break
+            time.sleep(self.interval)
+
+
+def run_shared(n_sessions, n_stalled, baud, seconds, interval, capacity):
+    master, slave, path = open_pty()
+    registry = PortRegistry(capacity=capacity, idle_timeout=None)
+    stop = threading.Event()
+    sessions = [Session(registry, path, baud, interval, stop) for _ in range(n_sessions)]
+    sessions += [Session(registry, path, baud, interval, stop, stalled=True) for _ in range(n_stalled)]
+    sessions[0].sub.wait_connected()
+    for s in sessions:
+        s.start()
+
+    writer = PacedWriter(master, make_line, baud=baud, duration=seconds)
+    writer.start()
+    writer.join()
+    time.sleep(0.5)  # let the reader and the sessions drain
+    stop.set()
+    for s in sessions:
+        s.join()
+
+    reader = sessions[0].sub.reader
+    written = len(writer.write_times) - writer.dropped
+    polling = [s for s in sessions if not s.stalled]
+    complete = all(len(s.received) == written and s.in_order for s in polling)
+    latencies = [t - writer.write_times[seq] for s in polling for seq, t in s.received]
+    lat = latency_summary(latencies)
+    missed = [s.sub.missed for s in sessions if s.stalled]
+    print(f"shared  {n_sessions:4d} sessions + {n_stalled} stalled: {written} lines, "
+          f"reader got {reader.lines_read}, writer dropped {writer.dropped}, "
+          f"all sessions complete: {complete}, latency p50 {lat['p50_ms']:.1f} ms "
+          f"p99 {lat['p99_ms']:.1f} ms, stalled missed {missed}")
+
+    for s in sessions:
+        s.sub.close()
+    reader.join(2)
+    os.close(master)
+    os.close(slave)
+    return complete and writer.dropped == 0
+
+
+def run_separate(n_sessions, baud, seconds):
+    """The old layout: every session opens the port and reads for itself"""
+    master, slave, path = open_pty()
+    stop = threading.Event()
+    counts = [0] * n_sessions
+    errors = [None] * n_sessions
+
+    def session(i):
+        with serial.Serial(path, baud, timeout=0.2) as ser:
+            reader = SerialLineReader(ser)
+            try:
+                while not stop.is_set():
+                    counts[i] += len(reader.read_batch()[1])
+            except serial.SerialException as e:
+                # pyserial notices another reader emptied the port under it
+                errors[i] = e
+
+    threads = [threading.Thread(target=session, args=(i,), daemon=True) for i in range(n_sessions)]
+    for t in threads:
+        t.start()
+    time.sleep(0.2)
+    writer = PacedWriter(master, make_line, baud=baud, duration=seconds)
+    writer.start()
+    writer.join()
+    time.sleep(0.5)
+    stop.set()
+    for t in threads:
+        t.join()
+    os.close(master)
+    os.close(slave)
+    print(f"separate {n_sessions:3d} sessions: {len(writer.write_times)} lines written, "
+          f"received per session {counts}, sessions that failed {sum(e is not None for e in errors)}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sessions", type=int, nargs="+", default=[1, 10, 100])
+    parser.add_argument("--stalled", type=int, default=2, help="sessions that subscribe and never read")
+    parser.add_argument("--baud", type=int, default=115200)
+    parser.add_argument("--seconds", type=float, default=5.0)
+    parser.add_argument("--interval", type=float, default=0.1, help="session poll interval")
+    parser.add_argument("--capacity", type=int, default=500, help="shared buffer lines")
+    args = parser.parse_args()
+
+    ok = True
+    for n in args.sessions:
+        ok &= run_shared(n, args.stalled, args.baud, args.seconds, args.interval, args.capacity)
+    run_separate(3, args.baud, min(args.seconds, 2.0))
+    return 0 if ok else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,165 @@
+"""Random window reads from the raw sample archive against a CSV recording.
+
+Hours of synthetic 104 Hz samples (with a reconnect gap) are written both as a
+``RawArchive`` and as a ``ts,sample`` CSV, the obvious way to dump a raw
+stream. Then:
+
+* write cost: CSV lines, archive appends with fsync per frame (``durable``)
+  and without
+* latency of reading one random 256-sample window: a memmap view, a CSV scan
+  to that line, and a full CSV load (the only option once a time range has to
+  be located by timestamp)
+* a time range by host time, from the archive index against the CSV
+* ``run_detection`` over every window of the archive, fed the strided view directly
+
+Windows read from both must hold the same samples.
+
+    python bench_raw_archive.py --hours 8
+"""
+import argparse
+import csv
+import os
+import sys
+import tempfile
+import time
+from itertools import islice
+
+import numpy as np
+
+from detection import FFT_SIZE, SAMPLE_RATE_HZ, VERDICT_NONE, run_detection
+from raw_archive import RawArchive, RawArchiveWriter
+
+FRAME = 32       # samples per RAW_STREAM frame, as the firmware sends them
+
+
+def synthetic(hours, seed=0):
+    rng = np.random.default_rng(seed)
+    n = int(hours * 3600 * SAMPLE_RATE_HZ)
+    t = np.arange(n) / SAMPLE_RATE_HZ
+    # Ten-minute cycles with 6 Hz (dyskinesia band) bursts over sensor noise
+    signal = 3000 * np.sin(2 * np.pi * 6.0 * t) * (np.sin(2 * np.pi * t / 600) > 0.5)
+    return (signal + rng.normal(0, 400, n)).astype(np.int16)
+
+
+def host_times(n, start, gap_at, gap):
+    ts = start + np.arange(n) / SAMPLE_RATE_HZ
+    ts[gap_at:] += gap
+    return ts
+
+
+def write_csv(path, samples, ts):
+    start = time.perf_counter()
+    with open(path, "w", newline="") as f:
+        w = csv.writer(f)
+        for i in range(0, len(samples), FRAME):
+            w.writerows(zip(ts[i:i + FRAME].tolist(), samples[i:i + FRAME].tolist()))
+    return time.perf_counter() - start
+
+
+def write_archive(path, samples, ts, durable, limit=None):
+    n = len(samples) if limit is None else min(limit, len(samples))
+    start = time.perf_counter()
+    with RawArchiveWriter(path, durable=durable) as writer:
+        for i in range(0, n, FRAME):
+            writer.append(samples[i:i + FRAME], ts[i])
+    return time.perf_counter() - start, n
+
+
+def csv_window(path, i):
+    with open(path, newline="") as f:
+        rows = list(islice(csv.reader(f), i * FFT_SIZE, (i + 1) * FFT_SIZE))
+    return np.array([int(r[1]) for r in rows], dtype=np.int16)
+
+
+def csv_load(path):
+    data = np.loadtxt(path, delimiter=",", dtype=np.float64)
+    return data[:, 0], data[:, 1].astype(np.int16)
+
+
+def percentiles(seconds):
+    ms = np.array(seconds) * 1000
+    return f"p50 {np.percentile(ms, 50):9.3f} ms  p99 {np.percentile(ms, 99):9.3f} ms"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--hours", type=float, default=8)
+    parser.add_argument("--reads", type=int, default=1000, help="random windows read from the archive")
+    parser.add_argument("--csv-reads", type=int, default=20, help="random windows read from the CSV (each is a scan)")
+    parser.add_argument("--durable-minutes", type=float, default=60,
+                        help="minutes of data written with fsync per append (it is slow)")
+    args = parser.parse_args()
+
+    samples = synthetic(args.hours)
+    n = len(samples)
+    start_ts = 1714550400.0
+    ts = host_times(n, start_ts, n // 2, 90.0)
+    rng = np.random.default_rng(1)
+    with tempfile.TemporaryDirectory() as root:
+        raw_path = os.path.join(root, "session.raw")
+        csv_path = os.path.join(root, "session.csv")
+        print(f"{n:,} samples ({args.hours:g} h at {SAMPLE_RATE_HZ} Hz), {FRAME}-sample appends")
+
+        t_csv = write_csv(csv_path, samples, ts)
+        t_raw, _ = write_archive(raw_path, samples, ts, durable=False)
+        durable_n = int(args.durable_minutes * 60 * SAMPLE_RATE_HZ)
+        t_durable, durable_n = write_archive(os.path.join(root, "durable.raw"), samples, ts, True, durable_n)
+        raw_size = os.path.getsize(raw_path) + os.path.getsize(os.path.splitext(raw_path)[0] + ".idx")
+        print("write:")
+        print(f"  csv                     {t_csv:7.2f} s   {os.path.getsize(csv_path) / 2**20:7.1f} MiB")
+        print(f"  archive                 {t_raw:7.2f} s   {raw_size / 2**20:7.1f} MiB")
+        print(f"  archive, durable        {t_durable / durable_n * 1e6:7.2f} us/sample "
+              f"({t_durable / durable_n * FRAME * 1e3:.2f} ms per append with 3 fsyncs; "
+              f"a board produces one every {FRAME / SAMPLE_RATE_HZ * 1e3:.0f} ms)")
+
+        archive = RawArchive(raw_path)
+        picks = rng.integers(0, archive.n_windows, args.reads)
+        mm_times = []
+        for i in picks:
+            t0 = time.perf_counter()
+            window = archive.window(int(i))
+            np.asarray(window).sum()   # touch the pages
+            mm_times.append(time.perf_counter() - t0)
+        csv_times = []
+        ok = True
+        for i in picks[:args.csv_reads]:
+            t0 = time.perf_counter()
+            window = csv_window(csv_path, int(i))
+            csv_times.append(time.perf_counter() - t0)
+            ok &= np.array_equal(window, archive.window(int(i)))
+        t0 = time.perf_counter()
+        csv_ts, csv_samples = csv_load(csv_path)
+        t_load = time.perf_counter() - t0
+        ok &= np.array_equal(csv_samples, archive.samples)
+        print("random 256-sample window:")
+        print(f"  memmap view             {percentiles(mm_times)}  ({len(mm_times)} reads)")
+        print(f"  csv scan to the line    {percentiles(csv_times)}  ({len(csv_times)} reads)")
+        print(f"  csv full load           {t_load * 1000:9.1f} ms once, {t_load / np.median(mm_times):,.0f}x a view")
+
+        # A 10-minute range after the reconnect, by host time
+        lo, hi = start_ts + args.hours * 1800 + 600, start_ts + args.hours * 1800 + 1200
+        t0 = time.perf_counter()
+        view = archive.time_range(lo, hi)
+        t_range = time.perf_counter() - t0
+        t0 = time.perf_counter()
+        keep = (csv_ts >= lo) & (csv_ts < hi)
+        from_csv = csv_samples[keep]
+        t_mask = time.perf_counter() - t0
+        ok &= np.array_equal(view, from_csv)
+        print(f"10-minute time range: archive index {t_range * 1e6:.0f} us, mask over the loaded csv "
+              f"{t_mask * 1000:.1f} ms (after the {t_load:.1f} s load), {len(view):,} samples")
+
+        t0 = time.perf_counter()
+        windows = archive.windows()
+        verdicts = run_detection(windows)
+        t_detect = time.perf_counter() - t0
+        flagged = int(np.count_nonzero(verdicts["verdict"] != VERDICT_NONE))
+        print(f"run_detection over all {len(windows):,} windows from the view: {t_detect:.2f} s "
+              f"({t_detect / len(windows) * 1e6:.0f} us/window), {flagged:,} flagged")
+        print(f"windows match: {ok}")
+        archive.close()
+    return 0 if ok else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,161 @@
+"""Cost of the rerun profiler, and whether its samples land in the right sections.
+
+* per-call cost of ``section()`` with profiling off and in ``sections`` mode
+* a synthetic rerun shaped like ``app.py`` (state load, sidebar, a fragment
+  with console join and chart build, a few function calls per section) run
+  with profiling off and in each mode; runs alternate and the median is kept.
+  Sample mode runs last: its sampler thread outlives a rerun by a few seconds
+  and would slow down the other modes too. It also lowers the process-wide
+  switch interval while a sampled rerun runs, which by itself changes how
+  fast a rerun goes, so its overhead is taken against reruns with profiling
+  off at that same interval, alternating with the sampled ones; the interval
+  must be back to its old value after
+* attribution: in ``sample`` mode the samples of two sections must be in
+  about the same ratio as their timed durations, and every line of the
+  folded output must be well formed
+
+    python bench_rerun_profiler.py --reruns 60
+"""
+import argparse
+import json
+import re
+import statistics
+import sys
+import tempfile
+import time
+
+from rerun_profiler import RerunProfiler, summarize
+
+FOLDED_LINE = re.compile(r"^\S[^\n]* [0-9]+$")
+
+
+def work(n):
+    total = 0
+    for i in range(n):
+        total += i * i
+    return total
+
+
+def per_call_ns(fn, n=100000):
+    start = time.perf_counter()
+    for _ in range(n):
+        fn()
+    return (time.perf_counter() - start) / n * 1e9
+
+
+def make_script(profiler, mode, scale):
+    """A rerun with the sections of app.py, doing ``scale`` units of work in each"""
+    @profiler.section("ports")
+    def ports():
+        return work(scale)
+
+    @profiler.run("live_panel", mode)
+    def live_panel():
+        with profiler.section("sync_console"):
+            work(scale * 2)
+        with profiler.section("console"):
+            "\n".join(str(i) for i in range(scale // 10))
+        with profiler.section("history_chart"):
+            work(scale * 3)
+
+    def script():
+        profiler.begin("app", mode)
+        profiler.mark("state")
+        json.loads(json.dumps({"lines": list(range(scale // 10))}))
+        profiler.mark("sidebar")
+        ports()
+        profiler.mark("main")
+        live_panel()
+        profiler.mark("about")
+        work(scale // 2)
+        profiler.end()
+    return script
+
+
+def timed(script, n):
+    start = time.perf_counter()
+    for _ in range(n):
+        script()
+    return (time.perf_counter() - start) / n
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--reruns", type=int, default=60, help="reruns per measurement")
+    parser.add_argument("--rounds", type=int, default=5)
+    parser.add_argument("--scale", type=int, default=20000, help="loop iterations per unit of work")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as workdir:
+        off = RerunProfiler(directory=workdir)
+
+        def off_section():
+            with off.section("x"):
+                pass
+        on = RerunProfiler(directory=workdir)
+        on.begin("calls", "sections")
+
+        def on_section():
+            with on.section("x"):
+                pass
+        print(f"section() {per_call_ns(off_section):.0f} ns off, {per_call_ns(on_section):.0f} ns timing sections")
+        on.end()
+
+        modes = (None, "sections", "cprofile", "sample")
+        times = {mode: [] for mode in modes}
+        times["fast switch"] = []
+        profilers = {mode: RerunProfiler(directory=workdir) for mode in modes}
+        scripts = {mode: make_script(profilers[mode], mode, args.scale) for mode in modes}
+        switch_interval = sys.getswitchinterval()
+        sampled_switch = min(switch_interval, profilers["sample"].interval / 10)
+        for _ in range(args.rounds):
+            for mode in modes[:-1]:
+                times[mode].append(timed(scripts[mode], args.reruns))
+        for _ in range(args.rounds):
+            # What sample mode does to the whole process, without sampling
+            sys.setswitchinterval(sampled_switch)
+            times["fast switch"].append(timed(scripts[None], args.reruns))
+            sys.setswitchinterval(switch_interval)
+            times["sample"].append(timed(scripts["sample"], args.reruns))
+        restored = sys.getswitchinterval() == switch_interval
+        base = statistics.median(times[None])
+        fast = statistics.median(times["fast switch"])
+        overhead = {}
+        for mode in modes:
+            t = statistics.median(times[mode])
+            overhead[mode] = t - (fast if mode == "sample" else base)
+            print(f"rerun, {mode or 'off':<9} {t * 1000:7.2f} ms ({(t - base) * 1000:+.2f} ms, {(t - base) / base * 100:+.1f}%)")
+        print(f"rerun, off at the {sampled_switch * 1000:g} ms switch interval sample mode sets: {fast * 1000:.2f} ms "
+              f"({(fast - base) / base * 100:+.1f}%); sampling itself {overhead['sample'] * 1000:+.2f} ms; "
+              f"interval restored to {switch_interval * 1000:g} ms after sampling: {restored}")
+
+        rows = {row["section"]: row for row in summarize(profilers["sections"].records("app"))}
+        print(f"sections recorded: {', '.join(rows)}")
+
+        # Attribution: history_chart does three units of work for each of ports'
+        timed_ratio = rows["main;live_panel;history_chart"]["mean"] / rows["sidebar;ports"]["mean"]
+        sampled = profilers["sample"]
+        text = sampled.folded("app", "samples")
+        lines = text.splitlines()
+        well_formed = bool(lines) and all(FOLDED_LINE.match(line) for line in lines)
+        per_section = {}
+        for line in lines:
+            stack, count = line.rsplit(" ", 1)
+            for name in ("ports", "history_chart"):
+                if f";{name};" in stack + ";":
+                    per_section[name] = per_section.get(name, 0) + int(count)
+        ratio = per_section.get("history_chart", 0) / max(1, per_section.get("ports", 0))
+        print(f"samples: {sum(int(line.rsplit(' ', 1)[1]) for line in lines)} in {len(lines)} stacks, "
+              f"history_chart/ports {ratio:.2f} (timed {timed_ratio:.2f}); well formed: {well_formed}")
+        sampled.dump()
+
+    # Sampling and section timings stay cheap enough to leave on while using the dashboard,
+    # whose reruns take tens of milliseconds
+    attributed = abs(ratio / timed_ratio - 1) < 0.3
+    ok = well_formed and attributed and restored and overhead["sections"] < 0.5e-3 and overhead["sample"] < 1e-3
+    print(f"overhead within budget (sections < 0.5 ms, sample < 1 ms per rerun), samples attributed, switch interval restored: {ok}")
+    return 0 if ok else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
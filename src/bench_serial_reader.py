@@ -0,0 +1,98 @@
+"""Benchmark the bulk serial reader against the old poll-and-sleep loop.
+
+A writer thread plays firmware verdict lines into a pseudo-terminal at the
+115200 baud line rate (every line back to back, far chattier than the real
+board) and each reader reports throughput and per-line latency.
+
+    python bench_serial_reader.py --duration 5 --baud 115200
+"""
+import argparse
+import os
+import threading
+import time
+
+import serial
+
+from bench_utils import PacedWriter, latency_summary
+from emulator import open_pty
+from serial_reader import SerialLineReader
+
+
+def make_line(seq):
+    return f"No movement disorder detected (T: {seq}, D: 0)\r\n".encode()
+
+
+def line_seq(line):
+    return int(line.split("T: ", 1)[1].split(",", 1)[0])
+
+
+def legacy_loop(ser, on_line, stop):
+    """The original in_waiting / readline / sleep(0.1) loop from app.py"""
+    while not stop.is_set():
+        if ser.in_waiting > 0:
+            raw = ser.readline()
+            if raw:
+                line = raw.decode("utf-8", "ignore").strip()
+                if line:
+                    on_line(time.perf_counter(), line)
+        time.sleep(0.1)
+
+
+def bulk_loop(ser, on_line, stop):
+    """The SerialLineReader loop now used by the monitoring apps"""
+    reader = SerialLineReader(ser)
+    while not stop.is_set():
+        _, lines = reader.read_batch()
+        now = time.perf_counter()
+        for line in lines:
+            on_line(now, line)
+
+
+def run(name, loop, duration, baud):
+    master, slave, path = open_pty()
+    received = {}
+
+    def on_line(ts, line):
+        try:
+            received[line_seq(line)] = ts
+        except (IndexError, ValueError):
+            pass  # a line torn by a pty overrun
+
+    writer = PacedWriter(master, make_line, baud=baud, duration=duration)
+    stop = threading.Event()
+    with serial.Serial(path, baud, timeout=0.1) as ser:
+        reader = threading.Thread(target=loop, args=(ser, on_line, stop), daemon=True)
+        reader.start()
+        writer.start()
+        writer.join()
+        # Give the reader a grace period to drain what is already in the pty
+        time.sleep(0.5)
+        writer.stopped.set()
+        stop.set()
+        reader.join(timeout=2)
+    os.close(master)
+    os.close(slave)
+
+    written = len(writer.write_times)
+    latencies = [received[i] - writer.write_times[i] for i in received if i < written]
+    summary = latency_summary(latencies)
+    print(f"{name:>8}: wrote {written} lines, received {len(received)} "
+          f"({len(received) / duration:.0f} lines/s, {writer.dropped} overrun), "
+          f"latency p50 {summary['p50_ms']:.1f} ms, p99 {summary['p99_ms']:.1f} ms, "
+          f"max {summary['max_ms']:.1f} ms")
+    summary.update(written=written, received=len(received), overrun=writer.dropped)
+    return summary
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--duration", type=float, default=3.0)
+    parser.add_argument("--baud", type=int, default=115200)
+    args = parser.parse_args()
+
+    run("legacy", legacy_loop, args.duration, args.baud)
+    run("bulk", bulk_loop, args.duration, args.baud)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,121 @@
+"""Cost of SessionStats per event and per snapshot against recomputing from the event store.
+
+The dashboard's statistics used to be ``COUNT(*) ... GROUP BY kind`` on every
+rerun, and anything richer (rates, magnitude moments, a frequency histogram)
+would mean reading every stored record again. Here, for a history of N
+firmware lines:
+
+* ``SessionStats.update`` per event, fed reader-sized batches
+* ``snapshot`` latency, which must not grow with N
+* the same numbers recomputed from ``EventStore.records()`` at each N
+* the statistics of two halves merged, against one pass over everything
+
+    python bench_session_stats.py --sizes 10000 100000 1000000
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+from bench_utils import latency_summary
+from event_store import EventStore
+from line_parser import KIND_DYSKINESIA, KIND_NORMAL, KIND_TREMOR, parse_lines
+from session_stats import SessionStats
+
+
+def firmware_lines(n, seed=0):
+    """Status, status, verdict per window, with a mix of verdicts"""
+    rng = np.random.default_rng(seed)
+    lines = []
+    for i in range(n // 3):
+        lines.append("Collecting samples...")
+        lines.append("Analyzing data...")
+        r = rng.random()
+        if r < 0.2:
+            lines.append(f"Tremor detected at {rng.choice([3.2, 3.7, 4.1, 4.5])} Hz (mag: {rng.integers(10000, 50000)})")
+        elif r < 0.3:
+            lines.append(f"Dyskinesia detected at {rng.choice([5.3, 5.7, 6.1, 6.5])} Hz (mag: {rng.integers(10000, 50000)})")
+        else:
+            lines.append(f"No movement disorder detected (T: {rng.integers(0, 9000)}, D: {rng.integers(0, 9000)})")
+    return lines
+
+
+def recompute(records, now):
+    """What a rerun would do without the online statistics"""
+    counts = np.bincount(records["kind"], minlength=5)
+    recent = records[records["ts"] >= now - 60]
+    rate = np.bincount(recent["kind"], minlength=5)
+    normal = records[records["kind"] == KIND_NORMAL]
+    t = normal["tremor_mag"].astype(np.float64)
+    d = normal["dysk_mag"].astype(np.float64)
+    hist = [np.bincount(np.rint(records["freq"][records["kind"] == k] / (104 / 256)).astype(int), minlength=32)
+            for k in (KIND_TREMOR, KIND_DYSKINESIA)]
+    return counts, rate, t.mean(), t.std(ddof=1), d.mean(), d.std(ddof=1), hist
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10000, 100000, 1000000])
+    parser.add_argument("--batch", type=int, default=3, help="lines per reader batch (one window)")
+    args = parser.parse_args()
+
+    ok = True
+    print(f"{'lines':>10} {'update/event':>13} {'snapshot p50':>13} {'store recompute':>16} {'records only':>13}")
+    for n in args.sizes:
+        lines = firmware_lines(n)
+        start_ts = time.time() - len(lines) / 30.0
+        # A window every 100 ms, all lines of a window received together
+        batches = [parse_lines(lines[i:i + args.batch], start_ts + i / 30.0) for i in range(0, len(lines), args.batch)]
+        records = np.concatenate(batches)
+        now = float(records["ts"][-1])
+
+        stats = SessionStats()
+        t0 = time.perf_counter()
+        for batch in batches:
+            stats.update(batch)
+        t_update = time.perf_counter() - t0
+
+        snaps = []
+        for _ in range(200):
+            t0 = time.perf_counter()
+            snap = stats.snapshot(now)
+            snaps.append(time.perf_counter() - t0)
+
+        with tempfile.TemporaryDirectory() as root:
+            store = EventStore(os.path.join(root, "events.db"))
+            for i in range(0, len(lines), 5000):
+                store.append(start_ts, lines[i:i + 5000], records[i:i + 5000])
+            t0 = time.perf_counter()
+            stored = store.records()
+            t_records = time.perf_counter() - t0
+            result = recompute(stored, now)
+            t_store = time.perf_counter() - t0
+            store.close()
+
+        counts, _, t_mean, t_std, d_mean, d_std, hist = result
+        match = (list(snap["counts"].values()) == counts.tolist()
+                 and np.isclose(snap["tremor_mag"]["mean"], t_mean) and np.isclose(snap["tremor_mag"]["std"], t_std)
+                 and np.isclose(snap["dysk_mag"]["mean"], d_mean) and np.isclose(snap["dysk_mag"]["std"], d_std)
+                 and snap["freq_hist"]["tremor"] == hist[0][:32].tolist())
+        ok &= bool(match)
+        print(f"{len(lines):>10,} {t_update / len(lines) * 1e6:>10.2f} us {latency_summary(snaps)['p50_ms']:>10.3f} ms "
+              f"{t_store * 1000:>13.1f} ms {t_records * 1000:>10.1f} ms  {'match' if match else 'MISMATCH'}")
+
+    # Two devices (or two sessions) merged against one pass
+    half = len(batches) // 2
+    a, b = SessionStats(), SessionStats()
+    for i, batch in enumerate(batches):
+        (a if i < half else b).update(batch)
+    merged, whole = SessionStats.merged([a, b]).snapshot(now), stats.snapshot(now)
+    same = all(merged[k] == whole[k] for k in ("counts", "rates_per_min", "freq_hist", "since_last"))
+    close = all(np.isclose(merged[m][f], whole[m][f]) for m in ("tremor_mag", "dysk_mag") for f in ("mean", "std"))
+    print(f"merge of two halves equals one pass: counts/rates/histograms {same}, moments {close}")
+    ok &= same and close
+    return 0 if ok else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,89 @@
+"""Benchmark the streaming STFT stage.
+
+* consistency: with ``hop == n_fft`` the stream must give the same verdicts as
+  ``detection.run_detection`` on disjoint windows
+* coverage: a short tremor burst that falls in the firmware's 1 s sleep gap is
+  missed by the firmware schedule but caught by overlapping hops
+* concurrency: how many 104 Hz streams one core keeps up with in real time
+
+    python bench_stft.py --hop 32 --seconds 60
+"""
+import argparse
+import sys
+import time
+
+import numpy as np
+
+import detection
+from detection import FFT_SIZE, SAMPLE_RATE_HZ, VERDICT_DYSKINESIA
+from stft import StreamingSTFT
+
+FS = int(SAMPLE_RATE_HZ)
+
+
+def check_consistency(seconds=120, seed=0):
+    rng = np.random.default_rng(seed)
+    t = np.arange(seconds * FS) / SAMPLE_RATE_HZ
+    freq = 4.5 + 2.0 * np.sin(2 * np.pi * t / 30)  # sweeps through both bands
+    samples = (1500 * np.sin(2 * np.pi * np.cumsum(freq) / SAMPLE_RATE_HZ)
+               + rng.normal(0, 200, len(t))).astype(np.int16)
+
+    stream = StreamingSTFT(hop=FFT_SIZE)
+    hops = np.concatenate([stream.push(samples[i:i + 100]) for i in range(0, len(samples), 100)])
+    batch = detection.run_detection(detection.sample_windows(samples))
+    same = np.mean(hops["verdict"] == batch["verdict"][:len(hops)])
+    print(f"consistency: {len(hops)} hops, {same:.2%} verdicts equal to run_detection")
+    return len(hops) == len(batch) and same > 0.99
+
+
+def check_coverage():
+    # Firmware cycle: 256 samples analysed, then ~104 samples slept through
+    cycle = FFT_SIZE + FS
+    n = 6 * cycle
+    t = np.arange(n) / SAMPLE_RATE_HZ
+    burst = np.zeros(n)
+    start = cycle + FFT_SIZE - 60
+    burst[start:start + 200] = 1.0  # ~2 s burst straddling the sleep gap
+    samples = (3000 * burst * np.sin(2 * np.pi * 6.1 * t)).astype(np.int16)
+
+    firmware = detection.run_detection(np.stack([samples[c:c + FFT_SIZE] for c in range(0, n - FFT_SIZE, cycle)]))
+    stream = StreamingSTFT(hop=26)
+    hops = stream.push(samples)
+    print(f"coverage: firmware schedule saw {np.sum(firmware['verdict'] == VERDICT_DYSKINESIA)} "
+          f"dyskinesia windows, streaming STFT saw {np.sum(hops['verdict'] == VERDICT_DYSKINESIA)} hops")
+    return np.any(hops["verdict"] == VERDICT_DYSKINESIA)
+
+
+def bench_streams(n_streams, hop, seconds, push_samples=26, seed=0):
+    """Wall time to process ``seconds`` of data on ``n_streams`` independent streams"""
+    rng = np.random.default_rng(seed)
+    data = rng.integers(-2000, 2000, size=(n_streams, seconds * FS), dtype=np.int16)
+    streams = [StreamingSTFT(hop=hop) for _ in range(n_streams)]
+    n_hops = 0
+    start = time.perf_counter()
+    for pos in range(0, seconds * FS, push_samples):
+        for i, stream in enumerate(streams):
+            n_hops += len(stream.push(data[i, pos:pos + push_samples]))
+    elapsed = time.perf_counter() - start
+    realtime = seconds * n_streams / elapsed
+    print(f"{n_streams:5d} streams, hop {hop}: {elapsed:.2f} s for {seconds} s of data, "
+          f"{n_hops / elapsed:,.0f} hops/s -> {realtime:,.0f} streams in real time per core "
+          f"(hop latency {hop / SAMPLE_RATE_HZ * 1000:.0f} ms)")
+    return realtime
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--hop", type=int, default=32)
+    parser.add_argument("--seconds", type=int, default=60)
+    args = parser.parse_args()
+
+    ok = check_consistency()
+    ok &= check_coverage()
+    for n in (1, 64, 256):
+        bench_streams(n, args.hop, args.seconds)
+    return 0 if ok else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,68 @@
+"""Small helpers shared by the benchmark scripts"""
+import os
+import threading
+import time
+
+
+def percentile(sorted_values, q):
+    """Nearest-rank percentile of an already sorted list"""
+    if not sorted_values:
+        return float("nan")
+    k = min(len(sorted_values) - 1, max(0, int(round(q / 100.0 * (len(sorted_values) - 1)))))
+    return sorted_values[k]
+
+
+def latency_summary(latencies):
+    """Summarise a list of latencies (seconds) as milliseconds"""
+    values = sorted(latencies)
+    return {
+        "count": len(values),
+        "p50_ms": percentile(values, 50) * 1000,
+        "p99_ms": percentile(values, 99) * 1000,
+        "max_ms": (values[-1] * 1000) if values else float("nan"),
+    }
+
+
+class PacedWriter(threading.Thread):
+    """Write lines to a pty master at a UART-like byte rate, recording write times
+
+    Like a real UART the writer never waits for the reader: when the pty buffer
+    is full the line is dropped and counted, so a slow reader shows up as loss.
+    """
+
+    def __init__(self, fd, make_line, baud=115200, duration=3.0, tick=0.005):
+        super().__init__(daemon=True)
+        self.fd = fd
+        self.make_line = make_line
+        self.bytes_per_sec = baud / 10.0  # 8N1 framing: 10 bits on the wire per byte
+        self.duration = duration
+        self.tick = tick
+        self.write_times = []
+        self.dropped = 0
+        self.stopped = threading.Event()
+
+    def run(self):
+        os.set_blocking(self.fd, False)
+        start = time.perf_counter()
+        sent = 0
+        seq = 0
+        while not self.stopped.is_set():
+            now = time.perf_counter()
+            if now - start >= self.duration:
+                break
+            budget = int((now - start) * self.bytes_per_sec) - sent
+            while True:
+                line = self.make_line(seq)
+                if len(line) > budget:
+                    break
+                budget -= len(line)
+                sent += len(line)
+                # The line is timestamped when the board would have emitted it
+                self.write_times.append(now)
+                seq += 1
+                try:
+                    if os.write(self.fd, line) < len(line):
+                        self.dropped += 1
+                except BlockingIOError:
+                    self.dropped += 1
+            time.sleep(self.tick)
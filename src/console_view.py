@@ -0,0 +1,152 @@
+"""Incremental, paged console output for the Streamlit dashboards.
+
+The dashboards used to rebuild the whole console on every update: a full page
+reload (``app.py``) or a rerun every 100 ms (``stm32_monitor.py``), each
+joining every buffered line into one string and sending all of it again.
+
+``ConsoleBuffer`` keeps a session's history as numbered lines in fixed-size
+blocks. Appending is O(new lines), a block's joined text is built once when
+it fills, and only one page of lines is ever turned into text, so the cost of
+an update no longer grows with the length of the session.
+
+``render_console`` draws the buffer inside an ``st.fragment`` that reruns on a
+timer: only the console is re-executed, not the whole script, and only the
+visible page is sent. The live page follows the tail; older pages are reached
+with a page selector instead of one giant text area.
+"""
+from collections import deque
+
+PAGE_LINES = 200
+BLOCK_LINES = 64
+
+
+class ConsoleBuffer:
+    """Bounded line history addressed by sequence number (first line ever added is 0)"""
+
+    def __init__(self, max_lines=100000, block=BLOCK_LINES):
+        self.block = block
+        self.max_blocks = max(2, -(-max_lines // block))
+        self._blocks = deque()   # lists of lines, all full except the last
+        self._texts = deque()    # joined text of each full block, built when it fills
+        self.first = 0           # sequence number of the oldest line kept
+        self.head = 0            # sequence number of the next line
+        self.version = 0         # bumped on every change, so renderers can skip unchanged pages
+        self._cache = (None, None)
+
+    def __len__(self):
+        return self.head - self.first
+
+    def extend(self, lines):
+        if not lines:
+            return
+        pos = 0
+        while pos < len(lines):
+            if not self._blocks or len(self._blocks[-1]) == self.block:
+                self._blocks.append([])
+                self._texts.append(None)
+            last = self._blocks[-1]
+            take = lines[pos:pos + self.block - len(last)]
+            last.extend(take)
+            pos += len(take)
+            if len(last) == self.block:
+                self._texts[-1] = "\n".join(last)
+        self.head += len(lines)
+        while len(self._blocks) > self.max_blocks:
+            self._blocks.popleft()
+            self._texts.popleft()
+            self.first += self.block
+        self.version += 1
+
+    def clear(self):
+        """Drop every line; sequence numbers keep counting up"""
+        self._blocks.clear()
+        self._texts.clear()
+        self.first = self.head
+        self.version += 1
+
+    def lines(self, start, stop):
+        """Lines with sequence numbers in ``[start, stop)``, clipped to what is kept"""
+        start = max(start, self.first)
+        stop = min(stop, self.head)
+        out = []
+        while start < stop:
+            b, offset = divmod(start - self.first, self.block)
+            chunk = self._blocks[b][offset:offset + stop - start]
+            out.extend(chunk)
+            start += len(chunk)
+        return out
+
+    def text(self, start, stop):
+        """Joined text of ``[start, stop)``, reusing the cached text of whole blocks"""
+        start = max(start, self.first)
+        stop = min(stop, self.head)
+        key = (self.version, start, stop)
+        if self._cache[0] == key:
+            return self._cache[1]
+        parts = []
+        pos = start
+        while pos < stop:
+            b, offset = divmod(pos - self.first, self.block)
+            block = self._blocks[b]
+            end = min(len(block), offset + stop - pos)
+            if offset == 0 and end == self.block:
+                parts.append(self._texts[b])
+            else:
+                parts.append("\n".join(block[offset:end]))
+            pos += end - offset
+        text = "\n".join(parts)
+        self._cache = (key, text)
+        return text
+
+    def page_count(self, page_lines=PAGE_LINES):
+        return max(1, -(-len(self) // page_lines))
+
+    def page_range(self, page, page_lines=PAGE_LINES):
+        """Sequence range of a page counted back from the tail (page 0 is the newest lines)"""
+        stop = self.head - page * page_lines
+        return max(self.first, stop - page_lines), max(self.first, stop)
+
+
+def draw_console(buffer, key="console", label="Console", page_lines=PAGE_LINES, height=400,
+                 empty_message="No data yet."):
+    """Draw one page of ``buffer``: the live tail, or a scrolled-back page that stays put"""
+    import streamlit as st  # only the dashboards need it
+
+    if not len(buffer):
+        st.info(empty_message)
+        return
+    pages = buffer.page_count(page_lines)
+    if st.session_state.get(f"{key}_page", 0) > pages - 1:
+        st.session_state[f"{key}_page"] = pages - 1  # the console was cleared
+    page = st.number_input("Scrollback page (0 = live)", min_value=0, max_value=pages - 1,
+                           step=1, key=f"{key}_page")
+    if page == 0:
+        st.session_state.pop(f"{key}_pinned", None)
+        start, stop = buffer.page_range(0, page_lines)
+    else:
+        # A scrolled-back page keeps its lines while new ones arrive at the tail
+        pinned = st.session_state.get(f"{key}_pinned")
+        if pinned is None or pinned[0] != page:
+            pinned = (page, buffer.page_range(page, page_lines))
+            st.session_state[f"{key}_pinned"] = pinned
+        start, stop = pinned[1]
+    st.text_area(label, buffer.text(start, stop), height=height, disabled=True)
+    st.caption(f"Lines {start + 1:,}-{stop:,} of {buffer.head:,}"
+               + (f" ({buffer.first:,} oldest dropped)" if buffer.first else ""))
+
+
+def render_console(buffer, poll, run_every=0.5, **kwargs):
+    """Draw ``buffer`` in a fragment that calls ``poll()`` and redraws every ``run_every`` seconds
+
+    ``poll()`` moves new lines into the buffer (it may also draw small status
+    elements). Only the fragment reruns, so the calling script needs no meta
+    refresh or ``st.rerun()`` loop. Extra arguments go to ``draw_console``.
+    """
+    import streamlit as st
+
+    @st.fragment(run_every=run_every)
+    def console():
+        poll()
+        draw_console(buffer, **kwargs)
+
+    console()
@@ -0,0 +1,248 @@
+"""Client of ``ingest_daemon.py`` for the dashboards.
+
+Each thread keeps one HTTP/1.1 connection open to the daemon and reuses it
+for every request, so a request costs one small round trip on an
+established socket. Status, counters and new lines need no request at all:
+``live_state()`` maps the daemon's shared-memory block, which a rerun reads
+with ``live_snapshot()``. The daemon's address is ``http://host:port`` or
+``unix:///path/to.sock``, taken from the ``STM32_DAEMON`` environment
+variable when it is set.
+
+    client = DaemonClient()
+    if not client.alive():
+        spawn_daemon()
+    client.start("/dev/ttyACM0", 115200)
+    rows = client.events(since=0)["rows"]
+    snap = live_snapshot(client.live_state())
+"""
+import http.client
+import json
+import os
+import socket
+import subprocess
+import sys
+import threading
+import time
+from urllib.parse import urlencode, urlsplit
+
+import numpy as np
+
+from line_parser import EVENT_DTYPE
+from live_state import LiveStateReader, block_name
+from metrics import metrics
+
+DEFAULT_URL = os.environ.get("STM32_DAEMON", "http://127.0.0.1:8765")
+DAEMON_SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "ingest_daemon.py")
+
+REQUEST_SECONDS = metrics.histogram("client_request_seconds", "Round trip of one request to the ingest daemon", ("route",))
+
+
+class DaemonError(Exception):
+    """The daemon is unreachable or refused a request"""
+
+
+class TCPHTTPConnection(http.client.HTTPConnection):
+    def connect(self):
+        super().connect()
+        # Small requests go out at once instead of waiting on delayed ACKs of the last response
+        self.sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+
+
+class UnixHTTPConnection(http.client.HTTPConnection):
+    def __init__(self, path, timeout=None):
+        super().__init__("localhost", timeout=timeout)
+        self.path = path
+
+    def connect(self):
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.settimeout(self.timeout)
+        self.sock.connect(self.path)
+
+
+def records_from_columns(cols):
+    """``{field: list}`` from the daemon back to an ``EVENT_DTYPE`` array"""
+    n = len(cols.get("ts", ()))
+    out = np.empty(n, dtype=EVENT_DTYPE)
+    if n:
+        for name in EVENT_DTYPE.names:
+            out[name] = cols[name]
+    return out
+
+
+class DaemonClient:
+    """Keep-alive connection per thread to an ingestion daemon"""
+
+    def __init__(self, url=DEFAULT_URL, timeout=5.0):
+        self.url = url
+        self.timeout = timeout
+        parts = urlsplit(url)
+        self._unix_path = parts.path if parts.scheme == "unix" else None
+        self._address = (parts.hostname or "127.0.0.1", parts.port or 80)
+        # ingest_daemon names its block the same way, from the address it serves on
+        self.live_name = block_name(os.path.abspath(self._unix_path) if self._unix_path
+                                    else "%s:%d" % self._address)
+        self._local = threading.local()
+        self.connects = 0
+
+    def _connection(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            if self._unix_path:
+                conn = UnixHTTPConnection(self._unix_path, timeout=self.timeout)
+            else:
+                conn = TCPHTTPConnection(*self._address, timeout=self.timeout)
+            self._local.conn = conn
+            self.connects += 1
+        return conn
+
+    def close(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is not None:
+            conn.close()
+            self._local.conn = None
+
+    def request(self, method, path, params=None, body=None):
+        """JSON response of one request; a connection the daemon closed is reopened once"""
+        start = time.perf_counter()
+        latency = REQUEST_SECONDS.labels(path)
+        if params:
+            path += "?" + urlencode({k: v for k, v in params.items() if v is not None})
+        payload = None if body is None else json.dumps(body).encode()
+        headers = {"Content-Type": "application/json"} if payload is not None else {}
+        for attempt in range(2):
+            conn = self._connection()
+            try:
+                conn.request(method, path, body=payload, headers=headers)
+                response = conn.getresponse()
+                data = response.read()
+            except (http.client.RemoteDisconnected, http.client.CannotSendRequest, BrokenPipeError,
+                    ConnectionResetError) as e:
+                # Idle keep-alive connections may be closed by a restarted daemon
+                self.close()
+                if attempt:
+                    raise DaemonError(f"daemon at {self.url} dropped the connection: {e}") from e
+                continue
+            except OSError as e:
+                self.close()
+                raise DaemonError(f"daemon at {self.url} is not reachable: {e}") from e
+            result = json.loads(data) if data else None
+            if response.status >= 400:
+                raise DaemonError((result or {}).get("error", f"HTTP {response.status}"))
+            latency.observe(time.perf_counter() - start)
+            return result
+
+    # --- Queries ---
+
+    def alive(self):
+        try:
+            self.status()
+            return True
+        except DaemonError:
+            return False
+
+    def status(self):
+        return self.request("GET", "/status")
+
+    def live_state(self):
+        """Map the daemon's live state block (the daemon runs on this machine)
+
+        The block is named after the daemon's address; one started with its own
+        ``--live-state`` name is asked for it.
+        """
+        try:
+            return LiveStateReader(self.live_name)
+        except FileNotFoundError:
+            pass
+        name = self.status()["live_state"]
+        try:
+            return LiveStateReader(name)
+        except FileNotFoundError as e:
+            raise DaemonError(f"no live state from the daemon at {self.url}: {e}") from e
+
+    def events(self, since=0, limit=None):
+        return self.request("GET", "/events", {"since": since, "limit": limit})
+
+    def records(self, kind=None, limit=None):
+        return records_from_columns(self.request("GET", "/records", {"kind": kind, "limit": limit}))
+
+    def stats(self):
+        return self.request("GET", "/stats")
+
+    def chart(self, start=None, end=None, points=800, method="minmax", last=None):
+        return self.request("GET", "/chart", {"start": start, "end": end, "points": points, "method": method,
+                                              "last": last})
+
+    def history(self, kind=None, device=None, start=None, end=None):
+        result = self.request("GET", "/history", {"kind": kind, "device": device, "start": start, "end": end})
+        result["rows"] = records_from_columns(result["rows"])
+        return result
+
+    def metrics(self):
+        """The daemon's metrics as ``metrics.MetricsRegistry.snapshot()`` returns them"""
+        return self.request("GET", "/metrics", {"format": "json"})
+
+    def ports(self, refresh=False):
+        """Serial ports as ``{"device", "description", "stlink"}``, ST-LINK first"""
+        return self.request("GET", "/ports", {"refresh": 1} if refresh else None)
+
+    # --- Commands ---
+
+    def probe(self, timeout=15.0):
+        """``(port, baud)`` the daemon detected, or ``None``"""
+        # Probing takes up to ``timeout``; a connection of its own waits that long
+        client = DaemonClient(self.url, timeout=timeout + 5.0)
+        try:
+            detected = client.request("POST", "/probe", body={"timeout": timeout})["detected"]
+        finally:
+            client.close()
+        return None if detected is None else tuple(detected)
+
+    def start(self, port, baud, lease=None):
+        """Have the daemon read ``port``; returns ``{"started", "live_id"}``
+
+        With a ``lease`` (any string unique to the caller) the port is shared: ``stop()``
+        with the same lease only stops it once nobody else holds a lease on it.
+        """
+        return self.request("POST", "/devices", body={"port": port, "baud": baud, "lease": lease})
+
+    def stop(self, port=None, lease=None):
+        """Ports the daemon stopped: ``port``, or all of them without one"""
+        return self.request("POST", "/devices/stop", body={"port": port, "lease": lease})["stopped"]
+
+    def clear(self):
+        self.request("POST", "/clear", body={})
+
+    def append(self, lines):
+        self.request("POST", "/append", body={"lines": list(lines)})
+
+
+def live_snapshot(reader, since=None, limit=None):
+    """``reader.snapshot()``; raises ``DaemonError`` once the daemon that writes the block has exited"""
+    if not reader.writer_alive():
+        raise DaemonError(f"the ingest daemon that wrote {reader.name} has exited")
+    return reader.snapshot(since, limit)
+
+
+def spawn_daemon(url=DEFAULT_URL, args=(), wait=10.0):
+    """Start ``ingest_daemon.py`` in the background for ``url`` and wait until it answers
+
+    The daemon gets its own session, so it outlives the process that started it.
+    """
+    parts = urlsplit(url)
+    if parts.scheme == "unix":
+        address = ["--unix", parts.path]
+    else:
+        address = ["--host", parts.hostname or "127.0.0.1", "--http-port", str(parts.port or 80)]
+    process = subprocess.Popen([sys.executable, DAEMON_SCRIPT, *address, *args],
+                               cwd=os.getcwd(), start_new_session=True,
+                               stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    client = DaemonClient(url)
+    deadline = time.monotonic() + wait
+    while time.monotonic() < deadline:
+        if client.alive():
+            client.close()
+            return process
+        if process.poll() is not None:
+            raise DaemonError(f"ingest daemon exited with status {process.returncode}")
+        time.sleep(0.05)
+    raise DaemonError(f"ingest daemon did not answer on {url} within {wait:.0f} s")
@@ -1,21 +1,24 @@
 import streamlit as st
 import serial
-import serial.tools.list_ports
-import time
 import os
 
+from port_inventory import inventory
+import port_probe
+import port_registry
+from console_view import ConsoleBuffer, draw_console
+
 # Function to get available ports with detailed info
 def get_available_ports():
-    ports = list(serial.tools.list_ports.comports())
-    return ports
+    # Cached; enumerated again only when /dev changes
+    return inventory.ports()
 
 # Initialize session state
 if "serial_data" not in st.session_state:
-    st.session_state.serial_data = []
+    st.session_state.serial_data = ConsoleBuffer(max_lines=100000)
 
 # Function to clear the console
 def clear_console():
-    st.session_state.serial_data = []
+    st.session_state.serial_data.clear()
 
 # Page setup
 st.set_page_config(page_title="STM32 Debug Console", layout="wide")
@@ -42,10 +45,21 @@ with st.sidebar:
                 if hasattr(port, 'manufacturer'):
                     st.write(f"Manufacturer: {port.manufacturer}")
         
-        # Manual port entry option
+        # Listen on every port at each candidate baud rate and show how each one scored
         st.divider()
+        if st.button("Auto-detect Port and Baud"):
+            with st.spinner("Listening on serial ports..."):
+                results = port_probe.probe([p.device for p in ports])
+            st.session_state.probe_results = [repr(r) for r in results]
+            st.session_state.detected = (results[0].port, results[0].baud) if results and results[0].matched else None
+        if "probe_results" in st.session_state:
+            with st.expander("Probe Results", expanded=st.session_state.get("detected") is None):
+                st.code("\n".join(st.session_state.probe_results) or "No ports probed")
+        detected = st.session_state.get("detected")
+        
+        # Manual port entry option
         manual_port = st.text_input("Manual Port Entry", 
-                                   value="/dev/tty.debug-console", 
+                                   value=detected[0] if detected else "/dev/tty.debug-console", 
                                    help="Enter port exactly as shown in terminal")
         
         # Port selection from dropdown
@@ -58,15 +72,19 @@ with st.sidebar:
         use_manual = st.checkbox("Use manual entry", value=True)
         st.session_state.port = manual_port if use_manual else selected_port
     
-    # Baud rate selection
+    # Baud rate selection; the firmware runs at 115200
+    baud_options = [115200, 9600, 57600, 38400, 19200, 4800]
+    detected = st.session_state.get("detected")
     st.session_state.baud_rate = st.selectbox("Baud Rate", 
-                                             options=[9600, 115200, 57600, 38400, 19200, 4800])
+                                             options=baud_options,
+                                             index=baud_options.index(detected[1]) if detected and detected[1] in baud_options else 0)
     
     # Clear console button
     st.button("Clear Console", on_click=clear_console)
     
     # Refresh ports button
     if st.button("Refresh Ports"):
+        inventory.invalidate()
         st.rerun()
 
 # Main area for console output
@@ -78,7 +96,9 @@ if st.button("Connect and Monitor", use_container_width=True):
         st.error("Please select a serial port")
     else:
         try:
-            with serial.Serial(st.session_state.port, st.session_state.baud_rate, timeout=0.5) as ser:
+            # Attach to the shared reader instead of opening the port a second time
+            with port_registry.subscribe(st.session_state.port, st.session_state.baud_rate) as sub:
+                sub.wait_connected()
                 st.success(f"Connected to {st.session_state.port} at {st.session_state.baud_rate} baud")
                 placeholder = st.empty()
                 
@@ -86,18 +106,15 @@ if st.button("Connect and Monitor", use_container_width=True):
                 stop_button = st.button("Stop Monitoring")
                 while not stop_button:
                     try:
-                        raw = ser.readline()
-                        if raw:
-                            line = raw.decode("utf-8", "ignore").rstrip()
-                            if line:
-                                st.session_state.serial_data.append(line)
-                                # Limit the buffer size
-                                if len(st.session_state.serial_data) > 500:
-                                    st.session_state.serial_data = st.session_state.serial_data[-500:]
-                        
-                        # Update the display
-                        placeholder.code("\n".join(st.session_state.serial_data), language="")
-                        time.sleep(0.1)
+                        # Waits up to 0.5 s for new lines, then takes everything buffered
+                        lines = sub.read_lines(timeout=0.5)
+                        if not sub.alive:
+                            raise serial.SerialException(sub.error)
+                        console = st.session_state.serial_data
+                        if lines:
+                            console.extend(lines)
+                            # Redraw only when something arrived, and only the last page
+                            placeholder.code(console.text(*console.page_range(0)), language="")
                         
                         # Check if stop was pressed
                         stop_button = st.button("Stop Monitoring")
@@ -128,8 +145,8 @@ if st.button("Connect and Monitor", use_container_width=True):
                     st.write("Platform info not available")
 
 # Show existing data even when not monitoring
-if st.session_state.serial_data:
-    st.code("\n".join(st.session_state.serial_data), language="")
+if len(st.session_state.serial_data):
+    draw_console(st.session_state.serial_data, key="debug_console", label="Serial output")
 else:
     st.info("No data yet. Click 'Connect and Monitor' to begin")
 
@@ -149,7 +166,7 @@ with col2:
     if st.button("Test Port"):
         try:
             # Just try to open and close
-            ser = serial.Serial(test_port, 9600)
+            ser = serial.Serial(test_port, st.session_state.baud_rate)
             ser.close()
             st.success(f"Successfully opened and closed {test_port}")
         except Exception as e:
@@ -0,0 +1,227 @@
+"""Host-side re-implementation of the firmware's runDetection() pipeline.
+
+Mirrors ``runDetection()`` in ``main.cpp`` step by step in float32, but works
+on a whole ``(n_windows, FFT_SIZE)`` array at once:
+
+1. symmetric Hann window ``0.5f * (1 - cosf(2*PI*i / (N-1)))``
+2. 256-point real FFT and magnitude, with ``arm_rfft_fast_f32``'s packing of
+   the Nyquist term into the imaginary slot of bin 0
+3. DC bin scaled by 0.1
+4. peak search over the tremor (3-5 Hz) and dyskinesia (5-7 Hz) bins
+5. threshold of 10x the mean of bins 1-10
+
+Window coefficients, bin indices, frequencies, the baseline mean and the
+decision use the same float32 operations in the same order as the firmware.
+The transform itself cannot match CMSIS's radix-4/8 butterflies bit for bit,
+so magnitudes agree to float32 rounding; only windows whose peak sits within
+that rounding of the threshold can classify differently.
+
+The decision only looks at bins 1-17, so the batched path skips the full FFT
+and multiplies the windows by a precomputed Hann-weighted DFT matrix for just
+those bins, which turns the whole batch into a single float32 GEMM.
+"""
+import numpy as np
+
+FFT_SIZE = 256
+SAMPLE_RATE_HZ = 104.0
+DC_SCALE = 0.1
+THRESHOLD_FACTOR = 10.0
+BASELINE_BINS = (1, 11)
+
+VERDICT_NONE = 0
+VERDICT_TREMOR = 1
+VERDICT_DYSKINESIA = 2
+
+# One row per analysed window, the same values the firmware prints
+DETECTION_DTYPE = np.dtype([
+    ("verdict", np.uint8),
+    ("tremor_freq", np.float32),
+    ("tremor_mag", np.float32),
+    ("dysk_freq", np.float32),
+    ("dysk_mag", np.float32),
+    ("threshold", np.float32),
+])
+
+_F32 = np.float32
+
+
+def band_bins(lo_hz, hi_hz, n_fft=FFT_SIZE, fs=SAMPLE_RATE_HZ):
+    """Inclusive bin range for a band, as ``uint32_t(f * FFT_SIZE / SAMPLE_RATE_HZ)``"""
+    lo = int(_F32(lo_hz) * _F32(n_fft) / _F32(fs))
+    hi = int(_F32(hi_hz) * _F32(n_fft) / _F32(fs))
+    return lo, hi
+
+
+def hann_window(n=FFT_SIZE):
+    """The firmware's symmetric Hann window evaluated in float32"""
+    i = np.arange(n, dtype=_F32)
+    # PI in arm_math.h is the float literal 3.14159265358979f
+    arg = _F32(2.0) * _F32(3.14159265358979) * i / _F32(n - 1)
+    return (_F32(0.5) * (_F32(1.0) - np.cos(arg))).astype(_F32)
+
+
+HANN = hann_window()
+TREMOR_BINS = band_bins(3.0, 5.0)
+DYSK_BINS = band_bins(5.0, 7.0)
+
+
+def band_dft_matrix(n_bins, n_fft=FFT_SIZE, window=HANN):
+    """Windowed DFT matrix ``(n_fft, 2 * n_bins + 1)``: cosines, sines and the Nyquist row"""
+    n = np.arange(n_fft)[:, None]
+    k = np.arange(n_bins)[None, :]
+    angle = 2.0 * np.pi * n * k / n_fft
+    nyquist = np.where(np.arange(n_fft) % 2 == 0, 1.0, -1.0)[:, None]
+    w = np.asarray(window, dtype=np.float64)[:, None]
+    return (np.hstack([np.cos(angle), -np.sin(angle), nyquist]) * w).astype(_F32)
+
+
+# Bins 0..DYSK_BINS[1] are all the decision ever reads
+DECISION_BINS = DYSK_BINS[1] + 1
+_DECISION_MATRIX = band_dft_matrix(DECISION_BINS)
+
+
+def magnitudes(windows, window=HANN, dc_scale=DC_SCALE):
+    """Windowed FFT magnitudes of shape ``(n_windows, FFT_SIZE // 2)`` in float32
+
+    Bin 0 holds ``|DC, Nyquist|`` like ``arm_cmplx_mag_f32`` on the packed
+    ``arm_rfft_fast_f32`` output, already scaled by ``dc_scale``.
+    """
+    windows = np.asarray(windows, dtype=_F32)
+    n_fft = windows.shape[-1]
+    spectrum = np.fft.rfft(windows * window, axis=-1)
+    re = spectrum.real.astype(_F32, copy=False)
+    im = spectrum.imag.astype(_F32, copy=False)
+    # Packed layout: [DC, Nyquist, Re1, Im1, ...]
+    im[..., 0] = re[..., n_fft // 2]
+    re = re[..., : n_fft // 2]
+    im = im[..., : n_fft // 2]
+    mags = np.sqrt(re * re + im * im)
+    mags[..., 0] *= _F32(dc_scale)
+    return mags
+
+
+def band_magnitudes(windows, matrix=_DECISION_MATRIX):
+    """Magnitudes of the first ``DECISION_BINS`` bins only, laid out like :func:`magnitudes`"""
+    windows = np.asarray(windows, dtype=_F32)
+    n_bins = (matrix.shape[1] - 1) // 2
+    y = windows @ matrix
+    re = y[:, :n_bins]
+    im = y[:, n_bins:2 * n_bins]
+    # arm_rfft_fast_f32 stores the Nyquist term in the imaginary slot of bin 0
+    im[:, 0] = y[:, 2 * n_bins]
+    mags = np.sqrt(re * re + im * im)
+    mags[:, 0] *= _F32(DC_SCALE)
+    return mags
+
+
+def _band_peak(mags, lo, hi):
+    """First maximum of ``mags[:, lo:hi + 1]``, with arm_max_f32's strict comparison"""
+    best = mags[:, lo].copy()
+    idx = np.zeros(len(mags), dtype=np.intp)
+    for k in range(lo + 1, hi + 1):
+        col = mags[:, k]
+        better = col > best
+        best = np.where(better, col, best)
+        idx[better] = k - lo
+    return best, idx
+
+
+def classify(mags, n_fft=FFT_SIZE, fs=SAMPLE_RATE_HZ, tremor_bins=None, dysk_bins=None,
+             threshold_factor=THRESHOLD_FACTOR, baseline_bins=BASELINE_BINS):
+    """Peak search and threshold decision over a ``(n_windows, n_bins)`` magnitude array"""
+    mags = np.asarray(mags, dtype=_F32)
+    if mags.ndim == 1:
+        mags = mags[None, :]
+    t0, t1 = tremor_bins or band_bins(3.0, 5.0, n_fft, fs)
+    d0, d1 = dysk_bins or band_bins(5.0, 7.0, n_fft, fs)
+
+    max_t, idx_t = _band_peak(mags, t0, t1)
+    max_d, idx_d = _band_peak(mags, d0, d1)
+
+    # arm_mean_f32 on Cortex-M4 is a sequential float32 sum divided by the count
+    b0, b1 = baseline_bins
+    total = np.zeros(len(mags), dtype=_F32)
+    for k in range(b0, b1):
+        total += mags[:, k]
+    baseline = total / _F32(b1 - b0)
+    threshold = baseline * _F32(threshold_factor)
+
+    out = np.empty(len(mags), dtype=DETECTION_DTYPE)
+    out["tremor_freq"] = (t0 + idx_t).astype(_F32) * _F32(fs) / _F32(n_fft)
+    out["dysk_freq"] = (d0 + idx_d).astype(_F32) * _F32(fs) / _F32(n_fft)
+    out["tremor_mag"] = max_t
+    out["dysk_mag"] = max_d
+    out["threshold"] = threshold
+
+    tremor = (max_t > max_d) & (max_t > threshold)
+    dysk = ~tremor & (max_d > max_t) & (max_d > threshold)
+    verdict = np.full(len(mags), VERDICT_NONE, dtype=np.uint8)
+    verdict[tremor] = VERDICT_TREMOR
+    verdict[dysk] = VERDICT_DYSKINESIA
+    out["verdict"] = verdict
+    return out
+
+
+def classify_one(mags, n_fft=FFT_SIZE, fs=SAMPLE_RATE_HZ):
+    """:func:`classify` of one spectrum with the firmware's bands, as a ``DETECTION_DTYPE`` tuple
+
+    Scalar float32 arithmetic in the same order as :func:`classify`, without
+    its per-call array overhead: for a single window it is several times faster.
+    """
+    m = np.asarray(mags, dtype=_F32).tolist()
+    t0, t1 = TREMOR_BINS if n_fft == FFT_SIZE and fs == SAMPLE_RATE_HZ else band_bins(3.0, 5.0, n_fft, fs)
+    d0, d1 = DYSK_BINS if n_fft == FFT_SIZE and fs == SAMPLE_RATE_HZ else band_bins(5.0, 7.0, n_fft, fs)
+    idx_t, idx_d = t0, d0
+    for k in range(t0 + 1, t1 + 1):
+        if m[k] > m[idx_t]:
+            idx_t = k
+    for k in range(d0 + 1, d1 + 1):
+        if m[k] > m[idx_d]:
+            idx_d = k
+    max_t, max_d = m[idx_t], m[idx_d]
+
+    b0, b1 = BASELINE_BINS
+    total = _F32(0.0)
+    for k in range(b0, b1):
+        total += _F32(m[k])
+    threshold = float(total / _F32(b1 - b0) * _F32(THRESHOLD_FACTOR))
+
+    verdict = VERDICT_NONE
+    if max_t > max_d and max_t > threshold:
+        verdict = VERDICT_TREMOR
+    elif max_d > max_t and max_d > threshold:
+        verdict = VERDICT_DYSKINESIA
+    fs32, n32 = _F32(fs), _F32(n_fft)
+    return (verdict, float(_F32(idx_t) * fs32 / n32), max_t, float(_F32(idx_d) * fs32 / n32), max_d, threshold)
+
+
+def run_detection(windows, chunk=4096):
+    """Classify raw sample windows of shape ``(n_windows, FFT_SIZE)``
+
+    Windows are processed in chunks so the working set stays in cache.
+    """
+    windows = np.asarray(windows)
+    if windows.ndim == 1:
+        windows = windows[None, :]
+    out = np.empty(len(windows), dtype=DETECTION_DTYPE)
+    for start in range(0, len(windows), chunk):
+        stop = start + chunk
+        out[start:stop] = classify(band_magnitudes(windows[start:stop]))
+    return out
+
+
+def sample_windows(samples, hop=FFT_SIZE, size=FFT_SIZE):
+    """View a 1-D recording as ``(n_windows, size)`` windows ``hop`` samples apart, without copying"""
+    samples = np.asarray(samples)
+    if len(samples) < size:
+        return samples[:0].reshape(0, size)
+    return np.lib.stride_tricks.sliding_window_view(samples, size)[::hop]
+
+
+def format_verdict(row):
+    """The line the firmware prints for one detection result"""
+    if row["verdict"] == VERDICT_TREMOR:
+        return f"Tremor detected at {row['tremor_freq']:.1f} Hz (mag: {row['tremor_mag']:.0f})"
+    if row["verdict"] == VERDICT_DYSKINESIA:
+        return f"Dyskinesia detected at {row['dysk_freq']:.1f} Hz (mag: {row['dysk_mag']:.0f})"
+    return f"No movement disorder detected (T: {row['tremor_mag']:.0f}, D: {row['dysk_mag']:.0f})"
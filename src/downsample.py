@@ -0,0 +1,252 @@
+"""Downsampled time series for charts of long sessions.
+
+A chart only has room for about one point per pixel, yet a session produces
+tens of thousands of verdicts per device. Three pieces keep what is drawn
+small while still showing every peak:
+
+* ``minmax`` keeps the lowest and the highest point of each bucket, so
+  spikes survive any amount of reduction
+* ``lttb`` (Largest-Triangle-Three-Buckets, Steinarsson 2013) picks the one
+  point per bucket that best preserves the shape of the line
+* ``SeriesPyramid`` keeps a series at full resolution plus levels of min/max
+  blocks, each ``FANOUT`` times coarser than the one below. Levels are
+  extended as points are appended, so a query never touches more than
+  a small multiple of ``max_points`` entries. It reads the finest level that
+  fits the visible range and reduces it to the budget with ``minmax`` or
+  ``lttb``.
+
+LTTB is not decomposable into blocks, so the pyramid stores min/max only;
+LTTB is run on the few thousand points a query reads.
+
+``ChartHistory`` holds one pyramid per (device, column) of parsed event records.
+"""
+import threading
+
+import numpy as np
+
+FANOUT = 8
+CHART_COLUMNS = ("tremor_mag", "dysk_mag", "freq")
+
+
+def minmax(x, y, n_out):
+    """Indices of the min and max point of equal-count buckets (at most ``n_out`` points), in order"""
+    n = len(x)
+    if n <= n_out:
+        return np.arange(n)
+    size = -(-n // max(1, n_out // 2))
+    buckets = -(-n // size)
+    y = np.asarray(y, dtype=np.float64)
+    pad = buckets * size - n
+    # The last bucket is padded with values that never win
+    lo = np.concatenate([y, np.full(pad, np.inf)]).reshape(buckets, size).argmin(axis=1)
+    hi = np.concatenate([y, np.full(pad, -np.inf)]).reshape(buckets, size).argmax(axis=1)
+    base = np.arange(buckets) * size
+    idx = np.sort(np.column_stack([base + lo, base + hi]), axis=1).ravel()
+    # A bucket whose min and max are the same point contributes it once
+    return idx[np.concatenate([[True], np.diff(idx) > 0])]
+
+
+def lttb(x, y, n_out):
+    """Indices of the ``n_out`` points Largest-Triangle-Three-Buckets keeps (first and last included)"""
+    n = len(x)
+    if n_out >= n:
+        return np.arange(n)
+    if n_out < 3:
+        return np.array([0, n - 1][:max(n_out, 0)], dtype=np.intp)
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+    edges = np.linspace(1, n - 1, n_out - 1).astype(np.intp)
+    idx = np.empty(n_out, dtype=np.intp)
+    idx[0] = 0
+    idx[-1] = n - 1
+    a = 0
+    for b in range(n_out - 2):
+        lo, hi = edges[b], edges[b + 1]
+        # The third vertex is the mean of the next bucket (the last point for the final bucket)
+        nlo, nhi = hi, edges[b + 2] if b + 2 < len(edges) else n
+        cx = x[nlo:nhi].mean()
+        cy = y[nlo:nhi].mean()
+        area = np.abs((x[a] - cx) * (y[lo:hi] - y[a]) - (x[a] - x[lo:hi]) * (cy - y[a]))
+        a = lo + int(np.argmax(area))
+        idx[b + 1] = a
+    return idx
+
+
+class _Level:
+    """Growable columns of one pyramid level"""
+
+    def __init__(self, names):
+        self.names = names
+        self.n = 0
+        self.cols = {name: np.empty(1024) for name in names}
+
+    def extend(self, **columns):
+        k = len(next(iter(columns.values())))
+        if self.n + k > len(self.cols[self.names[0]]):
+            size = max(2 * len(self.cols[self.names[0]]), self.n + k)
+            for name in self.names:
+                grown = np.empty(size)
+                grown[:self.n] = self.cols[name][:self.n]
+                self.cols[name] = grown
+        for name, values in columns.items():
+            self.cols[name][self.n:self.n + k] = values
+        self.n += k
+
+    def __getitem__(self, name):
+        return self.cols[name][:self.n]
+
+
+BLOCK_COLUMNS = ("t_start", "t_end", "t_min", "v_min", "t_max", "v_max")
+
+
+class SeriesPyramid:
+    """One time series at full resolution plus min/max levels ``FANOUT``, ``FANOUT**2``, ... points wide"""
+
+    def __init__(self, fanout=FANOUT):
+        self.fanout = fanout
+        self.raw = _Level(("t", "v"))
+        self.levels = []
+
+    def __len__(self):
+        return self.raw.n
+
+    def append(self, t, v):
+        """Append points in time order; NaN values are skipped"""
+        t = np.asarray(t, dtype=np.float64)
+        v = np.asarray(v, dtype=np.float64)
+        keep = np.isfinite(v)
+        if not keep.all():
+            t, v = t[keep], v[keep]
+        if not len(t):
+            return
+        self.raw.extend(t=t, v=v)
+        self._build(0)
+
+    def _build(self, level):
+        """Fold the complete, not yet aggregated groups of ``level`` into the level above"""
+        below = self.raw if level == 0 else self.levels[level - 1]
+        if level == len(self.levels):
+            if below.n < self.fanout:
+                return
+            self.levels.append(_Level(BLOCK_COLUMNS))
+        above = self.levels[level]
+        first = above.n * self.fanout
+        groups = (below.n - first) // self.fanout
+        if groups <= 0:
+            return
+        stop = first + groups * self.fanout
+        f = self.fanout
+        if level == 0:
+            t = below["t"][first:stop].reshape(groups, f)
+            v = below["v"][first:stop].reshape(groups, f)
+            i_min, i_max = v.argmin(axis=1), v.argmax(axis=1)
+            rows = np.arange(groups)
+            above.extend(t_start=t[:, 0], t_end=t[:, -1], t_min=t[rows, i_min], v_min=v[rows, i_min],
+                         t_max=t[rows, i_max], v_max=v[rows, i_max])
+        else:
+            cols = {name: below[name][first:stop].reshape(groups, f) for name in BLOCK_COLUMNS}
+            i_min, i_max = cols["v_min"].argmin(axis=1), cols["v_max"].argmax(axis=1)
+            rows = np.arange(groups)
+            above.extend(t_start=cols["t_start"][:, 0], t_end=cols["t_end"][:, -1],
+                         t_min=cols["t_min"][rows, i_min], v_min=cols["v_min"][rows, i_min],
+                         t_max=cols["t_max"][rows, i_max], v_max=cols["v_max"][rows, i_max])
+        self._build(level + 1)
+
+    def _points(self, level, start, end, first=0):
+        """Points of ``level`` entries from index ``first`` that overlap ``[start, end)``"""
+        if level == 0:
+            t = self.raw["t"][first:]
+            lo = int(np.searchsorted(t, start, "left"))
+            hi = int(np.searchsorted(t, end, "left"))
+            return t[lo:hi], self.raw["v"][first:][lo:hi]
+        lv = self.levels[level - 1]
+        lo = first + int(np.searchsorted(lv["t_end"][first:], start, "left"))
+        hi = first + int(np.searchsorted(lv["t_start"][first:], end, "left"))
+        if lo >= hi:
+            return np.empty(0), np.empty(0)
+        t_min, t_max = lv["t_min"][lo:hi], lv["t_max"][lo:hi]
+        v_min, v_max = lv["v_min"][lo:hi], lv["v_max"][lo:hi]
+        # Each block becomes its min and max point, in time order
+        min_first = t_min <= t_max
+        t = np.column_stack([np.where(min_first, t_min, t_max), np.where(min_first, t_max, t_min)]).ravel()
+        v = np.column_stack([np.where(min_first, v_min, v_max), np.where(min_first, v_max, v_min)]).ravel()
+        return t, v
+
+    def _count(self, level, start, end):
+        if level == 0:
+            t = self.raw["t"]
+            return int(np.searchsorted(t, end, "left") - np.searchsorted(t, start, "left"))
+        lv = self.levels[level - 1]
+        return 2 * int(np.searchsorted(lv["t_start"], end, "left") - np.searchsorted(lv["t_end"], start, "left"))
+
+    def query(self, start=None, end=None, max_points=1000, method="minmax"):
+        """At most ``max_points`` points ``(t, v)`` that draw the series over ``[start, end)``
+
+        The finest level with no more than ``FANOUT * max_points`` points in
+        range is reduced to the budget by ``method``: "minmax" keeps every
+        extreme, "lttb" the shape of the line.
+        """
+        if not len(self):
+            return np.empty(0), np.empty(0)
+        start = -np.inf if start is None else start
+        end = np.inf if end is None else end
+        level = 0
+        while level < len(self.levels) and self._count(level, start, end) > max_points * self.fanout:
+            level += 1
+        # Newer points than the last complete block of a level are still only in the levels below
+        parts = []
+        first = 0
+        for lv in range(level, -1, -1):
+            parts.append(self._points(lv, start, end, first))
+            if lv:
+                first = self.levels[lv - 1].n * self.fanout
+        t = np.concatenate([p[0] for p in parts])
+        v = np.concatenate([p[1] for p in parts])
+        # Blocks straddling the edges may put their min or max outside the range
+        inside = (t >= start) & (t < end)
+        if not inside.all():
+            t, v = t[inside], v[inside]
+        if len(t) > max_points:
+            idx = (lttb if method == "lttb" else minmax)(t, v, max_points)
+            t, v = t[idx], v[idx]
+        return t, v
+
+
+class ChartHistory:
+    """Pyramids of the numeric columns of parsed events, per device; safe to query while appending"""
+
+    def __init__(self, columns=CHART_COLUMNS, fanout=FANOUT):
+        self.columns = columns
+        self.fanout = fanout
+        self.series = {}
+        self._lock = threading.Lock()
+
+    def update(self, device, records):
+        """Append a batch of ``line_parser.EVENT_DTYPE`` records received from ``device``"""
+        if not len(records):
+            return
+        with self._lock:
+            for column in self.columns:
+                key = (device, column)
+                if key not in self.series:
+                    self.series[key] = SeriesPyramid(self.fanout)
+                self.series[key].append(records["ts"], records[column])
+
+    def devices(self):
+        with self._lock:
+            return sorted({device for device, _ in self.series})
+
+    def time_range(self, device=None):
+        with self._lock:
+            pyramids = [p for (d, _), p in self.series.items() if len(p) and (device is None or d == device)]
+            if not pyramids:
+                return None
+            return min(p.raw["t"][0] for p in pyramids), max(p.raw["t"][-1] for p in pyramids)
+
+    def query(self, device, column, start=None, end=None, max_points=1000, method="minmax"):
+        with self._lock:
+            pyramid = self.series.get((device, column))
+            if pyramid is None:
+                return np.empty(0), np.empty(0)
+            t, v = pyramid.query(start, end, max_points, method)
+            return t.copy(), v.copy()
@@ -0,0 +1,399 @@
+"""Software STM32 board emulator over pseudo-terminals.
+
+Each emulated board owns a pty pair and plays the firmware's serial output
+byte for byte: the startup banner from ``main()``, then per measurement cycle
+"Collecting samples...", an optional RAW_STREAM frame, "Analyzing data..." and
+the verdict line. Verdicts are not scripted: every cycle's 256-sample window
+comes from a synthetic accelerometer signal and goes through the host
+re-implementation of ``runDetection()`` (``detection.run_detection``), so the
+lines are what the firmware would print for that motion.
+
+Timing follows the firmware schedule (256 samples at 104 Hz, then a 1 s sleep)
+divided by ``speed``; ``speed=0`` drops the schedule and emits as fast as the
+emulated UART allows (``baud`` / 10 bytes per second), i.e. line-rate
+saturation. With ``baud=None`` there is no UART pacing at all.
+
+With ``strict_baud=True`` a board also checks the rate the host opened the
+pty at (ptys ignore it, real UARTs do not): a reader at the wrong rate gets
+the bytes a UART receiver would decode from the mismatched bit stream, i.e.
+garbage, as it would from the real board.
+
+One hub thread drives any number of boards. Like the ST-LINK's USB CDC link,
+output is flow-controlled by default: if nobody reads the port, the board
+stalls instead of losing lines. With ``flow_control=False`` it behaves like a
+bare UART and drops lines, counting them.
+
+    python emulator.py --boards 4 --scenario mixed --speed 10
+    python emulator.py --boards 1 --speed 0 --link /tmp/ttySTM32   # saturate, stable path
+"""
+import argparse
+import os
+import termios
+import threading
+import time
+import tty
+from collections import deque
+
+import numpy as np
+
+import detection
+from detection import FFT_SIZE, SAMPLE_RATE_HZ
+from frame_protocol import encode_frame
+
+SCENARIOS = ("rest", "tremor", "dyskinesia", "mixed", "sweep")
+
+# (firmware time offset in seconds, line) of the boot sequence in main()
+BANNER = [
+    (0.1, "\r\n\r\n------------------------------------"),
+    (0.1, "Tremor/Dyskinesia Detection System"),
+    (0.1, "------------------------------------"),
+    (0.4, "Testing sensor connectivity..."),
+    (0.4, "WHO_AM_I = 0x6A (expect 0x6A)"),
+    (0.4, "Configuring sensor control register..."),
+    (0.5, "Configuring accelerometer: 104 Hz, ±2g"),
+    (0.5, "System ready. Starting measurements..."),
+]
+BOOT_SECONDS = 1.7      # banner plus the three ready blinks
+WINDOW_SECONDS = FFT_SIZE / SAMPLE_RATE_HZ
+SLEEP_SECONDS = 1.0
+CYCLE_SECONDS = WINDOW_SECONDS + SLEEP_SECONDS
+
+# termios speed codes of the rates a host might open the pty at
+_SPEEDS = {getattr(termios, f"B{b}"): b for b in (1200, 2400, 4800, 9600, 19200, 38400, 57600, 115200,
+                                                   230400, 460800, 921600) if hasattr(termios, f"B{b}")}
+
+COLLECTING = b"Collecting samples...\r\n"
+ANALYZING = b"Analyzing data...\r\n"
+
+# Typical raw X-axis values at +-2 g (0.061 mg/LSB): board lying flat, some sensor noise
+OFFSET_LSB = 300.0
+NOISE_LSB = 60.0
+
+
+def synthetic_windows(scenario, cycle_index, rng, fs=SAMPLE_RATE_HZ):
+    """int16 sample windows for the given cycles (one row per cycle) of a scenario"""
+    cycle_index = np.asarray(cycle_index)
+    n = len(cycle_index)
+    t = cycle_index[:, None] * CYCLE_SECONDS + np.arange(FFT_SIZE)[None, :] / fs
+    x = OFFSET_LSB + rng.normal(0, NOISE_LSB, (n, FFT_SIZE))
+
+    if scenario == "mixed":
+        kinds = rng.choice(3, size=n, p=[0.5, 0.3, 0.2])
+    else:
+        kinds = np.full(n, {"rest": 0, "tremor": 1, "dyskinesia": 2, "sweep": 3}[scenario])
+    # The firmware only reports tremor for a peak in bin 11 (~4.5 Hz): bins 1-10 also form the
+    # threshold baseline and bin 12 ties with the dyskinesia band, so tremor motion is put there
+    freq = np.where(kinds == 1, rng.uniform(4.35, 4.6, n), rng.uniform(5.2, 6.9, n))
+    amp = np.where(kinds == 0, 0.0, rng.uniform(800, 3000, n))
+    if scenario == "sweep":
+        freq = 2.0 + 6.0 * (0.5 + 0.5 * np.sin(2 * np.pi * cycle_index * CYCLE_SECONDS / 60.0))
+        amp = np.full(n, 1500.0)
+    phase = rng.uniform(0, 2 * np.pi, n)
+    x += amp[:, None] * np.sin(2 * np.pi * freq[:, None] * t + phase[:, None])
+    return np.clip(np.round(x), -32768, 32767).astype(np.int16)
+
+
+def open_pty():
+    """Open a raw pseudo-terminal pair, returning (master_fd, slave_fd, slave_path)"""
+    master, slave = os.openpty()
+    tty.setraw(master)
+    tty.setraw(slave)
+    path = os.ttyname(slave)
+    return master, slave, path
+
+
+def uart_misread(data, tx_baud, rx_baud):
+    """Bytes a UART receiver at ``rx_baud`` decodes from 8N1 ``data`` sent back to back at ``tx_baud``"""
+    if not data or tx_baud == rx_baud:
+        return bytes(data)
+    bits = np.unpackbits(np.frombuffer(bytes(data), dtype=np.uint8)[:, None], axis=1, bitorder="little")
+    # Line level per transmitted bit time: start bit, 8 data bits LSB first, stop bit, then idle
+    n = len(bits)
+    level = np.hstack([np.zeros((n, 1), np.uint8), bits, np.ones((n, 1), np.uint8)]).ravel()
+    level = np.concatenate([level, np.ones(10, np.uint8)])
+    lows = np.flatnonzero(level == 0)
+    step = tx_baud / rx_baud          # one received bit in transmitted bit times
+    offsets = (np.arange(1, 10) + 0.5) * step
+    out = bytearray()
+    pos = 0.0
+    while True:
+        # The receiver waits for a low level (a start bit), then samples mid-bit at its own rate
+        k = int(np.searchsorted(lows, pos))
+        if k == len(lows):
+            break
+        start = lows[k]
+        at = (start + offsets).astype(np.intp)
+        if at[-1] >= len(level):
+            break
+        out.append(int(np.packbits(level[at[:8]], bitorder="little")[0]))
+        pos = start + offsets[-1]
+    return bytes(out)
+
+
+class EmulatedBoard:
+    """One board: a pty pair plus the generator of its firmware output"""
+
+    def __init__(self, scenario="mixed", speed=1.0, baud=115200, raw_stream=False, flow_control=True,
+                 seed=None, link=None, block=64, max_pending=65536, strict_baud=False):
+        if scenario not in SCENARIOS:
+            raise ValueError(f"unknown scenario {scenario!r}, expected one of {SCENARIOS}")
+        self.scenario = scenario
+        self.speed = speed
+        self.baud = baud
+        self.bytes_per_sec = None if baud is None else baud / 10.0  # 8N1
+        self.strict_baud = strict_baud and baud is not None
+        self._host_baud = baud
+        self._host_baud_checked = float("-inf")
+        self.raw_stream = raw_stream
+        self.flow_control = flow_control
+        self.block = block
+        self.max_pending = max_pending
+        self.rng = np.random.default_rng(seed)
+
+        self.master, self.slave, self.path = open_pty()
+        os.set_blocking(self.master, False)
+        self.link = link
+        if link is not None:
+            if os.path.islink(link):
+                os.unlink(link)
+            os.symlink(self.path, link)
+
+        self._events = self._firmware_output()
+        self._next = None
+        self._pending = bytearray()
+        self._verdict_ends = deque()  # (stream offset just past a verdict line, cycle, line)
+        self._queued = 0              # bytes ever queued
+        self._credit = 0.0
+        self._last_tick = None
+        self.start_time = None
+
+        self.bytes_sent = 0
+        self.lines_sent = 0
+        self.cycles = 0
+        self.dropped_lines = 0
+        self.verdicts = []            # (perf_counter when fully written, line)
+        self._verdict_cycles = []
+        self.results = []             # DETECTION_DTYPE blocks behind the verdicts
+
+    def _firmware_output(self):
+        """Yield ``(firmware time, bytes, (cycle, verdict line) or None)`` in output order"""
+        for t, line in BANNER:
+            yield t, (line + "\r\n").encode("utf-8"), None
+        cycle = 0
+        t = BOOT_SECONDS
+        while True:
+            # Windows and verdicts for a block of cycles at once, through the host detection math
+            windows = synthetic_windows(self.scenario, np.arange(cycle, cycle + self.block), self.rng)
+            rows = detection.run_detection(windows)
+            self.results.append(rows)
+            for window, row in zip(windows, rows):
+                yield t, COLLECTING, None
+                t += WINDOW_SECONDS
+                if self.raw_stream:
+                    yield t, encode_frame(cycle, window), None
+                yield t, ANALYZING, None
+                line = detection.format_verdict(row)
+                yield t, (line + "\r\n").encode("ascii"), (cycle, line)
+                t += SLEEP_SECONDS
+                cycle += 1
+
+    def detection_results(self):
+        """Ground truth for the verdicts written so far, as one DETECTION_DTYPE array"""
+        rows = np.concatenate(self.results) if self.results else np.empty(0, dtype=detection.DETECTION_DTYPE)
+        return rows[np.asarray(self._verdict_cycles, dtype=np.int64)]
+
+    def next_due(self):
+        """perf_counter time at which the next line is due (``-inf`` when saturating)"""
+        if self._next is None:
+            self._next = next(self._events)
+        if not self.speed:
+            return float("-inf")
+        return self.start_time + self._next[0] / self.speed
+
+    def _queue_due(self, now):
+        while True:
+            if self.next_due() > now:
+                return
+            if not self.speed and len(self._pending) >= 4096:
+                return  # saturating: keep just enough queued to keep the UART busy
+            if len(self._pending) >= self.max_pending:
+                if self.flow_control:
+                    return  # the firmware blocks in printf until the host reads
+                # A bare UART has nowhere to keep the backlog: the line is lost
+                self._next = None
+                self.dropped_lines += 1
+                continue
+            _, data, verdict = self._next
+            self._next = None
+            self._pending += data
+            self._queued += len(data)
+            if verdict is not None:
+                self._verdict_ends.append((self._queued,) + verdict)
+
+    def service(self, now):
+        """Queue the lines that are due and write what the UART rate and the pty allow"""
+        if self.start_time is None:
+            self.start_time = now
+            self._last_tick = now
+        self._queue_due(now)
+
+        if self.bytes_per_sec is None:
+            budget = len(self._pending)
+        else:
+            # A UART sends continuously while it has data; idle time earns no credit
+            self._credit = min(self._credit + (now - self._last_tick) * self.bytes_per_sec,
+                               max(64.0, self.bytes_per_sec * 0.02))
+            budget = min(len(self._pending), int(self._credit))
+        self._last_tick = now
+        if budget <= 0:
+            return
+        try:
+            if self.strict_baud and self.host_baud(now) != self.baud:
+                # The host samples at another rate: it gets garbage, and the UART time is spent all the same
+                garbled = uart_misread(self._pending[:budget], self.baud, self._host_baud)
+                accepted = os.write(self.master, garbled) if garbled else 0
+                # Bytes the pty refused were never sent: keep their share of the source bytes pending
+                written = budget if accepted == len(garbled) else budget * accepted // len(garbled)
+            else:
+                written = os.write(self.master, self._pending[:budget])
+        except BlockingIOError:
+            return  # the pty is full: nobody is reading
+        if self.bytes_per_sec is not None:
+            self._credit -= written
+        self.lines_sent += self._pending.count(b"\n", 0, written)
+        del self._pending[:written]
+        self.bytes_sent += written
+        while self._verdict_ends and self._verdict_ends[0][0] <= self.bytes_sent:
+            _, cycle, line = self._verdict_ends.popleft()
+            self.verdicts.append((now, line))
+            self._verdict_cycles.append(cycle)
+            self.cycles += 1
+
+    def host_baud(self, now):
+        """Rate the host side last configured the pty for (checked at most every 100 ms)"""
+        if now - self._host_baud_checked >= 0.1:
+            self._host_baud_checked = now
+            try:
+                self._host_baud = _SPEEDS.get(termios.tcgetattr(self.slave)[5], self._host_baud)
+            except termios.error:
+                pass
+        return self._host_baud
+
+    def busy(self):
+        """True while output is waiting for the UART or the reader"""
+        return bool(self._pending)
+
+    def stats(self):
+        return {
+            "path": self.path,
+            "cycles": self.cycles,
+            "lines_sent": self.lines_sent,
+            "bytes_sent": self.bytes_sent,
+            "pending_bytes": len(self._pending),
+            "dropped_lines": self.dropped_lines,
+        }
+
+    def close(self):
+        if self.link is not None and os.path.islink(self.link):
+            os.unlink(self.link)
+        for fd in (self.master, self.slave):
+            try:
+                os.close(fd)
+            except OSError:
+                pass
+
+
+class EmulatorHub(threading.Thread):
+    """One thread serving every emulated board"""
+
+    def __init__(self, boards=(), tick=0.002):
+        super().__init__(name="stm32-emulator", daemon=True)
+        self.boards = list(boards)
+        self.tick = tick
+        self._lock = threading.Lock()
+        self.stopped = threading.Event()
+
+    def add(self, board):
+        with self._lock:
+            self.boards.append(board)
+        return board
+
+    def run(self):
+        while not self.stopped.is_set():
+            now = time.perf_counter()
+            with self._lock:
+                boards = list(self.boards)
+            for board in boards:
+                board.service(now)
+            # Sleep until the next line is due, but keep ticking while UART output is pending
+            wake = min((b.next_due() for b in boards), default=now + self.tick)
+            idle = max(self.tick, min(wake - time.perf_counter(), 0.05))
+            if any(b.busy() for b in boards):
+                idle = self.tick
+            self.stopped.wait(idle)
+
+    def stop(self):
+        self.stopped.set()
+        if self.is_alive():
+            self.join()
+
+    def close(self):
+        self.stop()
+        for board in self.boards:
+            board.close()
+
+    def __enter__(self):
+        if not self.is_alive():
+            self.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def start_emulator(n_boards=1, links=None, seed=0, **board_args):
+    """Start a hub with ``n_boards`` boards; returns the running hub (``hub.boards[i].path``)"""
+    boards = []
+    for i in range(n_boards):
+        link = None if links is None else links[i]
+        boards.append(EmulatedBoard(seed=None if seed is None else seed + i, link=link, **board_args))
+    hub = EmulatorHub(boards)
+    hub.start()
+    return hub
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Emulate STM32 tremor/dyskinesia boards on pseudo-terminals")
+    parser.add_argument("--boards", type=int, default=1)
+    parser.add_argument("--scenario", choices=SCENARIOS, default="mixed")
+    parser.add_argument("--speed", type=float, default=1.0, help="schedule speed-up; 0 saturates the UART")
+    parser.add_argument("--baud", type=int, default=115200, help="emulated UART rate; 0 for no pacing")
+    parser.add_argument("--raw-stream", action="store_true", help="also send RAW_STREAM sample frames")
+    parser.add_argument("--strict-baud", action="store_true", help="garble output read at another baud rate")
+    parser.add_argument("--no-flow-control", action="store_true", help="drop lines when nobody reads")
+    parser.add_argument("--link", help="symlink to the pty (board number appended when --boards > 1)")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    links = None
+    if args.link:
+        links = [args.link] if args.boards == 1 else [f"{args.link}{i}" for i in range(args.boards)]
+    hub = start_emulator(args.boards, links=links, seed=args.seed, scenario=args.scenario,
+                         speed=args.speed, baud=args.baud or None, raw_stream=args.raw_stream,
+                         flow_control=not args.no_flow_control, strict_baud=args.strict_baud)
+    for board in hub.boards:
+        print(f"Emulated board on {board.link or board.path}")
+    print("Press Ctrl+C to stop")
+    try:
+        while True:
+            time.sleep(5)
+            for board in hub.boards:
+                print(board.stats())
+    except KeyboardInterrupt:
+        pass
+    finally:
+        hub.close()
+
+
+if __name__ == "__main__":
+    main()
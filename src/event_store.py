@@ -0,0 +1,232 @@
+"""Persistent event store for received serial lines.
+
+Every line is one row in an SQLite database running in WAL mode, so the
+reader thread can insert whole batches in a single transaction while any
+number of Streamlit reruns read a consistent snapshot at the same time.
+Counters are computed as aggregates over the rows instead of being stored.
+Verdict lines are parsed on insert (``line_parser``), so their frequency and
+magnitudes are columns that ``records()`` returns as a numpy array.
+"""
+import sqlite3
+
+import numpy as np
+
+from line_parser import EVENT_DTYPE, KIND_NAMES, line_kind, parse_lines
+
+KIND_TREMOR = "tremor"
+KIND_DYSKINESIA = "dyskinesia"
+KIND_NORMAL = "normal"
+KIND_STATUS = "status"
+KIND_OTHER = "other"
+KIND_CODES = {name: code for code, name in enumerate(KIND_NAMES)}
+
+# freq, tremor_mag and dysk_mag hold the numbers parsed from verdict lines (NULL otherwise)
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS events (
+    id         INTEGER PRIMARY KEY AUTOINCREMENT,
+    ts         REAL NOT NULL,
+    kind       TEXT NOT NULL,
+    line       TEXT NOT NULL,
+    freq       REAL,
+    tremor_mag REAL,
+    dysk_mag   REAL
+);
+CREATE INDEX IF NOT EXISTS idx_events_ts ON events(ts);
+CREATE INDEX IF NOT EXISTS idx_events_kind ON events(kind, id);
+CREATE TABLE IF NOT EXISTS meta (
+    key   TEXT PRIMARY KEY,
+    value TEXT
+);
+"""
+
+NUMBER_COLUMNS = ("freq", "tremor_mag", "dysk_mag")
+
+
+def classify_line(line):
+    """Map a firmware output line to an event kind"""
+    return KIND_NAMES[line_kind(line)]
+
+
+def _nullable(values):
+    """float32 column to Python floats, NaN as None (SQL NULL)"""
+    return [None if v != v else v for v in values.tolist()]
+
+
+class EventStore:
+    """SQLite-backed event log; use one instance per thread"""
+
+    def __init__(self, path, timeout=5.0):
+        self.path = path
+        self.conn = sqlite3.connect(path, timeout=timeout, isolation_level=None)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript(SCHEMA)
+        self._migrate()
+
+    def _migrate(self):
+        """Add the number columns to a database created before they existed, filling them from the lines"""
+        columns = {row[1] for row in self.conn.execute("PRAGMA table_info(events)")}
+        missing = [c for c in NUMBER_COLUMNS if c not in columns]
+        if not missing:
+            return
+        with self.conn:
+            self.conn.execute("BEGIN IMMEDIATE")
+            # Another connection may have migrated while this one waited for the lock
+            columns = {row[1] for row in self.conn.execute("PRAGMA table_info(events)")}
+            for column in NUMBER_COLUMNS:
+                if column not in columns:
+                    self.conn.execute(f"ALTER TABLE events ADD COLUMN {column} REAL")
+            rows = self.conn.execute("SELECT id, line FROM events WHERE kind IN (?, ?, ?)",
+                                     (KIND_TREMOR, KIND_DYSKINESIA, KIND_NORMAL)).fetchall()
+            if rows:
+                records = parse_lines([row[1] for row in rows])
+                self.conn.executemany(
+                    "UPDATE events SET freq = ?, tremor_mag = ?, dysk_mag = ? WHERE id = ?",
+                    zip(_nullable(records["freq"]), _nullable(records["tremor_mag"]),
+                        _nullable(records["dysk_mag"]), [row[0] for row in rows]),
+                )
+
+    def close(self):
+        self.conn.close()
+
+    # --- Writes ---
+
+    def append(self, ts, lines, records=None):
+        """Insert a batch of lines received at ``ts`` in one transaction, returning the last id
+
+        ``ts`` may be a scalar or one time per line. ``records`` is the
+        ``line_parser.parse_lines`` result for ``lines`` when the caller
+        already has it.
+        """
+        if not lines:
+            return self.last_id()
+        if records is None:
+            records = parse_lines(lines, ts)
+        kinds = [KIND_NAMES[k] for k in records["kind"].tolist()]
+        times = np.broadcast_to(np.asarray(ts, dtype=np.float64), len(lines)).tolist()
+        rows = zip(times, kinds, lines, _nullable(records["freq"]),
+                   _nullable(records["tremor_mag"]), _nullable(records["dysk_mag"]))
+        with self.conn:
+            self.conn.execute("BEGIN")
+            self.conn.executemany(
+                "INSERT INTO events (ts, kind, line, freq, tremor_mag, dysk_mag) VALUES (?, ?, ?, ?, ?, ?)",
+                rows,
+            )
+        return self.last_id()
+
+    def set_status(self, **values):
+        """Store connection status fields such as ``is_connected`` or ``error_message``"""
+        with self.conn:
+            self.conn.execute("BEGIN")
+            self.conn.executemany(
+                "INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)",
+                [(k, None if v is None else str(v)) for k, v in values.items()],
+            )
+
+    def clear(self):
+        """Hide everything received so far from counters and the console, keeping the history"""
+        self.set_status(cleared_id=self.last_id())
+
+    # --- Reads ---
+
+    def _meta(self, key, default=None):
+        row = self.conn.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return default if row is None or row[0] is None else row[0]
+
+    def cleared_id(self):
+        return int(self._meta("cleared_id", 0))
+
+    def last_id(self):
+        row = self.conn.execute("SELECT MAX(id) FROM events").fetchone()
+        return row[0] or 0
+
+    def status(self):
+        """Return connection status, error message and time of the last received line"""
+        last_ts = self.conn.execute("SELECT MAX(ts) FROM events").fetchone()[0]
+        return {
+            "is_connected": self._meta("is_connected") == "True",
+            "error_message": self._meta("error_message"),
+            "last_updated": last_ts,
+        }
+
+    def since(self, last_id, limit=1000):
+        """Rows ``(id, ts, kind, line)`` with id greater than ``last_id``, oldest first"""
+        last_id = max(last_id, self.cleared_id())
+        return self.conn.execute(
+            "SELECT id, ts, kind, line FROM events WHERE id > ? ORDER BY id LIMIT ?",
+            (last_id, limit),
+        ).fetchall()
+
+    def recent(self, n=100):
+        """The last ``n`` rows since the console was cleared, oldest first"""
+        rows = self.conn.execute(
+            "SELECT id, ts, kind, line FROM events WHERE id > ? ORDER BY id DESC LIMIT ?",
+            (self.cleared_id(), n),
+        ).fetchall()
+        rows.reverse()
+        return rows
+
+    def counts(self, start_ts=None, end_ts=None):
+        """Number of events per kind since the console was cleared, optionally in a time range"""
+        sql = "SELECT kind, COUNT(*) FROM events WHERE id > ?"
+        params = [self.cleared_id()]
+        if start_ts is not None:
+            sql += " AND ts >= ?"
+            params.append(start_ts)
+        if end_ts is not None:
+            sql += " AND ts < ?"
+            params.append(end_ts)
+        counts = {KIND_TREMOR: 0, KIND_DYSKINESIA: 0, KIND_NORMAL: 0}
+        counts.update(self.conn.execute(sql + " GROUP BY kind", params).fetchall())
+        return counts
+
+    def events(self, kind=None, start_ts=None, end_ts=None, limit=1000):
+        """Rows of one kind and/or time range, using the ts and kind indexes"""
+        sql = "SELECT id, ts, kind, line FROM events WHERE 1=1"
+        params = []
+        if kind is not None:
+            sql += " AND kind = ?"
+            params.append(kind)
+        if start_ts is not None:
+            sql += " AND ts >= ?"
+            params.append(start_ts)
+        if end_ts is not None:
+            sql += " AND ts < ?"
+            params.append(end_ts)
+        sql += " ORDER BY id LIMIT ?"
+        params.append(limit)
+        return self.conn.execute(sql, params).fetchall()
+
+    def records(self, kind=None, start_ts=None, end_ts=None, limit=None):
+        """Parsed events since the console was cleared as an ``EVENT_DTYPE`` array, oldest first
+
+        ``limit`` keeps the newest rows.
+        """
+        columns = "ts, kind, freq, tremor_mag, dysk_mag"
+        sql = f"SELECT id, {columns} FROM events WHERE id > ?"
+        params = [self.cleared_id()]
+        if kind is not None:
+            sql += " AND kind = ?"
+            params.append(kind)
+        if start_ts is not None:
+            sql += " AND ts >= ?"
+            params.append(start_ts)
+        if end_ts is not None:
+            sql += " AND ts < ?"
+            params.append(end_ts)
+        if limit is not None:
+            sql = f"SELECT {columns} FROM ({sql} ORDER BY id DESC LIMIT ?) ORDER BY id"
+            params.append(limit)
+        else:
+            sql = f"SELECT {columns} FROM ({sql}) ORDER BY id"
+        rows = self.conn.execute(sql, params).fetchall()
+        out = np.empty(len(rows), dtype=EVENT_DTYPE)
+        if rows:
+            ts, kinds, freq, tremor_mag, dysk_mag = zip(*rows)
+            out["ts"] = ts
+            out["kind"] = [KIND_CODES[k] for k in kinds]
+            # NULL comes back as None, which numpy turns into NaN
+            out["freq"] = np.array(freq, dtype=np.float64)
+            out["tremor_mag"] = np.array(tremor_mag, dtype=np.float64)
+            out["dysk_mag"] = np.array(dysk_mag, dtype=np.float64)
+        return out
@@ -0,0 +1,184 @@
+"""Framed binary protocol for streaming raw int16 accelerometer samples.
+
+Frame layout (little-endian)::
+
+    offset  size  field
+    0       2     sync word 0xA5 0x5A
+    2       2     sequence number (uint16, wraps)
+    4       2     sample count n
+    6       2n    samples (int16)
+    6+2n    2     CRC-16/CCITT-FALSE over bytes 2 .. 6+2n
+
+Frames can be interleaved with the firmware's text lines; anything that is
+not a valid frame is skipped while hunting for the next sync word.
+
+The parser keeps one reusable bytearray, can ``readinto`` it straight from a
+serial port, validates frames with the C-implemented ``binascii.crc_hqx`` and
+turns payloads into numpy arrays with ``np.frombuffer``; no Python object is
+created per sample.
+"""
+import binascii
+import struct
+
+import numpy as np
+
+SYNC = b"\xa5\x5a"
+HEADER = struct.Struct("<2sHH")
+CRC = struct.Struct("<H")
+HEADER_SIZE = HEADER.size
+CRC_SIZE = CRC.size
+MAX_SAMPLES = 2048
+CRC_INIT = 0xFFFF
+
+
+def frame_crc(body):
+    """CRC-16/CCITT-FALSE of the sequence, count and payload bytes"""
+    return binascii.crc_hqx(body, CRC_INIT)
+
+
+def encode_frame(seq, samples):
+    """Pure-Python encoder matching the firmware's RAW_STREAM output"""
+    payload = np.asarray(samples, dtype="<i2").tobytes()
+    n = len(payload) // 2
+    if n > MAX_SAMPLES:
+        raise ValueError(f"frame holds at most {MAX_SAMPLES} samples, got {n}")
+    header = HEADER.pack(SYNC, seq & 0xFFFF, n)
+    return header + payload + CRC.pack(frame_crc(header[2:] + payload))
+
+
+class FrameParser:
+    """Incremental frame decoder over a reusable receive buffer"""
+
+    def __init__(self, capacity=65536):
+        self._buf = bytearray(capacity)
+        self._view = memoryview(self._buf)
+        self._start = 0
+        self._end = 0
+        self._last_seq = None
+        self.frames = 0
+        self.samples = 0
+        self.crc_errors = 0
+        self.dropped_frames = 0
+        self.skipped_bytes = 0
+
+    @property
+    def capacity(self):
+        return len(self._buf)
+
+    def _compact(self):
+        """Move unparsed bytes to the front of the buffer"""
+        if self._start:
+            pending = self._end - self._start
+            self._buf[:pending] = self._view[self._start:self._end]
+            self._start, self._end = 0, pending
+
+    def feed(self, data):
+        """Append received bytes and decode every complete frame; see :meth:`decode`"""
+        data = memoryview(data)
+        seqs, chunks = [], []
+        done = []
+        while data:
+            if self._end == len(self._buf):
+                # Payload views point into the buffer, so copy them out before it moves
+                if chunks:
+                    done.append(self._result(seqs, chunks))
+                    seqs, chunks = [], []
+                self._compact()
+            space = len(self._buf) - self._end
+            if space == 0:
+                # A full buffer without one valid frame is garbage; drop it
+                self.skipped_bytes += self._end - self._start
+                self._start = self._end = 0
+                space = len(self._buf)
+            n = min(space, len(data))
+            self._buf[self._end:self._end + n] = data[:n]
+            self._end += n
+            data = data[n:]
+            self._decode_into(seqs, chunks)
+        if not done:
+            return self._result(seqs, chunks)
+        done.append(self._result(seqs, chunks))
+        return (np.concatenate([d[0] for d in done]),
+                np.concatenate([d[1] for d in done]))
+
+    def readinto(self, stream, max_bytes=None):
+        """Read from ``stream`` (serial port, socket file, ...) straight into the buffer and decode"""
+        self._compact()
+        if self._end == len(self._buf):
+            self.skipped_bytes += self._end
+            self._start = self._end = 0
+        stop = len(self._buf) if max_bytes is None else min(len(self._buf), self._end + max_bytes)
+        n = stream.readinto(self._view[self._end:stop]) or 0
+        self._end += n
+        return self.decode()
+
+    def decode(self):
+        """Decode all complete frames currently buffered
+
+        Returns ``(seqs, samples)``: a uint16 array with one sequence number per
+        frame and a contiguous int16 array holding all of their samples.
+        """
+        seqs, chunks = [], []
+        self._decode_into(seqs, chunks)
+        return self._result(seqs, chunks)
+
+    @staticmethod
+    def _result(seqs, chunks):
+        seqs = np.array(seqs, dtype=np.uint16)
+        if not chunks:
+            return seqs, np.empty(0, dtype=np.int16)
+        if len(chunks) == 1:
+            return seqs, chunks[0].copy()
+        return seqs, np.concatenate(chunks)
+
+    def _decode_into(self, seqs, chunks):
+        buf, view = self._buf, self._view
+        pos, end = self._start, self._end
+        while True:
+            sync = buf.find(SYNC, pos, end)
+            if sync < 0:
+                # Keep a trailing 0xA5 that may be the first half of a sync word
+                keep = 1 if end > pos and buf[end - 1] == SYNC[0] else 0
+                self.skipped_bytes += end - pos - keep
+                pos = end - keep
+                break
+            self.skipped_bytes += sync - pos
+            pos = sync
+            if end - pos < HEADER_SIZE:
+                break
+            _, seq, n = HEADER.unpack_from(buf, pos)
+            if n > MAX_SAMPLES:
+                # Not a real header; resume the search one byte further on
+                self.skipped_bytes += 1
+                pos += 1
+                continue
+            frame_end = pos + HEADER_SIZE + 2 * n + CRC_SIZE
+            if frame_end > end:
+                break
+            body = view[pos + 2:frame_end - CRC_SIZE]
+            (crc,) = CRC.unpack_from(buf, frame_end - CRC_SIZE)
+            if frame_crc(body) != crc:
+                self.crc_errors += 1
+                self.skipped_bytes += 1
+                pos += 1
+                continue
+
+            if self._last_seq is not None:
+                self.dropped_frames += (seq - self._last_seq - 1) & 0xFFFF
+            self._last_seq = seq
+            self.frames += 1
+            self.samples += n
+            seqs.append(seq)
+            # A view into the receive buffer; _result copies it out before it can be reused
+            chunks.append(np.frombuffer(buf, dtype="<i2", count=n, offset=pos + HEADER_SIZE))
+            pos = frame_end
+        self._start = pos
+
+    def stats(self):
+        return {
+            "frames": self.frames,
+            "samples": self.samples,
+            "crc_errors": self.crc_errors,
+            "dropped_frames": self.dropped_frames,
+            "skipped_bytes": self.skipped_bytes,
+        }
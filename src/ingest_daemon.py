@@ -0,0 +1,674 @@
+"""Headless ingestion daemon with a local query API.
+
+The dashboards used to run the serial reader, the parser and every writer
+(SQLite, archive, statistics, chart pyramids) inside the Streamlit server,
+next to the script reruns. This process does that work on its own, with no
+Streamlit import, so it starts in a fraction of a second and keeps recording
+when no browser is open. The apps talk to it through ``daemon_client``.
+
+Everything it stores is also published to a ``live_state`` shared-memory
+block (status, counters and the most recent lines), so a dashboard rerun with
+nothing new to fetch makes no request at all. The block is named after the
+address the daemon serves on. A second daemon on the same address, socket or
+block exits instead of taking them over.
+
+It serves JSON over HTTP/1.1 with keep-alive, on a TCP port bound to
+localhost or on a Unix socket:
+
+    GET  /status                      connection, counters, queues, devices, live state block
+    GET  /events?since=ID&limit=N     console rows ``[id, ts, kind, line]`` after ``since``, the
+                                      page size and the live state head matching the last row
+    GET  /records?limit=N&kind=K      parsed events as columns
+    GET  /stats                       session statistics (and those of finished sessions)
+    GET  /chart?start=&end=&last=&points=   downsampled magnitude series per device
+    GET  /history?kind=&device=&start=&end=   archived verdicts as columns
+    GET  /ports?refresh=1             serial ports, ST-LINK first
+    POST /probe      {"timeout"}      auto-detect port and baud rate
+    POST /devices    {"port", "baud", "lease"}   start reading a port; the reply has its live state id
+    POST /devices/stop {"port", "lease"}        stop one port (all without ``port``); with the
+                                      ``lease`` it was started with, only once no other lease holds it
+    POST /clear                       clear the console
+    POST /append     {"lines"}        store lines (test data, notes)
+    GET  /metrics                     Prometheus text format (``?format=json`` for a snapshot)
+
+    python ingest_daemon.py                         # http://127.0.0.1:8765
+    python ingest_daemon.py --unix /tmp/stm32.sock --port /dev/ttyACM0 --baud 115200
+"""
+import argparse
+import errno
+import json
+import os
+import signal
+import socket
+import socketserver
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from itertools import groupby
+from operator import itemgetter
+from urllib.parse import parse_qs, urlsplit
+
+import line_parser
+import port_registry
+from downsample import ChartHistory
+from event_archive import ArchiveWriter, EventArchive
+from event_store import EventStore
+from ingest_queue import COALESCE, IngestQueue
+from live_state import DEFAULT_NAME as LIVE_STATE_NAME, KIND_CODES, LiveStateWriter, block_name
+from metrics import STATE_WRITE, metrics
+from session_stats import SessionStats, load_stats, save_stats
+
+DATA_FILE = "serial_data.db"
+ARCHIVE_DIR = "event_archive"
+STATS_FILE = "session_stats.json"
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 8765
+
+INGEST_QUEUE_LINES = 20000
+INGEST_POLICY = COALESCE
+CHART_COLUMNS = ("tremor_mag", "dysk_mag")
+MAX_EVENT_ROWS = 5000
+# How long a restart at another baud rate waits for the old reader to let go of the port
+DEVICE_STOP_SECONDS = 3.0
+# Chart series of the verdicts already in the store when the daemon started
+STORED_SERIES = "stored"
+
+STAGES = ("parse", "store", "archive", "stats", "chart")
+STAGE_SECONDS = metrics.histogram("ingest_stage_seconds", "Time per batch in each publishing stage "
+                                  "(store is the SQLite commit)", ("device", "stage"))
+INGEST_LAG = metrics.histogram("ingest_lag_seconds", "From a batch's arrival at the reader to its commit", ("device",))
+INGEST_LINES = metrics.counter("ingest_lines_total", "Lines stored", ("device",))
+QUEUE_DEPTH = metrics.gauge("ingest_queue_depth", "Lines waiting between reader and storage", ("device",))
+QUEUE_HIGH_WATER = metrics.gauge("ingest_queue_high_water", "Longest the ingest queue has been this session", ("device",))
+QUEUE_DROPPED = metrics.gauge("ingest_queue_dropped", "Lines the ingest queue dropped this session", ("device",))
+API_SECONDS = metrics.histogram("api_request_seconds", "Handling one API request", ("route",))
+UPTIME = metrics.gauge("ingest_daemon_uptime_seconds", "Seconds since the daemon started")
+
+
+def columns(records):
+    """Structured array to ``{field: list}`` for JSON"""
+    return {name: records[name].tolist() for name in records.dtype.names}
+
+
+class DeviceIngest(threading.Thread):
+    """Reads one port through the registry and feeds the daemon's writers
+
+    Three threads per port (registry reader, relay, this one) rather than
+    ``async_ingest.AsyncIngest``: when storage falls behind, that engine pauses
+    the reader and leaves the bytes to the tty buffer, which loses them
+    uncounted once full. Here the ``IngestQueue`` drops status lines first and
+    the dashboards show how many, and the registry's reader keeps the serial
+    metrics of the pipeline panel.
+    """
+
+    def __init__(self, daemon, port, baud):
+        super().__init__(name=f"ingest-{port}", daemon=True)
+        self.owner = daemon
+        self.port = port
+        self.baud = baud
+        self.stop_event = threading.Event()
+        self.queue = IngestQueue(INGEST_QUEUE_LINES, INGEST_POLICY)
+        self.stats = SessionStats()
+        self.connected = False
+        self.error = None
+        self.started = time.time()
+        # Read at scrape time only
+        QUEUE_DEPTH.labels(port).set_function(lambda: len(self.queue))
+        QUEUE_HIGH_WATER.labels(port).set_function(lambda: self.queue.high_water)
+        QUEUE_DROPPED.labels(port).set_function(lambda: self.queue.dropped)
+
+    def run(self):
+        owner = self.owner
+        # SQLite connections belong to the thread that opened them
+        store = EventStore(owner.data_file)
+        parse_s, store_s, archive_s, stats_s, chart_s = (STAGE_SECONDS.labels(self.port, stage) for stage in STAGES)
+        lag = INGEST_LAG.labels(self.port)
+        stored = INGEST_LINES.labels(self.port)
+        clock = time.perf_counter
+
+        def publish(ts, lines):
+            # Parsed once: kinds and numbers for the store, the archive, statistics and charts
+            t0 = clock()
+            records = line_parser.parse_lines(lines, ts)
+            t1 = clock()
+            owner.write_lines(store, ts, lines, records, device=self.port)
+            t2 = clock()
+            owner.archive.append(self.port, records)
+            t3 = clock()
+            self.stats.update(records)
+            t4 = clock()
+            owner.chart_history.update(self.port, records)
+            t5 = clock()
+            parse_s.observe(t1 - t0)
+            store_s.observe(t2 - t1)
+            archive_s.observe(t3 - t2)
+            stats_s.observe(t4 - t3)
+            chart_s.observe(t5 - t4)
+            lag.observe(max(0.0, time.time() - ts))
+            stored.inc(len(lines))
+
+        def relay(sub):
+            # Drains the shared reader promptly, so overflow is decided by the queue's policy
+            # A read also reattaches the subscription if the registry detached it as idle
+            while not self.stop_event.is_set():
+                items = sub.read(timeout=0.5)
+                for ts, batch in groupby(items, key=itemgetter(0)):
+                    self.queue.put(ts, [line for _, line in batch])
+                if not sub.alive:
+                    break
+            self.queue.close()
+
+        reader = None
+        try:
+            print(f"Opening serial port {self.port} at {self.baud} baud")
+            with port_registry.subscribe(self.port, self.baud) as sub:
+                reader = sub.reader
+                sub.wait_connected()
+                self.connected = True
+                owner.set_status(store, is_connected=True, error_message=None)
+                publish(time.time(), [f"✅ Connected to {self.port} at {self.baud} baud"])
+
+                relay_thread = threading.Thread(target=relay, args=(sub,), name="serial-relay", daemon=True)
+                relay_thread.start()
+                while True:
+                    items = self.queue.get(timeout=0.5)
+                    if not items:
+                        if self.queue.closed:
+                            break
+                        continue
+                    # One transaction per reader batch
+                    for ts, batch in groupby(items, key=itemgetter(0)):
+                        publish(ts, [line for _, line in batch])
+                relay_thread.join()
+                if sub.error:
+                    raise OSError(sub.error)
+
+        except Exception as e:
+            print(f"Error reading {self.port}: {e}")
+            self.error = f"Serial Error: {e}"
+            owner.set_status(store, error_message=self.error)
+
+        finally:
+            self.connected = False
+            self.queue.close()
+            if reader is not None and reader.stopped.is_set():
+                # This was its last subscriber: wait until the port is closed, so a restart can reopen it
+                reader.join(1.0)
+            if not owner.devices_connected(exclude=self):
+                owner.set_status(store, is_connected=False)
+            owner.write_lines(store, time.time(), [f"Disconnected from {self.port}"], device=self.port)
+            store.close()
+            owner.finished(self)
+            print(f"Stopped reading {self.port}")
+
+    def stop(self):
+        self.stop_event.set()
+
+    def info(self):
+        return {
+            "baud": self.baud,
+            "connected": self.connected,
+            "running": self.is_alive(),
+            "stopping": self.stop_event.is_set(),
+            "error": self.error,
+            "started": self.started,
+            "live_id": self.owner.live_ids.get(self.port, 0),
+            "queue": self.queue.stats(),
+        }
+
+
+class IngestDaemon:
+    """Devices being read plus the shared writers; the HTTP handlers call into this"""
+
+    def __init__(self, data_file=DATA_FILE, archive_dir=ARCHIVE_DIR, stats_file=STATS_FILE,
+                 live_name=LIVE_STATE_NAME):
+        self.data_file = data_file
+        self.archive_dir = archive_dir
+        self.stats_file = stats_file
+        self.started = time.time()
+        self._lock = threading.Lock()
+        self._start_lock = threading.Lock()
+        self._local = threading.local()
+        self.devices = {}
+        self.live_ids = {}       # port -> device id of its lines in the live block (0 is no device)
+        # Sessions that started a port with a lease share it: their stop only releases the lease,
+        # and the port stops with the last one. A port started without a lease (the recording
+        # dashboard, --port) only stops when told to outright.
+        self.leases = {}         # port -> leases
+        self.pinned = set()
+        self.requests = 0
+
+        # Verdicts of every device go to one archive, written on its own thread
+        self.archive = ArchiveWriter(archive_dir)
+        self.archive.start()
+        self.history = EventArchive(archive_dir)
+        self.chart_history = ChartHistory(columns=CHART_COLUMNS)
+        self.finished_stats = load_stats(stats_file)
+        # Lines go to the store and the live block under one lock, in the same order
+        self._live_lock = threading.Lock()
+        self.live = LiveStateWriter(live_name)
+        store = self.store()
+        self.live.set_counts({KIND_CODES[kind]: n for kind, n in store.counts().items()})
+        self.live.set_status(connected=False, error=store.status()["error_message"])
+        UPTIME.set_function(lambda: time.time() - self.started)
+        # Charts start from the persisted console, so a restart does not blank them; loaded
+        # in the background so a large store does not delay serving
+        threading.Thread(target=self._seed_chart, name="chart-seed", daemon=True).start()
+
+    def _seed_chart(self):
+        store = EventStore(self.data_file)
+        self.chart_history.update(STORED_SERIES, store.records())
+        store.close()
+
+    def store(self):
+        """This thread's connection to the event store"""
+        store = getattr(self._local, "store", None)
+        if store is None:
+            store = self._local.store = EventStore(self.data_file)
+        return store
+
+    def write_lines(self, store, ts, lines, records=None, device=None):
+        """Append lines to ``store`` (this thread's connection) and publish them to the live block
+
+        ``device`` is the port they concern, if any; live readers can follow one port's lines.
+        """
+        if records is None:
+            records = line_parser.parse_lines(lines, ts)
+        dropped = sum(d.queue.dropped for d in self.running())
+        live_id = 0 if device is None else self.live_ids.get(device) or self.live_id(device)
+        with self._live_lock:
+            store.append(ts, lines, records)
+            self.live.publish(ts, lines, records["kind"], live_id)
+            self.live.set_status(dropped=dropped)
+
+    def set_status(self, store, **values):
+        """``EventStore.set_status`` mirrored to the live block"""
+        with self._live_lock:
+            store.set_status(**values)
+            self.live.set_status(connected=values.get("is_connected"),
+                                 error=values.get("error_message", False))
+
+    # --- Devices ---
+
+    def live_id(self, port):
+        """Device id of ``port``'s lines in the live block, stable while the daemon runs"""
+        with self._lock:
+            if port not in self.live_ids:
+                self.live_ids[port] = len(self.live_ids) + 1
+            return self.live_ids[port]
+
+    def start_device(self, port, baud, lease=None):
+        """Read ``port``; with ``lease`` the caller shares it (see ``stop_device``)"""
+        # One start at a time; status queries and stopping devices only need self._lock
+        with self._start_lock:
+            with self._lock:
+                if lease is None:
+                    self.pinned.add(port)
+                else:
+                    self.leases.setdefault(port, set()).add(lease)
+                current = self.devices.get(port)
+                if current is not None and current.is_alive():
+                    if current.baud == baud and not current.stop_event.is_set():
+                        return False
+                    # Popped so that its shutdown (devices_connected, finished) does not wait for us
+                    del self.devices[port]
+                else:
+                    current = None
+            if current is not None:
+                # The registry refuses a second baud rate while the old reader holds the port
+                current.stop()
+                current.join(DEVICE_STOP_SECONDS)
+                if current.is_alive():
+                    raise RuntimeError(f"the reader of {port} at {current.baud} baud did not stop "
+                                       f"within {DEVICE_STOP_SECONDS:g} s")
+            self.set_status(self.store(), error_message=None)
+            self.write_lines(self.store(), time.time(), [f"Starting connection to {port}..."], device=port)
+            device = DeviceIngest(self, port, baud)
+            with self._lock:
+                self.devices[port] = device
+            device.start()
+            return True
+
+    def stop_device(self, port=None, lease=None):
+        """Stop ``port`` (every port without one); with ``lease``, only once no other lease holds it"""
+        if lease is not None and port is None:
+            raise ValueError("a lease is released for one port")
+        with self._lock:
+            if lease is not None:
+                holders = self.leases.get(port, set())
+                holders.discard(lease)
+                if holders or port in self.pinned:
+                    return []
+            for p in [port] if port is not None else list(self.devices):
+                self.leases.pop(p, None)
+                self.pinned.discard(p)
+            targets = [d for p, d in self.devices.items() if port is None or p == port]
+        for device in targets:
+            if device.is_alive() and not device.stop_event.is_set():
+                device.stop()
+                self.write_lines(self.store(), time.time(), [f"Stopping monitoring of {device.port}..."],
+                                 device=device.port)
+        return [d.port for d in targets]
+
+    def devices_connected(self, exclude=None):
+        with self._lock:
+            return [d.port for d in self.devices.values() if d is not exclude and d.connected]
+
+    def finished(self, device):
+        """Merge a stopped device's statistics into those of finished sessions"""
+        with self._lock:
+            if self.devices.get(device.port) is device:
+                # Ended (not replaced by a restart): whoever held the port has to start it again
+                self.leases.pop(device.port, None)
+                self.pinned.discard(device.port)
+            self.finished_stats = self.finished_stats.merge(device.stats)
+            try:
+                with STATE_WRITE.labels("session_stats").time():
+                    save_stats(self.stats_file, self.finished_stats)
+            except Exception as e:
+                print(f"Error saving session statistics: {e}")
+
+    def running(self):
+        with self._lock:
+            return [d for d in self.devices.values() if d.is_alive()]
+
+    def close(self, timeout=5.0):
+        self.stop_device()
+        for device in self.running():
+            device.join(timeout)
+        self.archive.close()
+        self.live.close()
+
+    # --- Queries ---
+
+    def status(self):
+        store = self.store()
+        status = store.status()
+        with self._lock:
+            devices = {port: d.info() for port, d in self.devices.items()}
+        running = [info for info in devices.values() if info["running"]]
+        errors = [info["error"] for info in devices.values() if info["error"]]
+        return {
+            "pid": os.getpid(),
+            "uptime": time.time() - self.started,
+            "connected": any(info["connected"] for info in running),
+            "monitoring": bool(running),
+            "stopping": bool(running) and all(info["stopping"] for info in running),
+            "error_message": status["error_message"] or (errors[-1] if errors else None),
+            "last_updated": status["last_updated"],
+            "counts": store.counts(),
+            "cleared_id": store.cleared_id(),
+            "last_id": store.last_id(),
+            "dropped": sum(info["queue"]["dropped"] for info in running),
+            "devices": devices,
+            "readers": port_registry.registry.stats(),
+            "archive_devices": self.history.devices(),
+            "live_state": self.live.name,
+            "requests": self.requests,
+        }
+
+    def events(self, since=0, limit=MAX_EVENT_ROWS):
+        store = self.store()
+        limit = min(limit, MAX_EVENT_ROWS)
+        # Read with the live head under one lock: a short page ends exactly where the live block goes on
+        with self._live_lock:
+            rows = store.since(since, limit)
+            head = self.live.head
+        return {"cleared_id": store.cleared_id(), "rows": rows, "limit": limit, "live_head": head}
+
+    def records(self, kind=None, limit=None):
+        return columns(self.store().records(kind=kind, limit=limit))
+
+    def stats(self):
+        running = self.running()
+        session = SessionStats.merged([d.stats for d in running]) if running else None
+        with self._lock:
+            finished = self.finished_stats.snapshot()
+        return {"session": None if session is None else session.snapshot(), "finished": finished}
+
+    def chart(self, start=None, end=None, points=800, method="minmax", last=None):
+        """Series of every device over ``[start, end)``, or over the ``last`` seconds before the newest point"""
+        history = self.chart_history
+        span = history.time_range()
+        if last is not None and span is not None:
+            start = span[1] - last
+        series = []
+        for device in history.devices():
+            for column in CHART_COLUMNS:
+                t, v = history.query(device, column, start, end, points, method)
+                series.append({"device": device, "column": column, "t": t.tolist(), "v": v.tolist()})
+        return {"range": None if span is None else [float(span[0]), float(span[1])], "series": series}
+
+    def history_query(self, kind=None, device=None, start=None, end=None):
+        rows = self.history.query(kind, device, start, end)
+        return {"devices": self.history.devices(), "rows": columns(rows)}
+
+    def ports(self, refresh=False):
+        # Imported on first use, so the daemon starts without enumerating anything
+        from port_inventory import inventory, is_stlink
+        ports = inventory.ports(force=refresh)
+        ports.sort(key=lambda p: not is_stlink(p))
+        return [{"device": p.device, "description": p.description, "stlink": is_stlink(p)} for p in ports]
+
+    def probe(self, timeout=15.0):
+        import port_probe
+        busy = {d.port for d in self.running()}
+        ports = [p for p in port_probe.candidate_ports() if p not in busy]
+        return {"detected": port_probe.best_port(ports, timeout=timeout) if ports else None}
+
+    def clear(self):
+        with self._live_lock:
+            self.store().clear()
+            self.live.clear()
+
+    def append(self, lines):
+        self.write_lines(self.store(), time.time(), list(lines))
+
+
+# --- HTTP API ---
+
+class DaemonRequestHandler(BaseHTTPRequestHandler):
+    # Keep-alive: a dashboard reuses one connection for all of its polls
+    protocol_version = "HTTP/1.1"
+    server_version = "stm32-ingest/1"
+    verbose = False
+
+    def setup(self):
+        # Headers and body are separate writes; with Nagle on, the body waits for the
+        # client's delayed ACK. Unix sockets have no Nagle algorithm (nor the option).
+        self.disable_nagle_algorithm = isinstance(self.client_address, tuple)
+        super().setup()
+
+    def address_string(self):
+        # Unix-socket peers have no (host, port)
+        return self.client_address[0] if isinstance(self.client_address, tuple) else "unix"
+
+    def log_message(self, format, *args):
+        if self.verbose:
+            super().log_message(format, *args)
+
+    def _send(self, status, payload):
+        if isinstance(payload, str):
+            body, content_type = payload.encode(), "text/plain; version=0.0.4; charset=utf-8"
+        else:
+            body, content_type = json.dumps(payload, default=float).encode(), "application/json"
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _query(self):
+        url = urlsplit(self.path)
+        return url.path.rstrip("/") or "/", {k: v[-1] for k, v in parse_qs(url.query).items()}
+
+    def _body(self):
+        return json.loads(self._raw_body) if self._raw_body else {}
+
+    def _dispatch(self, routes):
+        daemon = self.server.ingest
+        daemon.requests += 1
+        # Read before any reply, so a request refused early (404, 400) leaves no body behind
+        # to be parsed as the next request on a keep-alive connection
+        length = int(self.headers.get("Content-Length") or 0)
+        self._raw_body = self.rfile.read(length) if length else b""
+        path, params = self._query()
+        route = routes.get(path)
+        if route is None:
+            self._send(404, {"error": f"no route {self.command} {path}"})
+            return
+        start = time.perf_counter()
+        try:
+            self._send(200, route(daemon, params, self))
+            API_SECONDS.labels(path).observe(time.perf_counter() - start)
+        except (KeyError, ValueError, TypeError) as e:
+            self._send(400, {"error": str(e)})
+        except Exception as e:
+            print(f"Error handling {self.command} {path}: {e}")
+            self._send(500, {"error": str(e)})
+
+    def do_GET(self):
+        self._dispatch(GET_ROUTES)
+
+    def do_POST(self):
+        self._dispatch(POST_ROUTES)
+
+
+def _float(params, key):
+    return float(params[key]) if params.get(key) not in (None, "") else None
+
+
+def _int(params, key, default=None):
+    return int(params[key]) if params.get(key) not in (None, "") else default
+
+
+def _start_device(daemon, body):
+    started = daemon.start_device(body["port"], int(body["baud"]), body.get("lease"))
+    return {"started": started, "live_id": daemon.live_id(body["port"])}
+
+
+def _stop_device(daemon, body):
+    return {"stopped": daemon.stop_device(body.get("port"), body.get("lease"))}
+
+
+GET_ROUTES = {
+    "/status": lambda d, p, h: d.status(),
+    "/events": lambda d, p, h: d.events(_int(p, "since", 0), _int(p, "limit", MAX_EVENT_ROWS)),
+    "/records": lambda d, p, h: d.records(p.get("kind"), _int(p, "limit")),
+    "/stats": lambda d, p, h: d.stats(),
+    "/chart": lambda d, p, h: d.chart(_float(p, "start"), _float(p, "end"), _int(p, "points", 800),
+                                      p.get("method", "minmax"), _float(p, "last")),
+    "/history": lambda d, p, h: d.history_query(p.get("kind"), p.get("device"), _float(p, "start"), _float(p, "end")),
+    "/ports": lambda d, p, h: d.ports(bool(_int(p, "refresh", 0))),
+    "/metrics": lambda d, p, h: metrics.snapshot() if p.get("format") == "json" else metrics.render(),
+}
+
+POST_ROUTES = {
+    "/probe": lambda d, p, h: d.probe(float(h._body().get("timeout", 15.0))),
+    "/devices": lambda d, p, h: _start_device(d, h._body()),
+    "/devices/stop": lambda d, p, h: _stop_device(d, h._body()),
+    "/clear": lambda d, p, h: d.clear() or {},
+    "/append": lambda d, p, h: d.append(h._body()["lines"]) or {},
+}
+
+
+class DaemonHTTPServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+
+class UnixDaemonServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+    def server_bind(self):
+        # A socket file left by a daemon that was killed would make bind fail; one that
+        # still accepts connections belongs to a running daemon and is left alone
+        if os.path.exists(self.server_address):
+            probe = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            try:
+                probe.connect(self.server_address)
+            except OSError:
+                os.unlink(self.server_address)
+            else:
+                raise OSError(errno.EADDRINUSE, "an ingest daemon is already running on this socket",
+                              self.server_address)
+            finally:
+                probe.close()
+        super().server_bind()
+
+
+def daemon_address(host=DEFAULT_HOST, port=DEFAULT_PORT, unix_path=None):
+    """What the daemon is known by: ``host:port``, or the absolute socket path"""
+    return os.path.abspath(unix_path) if unix_path else f"{host}:{port}"
+
+
+def make_server(daemon, host=DEFAULT_HOST, port=DEFAULT_PORT, unix_path=None):
+    """HTTP server for ``daemon`` on a localhost TCP port, or on a Unix socket when ``unix_path`` is set"""
+    if unix_path:
+        server = UnixDaemonServer(unix_path, DaemonRequestHandler)
+    else:
+        server = DaemonHTTPServer((host, port), DaemonRequestHandler)
+    server.ingest = daemon
+    return server
+
+
+def serve(daemon, server, ready=None):
+    """Serve until SIGINT/SIGTERM (or ``server.shutdown()``), then stop every device"""
+    try:
+        if ready is not None:
+            ready()
+        server.serve_forever(poll_interval=0.5)
+    finally:
+        server.server_close()
+        if isinstance(server, UnixDaemonServer) and os.path.exists(server.server_address):
+            os.unlink(server.server_address)
+        daemon.close()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Headless serial ingestion with a local query API")
+    parser.add_argument("--host", default=DEFAULT_HOST)
+    parser.add_argument("--http-port", type=int, default=DEFAULT_PORT)
+    parser.add_argument("--unix", help="serve on this Unix socket instead of TCP")
+    parser.add_argument("--db", default=DATA_FILE)
+    parser.add_argument("--archive", default=ARCHIVE_DIR)
+    parser.add_argument("--stats", default=STATS_FILE)
+    parser.add_argument("--live-state", help="name of the shared-memory live state block "
+                                             "(default: derived from the address served on)")
+    parser.add_argument("--port", action="append", default=[], help="serial port to read from the start (repeatable)")
+    parser.add_argument("--baud", type=int, default=115200)
+    parser.add_argument("--verbose", action="store_true", help="log every request")
+    args = parser.parse_args(argv)
+
+    start = time.perf_counter()
+    DaemonRequestHandler.verbose = args.verbose
+    # Bound first: a second instance must fail before it touches the live state block of the first
+    try:
+        server = make_server(None, args.host, args.http_port, args.unix)
+    except OSError as e:
+        print(f"Not starting: {e}", file=sys.stderr)
+        return 1
+    # Named after the bound port, so --http-port 0 gets a block of its own too
+    address = daemon_address(args.host, None if args.unix else server.server_address[1], args.unix)
+    try:
+        daemon = server.ingest = IngestDaemon(args.db, args.archive, args.stats, args.live_state or block_name(address))
+    except FileExistsError as e:
+        server.server_close()
+        print(f"Not starting: {e}", file=sys.stderr)
+        return 1
+    for port in args.port:
+        daemon.start_device(port, args.baud)
+
+    # SIGTERM from a service manager shuts down like Ctrl+C
+    signal.signal(signal.SIGTERM, lambda *_: threading.Thread(target=server.shutdown, daemon=True).start())
+    where = f"unix:{args.unix}" if args.unix else f"http://{args.host}:{server.server_address[1]}"
+    ready = lambda: print(f"Serving on {where} (ready in {(time.perf_counter() - start) * 1000:.0f} ms)", flush=True)
+    try:
+        serve(daemon, server, ready)
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,149 @@
+"""Bounded queue of received lines between a serial reader and its consumers.
+
+The reader puts each batch of ``(ts, line)`` pairs and never grows the queue
+past ``maxlen``. What happens to a batch that does not fit is the queue's
+overflow policy:
+
+* ``BLOCK``: the reader waits for room (up to ``put_timeout``, after which the
+  rest of the batch is dropped), so a slow consumer slows the reader and the
+  backlog stays in the serial driver
+* ``DROP_OLDEST``: the oldest queued lines make room, keeping the newest
+* ``DROP_NEWEST``: the lines that do not fit are dropped, keeping the oldest
+* ``COALESCE``: once the queue is half full, "Collecting samples..." and
+  "Analyzing data..." status lines are left out (they carry no data and come
+  back every window); if it still fills up, the oldest lines make room
+
+Every line is accounted for: ``enqueued == dequeued + len(queue) + dropped``,
+where ``dropped`` is split by reason (``dropped_oldest``, ``dropped_newest``,
+``coalesced``). ``high_water`` is the longest the queue has been.
+"""
+import threading
+import time
+from collections import deque
+from itertools import repeat
+
+from line_parser import KIND_STATUS, line_kind
+
+BLOCK = "block"
+DROP_OLDEST = "drop_oldest"
+DROP_NEWEST = "drop_newest"
+COALESCE = "coalesce"
+POLICIES = (BLOCK, DROP_OLDEST, DROP_NEWEST, COALESCE)
+
+
+class IngestQueue:
+    """Bounded FIFO of ``(ts, line)`` pairs with an overflow policy and drop counters"""
+
+    def __init__(self, maxlen=10000, policy=DROP_OLDEST, put_timeout=None):
+        if policy not in POLICIES:
+            raise ValueError(f"unknown overflow policy {policy!r}, expected one of {POLICIES}")
+        if maxlen < 1:
+            raise ValueError("maxlen must be at least 1")
+        self.maxlen = maxlen
+        self.policy = policy
+        self.put_timeout = put_timeout
+        # A full deque with maxlen drops from the left in O(1) as new items arrive
+        self._items = deque(maxlen=maxlen)
+        self._cond = threading.Condition()
+        self.closed = False
+
+        self.enqueued = 0
+        self.dequeued = 0
+        self.dropped_oldest = 0
+        self.dropped_newest = 0
+        self.coalesced = 0
+        self.high_water = 0
+        self.blocked_seconds = 0.0
+
+    def __len__(self):
+        return len(self._items)
+
+    @property
+    def dropped(self):
+        return self.dropped_oldest + self.dropped_newest + self.coalesced
+
+    def put(self, ts, lines):
+        """Queue ``lines`` received at ``ts``; returns how many were queued"""
+        if not lines:
+            return 0
+        with self._cond:
+            self.enqueued += len(lines)
+            if self.closed:
+                self.dropped_newest += len(lines)
+                return 0
+            if self.policy == BLOCK:
+                accepted = self._put_blocking(ts, lines)
+            else:
+                if self.policy == COALESCE and len(self._items) + len(lines) > self.maxlen // 2:
+                    kept = [line for line in lines if line_kind(line) != KIND_STATUS]
+                    self.coalesced += len(lines) - len(kept)
+                    lines = kept
+                if self.policy == DROP_NEWEST:
+                    room = self.maxlen - len(self._items)
+                    self.dropped_newest += max(0, len(lines) - room)
+                    lines = lines[:room]
+                else:
+                    self.dropped_oldest += max(0, len(self._items) + len(lines) - self.maxlen)
+                self._items.extend(zip(repeat(ts), lines))
+                accepted = len(lines)
+            self.high_water = max(self.high_water, len(self._items))
+            self._cond.notify_all()
+            return accepted
+
+    def _put_blocking(self, ts, lines):
+        deadline = None if self.put_timeout is None else time.monotonic() + self.put_timeout
+        accepted = 0
+        while accepted < len(lines):
+            room = self.maxlen - len(self._items)
+            if room <= 0:
+                if self.closed:
+                    break
+                start = time.monotonic()
+                remaining = None if deadline is None else deadline - start
+                if remaining is not None and remaining <= 0:
+                    break
+                self._cond.wait(remaining)
+                self.blocked_seconds += time.monotonic() - start
+                continue
+            chunk = lines[accepted:accepted + room]
+            self._items.extend(zip(repeat(ts), chunk))
+            accepted += len(chunk)
+            self._cond.notify_all()
+        self.dropped_newest += len(lines) - accepted
+        return accepted
+
+    def get(self, max_items=None, timeout=None):
+        """Take up to ``max_items`` queued pairs, oldest first, waiting up to ``timeout`` for some"""
+        with self._cond:
+            if not self._items and not self.closed:
+                self._cond.wait_for(lambda: self._items or self.closed, timeout)
+            n = len(self._items) if max_items is None else min(max_items, len(self._items))
+            popleft = self._items.popleft
+            items = [popleft() for _ in range(n)]
+            self.dequeued += n
+            if n:
+                # Wakes a reader blocked on a full queue
+                self._cond.notify_all()
+            return items
+
+    def close(self):
+        """Refuse new lines and wake everyone waiting; queued lines can still be taken"""
+        with self._cond:
+            self.closed = True
+            self._cond.notify_all()
+
+    def stats(self):
+        with self._cond:
+            return {
+                "policy": self.policy,
+                "maxlen": self.maxlen,
+                "queued": len(self._items),
+                "high_water": self.high_water,
+                "enqueued": self.enqueued,
+                "dequeued": self.dequeued,
+                "dropped": self.dropped,
+                "dropped_oldest": self.dropped_oldest,
+                "dropped_newest": self.dropped_newest,
+                "coalesced": self.coalesced,
+                "blocked_seconds": round(self.blocked_seconds, 3),
+            }
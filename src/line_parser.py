@@ -0,0 +1,191 @@
+"""Typed parsing of firmware output lines into compact event records.
+
+The firmware prints one of three verdict lines per analysis window (see
+``runDetection`` in ``main.cpp`` and ``detection.format_verdict``):
+
+    Tremor detected at %.1f Hz (mag: %.0f)
+    Dyskinesia detected at %.1f Hz (mag: %.0f)
+    No movement disorder detected (T: %.0f, D: %.0f)
+
+plus status lines ("Collecting samples...", "Analyzing data...") and the boot
+banner. ``parse_lines`` turns a batch of lines into an ``EVENT_DTYPE``
+structured array with the numbers kept as floats, so history, charts and
+statistics work on columns instead of re-reading strings. Fields a line does
+not carry are NaN. ``parse_line`` returns a single ``EventRecord``.
+
+Kind codes line up with the detection verdicts (``VERDICT_TREMOR`` = 1,
+``VERDICT_DYSKINESIA`` = 2) and are shared with ``live_state``.
+"""
+import re
+
+import numpy as np
+
+KIND_OTHER = 0
+KIND_TREMOR = 1
+KIND_DYSKINESIA = 2
+KIND_NORMAL = 3
+KIND_STATUS = 4
+KIND_NAMES = ("other", "tremor", "dyskinesia", "normal", "status")
+
+EVENT_DTYPE = np.dtype([
+    ("ts", np.float64),         # receive time (time.time())
+    ("kind", np.uint8),         # KIND_*
+    ("freq", np.float32),       # peak frequency of a tremor/dyskinesia verdict, Hz
+    ("tremor_mag", np.float32), # tremor band peak: "mag" of a tremor line, "T" of a normal line
+    ("dysk_mag", np.float32),   # dyskinesia band peak: "mag" of a dyskinesia line, "D" of a normal line
+])
+
+# printf("%.1f") / ("%.0f") output, including newlib's nan and inf
+_NUM = r"([-+]?(?:\d+(?:\.\d*)?|nan|inf))"
+
+# One precompiled pattern for every line kind; search() so prefixed lines (e.g. "TEST: ...") still parse
+_PATTERN = re.compile(
+    r"(Tremor|Dyskinesia) detected at " + _NUM + r" Hz \(mag: " + _NUM + r"\)"
+    r"|No movement disorder detected \(T: " + _NUM + r", D: " + _NUM + r"\)"
+    r"|(Collecting samples|Analyzing data)"
+)
+_match = _PATTERN.match
+_search = _PATTERN.search
+
+# Lines without numbers repeat verbatim (status lines, the banner), so their kind is remembered
+_CACHE_SIZE = 4096
+_kind_cache = {}
+
+
+class EventRecord:
+    """One parsed line"""
+
+    __slots__ = ("ts", "kind", "freq", "tremor_mag", "dysk_mag")
+
+    def __init__(self, ts, kind, freq=float("nan"), tremor_mag=float("nan"), dysk_mag=float("nan")):
+        self.ts = ts
+        self.kind = kind
+        self.freq = freq
+        self.tremor_mag = tremor_mag
+        self.dysk_mag = dysk_mag
+
+    @property
+    def kind_name(self):
+        return KIND_NAMES[self.kind]
+
+    @property
+    def mag(self):
+        """Magnitude of the reported peak (NaN for lines without a detection)"""
+        if self.kind == KIND_TREMOR:
+            return self.tremor_mag
+        if self.kind == KIND_DYSKINESIA:
+            return self.dysk_mag
+        return float("nan")
+
+    def __repr__(self):
+        return (f"EventRecord(ts={self.ts}, kind={self.kind_name}, freq={self.freq}, "
+                f"tremor_mag={self.tremor_mag}, dysk_mag={self.dysk_mag})")
+
+
+def _remember(line, kind):
+    if len(_kind_cache) >= _CACHE_SIZE:
+        _kind_cache.clear()
+    _kind_cache[line] = kind
+
+
+def line_kind(line):
+    """``KIND_*`` code of a single line"""
+    kind = _kind_cache.get(line)
+    if kind is not None:
+        return kind
+    m = _search(line)
+    if m is None:
+        _remember(line, KIND_OTHER)
+        return KIND_OTHER
+    detected, _, _, normal_t, _, _ = m.groups()
+    if detected is not None:
+        return KIND_TREMOR if detected == "Tremor" else KIND_DYSKINESIA
+    if normal_t is not None:
+        return KIND_NORMAL
+    _remember(line, KIND_STATUS)
+    return KIND_STATUS
+
+
+def parse_line(line, ts=0.0):
+    """Parse one line into an ``EventRecord``"""
+    m = _search(line)
+    if m is None:
+        return EventRecord(ts, KIND_OTHER)
+    detected, freq, mag, normal_t, normal_d, _ = m.groups()
+    if detected == "Tremor":
+        return EventRecord(ts, KIND_TREMOR, freq=float(freq), tremor_mag=float(mag))
+    if detected == "Dyskinesia":
+        return EventRecord(ts, KIND_DYSKINESIA, freq=float(freq), dysk_mag=float(mag))
+    if normal_t is not None:
+        return EventRecord(ts, KIND_NORMAL, tremor_mag=float(normal_t), dysk_mag=float(normal_d))
+    return EventRecord(ts, KIND_STATUS)
+
+
+def parse_lines(lines, ts=0.0):
+    """Parse a batch of lines into an ``EVENT_DTYPE`` array (``ts`` may be a scalar or one per line)
+
+    The loop only matches and collects the number strings; they are converted
+    to float32 in one numpy call per column afterwards. Lines without numbers
+    skip the regex after the first time they are seen.
+    """
+    n = len(lines)
+    out = np.empty(n, dtype=EVENT_DTYPE)
+    out["ts"] = ts
+    out["kind"] = KIND_OTHER
+    out["freq"] = np.nan
+    out["tremor_mag"] = np.nan
+    out["dysk_mag"] = np.nan
+
+    tremor_idx, tremor_freq, tremor_mag = [], [], []
+    dysk_idx, dysk_freq, dysk_mag = [], [], []
+    normal_idx, normal_t, normal_d = [], [], []
+    status_idx = []
+    cached = _kind_cache.get
+    for i, line in enumerate(lines):
+        kind = cached(line)
+        if kind is not None:
+            if kind == KIND_STATUS:
+                status_idx.append(i)
+            continue
+        # Firmware lines start with their text; only prefixed lines need the slower search
+        m = _match(line) or _search(line)
+        if m is None:
+            _remember(line, KIND_OTHER)
+            continue
+        detected, freq, mag, t, d, _ = m.groups()
+        if detected == "Tremor":
+            tremor_idx.append(i)
+            tremor_freq.append(freq)
+            tremor_mag.append(mag)
+        elif detected == "Dyskinesia":
+            dysk_idx.append(i)
+            dysk_freq.append(freq)
+            dysk_mag.append(mag)
+        elif t is not None:
+            normal_idx.append(i)
+            normal_t.append(t)
+            normal_d.append(d)
+        else:
+            _remember(line, KIND_STATUS)
+            status_idx.append(i)
+
+    if tremor_idx:
+        out["kind"][tremor_idx] = KIND_TREMOR
+        out["freq"][tremor_idx] = np.array(tremor_freq, dtype=np.float32)
+        out["tremor_mag"][tremor_idx] = np.array(tremor_mag, dtype=np.float32)
+    if dysk_idx:
+        out["kind"][dysk_idx] = KIND_DYSKINESIA
+        out["freq"][dysk_idx] = np.array(dysk_freq, dtype=np.float32)
+        out["dysk_mag"][dysk_idx] = np.array(dysk_mag, dtype=np.float32)
+    if normal_idx:
+        out["kind"][normal_idx] = KIND_NORMAL
+        out["tremor_mag"][normal_idx] = np.array(normal_t, dtype=np.float32)
+        out["dysk_mag"][normal_idx] = np.array(normal_d, dtype=np.float32)
+    if status_idx:
+        out["kind"][status_idx] = KIND_STATUS
+    return out
+
+
+def kind_counts(records):
+    """Number of records per ``KIND_*`` code, indexed by code"""
+    return np.bincount(records["kind"], minlength=len(KIND_NAMES))
@@ -0,0 +1,364 @@
+"""Shared-memory live state between the ingest daemon and dashboard reruns.
+
+One writer (``ingest_daemon.py``) owns a ``multiprocessing``
+shared-memory block holding a header and a fixed-size ring of recent lines.
+Any number of readers map the same block read-only and copy out what they
+need, so a rerun never touches the disk and never takes a lock.
+
+Consistency comes from a sequence lock: the writer makes ``seq`` odd, updates
+the ring, counters and status, then makes ``seq`` even again. A reader copies
+what it needs and retries if ``seq`` was odd or changed while it was copying.
+
+    python live_state.py --fake-writer   # publish synthetic firmware output
+"""
+import argparse
+import hashlib
+import mmap
+import os
+import time
+from multiprocessing import shared_memory
+
+import numpy as np
+
+from line_parser import KIND_DYSKINESIA, KIND_NAMES, KIND_NORMAL, KIND_STATUS, KIND_TREMOR
+
+DEFAULT_NAME = "stm32_live_state"
+MAGIC = 0x53544D4C  # "STML"
+VERSION = 3
+
+# Kind codes come from the line parser; KIND_CODES maps the event store's kind names to them
+KIND_CODES = {name: code for code, name in enumerate(KIND_NAMES)}
+
+ERROR_SIZE = 256
+
+HEADER_DTYPE = np.dtype([
+    ("magic", np.uint32),
+    ("version", np.uint32),
+    ("seq", np.uint64),
+    ("head", np.uint64),        # number of lines ever published
+    ("start", np.uint64),       # lines before this one were cleared
+    ("capacity", np.uint32),
+    ("line_size", np.uint32),
+    ("counts", np.uint64, len(KIND_NAMES)),  # indexed by KIND_*
+    ("connected", np.uint8),
+    ("dropped", np.uint64),     # lines the writer could not keep up with
+    ("writer_pid", np.uint32),
+    ("updated", np.float64),
+    ("error", f"S{ERROR_SIZE}"),
+], align=True)
+
+
+def record_dtype(line_size):
+    return np.dtype([
+        ("ts", np.float64),
+        ("kind", np.uint8),
+        ("device", np.uint16),      # the writer's id of the port a line came from, 0 for none
+        ("line", f"S{line_size}"),
+    ], align=True)
+
+
+def _layout(buf, capacity=None, line_size=None):
+    header = np.ndarray((1,), dtype=HEADER_DTYPE, buffer=buf)
+    if capacity is None:
+        capacity = int(header["capacity"][0])
+        line_size = int(header["line_size"][0])
+    ring = np.ndarray((capacity,), dtype=record_dtype(line_size), buffer=buf,
+                      offset=HEADER_DTYPE.itemsize)
+    return header, ring
+
+
+def block_name(address):
+    """Default block name of a daemon serving on ``address`` (``host:port`` or a socket path)
+
+    One block per address, so daemons on different ports or sockets never share one.
+    """
+    return f"{DEFAULT_NAME}_{hashlib.sha1(address.encode()).hexdigest()[:12]}"
+
+
+def pid_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+def _block_writer(name):
+    """Pid of the writer recorded in an existing block, 0 if it is not a live state block
+
+    Read through a read-only mapping: attaching a ``SharedMemory`` registers the
+    block with this process's resource tracker, which would unlink it at exit.
+    """
+    handle, buf = _map_readonly(name)
+    try:
+        if len(buf) < HEADER_DTYPE.itemsize:
+            return 0
+        header = np.ndarray((1,), dtype=HEADER_DTYPE, buffer=buf)
+        pid = int(header["writer_pid"][0]) if int(header["magic"][0]) == MAGIC else 0
+        del header
+        return pid
+    finally:
+        handle.close()
+
+
+class LiveStateWriter:
+    """The single writer side of the channel; creates the block, or replaces one whose writer has exited
+
+    Raises ``FileExistsError`` if the block belongs to a process that is still running.
+    """
+
+    def __init__(self, name=DEFAULT_NAME, capacity=1024, line_size=160):
+        size = HEADER_DTYPE.itemsize + capacity * record_dtype(line_size).itemsize
+        try:
+            pid = _block_writer(name)
+        except FileNotFoundError:
+            pass
+        else:
+            if pid and pid != os.getpid() and pid_alive(pid):
+                raise FileExistsError(f"live state block {name} is in use by process {pid}")
+            stale = shared_memory.SharedMemory(name=name)
+            stale.close()
+            stale.unlink()
+        self.shm = shared_memory.SharedMemory(name=name, create=True, size=size)
+        self.name = name
+        # A fresh block is zero-filled; magic goes in last so readers never see a half-built header
+        self.header, self.ring = _layout(self.shm.buf, capacity, line_size)
+        self.header["capacity"] = capacity
+        self.header["line_size"] = line_size
+        self.header["writer_pid"] = os.getpid()
+        self.header["updated"] = time.time()
+        self.header["version"] = VERSION
+        self.header["magic"] = MAGIC
+        self.capacity = capacity
+        self.line_size = line_size
+
+    @property
+    def head(self):
+        """Number of lines published so far"""
+        return int(self.header["head"][0])
+
+    def _begin(self):
+        self.header["seq"] += 1
+
+    def _end(self):
+        self.header["updated"] = time.time()
+        self.header["seq"] += 1
+
+    def publish(self, ts, lines, kinds, device=0):
+        """Append a batch of lines with their ``KIND_*`` codes, from ``device``, and bump the counters"""
+        n = len(lines)
+        if n == 0:
+            return
+        kinds = np.asarray(kinds, dtype=np.uint8)
+        # Counted before a batch longer than the ring is cut to its newest lines
+        added = np.bincount(kinds, minlength=len(KIND_NAMES))[:len(KIND_NAMES)].astype(np.uint64)
+        if n > self.capacity:
+            lines, kinds = lines[-self.capacity:], kinds[-self.capacity:]
+            skipped = n - self.capacity
+        else:
+            skipped = 0
+        head = int(self.header["head"][0])
+        encoded = [line.encode("utf-8")[:self.line_size] for line in lines]
+        idx = (head + skipped + np.arange(len(encoded))) % self.capacity
+
+        self._begin()
+        try:
+            self.ring["ts"][idx] = ts
+            self.ring["kind"][idx] = kinds
+            self.ring["device"][idx] = device
+            self.ring["line"][idx] = encoded
+            self.header["counts"][0] += added
+            self.header["head"] = head + n
+        finally:
+            self._end()
+
+    def set_status(self, connected=None, error=False, dropped=None):
+        """Update the connection flag, error text (``None`` clears it) and/or dropped line count"""
+        self._begin()
+        try:
+            if connected is not None:
+                self.header["connected"] = 1 if connected else 0
+            if error is not False:
+                self.header["error"] = (error or "").encode("utf-8")[:ERROR_SIZE]
+            if dropped is not None:
+                self.header["dropped"] = dropped
+        finally:
+            self._end()
+
+    def set_counts(self, counts):
+        """Overwrite counters from a ``{KIND_*: n}`` mapping, e.g. totals loaded from disk"""
+        self._begin()
+        try:
+            for kind, n in counts.items():
+                self.header["counts"][0, kind] = n
+        finally:
+            self._end()
+
+    def clear(self):
+        """Reset the counters and hide every line published so far"""
+        self._begin()
+        try:
+            self.header["counts"] = 0
+            self.header["start"] = self.header["head"]
+        finally:
+            self._end()
+
+    def close(self, unlink=True):
+        self.header = self.ring = None
+        self.shm.close()
+        if unlink:
+            try:
+                self.shm.unlink()
+            except FileNotFoundError:
+                pass
+
+
+class LiveSnapshot:
+    """A consistent copy of the live state"""
+
+    __slots__ = ("seq", "head", "start", "counts", "connected", "dropped", "error", "updated",
+                 "writer_pid", "records", "missed")
+
+    def lines(self, device=None):
+        """The copied lines, or only those of one ``device`` id"""
+        records = self.records if device is None else self.records[self.records["device"] == device]
+        if not len(records):
+            return []
+        # Lines never hold a newline: one decode of the joined batch beats one per line
+        return b"\n".join(records["line"].tolist()).decode("utf-8", "ignore").split("\n")
+
+    @property
+    def tremor_count(self):
+        return int(self.counts[KIND_TREMOR])
+
+    @property
+    def dyskinesia_count(self):
+        return int(self.counts[KIND_DYSKINESIA])
+
+    @property
+    def normal_count(self):
+        return int(self.counts[KIND_NORMAL])
+
+
+def _map_readonly(name):
+    """Map an existing block read-only, falling back to a normal attach where POSIX shm is missing"""
+    try:
+        import _posixshmem
+    except ImportError:
+        shm = shared_memory.SharedMemory(name=name)
+        return shm, shm.buf
+    fd = _posixshmem.shm_open("/" + name, os.O_RDONLY, mode=0o600)
+    try:
+        mm = mmap.mmap(fd, 0, access=mmap.ACCESS_READ)
+    finally:
+        os.close(fd)
+    return mm, mm
+
+
+class LiveStateReader:
+    """Read-only view of a writer's block; raises FileNotFoundError if no writer exists"""
+
+    def __init__(self, name=DEFAULT_NAME):
+        self.name = name
+        self._handle, buf = _map_readonly(name)
+        self.header, self.ring = _layout(buf)
+        if int(self.header["magic"][0]) != MAGIC or int(self.header["version"][0]) != VERSION:
+            self.close()
+            raise FileNotFoundError(f"{name} is not a version {VERSION} live state block")
+
+    def seq(self):
+        return int(self.header["seq"][0])
+
+    def writer_alive(self):
+        """False if the writing process has died without removing its block"""
+        return pid_alive(int(self.header["writer_pid"][0]))
+
+    def snapshot(self, since=None, limit=None, retries=100):
+        """Copy header fields and the lines published after ``since`` (all buffered lines by default)"""
+        capacity = len(self.ring)
+        for _ in range(retries):
+            seq = int(self.header["seq"][0])
+            if seq & 1:
+                time.sleep(0)
+                continue
+            # item() turns the header into Python values in one call, except the counts,
+            # which stay a view of the block until copied
+            h = dict(zip(HEADER_DTYPE.names, self.header[0].item()))
+            h["counts"] = h["counts"].copy()
+            head = h["head"]
+            if since is not None and since > head:
+                since = 0  # the writer restarted
+            first = max(head - capacity, h["start"], 0 if since is None else since)
+            if limit is not None:
+                first = max(first, head - limit)
+            idx = np.arange(first, head) % capacity
+            records = self.ring[idx]  # fancy indexing copies
+            if int(self.header["seq"][0]) != seq:
+                continue
+            snap = LiveSnapshot()
+            snap.seq = seq
+            snap.head = head
+            snap.start = h["start"]
+            snap.counts = h["counts"]
+            snap.connected = bool(h["connected"])
+            snap.dropped = h["dropped"]
+            snap.error = h["error"].decode("utf-8", "ignore") or None
+            snap.updated = h["updated"]
+            snap.writer_pid = h["writer_pid"]
+            snap.records = records
+            snap.missed = 0 if since is None else max(0, head - capacity - since)
+            return snap
+        raise TimeoutError("live state kept changing while reading")
+
+    def close(self):
+        self.header = self.ring = None
+        self._handle.close()
+
+
+def run_fake_writer(name=DEFAULT_NAME, rate=10.0, duration=None):
+    """Publish synthetic firmware output until interrupted (for testing the dashboards)"""
+    rng = np.random.default_rng()
+    writer = LiveStateWriter(name)
+    writer.set_status(connected=True, error=None)
+    end = None if duration is None else time.time() + duration
+    try:
+        while end is None or time.time() < end:
+            roll = rng.random()
+            if roll < 0.2:
+                line, kind = f"Tremor detected at {rng.uniform(4.5, 5.0):.1f} Hz (mag: {rng.integers(1000, 9000)})", KIND_TREMOR
+            elif roll < 0.3:
+                line, kind = f"Dyskinesia detected at {rng.uniform(5.0, 7.0):.1f} Hz (mag: {rng.integers(1000, 9000)})", KIND_DYSKINESIA
+            else:
+                line, kind = f"No movement disorder detected (T: {rng.integers(0, 5000)}, D: {rng.integers(0, 5000)})", KIND_NORMAL
+            writer.publish(time.time(), ["Collecting samples...", "Analyzing data...", line],
+                           [KIND_STATUS, KIND_STATUS, kind])
+            time.sleep(1.0 / rate)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        writer.set_status(connected=False)
+        writer.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Live state channel tools")
+    parser.add_argument("--fake-writer", action="store_true", help="publish synthetic firmware output")
+    parser.add_argument("--name", default=DEFAULT_NAME)
+    parser.add_argument("--rate", type=float, default=10.0, help="verdicts per second")
+    args = parser.parse_args()
+    if args.fake_writer:
+        print(f"Publishing fake firmware output to shared memory '{args.name}' (Ctrl+C to stop)")
+        run_fake_writer(args.name, args.rate)
+    else:
+        reader = LiveStateReader(args.name)
+        snap = reader.snapshot(limit=20)
+        print(f"seq {snap.seq}, {snap.head} lines, connected={snap.connected}, counts={snap.counts.tolist()}")
+        for line in snap.lines():
+            print(line)
+        reader.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -63,6 +63,46 @@ float32_t fftOut[FFT_SIZE];
 float32_t magOut[FFT_SIZE/2];
 arm_rfft_fast_instance_f32 fftInst;
 
+// ———————————— Raw sample streaming ————————————
+// Build with -DRAW_STREAM=1 to also send every sample window as a binary frame
+// (decoded on the host by frame_protocol.py):
+//   sync 0xA5 0x5A | seq u16 | count u16 | count x int16 | CRC-16/CCITT-FALSE u16
+// All fields are little-endian; the CRC covers seq, count and samples.
+#ifndef RAW_STREAM
+#define RAW_STREAM 0
+#endif
+
+int16_t rawBuf[FFT_SIZE];
+uint16_t frameSeq = 0;
+
+uint16_t crc16_ccitt(const uint8_t *data, size_t len, uint16_t crc) {
+    for (size_t i = 0; i < len; i++) {
+        crc ^= (uint16_t)data[i] << 8;
+        for (int b = 0; b < 8; b++) {
+            crc = (crc & 0x8000) ? (uint16_t)((crc << 1) ^ 0x1021) : (uint16_t)(crc << 1);
+        }
+    }
+    return crc;
+}
+
+void sendRawFrame(const int16_t *samples, uint16_t count) {
+    uint8_t header[6] = {
+        0xA5, 0x5A,
+        (uint8_t)(frameSeq & 0xFF), (uint8_t)(frameSeq >> 8),
+        (uint8_t)(count & 0xFF), (uint8_t)(count >> 8)
+    };
+    // Cortex-M4 is little-endian, so the sample buffer is already in wire order
+    uint16_t crc = crc16_ccitt(header + 2, 4, 0xFFFF);
+    crc = crc16_ccitt((const uint8_t *)samples, count * sizeof(int16_t), crc);
+    uint8_t trailer[2] = { (uint8_t)(crc & 0xFF), (uint8_t)(crc >> 8) };
+
+    fflush(stdout); // Don't split a pending text line with the frame
+    serial_port.write(header, sizeof(header));
+    serial_port.write(samples, count * sizeof(int16_t));
+    serial_port.write(trailer, sizeof(trailer));
+    frameSeq++;
+}
+
 // Sampling control variables
 Ticker sampler;
 volatile uint32_t idx = 0;
@@ -203,6 +243,7 @@ int main() {
                 sampleNow = false;
 
                 int16_t raw = read_16bit(OUTX_L_XL, OUTX_H_XL);
+                rawBuf[idx] = raw;
                 inputBuf[idx++] = float32_t(raw);
             }
             ThisThread::sleep_for(1ms); // Reduce CPU usage
@@ -210,6 +251,10 @@ int main() {
 
         sampler.detach();
 
+#if RAW_STREAM
+        sendRawFrame(rawBuf, FFT_SIZE);
+#endif
+
         
         // Run detection algorithm
         printf("Analyzing data...\r\n");
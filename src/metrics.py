@@ -0,0 +1,272 @@
+"""Counters, gauges and latency histograms for the ingestion pipeline.
+
+Cheap enough to leave on: a counter increment is one locked integer add
+and a histogram observation adds a ``bisect`` over fixed buckets. Labelled
+series are looked up once and kept by the caller (``family.labels(...)``), so
+the hot path does no dictionary work. Counters and gauges can also be backed
+by a function read only at scrape time (a reader's own byte count, a queue
+depth), so they cost nothing in between.
+
+``metrics`` is the process-wide registry. ``render()`` produces the
+Prometheus text exposition format (``/metrics`` of ``ingest_daemon.py``);
+``snapshot()`` gives the same values as a dict with p50/p99 estimates for
+the dashboard's metrics panel.
+"""
+import bisect
+import math
+import threading
+import time
+
+# Seconds, 10 us to 10 s: serial decode and parsing sit at the low end, SQLite commits in the middle
+LATENCY_BUCKETS = (1e-5, 2.5e-5, 5e-5, 1e-4, 2.5e-4, 5e-4, 1e-3, 2.5e-3, 5e-3, 0.01, 0.025, 0.05,
+                   0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _label_text(names, values):
+    if not names:
+        return ""
+    return "{" + ",".join(f'{n}="{_escape(v)}"' for n, v in zip(names, values)) + "}"
+
+
+def _number(value):
+    if value != value:
+        return "NaN"
+    if value == math.inf:
+        return "+Inf"
+    if isinstance(value, float) and value.is_integer() and abs(value) < 1e15:
+        return str(int(value))
+    return repr(value)
+
+
+class Counter:
+    """Monotonic count, plus the running total of a function read at scrape time"""
+
+    def __init__(self):
+        self.value = 0
+        self.function = None
+        self._lock = threading.Lock()
+
+    def inc(self, n=1):
+        with self._lock:
+            self.value += n
+
+    def set_function(self, function):
+        """Count whatever ``function()`` returns on top of ``value``; ``None`` folds the last reading in"""
+        with self._lock:
+            if self.function is not None:
+                self.value += self.function()
+            self.function = function
+
+    def clear_function(self, function):
+        """Fold in and drop ``function`` only if it is still the one counted"""
+        with self._lock:
+            if self.function is function:
+                self.value += function()
+                self.function = None
+
+    def get(self):
+        with self._lock:
+            return self.value + (self.function() if self.function is not None else 0)
+
+
+class Gauge:
+    """Value that goes up and down, or a function read at scrape time"""
+
+    def __init__(self):
+        self.value = 0
+        self.function = None
+
+    def set(self, value):
+        self.value = value
+
+    def set_function(self, function):
+        self.function = function
+
+    def get(self):
+        if self.function is not None:
+            try:
+                return self.function()
+            except Exception:
+                return math.nan
+        return self.value
+
+
+class Histogram:
+    """Counts of observations per bucket (upper bounds), plus their sum"""
+
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.bounds = tuple(buckets)
+        self.counts = [0] * (len(self.bounds) + 1)
+        self.sum = 0.0
+        self.count = 0
+        self._lock = threading.Lock()
+
+    def observe(self, value):
+        i = bisect.bisect_left(self.bounds, value)
+        with self._lock:
+            self.counts[i] += 1
+            self.sum += value
+            self.count += 1
+
+    def time(self):
+        return _Timer(self)
+
+    def quantile(self, q):
+        """Estimate of quantile ``q`` by linear interpolation inside its bucket"""
+        with self._lock:
+            counts = list(self.counts)
+            total = self.count
+        if not total:
+            return None
+        rank = q * total
+        seen = 0
+        for i, n in enumerate(counts):
+            if n and seen + n >= rank:
+                lo = self.bounds[i - 1] if i else 0.0
+                hi = self.bounds[i] if i < len(self.bounds) else self.bounds[-1]
+                return lo + (hi - lo) * max(0.0, rank - seen) / n
+            seen += n
+        return self.bounds[-1]
+
+
+class _Timer:
+    def __init__(self, histogram):
+        self.histogram = histogram
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.histogram.observe(time.perf_counter() - self.start)
+
+
+class Family:
+    """All series of one metric name, one per combination of label values"""
+
+    def __init__(self, kind, name, help, labelnames, make):
+        self.kind = kind
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._make = make
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def labels(self, *values, **by_name):
+        """The series for these label values, created on first use; keep it for the hot path"""
+        if by_name:
+            values = tuple(by_name[n] for n in self.labelnames)
+        key = tuple(str(v) for v in values)
+        if len(key) != len(self.labelnames):
+            raise ValueError(f"{self.name} takes labels {self.labelnames}, got {key}")
+        series = self._series.get(key)
+        if series is None:
+            with self._lock:
+                series = self._series.setdefault(key, self._make())
+        return series
+
+    def remove(self, *values):
+        with self._lock:
+            self._series.pop(tuple(str(v) for v in values), None)
+
+    def series(self):
+        with self._lock:
+            return list(self._series.items())
+
+    # Unlabelled families act as their single series
+    def inc(self, n=1):
+        self.labels().inc(n)
+
+    def set(self, value):
+        self.labels().set(value)
+
+    def set_function(self, function):
+        self.labels().set_function(function)
+
+    def observe(self, value):
+        self.labels().observe(value)
+
+    def time(self):
+        return self.labels().time()
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self._families = {}
+        self._lock = threading.Lock()
+        self.created = time.time()
+
+    def _family(self, kind, name, help, labelnames, make):
+        with self._lock:
+            family = self._families.get(name)
+            if family is None:
+                family = self._families[name] = Family(kind, name, help, labelnames, make)
+            elif family.kind != kind or family.labelnames != tuple(labelnames):
+                raise ValueError(f"metric {name} already registered as a {family.kind} {family.labelnames}")
+            return family
+
+    def counter(self, name, help="", labelnames=()):
+        return self._family("counter", name, help, labelnames, Counter)
+
+    def gauge(self, name, help="", labelnames=()):
+        return self._family("gauge", name, help, labelnames, Gauge)
+
+    def histogram(self, name, help="", labelnames=(), buckets=LATENCY_BUCKETS):
+        return self._family("histogram", name, help, labelnames, lambda: Histogram(buckets))
+
+    def families(self):
+        with self._lock:
+            return list(self._families.values())
+
+    def render(self):
+        """Prometheus text exposition format, version 0.0.4"""
+        out = []
+        for family in self.families():
+            out.append(f"# HELP {family.name} {family.help}")
+            out.append(f"# TYPE {family.name} {family.kind}")
+            for values, series in family.series():
+                labels = _label_text(family.labelnames, values)
+                if family.kind in ("counter", "gauge"):
+                    out.append(f"{family.name}{labels} {_number(series.get())}")
+                else:
+                    with series._lock:
+                        counts, total, count = list(series.counts), series.sum, series.count
+                    cumulative = 0
+                    for bound, n in zip(series.bounds + (math.inf,), counts):
+                        cumulative += n
+                        le = _label_text(family.labelnames + ("le",), values + (_number(float(bound)),))
+                        out.append(f"{family.name}_bucket{le} {cumulative}")
+                    out.append(f"{family.name}_sum{labels} {_number(total)}")
+                    out.append(f"{family.name}_count{labels} {count}")
+        return "\n".join(out) + "\n"
+
+    def snapshot(self):
+        """``{name: [{"labels": {...}, ...values}]}``; histograms carry count, sum, mean, p50 and p99"""
+        result = {}
+        for family in self.families():
+            rows = []
+            for values, series in family.series():
+                row = {"labels": dict(zip(family.labelnames, values))}
+                if family.kind in ("counter", "gauge"):
+                    row["value"] = series.get()
+                else:
+                    row["count"] = series.count
+                    row["sum"] = series.sum
+                    row["mean"] = series.sum / series.count if series.count else None
+                    row["p50"] = series.quantile(0.5)
+                    row["p99"] = series.quantile(0.99)
+                rows.append(row)
+            result[family.name] = rows
+        return result
+
+
+metrics = MetricsRegistry()
+
+# Every writer of persistent state outside the event store (archive segments, session
+# statistics) times its writes here, labelled by target
+STATE_WRITE = metrics.histogram("state_write_seconds", "Writing persistent state outside the event store", ("target",))
@@ -0,0 +1,351 @@
+"""Offline sweep of the detection parameters over labelled raw recordings.
+
+The firmware hard-codes its detection: 256-point windows, the DC bin scaled by
+0.1, a threshold of 10x the mean of bins 1-10 and band edges at 3, 5 and
+7 Hz. This scores a grid of those parameters against recordings whose motion
+is known and reports accuracy and a confusion matrix per configuration.
+
+A corpus is a CSV of labelled segments of ``raw_archive.py`` recordings::
+
+    recording,start,end,label
+    patient1.raw,0,95.5,none
+    patient1.raw,95.5,240,tremor
+
+``start`` and ``end`` are seconds from the recording's first sample (an
+empty ``end`` runs to its end), the label is ``none``, ``tremor`` or
+``dyskinesia`` and paths are relative to the CSV. Only windows lying
+entirely inside one segment are scored. Other columns are ignored, so the
+corpus ``synth`` writes with ``synthetic_motion.write_corpus`` (which adds a
+``condition`` column) loads as is.
+
+The FFT is the expensive part and depends only on the recording, the window
+size and the hop. Magnitudes are computed once per (recording, window, hop),
+saved as ``.npy`` in the cache directory and memory-mapped by every worker,
+so thresholds, DC scales, baselines and band edges are all scored on the same
+spectra, and a later sweep of the same corpus does no FFTs at all. Spectra
+(one per task) and configurations (in chunks) are spread over a process
+pool, so a sweep scales with the number of cores.
+
+The DC bin only changes a decision when the baseline starts at bin 0.
+Baseline bins are given for a 256-point window and scaled with the window
+size, so they cover the same frequencies. ``--hop 360`` matches the
+firmware's duty cycle (256 samples, then a 1 s sleep); the default hop is
+one window.
+
+    python param_sweep.py synth corpus --recordings 4 --minutes 30
+    python param_sweep.py run corpus/labels.csv --window 128 256 512 --threshold 4 6 8 10 \\
+        --baseline 1,11 2,6 --bands 3,5,7 3.5,5,7 --out sweep.json
+"""
+import argparse
+import csv
+import hashlib
+import itertools
+import json
+import math
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+import detection
+import synthetic_motion
+from detection import FFT_SIZE, SAMPLE_RATE_HZ, VERDICT_DYSKINESIA, VERDICT_NONE, VERDICT_TREMOR
+from raw_archive import RawArchive
+
+LABELS = {"none": VERDICT_NONE, "rest": VERDICT_NONE, "normal": VERDICT_NONE,
+          "tremor": VERDICT_TREMOR, "dyskinesia": VERDICT_DYSKINESIA}
+CLASSES = ("none", "tremor", "dyskinesia")
+# Spectra are cached up to this frequency; band and baseline edges must lie below it
+MAX_FREQ_HZ = 20.0
+# Windows per FFT batch while computing spectra
+CHUNK_WINDOWS = 4096
+
+# runDetection() as flashed
+FIRMWARE = {
+    "window": FFT_SIZE,
+    "hop": FFT_SIZE,
+    "threshold": detection.THRESHOLD_FACTOR,
+    "dc_scale": detection.DC_SCALE,
+    "baseline": detection.BASELINE_BINS,
+    "bands": (3.0, 5.0, 7.0),
+}
+
+def load_corpus(path):
+    """``{recording path: [(start_s, end_s, verdict), ...]}`` from a labels CSV"""
+    base = os.path.dirname(os.path.abspath(path))
+    corpus = {}
+    with open(path, newline="") as f:
+        for line, row in enumerate(csv.DictReader(f), start=2):
+            label = row["label"].strip().lower()
+            if label not in LABELS:
+                raise ValueError(f"{path}:{line}: unknown label {row['label']!r}")
+            end = (row["end"] or "").strip()
+            recording = os.path.join(base, row["recording"].strip())
+            corpus.setdefault(recording, []).append((float(row["start"]), float(end) if end else math.inf,
+                                                     LABELS[label]))
+    return corpus
+
+
+def window_labels(segments, n_windows, size, hop, rate):
+    """Verdict each window should get, or -1 where it is not inside a single labelled segment"""
+    starts = np.arange(n_windows) * hop / rate
+    ends = starts + size / rate
+    labels = np.full(n_windows, -1, dtype=np.int8)
+    for start, end, verdict in segments:
+        labels[(starts >= start) & (ends <= end)] = verdict
+    return labels
+
+
+def n_windows(committed, size, hop):
+    return (committed - size) // hop + 1 if committed >= size else 0
+
+
+# --- Spectra ---
+
+def spectra_bins(size, fs=SAMPLE_RATE_HZ):
+    return min(size // 2, int(MAX_FREQ_HZ * size / fs) + 1)
+
+
+def spectra_path(cache_dir, recording, size, hop):
+    """Cache file of a recording's magnitudes; a recording that grew or was replaced gets a new one"""
+    st = os.stat(recording)
+    digest = hashlib.sha1(f"{os.path.abspath(recording)}|{st.st_size}|{st.st_mtime_ns}".encode()).hexdigest()[:12]
+    name = os.path.splitext(os.path.basename(recording))[0]
+    return os.path.join(cache_dir, f"{name}-{digest}-w{size}-h{hop}.npy")
+
+
+def compute_spectra(recording, size, hop, path):
+    """Write the windowed magnitudes of a recording to ``path``, bin 0 unscaled; returns the window count"""
+    archive = RawArchive(recording)
+    windows = archive.windows(hop=hop, size=size)
+    window = detection.hann_window(size)
+    n_bins = spectra_bins(size)
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    out = np.lib.format.open_memmap(path + ".tmp", mode="w+", dtype=np.float32, shape=(len(windows), n_bins))
+    for start in range(0, len(windows), CHUNK_WINDOWS):
+        stop = start + CHUNK_WINDOWS
+        out[start:stop] = detection.magnitudes(windows[start:stop], window, dc_scale=1.0)[:, :n_bins]
+    out.flush()
+    del out
+    archive.close()
+    os.replace(path + ".tmp", path)
+    return len(windows)
+
+
+def _spectra_task(job):
+    return compute_spectra(*job)
+
+
+# --- Scoring ---
+
+def config_bins(config, fs=SAMPLE_RATE_HZ):
+    """Tremor, dyskinesia and baseline bin ranges of a configuration at its window size"""
+    size = config["window"]
+    lo, mid, hi = config["bands"]
+    b0, b1 = config["baseline"]
+    return (detection.band_bins(lo, mid, size, fs), detection.band_bins(mid, hi, size, fs),
+            (b0 * size // FFT_SIZE, b1 * size // FFT_SIZE))
+
+
+def classify(mags, config):
+    """Verdicts of ``config`` for cached magnitudes (bin 0 unscaled)"""
+    tremor_bins, dysk_bins, baseline_bins = config_bins(config)
+    used = max(tremor_bins[1], dysk_bins[1], baseline_bins[1] - 1) + 1
+    view = mags[:, :used]
+    if min(tremor_bins[0], dysk_bins[0], baseline_bins[0]) == 0:
+        view = view.copy()
+        view[:, 0] *= np.float32(config["dc_scale"])
+    return detection.classify(view, n_fft=config["window"], tremor_bins=tremor_bins, dysk_bins=dysk_bins,
+                              threshold_factor=config["threshold"], baseline_bins=baseline_bins)["verdict"]
+
+
+def evaluate(files, labels, configs):
+    """Confusion matrices (true x detected verdict) of configurations sharing a window size and hop"""
+    mags = np.concatenate([np.load(path, mmap_mode="r")[truth >= 0] for path, truth in zip(files, labels)])
+    truth = np.concatenate([truth[truth >= 0] for truth in labels]).astype(np.intp)
+    confusions = []
+    for config in configs:
+        verdict = classify(mags, config).astype(np.intp)
+        confusions.append(np.bincount(truth * 3 + verdict, minlength=9).reshape(3, 3))
+    return confusions
+
+
+def _evaluate_task(task):
+    return evaluate(*task)
+
+
+def score(config, confusion):
+    total = int(confusion.sum())
+    per_class = confusion.sum(axis=1)
+    recall = {name: (float(confusion[i, i] / per_class[i]) if per_class[i] else None) for i, name in enumerate(CLASSES)}
+    known = [r for r in recall.values() if r is not None]
+    return {
+        "config": config,
+        "windows": total,
+        "accuracy": float(np.trace(confusion) / total) if total else None,
+        "balanced_accuracy": sum(known) / len(known) if known else None,
+        "recall": recall,
+        "confusion": confusion.tolist(),
+    }
+
+
+def grid_configs(grid):
+    """Every combination of the grid's values, with ``hop=0`` meaning one window"""
+    configs = []
+    for values in itertools.product(*grid.values()):
+        config = dict(zip(grid, values))
+        config["hop"] = config["hop"] or config["window"]
+        lo, mid, hi = config["bands"]
+        if not 0 <= lo < mid < hi < MAX_FREQ_HZ:
+            raise ValueError(f"band edges {config['bands']} must increase and stay below {MAX_FREQ_HZ:g} Hz")
+        b0, b1 = config["baseline"]
+        if not 0 <= b0 < b1 or b1 * SAMPLE_RATE_HZ / FFT_SIZE > MAX_FREQ_HZ:
+            raise ValueError(f"baseline bins {config['baseline']} must be increasing and below {MAX_FREQ_HZ:g} Hz")
+        if config not in configs:
+            configs.append(config)
+    return configs
+
+
+def sweep(corpus, grid, cache_dir, workers=None):
+    """Score every configuration of ``grid`` (``{parameter: [values]}``) on ``corpus``
+
+    Returns the scores, best accuracy first, and timings of the two stages.
+    """
+    workers = workers or os.cpu_count() or 1
+    configs = grid_configs(grid)
+    groups = {}
+    for config in configs:
+        groups.setdefault((config["window"], config["hop"]), []).append(config)
+    os.makedirs(cache_dir, exist_ok=True)
+
+    executor = None
+    if workers > 1:
+        executor = ProcessPoolExecutor(workers, mp_context=multiprocessing.get_context("spawn"))
+    run = executor.map if executor is not None else map
+    try:
+        # Spectra missing from the cache, one (recording, window size, hop) per task
+        start = time.perf_counter()
+        committed = {recording: RawArchive(recording).committed for recording in corpus}
+        jobs = []
+        for size, hop in groups:
+            for recording in corpus:
+                path = spectra_path(cache_dir, recording, size, hop)
+                if n_windows(committed[recording], size, hop) and not os.path.exists(path):
+                    jobs.append((recording, size, hop, path))
+        list(run(_spectra_task, jobs))
+        spectra_seconds = time.perf_counter() - start
+
+        # Configurations in chunks, a few per worker so the pool stays busy to the end
+        start = time.perf_counter()
+        tasks = []
+        for (size, hop), group in groups.items():
+            files, labels = [], []
+            for recording, segments in corpus.items():
+                n = n_windows(committed[recording], size, hop)
+                truth = window_labels(segments, n, size, hop, SAMPLE_RATE_HZ)
+                if (truth >= 0).any():
+                    files.append(spectra_path(cache_dir, recording, size, hop))
+                    labels.append(truth)
+            if not files:
+                print(f"No labelled {size}-sample windows at hop {hop}; skipped")
+                continue
+            chunk = max(1, math.ceil(len(group) / (workers * 4)))
+            tasks.extend((files, labels, group[i:i + chunk]) for i in range(0, len(group), chunk))
+        results = []
+        for task, confusions in zip(tasks, run(_evaluate_task, tasks)):
+            results.extend(score(config, confusion) for config, confusion in zip(task[2], confusions))
+        evaluate_seconds = time.perf_counter() - start
+    finally:
+        if executor is not None:
+            executor.shutdown()
+    results.sort(key=lambda r: -(r["accuracy"] or 0.0))
+    return results, {"spectra": len(jobs), "spectra_seconds": spectra_seconds,
+                     "configs": len(configs), "evaluate_seconds": evaluate_seconds, "workers": workers}
+
+
+# --- Command line ---
+
+def _numbers(kind, count):
+    def parse(text):
+        values = tuple(kind(v) for v in text.split(","))
+        if len(values) != count:
+            raise argparse.ArgumentTypeError(f"expected {count} comma-separated values, got {text!r}")
+        return values
+    return parse
+
+
+def describe(config):
+    marker = " (firmware)" if config == FIRMWARE else ""
+    return (f"window {config['window']} hop {config['hop']} threshold {config['threshold']:g} dc {config['dc_scale']:g} "
+            f"baseline {config['baseline'][0]}-{config['baseline'][1] - 1} bands {'/'.join(f'{e:g}' for e in config['bands'])}"
+            + marker)
+
+
+def print_confusion(result):
+    print("  " + "true / detected".ljust(18) + "".join(f"{name:>12}" for name in CLASSES))
+    for name, row in zip(CLASSES, result["confusion"]):
+        print(f"  {name:<18}" + "".join(f"{n:>12}" for n in row))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Sweep detection parameters over labelled raw recordings")
+    sub = parser.add_subparsers(dest="command", required=True)
+    p = sub.add_parser("run", help="score a parameter grid on a labelled corpus")
+    p.add_argument("labels", help="CSV of recording,start,end,label")
+    p.add_argument("--window", type=int, nargs="+", default=[FFT_SIZE], help="FFT sizes in samples")
+    p.add_argument("--hop", type=int, nargs="+", default=[0], help="samples between windows, 0 for one window")
+    p.add_argument("--threshold", type=float, nargs="+", default=[detection.THRESHOLD_FACTOR],
+                   help="multiples of the baseline mean")
+    p.add_argument("--dc-scale", type=float, nargs="+", default=[detection.DC_SCALE])
+    p.add_argument("--baseline", type=_numbers(int, 2), nargs="+", default=[detection.BASELINE_BINS],
+                   help="first,last+1 baseline bins of a 256-point window")
+    p.add_argument("--bands", type=_numbers(float, 3), nargs="+", default=[FIRMWARE["bands"]],
+                   help="tremor low, tremor/dyskinesia edge, dyskinesia high in Hz")
+    p.add_argument("--workers", type=int, default=os.cpu_count())
+    p.add_argument("--cache", help="spectra cache directory (default: .spectra next to the labels)")
+    p.add_argument("--top", type=int, default=10)
+    p.add_argument("--out", help="write every configuration's scores and confusion matrix as JSON")
+    p = sub.add_parser("synth", help="write a labelled synthetic corpus (see synthetic_motion.py)")
+    p.add_argument("directory")
+    p.add_argument("--recordings", type=int, default=4)
+    p.add_argument("--minutes", type=float, default=30.0)
+    p.add_argument("--seed", type=int, default=0)
+    p.add_argument("--mix", type=float, nargs=len(synthetic_motion.CONDITIONS), default=synthetic_motion.DEFAULT_MIX,
+                   help=f"relative share of {', '.join(synthetic_motion.CONDITIONS)} segments")
+    args = parser.parse_args()
+
+    if args.command == "synth":
+        labels = synthetic_motion.write_corpus(args.directory, args.recordings, args.minutes, args.seed, args.mix)
+        print(f"{args.recordings} recordings of {args.minutes:g} min, labels in {labels}")
+        return
+
+    corpus = load_corpus(args.labels)
+    grid = {"window": args.window, "hop": args.hop, "threshold": args.threshold, "dc_scale": args.dc_scale,
+            "baseline": args.baseline, "bands": args.bands}
+    cache = args.cache or os.path.join(os.path.dirname(os.path.abspath(args.labels)), ".spectra")
+    results, timing = sweep(corpus, grid, cache, args.workers)
+    print(f"{len(corpus)} recordings: {timing['spectra']} spectra computed in {timing['spectra_seconds']:.2f} s, "
+          f"{timing['configs']} configurations scored in {timing['evaluate_seconds']:.2f} s "
+          f"with {timing['workers']} worker(s)")
+    if not results:
+        return
+    print(f"{'rank':>4} {'accuracy':>9} {'balanced':>9}  configuration")
+    for rank, result in enumerate(results[:args.top], start=1):
+        print(f"{rank:>4} {result['accuracy']:>9.3f} {result['balanced_accuracy']:>9.3f}  {describe(result['config'])}")
+    print(f"best of {results[0]['windows']} windows: {describe(results[0]['config'])}")
+    print_confusion(results[0])
+    firmware = next((r for r in results if r["config"] == FIRMWARE), None)
+    if firmware is not None and firmware is not results[0]:
+        print(f"firmware defaults: accuracy {firmware['accuracy']:.3f}, "
+              f"rank {results.index(firmware) + 1} of {len(results)}")
+        print_confusion(firmware)
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump(results, f, indent=1)
+        print(f"scores of every configuration in {args.out}")
+
+
+if __name__ == "__main__":
+    main()
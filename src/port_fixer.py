@@ -7,6 +7,9 @@ import signal
 import serial
 import serial.tools.list_ports
 
+import port_probe
+from serial_reader import SerialLineReader
+
 def get_user_sudo():
     """Ask for sudo password if not already running with sudo"""
     if os.geteuid() != 0:
@@ -104,7 +107,7 @@ def kill_process(pid):
         except:
             return False
 
-def test_port_connection(port_name, baud_rate=9600):
+def test_port_connection(port_name, baud_rate=115200):
     """Test if we can open and close the port"""
     try:
         print(f"Testing connection to {port_name}...")
@@ -117,7 +120,7 @@ def test_port_connection(port_name, baud_rate=9600):
         print(f"Error testing port: {e}")
         return False
 
-def monitor_port(port_name, baud_rate=9600, duration=10):
+def monitor_port(port_name, baud_rate=115200, duration=10):
     """Monitor the port for a short duration to verify it's working"""
     try:
         print(f"\nMonitoring {port_name} for {duration} seconds...")
@@ -125,13 +128,14 @@ def monitor_port(port_name, baud_rate=9600, duration=10):
             end_time = time.time() + duration
             received_data = False
             
+            reader = SerialLineReader(ser)
+            
             while time.time() < end_time:
                 try:
-                    data = ser.readline()
-                    if data:
+                    _, lines = reader.read_batch()
+                    for line in lines:
                         received_data = True
-                        print(f"Data: {data.decode('utf-8', errors='replace').strip()}")
-                    time.sleep(0.05)
+                        print(f"Data: {line}")
                 except serial.SerialException as e:
                     print(f"Error during monitoring: {e}")
                     return False
@@ -154,11 +158,24 @@ def main():
         print("No serial ports detected. Please check your device connection.")
         return 1
     
+    # Listen on all ports at once for the firmware's output, at each candidate baud rate
+    print("\nProbing ports for firmware output...")
+    results = port_probe.probe(available_ports)
+    for r in results:
+        print(f"  {r!r}")
+    detected = (results[0].port, results[0].baud) if results and results[0].matched else None
+    if detected:
+        print(f"Firmware output found on {detected[0]} at {detected[1]} baud")
+    else:
+        print("No port is sending firmware output (busy, silent, or not the tremor firmware)")
+    
     # Get port selection from user
-    port_index = 0
+    port_index = available_ports.index(detected[0]) if detected else 0
     if len(available_ports) > 1:
         try:
-            port_index = int(input(f"Select port number (1-{len(available_ports)}): ")) - 1
+            choice = input(f"Select port number (1-{len(available_ports)}) [{port_index + 1}]: ").strip()
+            if choice:
+                port_index = int(choice) - 1
             if port_index < 0 or port_index >= len(available_ports):
                 print("Invalid selection, using first port.")
                 port_index = 0
@@ -202,9 +219,10 @@ def main():
     
     # Test port connection
     print("\nTesting port connection...")
-    baud_rate = input("Enter baud rate [9600]: ").strip()
+    default_baud = detected[1] if detected and detected[0] == port_name else 115200
+    baud_rate = input(f"Enter baud rate [{default_baud}]: ").strip()
     if not baud_rate:
-        baud_rate = 9600
+        baud_rate = default_baud
     else:
         baud_rate = int(baud_rate)
     
@@ -0,0 +1,140 @@
+"""Cached serial port enumeration shared by every dashboard session.
+
+``serial.tools.list_ports.comports()`` globs ``/dev`` and reads several
+sysfs files per candidate device on Linux (IOKit and SetupAPI queries on
+macOS and Windows). The dashboards called it at the top of every rerun. Here
+the result is kept, and enumeration runs again only when:
+
+* a watched directory changed: ``/dev`` gains or loses an entry whenever a
+  device node is created or removed, which moves its mtime, so one
+  ``stat`` per check stands in for a whole enumeration
+* or ``ttl`` seconds passed, as a backstop on systems without ``/dev``
+
+Checks themselves are rate-limited to one per ``check_interval``.
+
+Ports are indexed by USB VID:PID. ST-LINK probes (the B-L475E-IOT01A carries
+an ST-LINK/V2-1, 0483:374B) are recognised from the IDs the USB stack
+reports. Description matching is only the fallback for ports without IDs.
+
+Streamlit imports this module once per server process, so all sessions share
+``inventory``.
+"""
+import os
+import threading
+import time
+
+import serial.tools.list_ports
+
+ST_VID = 0x0483
+# ST-LINK/V2, V2-1 (with and without mass storage), V3 variants
+STLINK_PIDS = {0x3748, 0x374B, 0x3752, 0x374E, 0x374F, 0x3753, 0x3754}
+STLINK_NAMES = ("STM", "STLink", "ST-LINK")
+WATCH_PATHS = ("/dev", "/dev/serial/by-id")
+
+
+def is_stlink(port):
+    """True for an ST-LINK virtual COM port, by USB IDs when the port has them"""
+    if port.vid is not None:
+        return port.vid == ST_VID and port.pid in STLINK_PIDS
+    return any(name in (port.description or "") for name in STLINK_NAMES)
+
+
+class PortInventory:
+    """``comports()`` behind a cache invalidated by changes to the device directories"""
+
+    def __init__(self, ttl=30.0, check_interval=0.5, watch=WATCH_PATHS, enumerate_ports=None):
+        self.ttl = ttl
+        self.check_interval = check_interval
+        self.watch = watch
+        self._enumerate = enumerate_ports or serial.tools.list_ports.comports
+        self._lock = threading.Lock()
+        self._ports = []
+        self._by_device = {}
+        self._by_id = {}
+        self._signature = None
+        self._refreshed = float("-inf")
+        self._checked = float("-inf")
+        self.refreshes = 0
+        self.checks = 0
+
+    def _watch_signature(self):
+        signature = []
+        for path in self.watch:
+            try:
+                st = os.stat(path)
+                signature.append((st.st_mtime_ns, st.st_ino))
+            except OSError:
+                signature.append(None)
+        return tuple(signature)
+
+    def _refresh(self, signature, now):
+        ports = sorted(self._enumerate(), key=lambda p: p.device)
+        by_id = {}
+        for port in ports:
+            if port.vid is not None:
+                by_id.setdefault((port.vid, port.pid), []).append(port)
+        self._ports = ports
+        self._by_device = {port.device: port for port in ports}
+        self._by_id = by_id
+        self._signature = signature
+        self._refreshed = now
+        self.refreshes += 1
+
+    def _current(self, force=False):
+        """Refresh if needed; caller holds the lock"""
+        now = time.monotonic()
+        if not force and now - self._checked < self.check_interval:
+            return
+        self._checked = now
+        self.checks += 1
+        signature = self._watch_signature()
+        if force or signature != self._signature or now - self._refreshed >= self.ttl:
+            self._refresh(signature, now)
+
+    def ports(self, force=False):
+        """All serial ports, sorted by device name (``ListPortInfo`` objects)"""
+        with self._lock:
+            self._current(force)
+            return list(self._ports)
+
+    def get(self, device):
+        with self._lock:
+            self._current()
+            return self._by_device.get(device)
+
+    def by_usb_id(self, vid, pid=None):
+        """Ports with the given USB vendor (and product) ID"""
+        with self._lock:
+            self._current()
+            if pid is not None:
+                return list(self._by_id.get((vid, pid), ()))
+            return [port for (v, _), ports in self._by_id.items() if v == vid for port in ports]
+
+    def stlink_ports(self):
+        """ST-LINK ports, matched by USB IDs (or by description for ports without them)"""
+        return [port for port in self.ports() if is_stlink(port)]
+
+    def devices(self, stlink_first=True):
+        """Device names, ST-LINK ports first"""
+        ports = self.ports()
+        if stlink_first:
+            ports.sort(key=lambda p: not is_stlink(p))
+        return [port.device for port in ports]
+
+    def invalidate(self):
+        """Enumerate again on the next call (e.g. a "Refresh Ports" button)"""
+        with self._lock:
+            self._checked = float("-inf")
+            self._signature = None
+
+    def stats(self):
+        with self._lock:
+            return {
+                "ports": len(self._ports),
+                "refreshes": self.refreshes,
+                "checks": self.checks,
+                "age_s": round(time.monotonic() - self._refreshed, 1) if self.refreshes else None,
+            }
+
+
+inventory = PortInventory()
@@ -0,0 +1,204 @@
+"""Find the port and baud rate the tremor firmware is talking on.
+
+``probe`` opens every candidate port at once, one worker thread per port.
+Each worker tries the candidate baud rates in turn, most likely first (the
+firmware's ``BufferedSerial`` runs at 115200). It listens for up to
+``listen`` seconds per rate and scores the decoded text against the firmware's
+line grammar (verdicts, status lines, the boot banner). A wrong rate decodes
+to garbage that never matches, so the first grammar lines settle the rate
+and the worker stops early. A port that stays silent, or that prints clean
+text lines that are not the firmware's (another device at the right rate),
+is not tried at the other rates either. The whole probe is bounded by
+``timeout``: ports whose worker has not finished by then (e.g. stuck opening
+the device) are left out of the results.
+
+The result is a ranked list of ``ProbeResult``. ``best_port`` returns the
+winning ``(port, baud)`` or ``None``. The Streamlit apps and
+``port_fixer.py`` use it for their auto-detect buttons; ``bench_port_probe.py``
+runs it against emulated boards opened with ``strict_baud``.
+
+    python port_probe.py                 # all serial ports
+    python port_probe.py /dev/ttyACM0 /dev/ttyUSB0 --timeout 8
+"""
+import argparse
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+
+import serial
+
+from line_parser import KIND_OTHER, line_kind
+from port_inventory import inventory
+
+# Most likely first: the firmware's rate, then the old dashboard default, then the rest
+CANDIDATE_BAUDS = (115200, 9600, 57600, 38400, 19200, 230400)
+# Lines of the boot banner in main() that line_parser does not classify
+BANNER_PREFIXES = ("Tremor/Dyskinesia Detection System", "Testing sensor connectivity", "WHO_AM_I",
+                   "Configuring", "System ready", "------")
+# One firmware cycle is 256 samples at 104 Hz plus a 1 s sleep: every rate gets to see a status line
+LISTEN_SECONDS = 3.6
+CONFIDENT_LINES = 2
+
+
+def is_firmware_line(line):
+    line = line.strip()
+    return bool(line) and (line_kind(line) != KIND_OTHER or line.startswith(BANNER_PREFIXES))
+
+
+def is_text_line(line):
+    line = line.strip()
+    return bool(line) and line.isascii() and line.isprintable()
+
+
+def score_bytes(data):
+    """``(score, firmware lines, other text lines)`` of raw bytes; the score is the share of
+    complete lines that fit the grammar"""
+    lines = data.decode("utf-8", errors="replace").split("\n")[:-1]
+    good = sum(1 for line in lines if is_firmware_line(line))
+    text = sum(1 for line in lines if is_text_line(line)) - good
+    return (good / len(lines) if lines else 0.0), good, max(0, text)
+
+
+class ProbeResult:
+    """What one port sounded like at one baud rate"""
+
+    def __init__(self, port, baud, score=0.0, lines=0, nbytes=0, seconds=0.0, error=None, sample=""):
+        self.port = port
+        self.baud = baud
+        self.score = score
+        self.lines = lines          # firmware lines recognised
+        self.other_lines = 0        # clean text lines that are not the firmware's
+        self.nbytes = nbytes
+        self.seconds = seconds
+        self.error = error
+        self.sample = sample        # the last recognised line, for display
+
+    @property
+    def matched(self):
+        return self.lines > 0
+
+    @property
+    def conclusive(self):
+        """Other rates need not be tried: the firmware, silence, an error or another device's text"""
+        return (self.error is not None or self.nbytes == 0 or self.lines >= CONFIDENT_LINES
+                or (not self.lines and self.other_lines >= CONFIDENT_LINES))
+
+    def rank(self):
+        return (self.matched, self.lines >= CONFIDENT_LINES, self.score, self.lines)
+
+    def __repr__(self):
+        if self.error:
+            return f"<{self.port} @ {self.baud}: {self.error}>"
+        return f"<{self.port} @ {self.baud}: score {self.score:.2f}, {self.lines} lines, {self.nbytes} bytes>"
+
+
+def listen(port, baud, seconds, deadline=None, stop=None):
+    """Open ``port`` at ``baud`` and score what arrives within ``seconds``; stops at the first confident match"""
+    start = time.monotonic()
+    end = start + seconds if deadline is None else min(start + seconds, deadline)
+    result = ProbeResult(port, baud)
+    data = bytearray()
+    try:
+        with serial.serial_for_url(port, baud, timeout=0.05) as ser:
+            # Bytes already buffered were received at the previous rate
+            ser.reset_input_buffer()
+            while time.monotonic() < end and not (stop is not None and stop.is_set()):
+                chunk = ser.read(max(1, ser.in_waiting))
+                if not chunk:
+                    continue
+                data += chunk
+                if b"\n" in chunk:
+                    result.score, result.lines, result.other_lines = score_bytes(data)
+                    if result.lines >= CONFIDENT_LINES:
+                        break
+    except (serial.SerialException, OSError, ValueError) as e:
+        result.error = str(e)
+    result.nbytes = len(data)
+    result.seconds = time.monotonic() - start
+    if result.lines:
+        result.sample = next(line.strip() for line in reversed(data.decode("utf-8", errors="replace").split("\n")[:-1])
+                             if is_firmware_line(line))
+    return result
+
+
+def probe_port(port, bauds=CANDIDATE_BAUDS, listen_seconds=LISTEN_SECONDS, deadline=None, stop=None, found=None):
+    """Try ``bauds`` on one port in order; returns the results, stopping at the first confident rate"""
+    results = []
+    for baud in bauds:
+        if (deadline is not None and time.monotonic() >= deadline) or (stop is not None and stop.is_set()):
+            break
+        result = listen(port, baud, listen_seconds, deadline, stop)
+        results.append(result)
+        if result.conclusive:
+            if result.lines >= CONFIDENT_LINES and found is not None:
+                found.set()
+            break
+    return results
+
+
+def candidate_ports():
+    """Serial ports of the system, ST-LINK ones first"""
+    return inventory.devices()
+
+
+def probe(ports=None, bauds=CANDIDATE_BAUDS, timeout=15.0, listen_seconds=LISTEN_SECONDS, workers=8,
+          first_match=False):
+    """Probe ``ports`` (default: every serial port) in parallel; returns all results, best first
+
+    With ``first_match`` every worker stops as soon as one port is confidently the firmware.
+    """
+    ports = candidate_ports() if ports is None else list(ports)
+    if not ports:
+        return []
+    deadline = time.monotonic() + timeout
+    stop = threading.Event()
+    found = stop if first_match else None
+    pool = ThreadPoolExecutor(max_workers=max(1, min(workers, len(ports))), thread_name_prefix="port-probe")
+    futures = [pool.submit(probe_port, port, bauds, listen_seconds, deadline, stop, found) for port in ports]
+    try:
+        done, _ = wait(futures, timeout=max(0.0, deadline - time.monotonic()) + 1.0)
+    finally:
+        # Workers past the deadline give up at their next read. One stuck in a call that never
+        # returns (a hanging open) is left behind instead of holding up the results of the others
+        stop.set()
+        pool.shutdown(wait=False, cancel_futures=True)
+    results = []
+    for future in futures:
+        if future in done:
+            results.extend(future.result())
+    results.sort(key=ProbeResult.rank, reverse=True)
+    return results
+
+
+def best_port(ports=None, bauds=CANDIDATE_BAUDS, timeout=15.0, **kwargs):
+    """``(port, baud)`` of the best firmware match, or ``None`` when nothing sounds like the board"""
+    results = probe(ports, bauds, timeout, first_match=True, **kwargs)
+    if results and results[0].matched:
+        return results[0].port, results[0].baud
+    return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Find the port and baud rate of the tremor firmware")
+    parser.add_argument("ports", nargs="*", help="ports or pyserial URLs (default: all serial ports)")
+    parser.add_argument("--bauds", type=int, nargs="+", default=list(CANDIDATE_BAUDS))
+    parser.add_argument("--timeout", type=float, default=15.0)
+    parser.add_argument("--listen", type=float, default=LISTEN_SECONDS, help="seconds per port and rate")
+    args = parser.parse_args()
+
+    start = time.monotonic()
+    results = probe(args.ports or None, args.bauds, args.timeout, args.listen)
+    print(f"Probed {len({r.port for r in results})} ports in {time.monotonic() - start:.1f} s")
+    for r in results:
+        print(f"  {r!r}" + (f"  {r.sample!r}" if r.sample else "")
+              + (f"  ({r.other_lines} lines of another device)" if r.other_lines and not r.lines else ""))
+    if results and results[0].matched:
+        print(f"Firmware found on {results[0].port} at {results[0].baud} baud")
+        return 0
+    print("No port sounded like the firmware")
+    return 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,318 @@
+"""Process-wide registry of serial readers with fan-out to many subscribers.
+
+Every dashboard session used to open its own ``serial.Serial`` on the same
+device, so the second one failed or stole lines from the first. Here there is
+at most one reader thread per (port, baud). Sessions ``subscribe()`` and get
+their own cursor into a shared bounded buffer of received lines:
+
+* the reader never waits for subscribers; appending is O(batch)
+* a subscriber that falls more than ``capacity`` lines behind skips ahead and
+  is told how many lines it missed
+* the reader stops when the last subscription is closed; subscriptions that
+  have not read for ``idle_timeout`` seconds (a closed tab) are detached the
+  next time the registry is used. A detached subscription reports
+  ``alive = False`` and the reason in ``error``; reading from it again
+  reattaches it, and lines that left the buffer meanwhile count as missed
+* a port reopened (e.g. at another baud) is only opened once the previous
+  reader has closed it, so two readers never split its bytes
+
+Streamlit imports this module once per server process, so all sessions share
+the same registry.
+"""
+import threading
+import time
+
+import serial
+
+from metrics import metrics
+from serial_reader import SerialLineReader
+
+SERIAL_BYTES = metrics.counter("serial_bytes_total", "Bytes read from serial ports", ("port",))
+SERIAL_LINES = metrics.counter("serial_lines_total", "Non-empty lines read from serial ports", ("port",))
+DECODE_ERRORS = metrics.counter("serial_decode_errors_total", "Lines holding bytes that are not UTF-8", ("port",))
+DECODE_SECONDS = metrics.histogram("serial_decode_seconds", "Splitting and decoding one read", ("port",))
+PORT_OPENS = metrics.counter("serial_port_opens_total", "Times a port was opened", ("port",))
+PORT_RECONNECTS = metrics.counter("serial_port_reconnects_total", "Opens of a port that had been open before", ("port",))
+PORT_ERRORS = metrics.counter("serial_port_errors_total", "Readers ended by an error", ("port",))
+_opened_ports = set()
+# How long a new reader waits for the previous reader of its port to close it
+PREVIOUS_READER_SECONDS = 2.0
+
+
+class SharedLineBuffer:
+    """Bounded ring of received lines addressed by an ever-increasing sequence number"""
+
+    def __init__(self, capacity=10000):
+        self.capacity = capacity
+        self._ts = [0.0] * capacity
+        self._lines = [""] * capacity
+        self.head = 0  # sequence number of the next line
+        self._cond = threading.Condition()
+
+    def append(self, ts, lines):
+        with self._cond:
+            # A batch longer than the ring keeps its newest lines at their own sequence numbers
+            head = self.head + max(0, len(lines) - self.capacity)
+            for line in lines[-self.capacity:]:
+                i = head % self.capacity
+                self._ts[i] = ts
+                self._lines[i] = line
+                head += 1
+            self.head += len(lines)
+            self._cond.notify_all()
+
+    def read(self, cursor, max_items=None, timeout=None):
+        """Lines after ``cursor``: returns ``(new_cursor, [(ts, line), ...], missed)``"""
+        with self._cond:
+            if timeout and cursor >= self.head:
+                self._cond.wait(timeout)
+            head = self.head
+            first = max(cursor, head - self.capacity)
+            missed = first - cursor
+            last = head if max_items is None else min(head, first + max_items)
+            items = [(self._ts[i % self.capacity], self._lines[i % self.capacity])
+                     for i in range(first, last)]
+        return last, items, missed
+
+    def wake(self):
+        with self._cond:
+            self._cond.notify_all()
+
+
+class PortReader(threading.Thread):
+    """The one thread that owns a serial port and feeds its SharedLineBuffer"""
+
+    def __init__(self, port, baud, capacity=10000, timeout=0.2, previous=None):
+        super().__init__(name=f"reader {port}@{baud}", daemon=True)
+        self.port = port
+        self.baud = baud
+        self.timeout = timeout
+        self.previous = previous  # the stopped reader that last had this port open
+        self.buffer = SharedLineBuffer(capacity)
+        self.connected = threading.Event()
+        self.stopped = threading.Event()
+        self.error = None
+        self.lines_read = 0
+
+    def run(self):
+        counted = ()
+        try:
+            # The port can only be opened again once the previous reader has closed it
+            if self.previous is not None:
+                self.previous.join(PREVIOUS_READER_SECONDS)
+                if self.previous.is_alive():
+                    raise serial.SerialException(f"{self.port} is still held by the previous reader")
+                self.previous = None
+            # serial_for_url also accepts loop:// and other pyserial URLs
+            with serial.serial_for_url(self.port, self.baud, timeout=self.timeout) as ser:
+                self.connected.set()
+                PORT_OPENS.labels(self.port).inc()
+                if self.port in _opened_ports:
+                    PORT_RECONNECTS.labels(self.port).inc()
+                _opened_ports.add(self.port)
+                reader = SerialLineReader(ser, decode_time=DECODE_SECONDS.labels(self.port).observe)
+                # The reader counts anyway; the counters read its totals at scrape time
+                counted = ((SERIAL_BYTES, lambda: reader.bytes_read), (SERIAL_LINES, lambda: reader.lines_read),
+                           (DECODE_ERRORS, lambda: reader.decode_errors))
+                for family, total in counted:
+                    family.labels(self.port).set_function(total)
+                while not self.stopped.is_set():
+                    ts, lines = reader.read_batch()
+                    if lines:
+                        self.buffer.append(ts, lines)
+                        self.lines_read += len(lines)
+        except Exception as e:
+            # Errors raised while shutting down (e.g. the device went away after stop()) are not news
+            if not self.stopped.is_set():
+                self.error = str(e)
+                PORT_ERRORS.labels(self.port).inc()
+                print(f"Error in reader for {self.port}: {e}")
+        finally:
+            # A newer reader of the same port may own the series by now
+            for family, total in counted:
+                family.labels(self.port).clear_function(total)
+            self.connected.clear()
+            self.stopped.set()
+            self.buffer.wake()
+
+    def stop(self):
+        self.stopped.set()
+        self.buffer.wake()
+
+
+class Subscription:
+    """One session's cursor into a shared port reader"""
+
+    def __init__(self, registry, key, reader, cursor):
+        self._registry = registry
+        self.key = key
+        self.reader = reader
+        self.cursor = cursor
+        self.missed = 0
+        self.last_read = time.monotonic()
+        self.closed = False
+        self.detached = None    # why the registry let go of an idle subscription
+        self.reattached = 0
+
+    @property
+    def port(self):
+        return self.key[0]
+
+    @property
+    def baud(self):
+        return self.key[1]
+
+    @property
+    def connected(self):
+        return self.reader.connected.is_set()
+
+    @property
+    def error(self):
+        return self.reader.error or self.detached
+
+    @property
+    def alive(self):
+        return self.detached is None and not self.reader.stopped.is_set()
+
+    def wait_connected(self, timeout=5.0):
+        """Block until the port is open; raises ``serial.SerialException`` if opening failed"""
+        deadline = time.monotonic() + timeout
+        while not self.reader.connected.wait(0.05):
+            if self.reader.stopped.is_set() or time.monotonic() > deadline:
+                raise serial.SerialException(self.reader.error or f"Timed out opening {self.port}")
+        return True
+
+    def read(self, max_items=None, timeout=None):
+        """New ``(ts, line)`` pairs since the last read, waiting up to ``timeout`` for some"""
+        self.last_read = time.monotonic()
+        if self.detached is not None and not self.closed:
+            self._registry.reattach(self)
+        self.cursor, items, missed = self.reader.buffer.read(self.cursor, max_items, timeout)
+        self.missed += missed
+        return items
+
+    def read_lines(self, max_items=None, timeout=None):
+        return [line for _, line in self.read(max_items, timeout)]
+
+    def close(self):
+        if not self.closed:
+            self.closed = True
+            self._registry.release(self)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class PortRegistry:
+    """One reader per (port, baud), shared by reference-counted subscriptions"""
+
+    def __init__(self, capacity=10000, idle_timeout=60.0):
+        self.capacity = capacity
+        self.idle_timeout = idle_timeout
+        self._lock = threading.Lock()
+        self._readers = {}
+        self._subs = {}
+        self._stopping = {}     # port -> last reader stopped on it, until the port is opened again
+
+    def subscribe(self, port, baud, backlog=0):
+        """Attach to the reader for ``(port, baud)``, starting one if needed
+
+        ``backlog`` lines already in the shared buffer are replayed to the new
+        subscriber. Opening a port that is already being read at a different
+        baud rate raises ``serial.SerialException``.
+        """
+        key = (port, int(baud))
+        with self._lock:
+            self._reap_idle()
+            reader = self._readers.get(key)
+            if reader is not None and reader.stopped.is_set():
+                self._drop(key)
+                reader = None
+            if reader is None:
+                reader = self._start(key)
+            sub = Subscription(self, key, reader, max(0, reader.buffer.head - backlog))
+            self._subs[key].add(sub)
+            return sub
+
+    def reattach(self, sub):
+        """Put a detached subscription back on the reader for its port, starting one if needed"""
+        with self._lock:
+            reader = self._readers.get(sub.key)
+            if reader is not None and reader.stopped.is_set():
+                self._drop(sub.key)
+                reader = None
+            if reader is None:
+                reader = self._start(sub.key)
+            if reader is not sub.reader:
+                # A new reader's buffer starts over; what the old one received after the detach is gone
+                sub.reader = reader
+                sub.cursor = 0
+            self._subs[sub.key].add(sub)
+            sub.detached = None
+            sub.reattached += 1
+
+    def release(self, sub):
+        with self._lock:
+            subs = self._subs.get(sub.key)
+            if subs is None or sub not in subs:
+                return
+            subs.discard(sub)
+            if not subs:
+                self._drop(sub.key)
+
+    def _start(self, key):
+        port, baud = key
+        for other_port, other_baud in self._readers:
+            if other_port == port:
+                raise serial.SerialException(f"{port} is already open at {other_baud} baud")
+        previous = self._stopping.pop(port, None)
+        reader = PortReader(port, baud, self.capacity, previous=previous if previous and previous.is_alive() else None)
+        self._readers[key] = reader
+        self._subs[key] = set()
+        reader.start()
+        return reader
+
+    def _drop(self, key):
+        reader = self._readers.pop(key, None)
+        self._subs.pop(key, None)
+        if reader is not None:
+            reader.stop()
+            self._stopping[key[0]] = reader
+
+    def _reap_idle(self):
+        """Detach subscriptions whose session stopped reading (e.g. a closed browser tab)"""
+        if not self.idle_timeout:
+            return
+        now = time.monotonic()
+        cutoff = now - self.idle_timeout
+        for key in list(self._subs):
+            subs = self._subs[key]
+            for sub in [s for s in subs if s.last_read < cutoff]:
+                sub.detached = f"no read for {now - sub.last_read:.0f} s, detached from {sub.port}"
+                subs.discard(sub)
+            if not subs:
+                self._drop(key)
+
+    def stats(self):
+        with self._lock:
+            self._reap_idle()
+            return {
+                f"{port}@{baud}": {
+                    "subscribers": len(self._subs.get((port, baud), ())),
+                    "connected": reader.connected.is_set(),
+                    "lines_read": reader.lines_read,
+                    "error": reader.error,
+                }
+                for (port, baud), reader in self._readers.items()
+            }
+
+
+registry = PortRegistry()
+
+
+def subscribe(port, baud, backlog=0):
+    """Subscribe to ``port`` through the process-wide registry"""
+    return registry.subscribe(port, baud, backlog)
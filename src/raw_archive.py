@@ -0,0 +1,346 @@
+"""Append-only archive of raw int16 accelerometer samples, read through numpy.memmap.
+
+One recording (one device, one session) is two files:
+
+``<name>.raw``: a 4096-byte header followed by the samples as little-endian
+int16, back to back. The header holds::
+
+    offset  size  field
+    0       8     magic b"STMRAW01"
+    8       4     format version (uint32)
+    12      4     index stride in samples (uint32)
+    16      8     sample rate in Hz (float64)
+    24      8     committed sample count (uint64)
+
+``<name>.idx``: the sparse timestamp index, records of (first sample uint64,
+host time float64). There is one entry every ``index_stride`` samples, plus
+one wherever the host clock and the sample clock disagree by more than
+``gap_tolerance`` (a reconnect, a lost frame). Times in between are
+extrapolated at the sample rate.
+
+Appends are crash safe. The samples and index entries are written (and
+fsynced) first. Then the committed count in the header is updated in one
+8-byte write. A reader only ever looks at committed samples. A writer that
+reopens a file cut off mid-append truncates the torn tail.
+
+Because the data starts on a page boundary, ``RawArchive.samples`` is a
+read-only ``np.memmap``. Any 256-sample ``runDetection`` window
+(``window``, ``windows``) or time range (``time_range``) is a view into it,
+with no copying or parsing.
+
+    python raw_archive.py record /dev/ttyACM0 session.raw --duration 3600
+    python raw_archive.py info session.raw
+    python raw_archive.py compact session.raw --start "2024-05-01 10:00" --end "2024-05-01 14:00"
+"""
+import argparse
+import os
+import struct
+import time
+from datetime import datetime
+
+import numpy as np
+
+from detection import FFT_SIZE, SAMPLE_RATE_HZ, sample_windows
+
+MAGIC = b"STMRAW01"
+VERSION = 1
+HEADER = struct.Struct("<8sIIdQ")
+HEADER_SIZE = 4096          # data starts on a page boundary so it can be memory-mapped
+COMMITTED_OFFSET = 24
+COMMITTED = struct.Struct("<Q")
+SAMPLE_DTYPE = np.dtype("<i2")
+INDEX_DTYPE = np.dtype([("sample", "<u8"), ("ts", "<f8")])
+INDEX_STRIDE = 104 * 60     # one index entry per minute of samples
+
+
+def index_path(path):
+    return os.path.splitext(path)[0] + ".idx"
+
+
+def read_header(f):
+    f.seek(0)
+    raw = f.read(HEADER.size)
+    if len(raw) < HEADER.size:
+        raise ValueError("file too short for a raw archive header")
+    magic, version, stride, rate, committed = HEADER.unpack(raw)
+    if magic != MAGIC:
+        raise ValueError("not a raw sample archive")
+    if version != VERSION:
+        raise ValueError(f"unsupported raw archive version {version}")
+    return stride, rate, committed
+
+
+def read_index(path, committed):
+    """Index entries of the first ``committed`` samples
+
+    Entries written for an append that never committed, and a torn trailing
+    record, are left out: only the leading run of increasing positions below
+    ``committed`` is kept.
+    """
+    try:
+        with open(index_path(path), "rb") as f:
+            raw = f.read()
+    except FileNotFoundError:
+        return np.empty(0, dtype=INDEX_DTYPE)
+    entries = np.frombuffer(raw, dtype=INDEX_DTYPE, count=len(raw) // INDEX_DTYPE.itemsize)
+    valid = entries["sample"] < committed
+    valid[1:] &= np.diff(entries["sample"].astype(np.int64)) > 0
+    return entries[:int(np.argmin(valid)) if not valid.all() else len(entries)].copy()
+
+
+def _time_of(index, rate, samples):
+    """Host time of sample positions, extrapolated from the nearest index entry at or before each"""
+    samples = np.asarray(samples)
+    if not len(index):
+        return np.full(samples.shape, np.nan)
+    k = np.maximum(np.searchsorted(index["sample"], samples, "right") - 1, 0)
+    return index["ts"][k] + (samples - index["sample"][k].astype(np.int64)) / rate
+
+
+def _sample_at(index, rate, ts, committed):
+    """First sample position at or after host time ``ts``"""
+    if not len(index):
+        return 0
+    k = max(int(np.searchsorted(index["ts"], ts, "right")) - 1, 0)
+    pos = int(index["sample"][k]) + int(np.ceil((ts - index["ts"][k]) * rate - 1e-9))
+    # Between two entries the position is bounded by the next one (a gap in the recording)
+    if k + 1 < len(index):
+        pos = min(pos, int(index["sample"][k + 1]))
+    return min(max(pos, 0), committed)
+
+
+class RawArchiveWriter:
+    """Append samples to a recording, creating it or resuming after the last committed sample"""
+
+    def __init__(self, path, sample_rate=SAMPLE_RATE_HZ, index_stride=INDEX_STRIDE, gap_tolerance=0.5,
+                 durable=True):
+        self.path = path
+        self.gap_tolerance = gap_tolerance
+        self.durable = durable
+        exists = os.path.exists(path) and os.path.getsize(path) >= HEADER.size
+        self._data = open(path, "r+b" if exists else "w+b")
+        self._index = open(index_path(path), "r+b" if exists and os.path.exists(index_path(path)) else "w+b")
+        if exists:
+            self.index_stride, self.sample_rate, self.committed = read_header(self._data)
+            self._recover()
+        else:
+            self.index_stride, self.sample_rate, self.committed = index_stride, float(sample_rate), 0
+            self._data.write(HEADER.pack(MAGIC, VERSION, self.index_stride, self.sample_rate, 0))
+            self._data.truncate(HEADER_SIZE)
+            self._sync(self._data)
+            self._last_entry = None
+
+    def _recover(self):
+        """Drop whatever an interrupted append left past the committed count"""
+        self._data.truncate(HEADER_SIZE + self.committed * SAMPLE_DTYPE.itemsize)
+        entries = read_index(self.path, self.committed)
+        self._index.truncate(entries.nbytes)
+        self._last_entry = entries[-1].copy() if len(entries) else None
+
+    def _sync(self, f):
+        f.flush()
+        if self.durable:
+            os.fsync(f.fileno())
+
+    def append(self, samples, ts=None):
+        """Append int16 samples; ``ts`` is the host time of the first one (default: continue the sample clock)"""
+        samples = np.ascontiguousarray(samples, dtype=SAMPLE_DTYPE)
+        n = len(samples)
+        if n == 0:
+            return self.committed
+        first = self.committed
+        entries = []
+        if self._last_entry is not None:
+            expected = self._last_entry["ts"] + (first - int(self._last_entry["sample"])) / self.sample_rate
+        else:
+            expected = None
+        if ts is None:
+            ts = time.time() if expected is None else expected
+        if expected is None or abs(ts - expected) > self.gap_tolerance:
+            entries.append((first, ts))
+        else:
+            ts = expected
+        # Stride entries keep every extrapolation short
+        last = entries[-1][0] if entries else int(self._last_entry["sample"])
+        for pos in range(last + self.index_stride, first + n, self.index_stride):
+            entries.append((pos, ts + (pos - first) / self.sample_rate))
+
+        self._data.seek(HEADER_SIZE + first * SAMPLE_DTYPE.itemsize)
+        self._data.write(samples.data)
+        self._sync(self._data)
+        if entries:
+            entries = np.array(entries, dtype=INDEX_DTYPE)
+            self._index.seek(0, os.SEEK_END)
+            self._index.write(entries.tobytes())
+            self._sync(self._index)
+            self._last_entry = entries[-1].copy()
+        # The commit point: one 8-byte write of the new sample count
+        self.committed = first + n
+        self._data.seek(COMMITTED_OFFSET)
+        self._data.write(COMMITTED.pack(self.committed))
+        self._sync(self._data)
+        return self.committed
+
+    def close(self):
+        self._data.close()
+        self._index.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class RawArchive:
+    """Read-only, zero-copy access to a recording (call ``refresh`` to see samples appended since)"""
+
+    def __init__(self, path):
+        self.path = path
+        self._samples = None
+        self.committed = -1
+        self.refresh()
+
+    def refresh(self):
+        with open(self.path, "rb") as f:
+            self.index_stride, self.sample_rate, committed = read_header(f)
+        if committed != self.committed:
+            self.committed = committed
+            self._samples = (np.memmap(self.path, dtype=SAMPLE_DTYPE, mode="r", offset=HEADER_SIZE,
+                                       shape=(committed,)) if committed else np.empty(0, dtype=SAMPLE_DTYPE))
+            self.index = read_index(self.path, committed)
+        return self
+
+    @property
+    def samples(self):
+        return self._samples
+
+    def __len__(self):
+        return self.committed
+
+    @property
+    def start_time(self):
+        return float(self.index["ts"][0]) if len(self.index) else None
+
+    @property
+    def end_time(self):
+        return float(self.time_of(self.committed)) if len(self.index) else None
+
+    def time_of(self, sample):
+        """Host time of a sample position (or array of positions)"""
+        return _time_of(self.index, self.sample_rate, sample)
+
+    def sample_at(self, ts):
+        """First sample position at or after host time ``ts``"""
+        return _sample_at(self.index, self.sample_rate, ts, self.committed)
+
+    def time_range(self, start_ts, end_ts):
+        """Samples with ``start_ts <= time < end_ts`` as a view"""
+        return self._samples[self.sample_at(start_ts):self.sample_at(end_ts)]
+
+    @property
+    def n_windows(self):
+        return self.committed // FFT_SIZE
+
+    def window(self, i, size=FFT_SIZE):
+        """The ``i``-th analysis window (as ``runDetection`` consumes them) as a view"""
+        if not 0 <= i < self.committed // size:
+            raise IndexError(f"window {i} out of range")
+        return self._samples[i * size:(i + 1) * size]
+
+    def windows(self, start=0, stop=None, hop=FFT_SIZE, size=FFT_SIZE):
+        """Windows over samples ``start:stop`` as an ``(n, size)`` strided view"""
+        return sample_windows(self._samples[start:stop], hop=hop, size=size)
+
+    def close(self):
+        self._samples = None
+
+
+def compact(path, out=None, start_ts=None, end_ts=None):
+    """Rewrite a recording with only its committed samples (optionally a time range) and a minimal index
+
+    Writes to ``out`` or, by default, replaces ``path`` through a temporary file.
+    """
+    src = RawArchive(path)
+    lo = 0 if start_ts is None else src.sample_at(start_ts)
+    hi = src.committed if end_ts is None else src.sample_at(end_ts)
+    target = out or path + ".compact"
+    for p in (target, index_path(target)):
+        if os.path.exists(p):
+            os.remove(p)
+    # Keep the entries where the host clock jumped; the writer adds the stride entries again
+    idx = src.index
+    predicted = idx["ts"][:-1] + (idx["sample"][1:] - idx["sample"][:-1]) / src.sample_rate
+    jumps = idx["sample"][1:][np.abs(idx["ts"][1:] - predicted) > 1e-6].tolist()
+    breaks = [lo] + [s for s in jumps if lo < s < hi] + [hi]
+    with RawArchiveWriter(target, src.sample_rate, src.index_stride, gap_tolerance=1e-6, durable=False) as dst:
+        for a, b in zip(breaks[:-1], breaks[1:]):
+            for chunk in range(a, b, 1 << 20):
+                stop = min(b, chunk + (1 << 20))
+                dst.append(src.samples[chunk:stop], float(src.time_of(chunk)) if chunk == a else None)
+        os.fsync(dst._data.fileno())
+        os.fsync(dst._index.fileno())
+    src.close()
+    if out is None:
+        os.replace(index_path(target), index_path(path))
+        os.replace(target, path)
+        target = path
+    return target
+
+
+def record(port, path, baud=115200, duration=None):
+    """Append the RAW_STREAM frames read from ``port`` to ``path`` until ``duration`` seconds or Ctrl+C"""
+    import serial
+
+    from frame_protocol import FrameParser
+
+    parser = FrameParser()
+    end = None if duration is None else time.monotonic() + duration
+    with serial.serial_for_url(port, baud, timeout=0.5) as ser, RawArchiveWriter(path) as writer:
+        try:
+            while end is None or time.monotonic() < end:
+                _, samples = parser.readinto(ser)
+                if len(samples):
+                    # Frames are timestamped on arrival: the last sample was just taken
+                    writer.append(samples, time.time() - (len(samples) - 1) / writer.sample_rate)
+        except KeyboardInterrupt:
+            pass
+        print(f"{writer.committed} samples in {path}; frames: {parser.stats()}")
+
+
+def _parse_time(value):
+    return None if value is None else datetime.fromisoformat(value).timestamp()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Raw accelerometer sample archives")
+    sub = parser.add_subparsers(dest="command", required=True)
+    p = sub.add_parser("record", help="store RAW_STREAM frames from a serial port")
+    p.add_argument("port")
+    p.add_argument("path")
+    p.add_argument("--baud", type=int, default=115200)
+    p.add_argument("--duration", type=float)
+    p = sub.add_parser("info", help="print a recording's size and time span")
+    p.add_argument("path")
+    p = sub.add_parser("compact", help="drop torn appends, thin the index, optionally keep a time range")
+    p.add_argument("path")
+    p.add_argument("--out")
+    p.add_argument("--start", help="local time, e.g. '2024-05-01 10:00'")
+    p.add_argument("--end")
+    args = parser.parse_args()
+
+    if args.command == "record":
+        record(args.port, args.path, args.baud, args.duration)
+    elif args.command == "info":
+        archive = RawArchive(args.path)
+        print(f"{archive.committed} samples at {archive.sample_rate:g} Hz ({archive.committed / archive.sample_rate / 3600:.2f} h), "
+              f"{archive.n_windows} windows, {len(archive.index)} index entries")
+        if archive.start_time is not None:
+            print(f"{datetime.fromtimestamp(archive.start_time)} .. {datetime.fromtimestamp(archive.end_time)}")
+    else:
+        target = compact(args.path, args.out, _parse_time(args.start), _parse_time(args.end))
+        print(f"compacted into {target}: {RawArchive(target).committed} samples")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,443 @@
+"""Opt-in profiler for reruns of the Streamlit dashboards.
+
+Off unless the ``STM32_PROFILE`` environment variable, or the page's
+``?profile=`` query parameter, names a mode:
+
+* ``sections``: only the time spent in each named section
+* ``sample``: sections, plus the script thread's stack sampled every
+  ``SAMPLE_INTERVAL`` seconds by a background thread; cheap enough to leave
+  on while using the dashboard (``1``/``on`` choose this mode). While a
+  sampled rerun runs, the interpreter's switch interval is lowered to a tenth
+  of ``SAMPLE_INTERVAL`` so the sampler gets the GIL on time. That setting is
+  process-wide: every thread of the server, other sessions included, switches
+  more often until the last sampled rerun ends
+* ``cprofile``: sections, plus deterministic profiling of every call with
+  ``cProfile``; exact call counts, but the rerun itself runs slower
+
+A rerun is timed from ``begin()`` to ``end()``. ``mark(name)`` starts the
+next top-level section of a flat script. ``section(name)`` times a block, or
+a function when used as a decorator. ``run(name, mode)`` wraps a fragment:
+it is a section of the page when the fragment runs inside it, and a rerun of
+its own when the fragment refreshes alone. With profiling off every call
+returns after one thread-local lookup.
+
+The last ``HISTORY`` reruns are kept in memory and appended to
+``<dir>/reruns.jsonl``. Every ``DUMP_SECONDS`` at most, each script's folded
+stacks (``a;b;c weight`` lines, read by flamegraph.pl, inferno and
+speedscope) are written to ``<dir>/<name>.sections.folded`` (microseconds)
+and, in sample mode, ``<dir>/<name>.samples.folded`` (samples); cProfile
+statistics go to ``<dir>/<name>.prof`` for pstats or snakeviz.
+
+Comparing two histories section by section shows where a rerun got slower:
+
+    python rerun_profiler.py profiles/reruns.jsonl --baseline before.jsonl
+"""
+import argparse
+import collections
+import contextlib
+import cProfile
+import functools
+import json
+import os
+import pstats
+import random
+import sys
+import threading
+import time
+
+MODES = ("sections", "sample", "cprofile")
+PROFILE_DIR = os.environ.get("STM32_PROFILE_DIR", "profiles")
+# Reruns kept in memory for the dashboard's profile panel
+HISTORY = 500
+SAMPLE_INTERVAL = 0.005
+DUMP_SECONDS = 5.0
+# A sampled thread still running its rerun after this long was cut short and reused
+STALE_SECONDS = 60.0
+# The sampler thread waits this long for the next sampled rerun before exiting
+IDLE_SECONDS = 10.0
+
+
+def requested_mode(query=None):
+    """Mode asked for by the ``profile`` query parameter, else by ``STM32_PROFILE``; ``None`` when off"""
+    value = (query if query is not None else os.environ.get("STM32_PROFILE", "")).strip().lower()
+    if value in ("", "0", "off", "false", "no"):
+        return None
+    if value in ("1", "on", "true", "yes"):
+        return "sample"
+    if value not in MODES:
+        print(f"Unknown profile mode {value!r}, timing sections only")
+        return "sections"
+    return value
+
+
+def _percentile(values, q):
+    """Nearest-rank percentile of an already sorted list"""
+    return values[min(len(values) - 1, max(0, int(round(q / 100.0 * (len(values) - 1)))))]
+
+
+def summarize(records):
+    """One row per section of complete ``records``: count, p50, p99 and mean in seconds, share of the rerun"""
+    times = collections.defaultdict(list)
+    for record in records:
+        if record["interrupted"]:
+            continue
+        times[""].append(record["seconds"])
+        for path, seconds in record["sections"].items():
+            times[path].append(seconds)
+    total = sum(times[""])
+    rows = []
+    for path, values in times.items():
+        values.sort()
+        rows.append({
+            "section": path or "(rerun)",
+            "count": len(values),
+            "p50": _percentile(values, 50),
+            "p99": _percentile(values, 99),
+            "mean": sum(values) / len(values),
+            "share": sum(values) / total if total else 0.0,
+        })
+    rows.sort(key=lambda row: -row["share"])
+    return rows
+
+
+def folded_text(folded):
+    """``{stack: weight}`` as folded-stack lines, heaviest first"""
+    return "".join(f"{stack} {weight}\n" for stack, weight in sorted(folded.items(), key=lambda kv: -kv[1]) if weight > 0)
+
+
+class Rerun:
+    """Timings of one rerun in progress"""
+
+    def __init__(self, name, mode, depth):
+        self.name = name
+        self.mode = mode
+        # Frames below the script's own are Streamlit's; samples leave them out
+        self.depth = depth
+        self.wall = time.time()
+        self.start = time.perf_counter()
+        self.stack = []
+        self.marked = False
+        # Path of the innermost open section, read by the sampler thread
+        self.path = (name,)
+        self.totals = collections.defaultdict(float)
+        self.samples = collections.Counter()
+        self.cprofile = None
+
+    def push(self, name):
+        self.stack.append(time.perf_counter())
+        self.path = self.path + (name,)
+
+    def pop(self):
+        self.totals[self.path] += time.perf_counter() - self.stack.pop()
+        self.path = self.path[:-1]
+
+    def folded(self):
+        """Self time of every section path in microseconds, as folded stacks"""
+        children = collections.defaultdict(float)
+        for path, seconds in self.totals.items():
+            if len(path) > 1:
+                children[path[:-1]] += seconds
+        return {";".join(path): max(0, int((seconds - children[path]) * 1e6)) for path, seconds in self.totals.items()}
+
+
+class _Section:
+    """``RerunProfiler.section()``: a context manager, or a decorator timing every call"""
+
+    __slots__ = ("profiler", "name", "run")
+
+    def __init__(self, profiler, name):
+        self.profiler = profiler
+        self.name = name
+        self.run = None
+
+    def __enter__(self):
+        run = self.run = self.profiler.current()
+        if run is not None:
+            run.push(self.name)
+        return self
+
+    def __exit__(self, *exc):
+        run = self.run
+        # A section opened on a rerun that has since been replaced is not closed on the new one
+        if run is not None and self.profiler.current() is run and run.stack:
+            run.pop()
+
+    def __call__(self, function):
+        profiler, name = self.profiler, self.name
+
+        @functools.wraps(function)
+        def timed(*args, **kwargs):
+            if profiler.current() is None:
+                return function(*args, **kwargs)
+            with _Section(profiler, name):
+                return function(*args, **kwargs)
+        return timed
+
+
+class RerunProfiler:
+    def __init__(self, history=HISTORY, directory=PROFILE_DIR, interval=SAMPLE_INTERVAL):
+        self.history = collections.deque(maxlen=history)
+        self.directory = directory
+        self.interval = interval
+        self.count = 0
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._sampled = {}
+        self._sampler = None
+        self._switch_interval = None
+        self._sections = collections.defaultdict(collections.Counter)
+        self._samples = collections.defaultdict(collections.Counter)
+        self._stats = {}
+        self._dumped = time.monotonic()
+        self._history_file = None
+
+    def current(self):
+        """The rerun being timed on this thread, if any"""
+        return getattr(self._local, "run", None)
+
+    def begin(self, name, mode, frame=None):
+        """Start timing a rerun of ``name`` on this thread; nothing happens when ``mode`` is ``None``"""
+        stale = self.current()
+        if stale is not None:
+            # st.rerun() and st.stop() end a script early, before it reaches end()
+            self._finish(stale, interrupted=True)
+        if mode is None:
+            return None
+        depth = 0
+        frame = frame or sys._getframe(1)
+        while frame is not None:
+            depth += 1
+            frame = frame.f_back
+        run = self._local.run = Rerun(name, mode, depth)
+        if mode == "cprofile":
+            run.cprofile = cProfile.Profile()
+            try:
+                run.cprofile.enable()
+            except ValueError:
+                # Another session is being profiled and this Python allows one profiler at a time
+                run.cprofile = None
+        elif mode == "sample":
+            with self._lock:
+                if not self._sampled:
+                    # The sampler needs the GIL to read a stack. With the default 5 ms switch
+                    # interval it only gets it once the script releases it for I/O, and the
+                    # samples then pile up at a fixed offset from the end of each rerun
+                    self._switch_interval = sys.getswitchinterval()
+                    sys.setswitchinterval(min(self._switch_interval, self.interval / 10))
+                self._sampled[threading.get_ident()] = run
+                if self._sampler is None:
+                    self._sampler = threading.Thread(target=self._sample_loop, name="rerun-sampler", daemon=True)
+                    self._sampler.start()
+        return run
+
+    def end(self):
+        """Finish this thread's rerun, keep it in the history and write the profiles when due"""
+        run = self.current()
+        if run is not None:
+            self._finish(run)
+
+    def mark(self, name):
+        """Close the previous top-level section of the rerun and open ``name``"""
+        run = self.current()
+        if run is None:
+            return
+        if run.marked and len(run.stack) == 1:
+            run.pop()
+        run.push(name)
+        run.marked = len(run.stack) == 1
+
+    def section(self, name):
+        """Time a block, or a function when used as a decorator, as ``name`` inside the open section"""
+        return _Section(self, name)
+
+    @contextlib.contextmanager
+    def run(self, name, mode):
+        """A fragment: a section of the rerun in progress, otherwise a rerun of its own"""
+        if self.current() is not None or mode is None:
+            with self.section(name):
+                yield
+            return
+        run = self.begin(name, mode, sys._getframe(2))
+        try:
+            yield
+        finally:
+            if self.current() is run:
+                self._finish(run)
+
+    def _finish(self, run, interrupted=False):
+        self._local.run = None
+        if run.cprofile is not None:
+            run.cprofile.disable()
+        seconds = time.perf_counter() - run.start
+        while run.stack:
+            run.pop()
+        run.totals[(run.name,)] = seconds
+        record = {
+            "name": run.name,
+            "mode": run.mode,
+            "start": run.wall,
+            "seconds": seconds,
+            "interrupted": interrupted,
+            "sections": {";".join(path[1:]): s for path, s in run.totals.items() if len(path) > 1},
+        }
+        now = time.monotonic()
+        with self._lock:
+            self._unsample(threading.get_ident(), run)
+            self.history.append(record)
+            self.count += 1
+            self._sections[run.name].update(run.folded())
+            self._samples[run.name].update(run.samples)
+            if run.cprofile is not None:
+                if run.name in self._stats:
+                    self._stats[run.name].add(run.cprofile)
+                else:
+                    self._stats[run.name] = pstats.Stats(run.cprofile)
+            due = now - self._dumped >= DUMP_SECONDS
+            if due:
+                self._dumped = now
+        self._append(record)
+        if due:
+            self.dump()
+
+    def _unsample(self, ident, run):
+        """Stop sampling ``run``; the last one restores the switch interval. Called with the lock held"""
+        if self._sampled.get(ident) is not run:
+            return
+        del self._sampled[ident]
+        if not self._sampled and self._switch_interval is not None:
+            sys.setswitchinterval(self._switch_interval)
+            self._switch_interval = None
+
+    def _sample_loop(self):
+        idle_since = time.monotonic()
+        while True:
+            # Poisson sampling: no fixed phase to lock onto a rerun that repeats at a steady period
+            time.sleep(random.expovariate(1.0 / self.interval))
+            with self._lock:
+                if not self._sampled:
+                    if time.monotonic() - idle_since > IDLE_SECONDS:
+                        self._sampler = None
+                        return
+                    continue
+                runs = list(self._sampled.items())
+            idle_since = time.monotonic()
+            frames = sys._current_frames()
+            now = time.perf_counter()
+            for ident, run in runs:
+                frame = frames.get(ident)
+                if frame is None or now - run.start > STALE_SECONDS:
+                    # The script thread is gone, or moved on without ending this rerun
+                    with self._lock:
+                        self._unsample(ident, run)
+                    continue
+                stack = []
+                while frame is not None:
+                    stack.append(frame)
+                    frame = frame.f_back
+                stack.reverse()
+                names = [f"{os.path.basename(f.f_code.co_filename)}:{f.f_code.co_name}" for f in stack[run.depth - 1:]]
+                key = ";".join(run.path + tuple(names))
+                # _finish merges run.samples under the lock once the run is unsampled
+                with self._lock:
+                    if self._sampled.get(ident) is run:
+                        run.samples[key] += 1
+            del frames
+
+    def _append(self, record):
+        line = json.dumps(record) + "\n"
+        try:
+            with self._lock:
+                if self._history_file is None:
+                    os.makedirs(self.directory, exist_ok=True)
+                    self._history_file = open(os.path.join(self.directory, "reruns.jsonl"), "a")
+                self._history_file.write(line)
+                self._history_file.flush()
+        except OSError as e:
+            print(f"Could not record rerun profile: {e}")
+
+    # --- Queries ---
+
+    def names(self):
+        with self._lock:
+            return sorted({record["name"] for record in self.history})
+
+    def records(self, name=None):
+        """Reruns in the history, oldest first"""
+        with self._lock:
+            return [record for record in self.history if name is None or record["name"] == name]
+
+    def summary(self, name=None):
+        return summarize(self.records(name))
+
+    def folded(self, name, kind="sections"):
+        """Folded stacks of every rerun of ``name`` so far: ``"sections"`` in microseconds or ``"samples"``"""
+        with self._lock:
+            folded = dict((self._sections if kind == "sections" else self._samples)[name])
+        return folded_text(folded)
+
+    def dump(self):
+        """Write the folded stacks and cProfile statistics gathered so far"""
+        with self._lock:
+            names = set(self._sections) | set(self._samples)
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            for name in names:
+                for kind in ("sections", "samples"):
+                    text = self.folded(name, kind)
+                    if text:
+                        path = os.path.join(self.directory, f"{name}.{kind}.folded")
+                        with open(path + ".tmp", "w") as f:
+                            f.write(text)
+                        os.replace(path + ".tmp", path)
+            with self._lock:
+                for name, stats in self._stats.items():
+                    stats.dump_stats(os.path.join(self.directory, f"{name}.prof"))
+        except OSError as e:
+            print(f"Could not write rerun profiles: {e}")
+
+
+profiler = RerunProfiler()
+
+
+def load_records(path, name=None):
+    with open(path) as f:
+        records = [json.loads(line) for line in f if line.strip()]
+    return [r for r in records if name is None or r["name"] == name]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Summarise rerun profiles, optionally against a baseline")
+    parser.add_argument("history", help="reruns.jsonl written while profiling")
+    parser.add_argument("--name", default="app", help="script or fragment to summarise")
+    parser.add_argument("--baseline", help="reruns.jsonl of an earlier version to compare with")
+    parser.add_argument("--threshold", type=float, default=20.0, help="p50 increase, in percent, that counts as a regression")
+    parser.add_argument("--min-ms", type=float, default=1.0, help="ignore sections whose p50 moved less than this")
+    args = parser.parse_args()
+
+    rows = summarize(load_records(args.history, args.name))
+    if not rows:
+        print(f"No complete reruns of {args.name} in {args.history}")
+        return 1
+    before = {}
+    if args.baseline:
+        before = {row["section"]: row for row in summarize(load_records(args.baseline, args.name))}
+    print(f"{'section':<40} {'count':>6} {'p50 ms':>9} {'p99 ms':>9} {'share':>7}" + ("  p50 vs baseline" if before else ""))
+    regressions = []
+    for row in rows:
+        line = (f"{row['section']:<40} {row['count']:>6} {row['p50'] * 1000:>9.2f} {row['p99'] * 1000:>9.2f} "
+                f"{row['share'] * 100:>6.1f}%")
+        old = before.get(row["section"])
+        if old is not None:
+            change = (row["p50"] - old["p50"]) / old["p50"] * 100 if old["p50"] else 0.0
+            line += f"  {change:+.0f}%"
+            if change > args.threshold and (row["p50"] - old["p50"]) * 1000 >= args.min_ms:
+                regressions.append(row["section"])
+                line += "  REGRESSION"
+        print(line)
+    if regressions:
+        print(f"Slower than the baseline: {', '.join(regressions)}")
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
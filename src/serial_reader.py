@@ -0,0 +1,108 @@
+"""Bulk serial line reader.
+
+Instead of polling ``in_waiting``, calling ``readline()`` once and sleeping,
+the reader blocks on the port (bounded by the port timeout) until the first
+byte arrives and then drains everything that is buffered in a single read.
+Bytes are split into lines incrementally so a line cut in half between two
+reads is kept until its newline arrives.
+"""
+import time
+
+
+class LineSplitter:
+    """Split a byte stream into decoded lines, keeping partial lines across feeds"""
+
+    def __init__(self, max_line=4096):
+        self.max_line = max_line
+        self._partial = b""
+        # Lines with bytes that are not UTF-8 (noise, a wrong baud rate); they are kept without those bytes
+        self.decode_errors = 0
+
+    def feed(self, data):
+        """Return the complete lines contained in ``data`` plus any carried partial line"""
+        if self._partial:
+            data = self._partial + data
+        parts = data.split(b"\n")
+        self._partial = parts.pop()
+
+        # A runaway line without newline (wrong baud rate, binary noise) must not
+        # grow forever, so flush it as a line of its own
+        if len(self._partial) > self.max_line:
+            parts.append(self._partial)
+            self._partial = b""
+
+        lines = []
+        for raw in parts:
+            try:
+                line = raw.decode("utf-8").strip()
+            except UnicodeDecodeError:
+                self.decode_errors += 1
+                line = raw.decode("utf-8", "ignore").strip()
+            if line:
+                lines.append(line)
+        return lines
+
+    def reset(self):
+        """Drop any buffered partial line"""
+        self._partial = b""
+
+
+class SerialLineReader:
+    """Read batches of lines from an open serial port"""
+
+    def __init__(self, ser, max_read=65536, decode_time=None):
+        self.ser = ser
+        # Called with the seconds spent splitting and decoding each non-empty read
+        self.decode_time = decode_time
+        self.max_read = max_read
+        self.splitter = LineSplitter()
+        self.bytes_read = 0
+        self.lines_read = 0
+
+    @property
+    def decode_errors(self):
+        return self.splitter.decode_errors
+
+    def _consume(self, data):
+        ts = time.time()
+        self.bytes_read += len(data)
+        if not data:
+            return ts, []
+        if self.decode_time is None:
+            lines = self.splitter.feed(data)
+        else:
+            start = time.perf_counter()
+            lines = self.splitter.feed(data)
+            self.decode_time(time.perf_counter() - start)
+        self.lines_read += len(lines)
+        return ts, lines
+
+    def read_batch(self):
+        """Block until data arrives (or the port timeout), then drain everything buffered
+
+        Returns ``(receive_time, lines)``; ``lines`` is empty on timeout.
+        """
+        waiting = self.ser.in_waiting
+        # With nothing buffered, read(1) blocks for at most ser.timeout seconds
+        data = self.ser.read(max(1, min(waiting, self.max_read)))
+        if data and not waiting:
+            waiting = self.ser.in_waiting
+            if waiting:
+                data += self.ser.read(min(waiting, self.max_read))
+        return self._consume(data)
+
+    def read_available(self):
+        """Drain whatever is buffered right now without blocking"""
+        waiting = self.ser.in_waiting
+        data = self.ser.read(min(waiting, self.max_read)) if waiting else b""
+        return self._consume(data)
+
+
+def run_line_reader(ser, on_batch, should_stop):
+    """Feed every non-empty batch of lines to ``on_batch(ts, lines)`` until ``should_stop()``"""
+    reader = SerialLineReader(ser)
+    while not should_stop():
+        ts, lines = reader.read_batch()
+        if lines:
+            on_batch(ts, lines)
+    return reader
@@ -0,0 +1,314 @@
+"""Online statistics of a monitoring session, updated per parsed event batch.
+
+``SessionStats`` keeps, in constant memory and constant time per event:
+
+* counts per kind
+* events per minute over sliding windows (1, 5, 15 and 60 minutes), from a
+  ring of per-bucket counts per window
+* running mean, variance, min and max (Welford) of the T and D magnitudes
+  of "No movement disorder detected (T: ..., D: ...)" lines
+* histograms of the frequencies of tremor and dyskinesia verdicts, one bin
+  per FFT bin (``SAMPLE_RATE_HZ / FFT_SIZE`` wide), which is all the
+  resolution the firmware has
+* the time of the last event of each kind
+
+Everything is mergeable: ``merge`` combines the statistics of two devices or
+two sessions as if one object had seen both streams. ``to_dict`` and
+``from_dict`` round-trip through JSON, so finished sessions can be summed up
+on disk (``load_stats`` / ``save_stats``).
+
+``update`` is called by the reader thread and ``snapshot`` by dashboard
+reruns; a lock keeps them apart, and a snapshot copies a few hundred numbers.
+"""
+import json
+import math
+import os
+import threading
+import time
+
+import numpy as np
+
+from detection import FFT_SIZE, SAMPLE_RATE_HZ
+from line_parser import KIND_DYSKINESIA, KIND_NAMES, KIND_NORMAL, KIND_TREMOR
+
+# (label, span in seconds, buckets): events per minute over each span
+RATE_WINDOWS = (("1 min", 60, 60), ("5 min", 300, 60), ("15 min", 900, 60), ("60 min", 3600, 60))
+FREQ_BIN_HZ = SAMPLE_RATE_HZ / FFT_SIZE
+FREQ_BINS = 32              # 0-13 Hz; frequencies above go into the last bin
+HISTOGRAM_KINDS = (KIND_TREMOR, KIND_DYSKINESIA)
+
+
+class RateWindow:
+    """Event counts per kind over the last ``span`` seconds, in ``buckets`` ring slots"""
+
+    def __init__(self, span=60, buckets=60):
+        self.span = span
+        self.buckets = buckets
+        self.width = span / buckets
+        self.counts = np.zeros((buckets, len(KIND_NAMES)), dtype=np.int64)
+        self.head = None        # absolute bucket number of the newest slot
+
+    def _advance(self, bucket):
+        if self.head is None:
+            self.head = bucket
+            return
+        if bucket <= self.head:
+            return
+        if bucket - self.head >= self.buckets:
+            self.counts[:] = 0
+        else:
+            for b in range(self.head + 1, bucket + 1):
+                self.counts[b % self.buckets] = 0
+        self.head = bucket
+
+    def add(self, ts, kinds):
+        """Count events of ``kinds`` received at ``ts`` (a scalar or one per event)"""
+        if not len(kinds):
+            return
+        buckets = np.floor_divide(ts, self.width).astype(np.int64)
+        if buckets.ndim == 0:
+            # A reader batch shares one receive time
+            bucket = int(buckets)
+            self._advance(bucket)
+            if bucket > self.head - self.buckets:
+                self.counts[bucket % self.buckets] += np.bincount(kinds, minlength=len(KIND_NAMES))
+            return
+        self._advance(int(buckets.max()))
+        # Late events still inside the window go to their own slot; older ones are not counted
+        keep = buckets > self.head - self.buckets
+        np.add.at(self.counts, (buckets[keep] % self.buckets, kinds[keep]), 1)
+
+    def per_minute(self, now):
+        """Events per minute of each kind over the window ending at ``now``"""
+        if self.head is None:
+            return np.zeros(len(KIND_NAMES))
+        self._advance(int(now // self.width))
+        return self.counts.sum(axis=0) * (60.0 / self.span)
+
+    def merge(self, other):
+        if (other.span, other.buckets) != (self.span, self.buckets):
+            raise ValueError("rate windows of different shapes cannot be merged")
+        if other.head is None:
+            return
+        counts = other.counts.copy()
+        if self.head is not None and other.head < self.head:
+            # The other ring's oldest slots have left our window
+            for b in range(other.head + 1, min(self.head, other.head + self.buckets) + 1):
+                counts[b % self.buckets] = 0
+        else:
+            self._advance(other.head)
+        self.counts += counts
+
+    def to_dict(self):
+        return {"span": self.span, "buckets": self.buckets, "head": self.head, "counts": self.counts.tolist()}
+
+    @classmethod
+    def from_dict(cls, d):
+        window = cls(d["span"], d["buckets"])
+        window.head = d["head"]
+        window.counts[:] = d["counts"]
+        return window
+
+
+class RunningMoments:
+    """Welford mean and variance with min and max; non-finite values are skipped"""
+
+    def __init__(self):
+        self.n = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+        self.min = math.inf
+        self.max = -math.inf
+
+    def add(self, values):
+        values = np.asarray(values, dtype=np.float64)
+        values = values[np.isfinite(values)]
+        if not len(values):
+            return
+        if len(values) == 1:
+            x = float(values[0])
+            self.n += 1
+            delta = x - self.mean
+            self.mean += delta / self.n
+            self.m2 += delta * (x - self.mean)
+            self.min = min(self.min, x)
+            self.max = max(self.max, x)
+            return
+        # A batch is reduced on its own and then merged in
+        batch = RunningMoments()
+        batch.n = len(values)
+        batch.mean = float(values.mean())
+        batch.m2 = float(((values - batch.mean) ** 2).sum())
+        batch.min = float(values.min())
+        batch.max = float(values.max())
+        self.merge(batch)
+
+    def merge(self, other):
+        """Chan et al.'s pairwise combination of two sets of moments"""
+        if not other.n:
+            return
+        n = self.n + other.n
+        delta = other.mean - self.mean
+        self.mean += delta * other.n / n
+        self.m2 += other.m2 + delta * delta * self.n * other.n / n
+        self.n = n
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+
+    @property
+    def variance(self):
+        return self.m2 / (self.n - 1) if self.n > 1 else float("nan")
+
+    @property
+    def std(self):
+        return math.sqrt(self.variance) if self.n > 1 else float("nan")
+
+    def summary(self):
+        if not self.n:
+            return {"n": 0, "mean": None, "std": None, "min": None, "max": None}
+        return {"n": self.n, "mean": self.mean, "std": self.std if self.n > 1 else None,
+                "min": self.min, "max": self.max}
+
+    def to_dict(self):
+        return {"n": self.n, "mean": self.mean, "m2": self.m2,
+                "min": self.min if self.n else None, "max": self.max if self.n else None}
+
+    @classmethod
+    def from_dict(cls, d):
+        moments = cls()
+        moments.n, moments.mean, moments.m2 = d["n"], d["mean"], d["m2"]
+        if moments.n:
+            moments.min, moments.max = d["min"], d["max"]
+        return moments
+
+
+class SessionStats:
+    """Counts, sliding rates, magnitude moments and frequency histograms of a stream of event records"""
+
+    def __init__(self, rate_windows=RATE_WINDOWS, freq_bins=FREQ_BINS, freq_bin_hz=FREQ_BIN_HZ):
+        self.rate_labels = [label for label, _, _ in rate_windows]
+        self.rates = [RateWindow(span, buckets) for _, span, buckets in rate_windows]
+        self.freq_bin_hz = freq_bin_hz
+        self.counts = np.zeros(len(KIND_NAMES), dtype=np.int64)
+        self.last_ts = np.full(len(KIND_NAMES), np.nan)
+        self.first_ts = None
+        self.tremor_mag = RunningMoments()
+        self.dysk_mag = RunningMoments()
+        # One row per HISTOGRAM_KINDS entry; bin k is centred on k * freq_bin_hz
+        self.freq_hist = np.zeros((len(HISTOGRAM_KINDS), freq_bins), dtype=np.int64)
+        self._lock = threading.Lock()
+
+    def update(self, records):
+        """Add a batch of ``line_parser.EVENT_DTYPE`` records"""
+        if not len(records):
+            return
+        kinds = records["kind"]
+        ts = records["ts"]
+        with self._lock:
+            self.counts += np.bincount(kinds, minlength=len(KIND_NAMES))
+            # Reader batches share one receive time; parse_lines fills the column with it
+            batch_ts = ts[0] if ts[0] == ts[-1] else ts
+            for window in self.rates:
+                window.add(batch_ts, kinds)
+            if self.first_ts is None:
+                self.first_ts = float(ts.min())
+            for kind in np.unique(kinds).tolist():
+                self.last_ts[kind] = np.fmax(self.last_ts[kind], ts[kinds == kind].max())
+
+            normal = kinds == KIND_NORMAL
+            if normal.any():
+                self.tremor_mag.add(records["tremor_mag"][normal])
+                self.dysk_mag.add(records["dysk_mag"][normal])
+            for row, kind in enumerate(HISTOGRAM_KINDS):
+                freqs = records["freq"][kinds == kind]
+                freqs = freqs[np.isfinite(freqs)]
+                if len(freqs):
+                    bins = np.clip(np.rint(freqs / self.freq_bin_hz), 0, self.freq_hist.shape[1] - 1).astype(np.intp)
+                    self.freq_hist[row] += np.bincount(bins, minlength=self.freq_hist.shape[1])
+
+    def merge(self, other):
+        """Fold in the statistics of another device or session"""
+        if other.rate_labels != self.rate_labels or other.freq_hist.shape != self.freq_hist.shape:
+            raise ValueError("session statistics with different windows or bins cannot be merged")
+        # Copy ``other`` under its own lock first: holding both locks would deadlock on
+        # ``x.merge(x)`` and on ``a.merge(b)`` racing ``b.merge(a)``
+        other = SessionStats.from_dict(other.to_dict())
+        with self._lock:
+            self.counts += other.counts
+            self.last_ts = np.fmax(self.last_ts, other.last_ts)
+            if other.first_ts is not None:
+                self.first_ts = other.first_ts if self.first_ts is None else min(self.first_ts, other.first_ts)
+            for mine, theirs in zip(self.rates, other.rates):
+                mine.merge(theirs)
+            self.tremor_mag.merge(other.tremor_mag)
+            self.dysk_mag.merge(other.dysk_mag)
+            self.freq_hist += other.freq_hist
+        return self
+
+    @classmethod
+    def merged(cls, stats):
+        total = cls()
+        for s in stats:
+            total.merge(s)
+        return total
+
+    def snapshot(self, now=None):
+        """Plain numbers for rendering; rates and ages are as of ``now`` (default: the current time)"""
+        now = time.time() if now is None else now
+        with self._lock:
+            rates = {label: dict(zip(KIND_NAMES, window.per_minute(now).tolist()))
+                     for label, window in zip(self.rate_labels, self.rates)}
+            since_last = {name: (None if np.isnan(ts) else max(0.0, now - float(ts)))
+                          for name, ts in zip(KIND_NAMES, self.last_ts)}
+            return {
+                "counts": dict(zip(KIND_NAMES, self.counts.tolist())),
+                "rates_per_min": rates,
+                "since_last": since_last,
+                "duration": None if self.first_ts is None else max(0.0, now - self.first_ts),
+                "tremor_mag": self.tremor_mag.summary(),
+                "dysk_mag": self.dysk_mag.summary(),
+                "freq_bins_hz": (np.arange(self.freq_hist.shape[1]) * self.freq_bin_hz).tolist(),
+                "freq_hist": {KIND_NAMES[kind]: self.freq_hist[row].tolist()
+                              for row, kind in enumerate(HISTOGRAM_KINDS)},
+            }
+
+    def to_dict(self):
+        with self._lock:
+            return {
+                "counts": self.counts.tolist(),
+                "last_ts": [None if np.isnan(ts) else float(ts) for ts in self.last_ts],
+                "first_ts": self.first_ts,
+                "rates": {label: window.to_dict() for label, window in zip(self.rate_labels, self.rates)},
+                "tremor_mag": self.tremor_mag.to_dict(),
+                "dysk_mag": self.dysk_mag.to_dict(),
+                "freq_bin_hz": self.freq_bin_hz,
+                "freq_hist": self.freq_hist.tolist(),
+            }
+
+    @classmethod
+    def from_dict(cls, d):
+        windows = [(label, w["span"], w["buckets"]) for label, w in d["rates"].items()]
+        stats = cls(windows, len(d["freq_hist"][0]), d["freq_bin_hz"])
+        stats.counts[:] = d["counts"]
+        stats.last_ts[:] = [np.nan if ts is None else ts for ts in d["last_ts"]]
+        stats.first_ts = d["first_ts"]
+        stats.rates = [RateWindow.from_dict(w) for w in d["rates"].values()]
+        stats.tremor_mag = RunningMoments.from_dict(d["tremor_mag"])
+        stats.dysk_mag = RunningMoments.from_dict(d["dysk_mag"])
+        stats.freq_hist[:] = d["freq_hist"]
+        return stats
+
+
+def load_stats(path):
+    """Statistics saved by ``save_stats``, or empty ones if there are none yet"""
+    if not os.path.exists(path):
+        return SessionStats()
+    with open(path) as f:
+        return SessionStats.from_dict(json.load(f))
+
+
+def save_stats(path, stats):
+    tmp = path + ".tmp"
+    with open(tmp, "w") as f:
+        json.dump(stats.to_dict(), f)
+    os.replace(tmp, path)
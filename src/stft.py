@@ -0,0 +1,147 @@
+"""Streaming sliding-window spectrogram for raw accelerometer samples.
+
+The firmware analyses one 256-sample window, sleeps a second and starts over,
+so events between windows are never seen. ``StreamingSTFT`` instead runs the
+same analysis every ``hop`` samples over overlapping windows:
+
+* input goes into a fixed-size buffer, so memory does not grow with the stream
+* every window that completes during one ``push`` is transformed in a single
+  batched FFT using the precomputed window
+* each hop yields the firmware's verdict fields plus tremor and dyskinesia
+  band powers, and its spectrum is kept in a bounded ring for display
+
+Output lags the newest sample by at most ``hop`` samples plus compute time.
+"""
+import numpy as np
+
+import detection
+from detection import FFT_SIZE, SAMPLE_RATE_HZ
+
+# Per-hop output: window end position, band powers and the detection fields
+HOP_DTYPE = np.dtype([
+    ("sample", np.int64),
+    ("tremor_power", np.float32),
+    ("dysk_power", np.float32),
+] + [(name, detection.DETECTION_DTYPE.fields[name][0]) for name in detection.DETECTION_DTYPE.names])
+
+
+def power_bins(lo_hz, hi_hz, n_fft=FFT_SIZE, fs=SAMPLE_RATE_HZ):
+    """Bins fully inside a band, as ``process_window`` in signal.cpp picks them"""
+    bin_width = fs / n_fft
+    return int(np.ceil(lo_hz / bin_width)), int(np.floor(hi_hz / bin_width))
+
+
+class SpectrogramRing:
+    """The last ``rows`` spectra of a stream, oldest first on read"""
+
+    def __init__(self, rows, n_bins):
+        self._data = np.zeros((rows, n_bins), dtype=np.float32)
+        self._samples = np.full(rows, -1, dtype=np.int64)
+        self._next = 0
+        self.count = 0
+
+    def extend(self, samples, spectra):
+        rows = len(self._data)
+        if len(spectra) >= rows:
+            samples, spectra = samples[-rows:], spectra[-rows:]
+        idx = (self._next + np.arange(len(spectra))) % rows
+        self._data[idx] = spectra
+        self._samples[idx] = samples
+        self._next = (self._next + len(spectra)) % rows
+        self.count = min(rows, self.count + len(spectra))
+
+    def snapshot(self):
+        """``(sample_positions, spectra)`` copies, oldest row first"""
+        rows = len(self._data)
+        order = (self._next - self.count + np.arange(self.count)) % rows
+        return self._samples[order], self._data[order]
+
+
+class StreamingSTFT:
+    """Overlapping-window detection over a continuous sample stream"""
+
+    def __init__(self, n_fft=FFT_SIZE, hop=32, fs=SAMPLE_RATE_HZ, max_freq_hz=20.0,
+                 history=512, block=None):
+        if not 0 < hop <= n_fft:
+            raise ValueError("hop must be between 1 and n_fft")
+        self.n_fft = n_fft
+        self.hop = hop
+        self.fs = fs
+        self.window = detection.HANN if n_fft == FFT_SIZE else detection.hann_window(n_fft)
+        self.tremor_bins = power_bins(3.0, 5.0, n_fft, fs)
+        self.dysk_bins = power_bins(5.0, 7.0, n_fft, fs)
+        self.n_bins = min(n_fft // 2, int(max_freq_hz * n_fft / fs) + 1)
+        self.spectrogram = SpectrogramRing(history, self.n_bins)
+
+        # Room for one window plus ``block`` new samples; longer pushes are sliced
+        self.block = block or 4 * n_fft
+        self._buf = np.zeros(n_fft + self.block, dtype=np.float32)
+        self._fill = 0
+        self._base = 0  # stream position of _buf[0]
+        self._next = 0  # buffer offset where the next window starts
+
+    @property
+    def overlap(self):
+        return 1.0 - self.hop / self.n_fft
+
+    @property
+    def latency_s(self):
+        """Worst-case delay between a sample arriving and the hop that covers it"""
+        return self.hop / self.fs
+
+    def push(self, samples):
+        """Add samples; returns a ``HOP_DTYPE`` array with one row per completed hop"""
+        samples = np.asarray(samples)
+        out = []
+        for start in range(0, len(samples), self.block):
+            out.append(self._push_block(samples[start:start + self.block]))
+        if len(out) == 1:
+            return out[0]
+        return np.concatenate(out) if out else np.empty(0, dtype=HOP_DTYPE)
+
+    def _push_block(self, samples):
+        n = len(samples)
+        self._buf[self._fill:self._fill + n] = samples
+        self._fill += n
+
+        n_frames = 0
+        if self._fill - self._next >= self.n_fft:
+            n_frames = (self._fill - self._next - self.n_fft) // self.hop + 1
+        if n_frames == 0:
+            self._discard()
+            return np.empty(0, dtype=HOP_DTYPE)
+
+        windows = np.lib.stride_tricks.sliding_window_view(
+            self._buf[self._next:self._fill], self.n_fft)[::self.hop][:n_frames]
+        mags = detection.magnitudes(windows, self.window)
+        ends = self._base + self._next + self.n_fft + self.hop * np.arange(n_frames, dtype=np.int64)
+
+        hops = np.empty(n_frames, dtype=HOP_DTYPE)
+        hops["sample"] = ends
+        t0, t1 = self.tremor_bins
+        d0, d1 = self.dysk_bins
+        hops["tremor_power"] = mags[:, t0:t1 + 1].sum(axis=1)
+        hops["dysk_power"] = mags[:, d0:d1 + 1].sum(axis=1)
+        verdicts = detection.classify(mags, n_fft=self.n_fft, fs=self.fs)
+        for name in detection.DETECTION_DTYPE.names:
+            hops[name] = verdicts[name]
+        self.spectrogram.extend(ends, mags[:, :self.n_bins])
+
+        self._next += n_frames * self.hop
+        self._discard()
+        return hops
+
+    def _discard(self):
+        """Drop samples no future window needs, keeping the buffer bounded"""
+        keep_from = min(self._next, self._fill)
+        if keep_from == 0:
+            return
+        remaining = self._fill - keep_from
+        self._buf[:remaining] = self._buf[keep_from:self._fill]
+        self._base += keep_from
+        self._fill = remaining
+        self._next -= keep_from
+
+    def spectrogram_hz(self):
+        """Frequencies of the spectrogram columns"""
+        return np.arange(self.n_bins) * self.fs / self.n_fft
@@ -1,27 +1,50 @@
-import streamlit as st
-import serial
-import serial.tools.list_ports
 import time
+import uuid
+
+import streamlit as st
+
+from console_view import ConsoleBuffer, render_console
+from daemon_client import DaemonClient, DaemonError, live_snapshot, spawn_daemon
+from rerun_profiler import profiler, requested_mode
+
+# The ingest daemon owns the ports; this app shows what it receives
+@st.cache_resource
+def get_client():
+    client = DaemonClient()
+    if not client.alive():
+        spawn_daemon(client.url)
+    return client
+
+# New lines come from the daemon's shared memory; whether it still reads the port is asked this often
+@st.cache_resource
+def get_live():
+    return get_client().live_state()
+
+DEVICE_CHECK_SECONDS = 1.0
+
+def forget_daemon():
+    """Drop the cached client and live block, so the next rerun starts a new daemon"""
+    get_client.clear()
+    get_live.clear()
 
 # Function to get available ports
-def get_available_ports():
-    ports = list(serial.tools.list_ports.comports())
+def get_available_ports(ports):
     port_dict = {}
     
     for port in ports:
         # Create nice display name with description
-        if port.description and port.description != "n/a":
-            display_name = f"{port.device}: {port.description}"
+        if port["description"] and port["description"] != "n/a":
+            display_name = f"{port['device']}: {port['description']}"
         else:
-            display_name = port.device
+            display_name = port["device"]
             
-        port_dict[display_name] = port.device
+        port_dict[display_name] = port["device"]
     
     return port_dict
 
 # Initialize session state
 if "serial_data" not in st.session_state:
-    st.session_state.serial_data = []
+    st.session_state.serial_data = ConsoleBuffer(max_lines=100000)
 
 if "connected" not in st.session_state:
     st.session_state.connected = False
@@ -29,20 +52,45 @@ if "connected" not in st.session_state:
 if "port" not in st.session_state:
     st.session_state.port = ""
 
+# This session's share of the daemon's reader: other tabs and dashboards may watch the same port
+if "lease" not in st.session_state:
+    st.session_state.lease = uuid.uuid4().hex
+
 # Function to clear the console
 def clear_console():
-    st.session_state.serial_data = []
+    st.session_state.serial_data.clear()
 
 # Page setup
 st.set_page_config(page_title="STM32 Monitor", layout="wide")
 st.title("📟 STM32L475 Serial Monitor")
 
+# Opt-in: STM32_PROFILE=sample|cprofile|sections, or ?profile=... on the page
+PROFILE = requested_mode(st.query_params.get("profile"))
+profiler.begin("stm32_monitor", PROFILE)
+profiler.mark("client")
+try:
+    client = get_client()
+except DaemonError as e:
+    st.error(f"The ingest daemon is not running and could not be started: {e}")
+    st.stop()
+
 # Sidebar for connection settings
+profiler.mark("sidebar")
 with st.sidebar:
     st.header("Connection Settings")
     
     # Port selection
-    port_dict = get_available_ports()
+    # Enumerated by the daemon, cached until /dev changes
+    try:
+        ports = client.ports(refresh=st.session_state.pop("refresh_ports", False))
+    except DaemonError as e:
+        forget_daemon()
+        st.error(f"Lost the ingest daemon: {e}")
+        # The rerun of the click starts a new daemon
+        st.button("Reconnect")
+        st.stop()
+    port_dict = get_available_ports(ports)
+    stlink_ports = {p["device"] for p in ports if p["stlink"]}
     
     if not port_dict:
         st.warning("No serial ports found")
@@ -51,10 +99,20 @@ with st.sidebar:
         # Look for STM32 device in ports
         stm32_port = None
         for display_name, port in port_dict.items():
-            if "STM32" in display_name or "usbmodem" in display_name:
+            if port in stlink_ports:
                 stm32_port = display_name
                 break
         
+        # Listen on every port at each candidate baud rate for firmware lines
+        if st.button("Auto-detect", use_container_width=True, disabled=st.session_state.connected):
+            with st.spinner("Listening on serial ports..."):
+                st.session_state.detected = client.probe()
+            if st.session_state.detected is None:
+                st.warning("No port is sending firmware output")
+        detected = st.session_state.get("detected")
+        if detected is not None:
+            stm32_port = next((name for name, port in port_dict.items() if port == detected[0]), stm32_port)
+        
         # Select port from dropdown
         selected_display = st.selectbox(
             "Select Port", 
@@ -63,27 +121,41 @@ with st.sidebar:
         )
         
         selected_port = port_dict[selected_display]
-        st.session_state.port = selected_port
+        # The connected port stays the one to read and release until Disconnect
+        if not st.session_state.connected:
+            st.session_state.port = selected_port
     
     # Baud rate selection
-    baud_rate = st.selectbox("Baud Rate", options=[9600, 115200, 57600, 38400, 19200, 4800])
+    # The firmware runs at 115200 unless auto-detect found otherwise
+    baud_options = [115200, 9600, 57600, 38400, 19200, 4800]
+    detected = st.session_state.get("detected")
+    baud_rate = st.selectbox("Baud Rate", options=baud_options,
+                             index=baud_options.index(detected[1]) if detected and detected[1] in baud_options else 0)
     
     # Connect/Disconnect button
     if not st.session_state.connected:
         if st.button("Connect", type="primary", use_container_width=True):
             try:
-                # Try to establish connection
-                st.session_state.ser = serial.Serial(selected_port, baud_rate, timeout=0.5)
+                # Shown from here on; the daemon shares the port with every other session watching it
+                st.session_state.cursor = live_snapshot(get_live(), limit=0).head
+                reply = client.start(selected_port, baud_rate, lease=st.session_state.lease)
+                # Lines of this port only; the daemon may be reading others for other sessions
+                st.session_state.live_id = reply["live_id"]
                 st.session_state.connected = True
-                st.session_state.serial_data.append(f"Connected to {selected_port} at {baud_rate} baud")
-            except Exception as e:
+            except DaemonError as e:
+                forget_daemon()
                 st.error(f"Cannot connect: {e}")
     else:
         if st.button("Disconnect", type="primary", use_container_width=True):
-            if hasattr(st.session_state, 'ser'):
-                st.session_state.ser.close()
+            # Only this session lets go; the daemon stops the port once no other session holds it
+            try:
+                stopped = client.stop(st.session_state.port, lease=st.session_state.lease)
+                note = "" if stopped else f" ({st.session_state.port} stays open for other sessions)"
+            except DaemonError as e:
+                forget_daemon()
+                note = f" (could not tell the daemon: {e})"
             st.session_state.connected = False
-            st.session_state.serial_data.append("Disconnected")
+            st.session_state.serial_data.extend([f"Disconnected{note}"])
     
     # Clear and refresh buttons
     col1, col2 = st.columns(2)
@@ -91,6 +163,7 @@ with st.sidebar:
         st.button("Clear Console", on_click=clear_console, use_container_width=True)
     with col2:
         if st.button("Refresh Ports", use_container_width=True):
+            st.session_state.refresh_ports = True
             st.rerun()
     
     # Connection status
@@ -100,47 +173,42 @@ with st.sidebar:
         st.warning("Not connected")
 
 # Main area for console output
+profiler.mark("console")
 st.subheader("Console Output")
-console = st.empty()
-
-# Auto scroll toggle
-auto_scroll = st.checkbox("Auto-scroll", value=True)
-
-# Display console output
-if st.session_state.serial_data:
-    console.code("\n".join(st.session_state.serial_data), language="")
-else:
-    console.info("No data yet. Please connect to start monitoring.")
 
 # Read data when connected
-if st.session_state.connected and hasattr(st.session_state, 'ser'):
+@profiler.run("poll_serial", PROFILE)
+def poll_serial():
+    if not st.session_state.connected:
+        return
     try:
-        ser = st.session_state.ser
-        if ser.in_waiting > 0:
-            raw = ser.readline()
-            if raw:
-                line = raw.decode("utf-8", "ignore").rstrip()
-                if line:
-                    st.session_state.serial_data.append(line)
-                    # Keep only last 500 lines
-                    if len(st.session_state.serial_data) > 500:
-                        st.session_state.serial_data = st.session_state.serial_data[-500:]
-                    
-                    # Update display
-                    console.code("\n".join(st.session_state.serial_data), language="")
-    except Exception as e:
-        st.error(f"Error reading serial data: {e}")
+        # Everything the daemon published since this session's last refresh
+        snap = live_snapshot(get_live(), since=st.session_state.cursor)
+        if snap.missed:
+            st.session_state.serial_data.extend([f"({snap.missed} lines skipped)"])
+        lines = snap.lines(st.session_state.live_id)
+        if lines:
+            st.session_state.serial_data.extend(lines)
+        st.session_state.cursor = snap.head
+        # At once when the daemon reports a problem
+        now = time.monotonic()
+        device = {"running": True}
+        if snap.error or not snap.connected or now - st.session_state.get("device_checked", 0.0) > DEVICE_CHECK_SECONDS:
+            st.session_state.device_checked = now
+            device = client.status()["devices"].get(st.session_state.port)
+        error = None
+        if device is None or not device["running"]:
+            error = (device or {}).get("error") or "the daemon stopped reading the port"
+    except DaemonError as e:
+        forget_daemon()
+        error = e
+    if error is not None:
+        st.session_state.serial_data.extend([f"Error reading serial data: {error}"])
         st.session_state.connected = False
-        if hasattr(st.session_state, 'ser'):
-            try:
-                st.session_state.ser.close()
-            except:
-                pass
-
-# Auto-rerun for updates
-if st.session_state.connected:
-    time.sleep(0.1)
-    st.rerun()
+        # Redraw the sidebar as disconnected
+        st.rerun()
 
-# Add a small delay to reduce CPU usage even when not connected
-time.sleep(0.1)
\ No newline at end of file
+# Only the console reruns, and only its visible page is sent; no full-page rerun loop
+render_console(st.session_state.serial_data, poll_serial, run_every=0.25, key="console",
+               label="Serial output", empty_message="No data yet. Please connect to start monitoring.")
+profiler.end()
@@ -0,0 +1,216 @@
+"""Labelled synthetic X-axis accelerometer signals to check the detectors against ground truth.
+
+Samples are what the LSM6DSL returns with ``CTRL1_XL = 0x40`` (104 Hz, +-2 g):
+int16 counts at 0.061 mg/LSB (``sensor.cpp``), clipped at the int16 limits,
+where the sensor saturates just below 2 g. A signal is a run of segments,
+each a whole number of 256-sample windows long, so every ``runDetection``
+window of a segment carries the segment's label. Every segment has:
+
+* gravity: the X component of 1 g at a random orientation (uniform in -1..1 g)
+* drift: a linear slope plus a slow wander below 0.1 Hz
+* noise: white, 10-120 LSB rms (the sensor alone gives about 11 LSB at this rate)
+
+and one kind of motion on top:
+
+* ``rest``: nothing else (label none)
+* ``voluntary``: slow arm movement at 0.2-1.5 Hz, a hard negative (label none)
+* ``tremor`` at 3-5 Hz and ``dyskinesia`` at 5-7 Hz, with slow amplitude and
+  frequency modulation
+* ``mixture``: tremor and dyskinesia at once, labelled by the stronger one
+
+Motion amplitudes are log-uniform from near the noise floor to 0.5 g, and a
+share of the motion segments is strong enough (1-2.5 g) to saturate. Centre
+frequencies keep 0.1 Hz plus the modulation depth away from the band edges,
+so every label is unambiguous in frequency; whether a detector resolves it is
+what gets measured.
+
+Each chunk of segments is computed as 2-D arrays with one row per segment,
+so hours of signal take well under a second.
+
+    python synthetic_motion.py corpus --recordings 4 --minutes 120
+"""
+import argparse
+import csv
+import os
+import time
+
+import numpy as np
+
+from detection import FFT_SIZE, SAMPLE_RATE_HZ, VERDICT_DYSKINESIA, VERDICT_NONE, VERDICT_TREMOR
+from raw_archive import RawArchiveWriter, index_path
+
+# sensor.cpp: 0.061 mg per LSB at +-2 g
+G_LSB = 1.0 / 0.000061
+INT16_MIN, INT16_MAX = -32768, 32767
+
+CONDITIONS = ("rest", "voluntary", "tremor", "dyskinesia", "mixture")
+REST, VOLUNTARY, TREMOR, DYSKINESIA, MIXTURE = range(len(CONDITIONS))
+# Share of segments per condition
+DEFAULT_MIX = (0.25, 0.1, 0.25, 0.25, 0.15)
+LABELS = ("none", "tremor", "dyskinesia")
+# 12 windows, 29.5 s
+SEGMENT_WINDOWS = 12
+# Share of motion segments driven into saturation
+SATURATING = 0.05
+# Segments computed at once: about 3 MB of float32 per array
+CHUNK_SEGMENTS = 256
+
+# One row per segment
+SEGMENT_DTYPE = np.dtype([
+    ("start", np.int64),
+    ("length", np.int32),
+    ("label", np.uint8),
+    ("condition", np.uint8),
+    ("freq", np.float32),
+    ("amp_g", np.float32),
+    ("second_freq", np.float32),
+    ("second_amp_g", np.float32),
+    ("gravity_g", np.float32),
+    ("noise_lsb", np.float32),
+    ("saturated", np.bool_),
+])
+
+
+def _band_freq(rng, lo, depth):
+    """Centre frequencies in ``[lo, lo + 2)`` Hz that stay inside the band while modulated by ``depth``"""
+    return rng.uniform(lo + 0.1 + depth, lo + 1.9 - depth)
+
+
+def _oscillation(rng, t, freq, amp_g, fm_depth):
+    """``amp_g`` sines at ``freq`` with slow frequency (by ``fm_depth`` Hz) and amplitude modulation, in g"""
+    n = len(freq)
+    fm_rate = rng.uniform(0.05, 0.3, n)[:, None]
+    am_rate = rng.uniform(0.05, 0.5, n)[:, None]
+    am_depth = rng.uniform(0.0, 0.4, n)[:, None]
+    # Instantaneous frequency freq + fm_depth * cos(2 pi fm_rate t)
+    phase = (2 * np.pi * freq[:, None] * t + (fm_depth[:, None] / fm_rate) * np.sin(2 * np.pi * fm_rate * t)
+             + rng.uniform(0, 2 * np.pi, (n, 1)))
+    envelope = amp_g[:, None] * (1.0 + am_depth * np.sin(2 * np.pi * am_rate * t + rng.uniform(0, 2 * np.pi, (n, 1))))
+    return (envelope * np.sin(phase)).astype(np.float32)
+
+
+def generate(n_segments, rng, mix=DEFAULT_MIX, segment_windows=SEGMENT_WINDOWS, start=0, fs=SAMPLE_RATE_HZ):
+    """``(samples, segments)``: int16 counts of ``n_segments`` back-to-back segments and a ``SEGMENT_DTYPE`` row each"""
+    n = n_segments
+    length = segment_windows * FFT_SIZE
+    t = (np.arange(length) / fs).astype(np.float32)[None, :]
+    condition = rng.choice(len(CONDITIONS), size=n, p=np.asarray(mix) / np.sum(mix))
+    segments = np.zeros(n, dtype=SEGMENT_DTYPE)
+    segments["start"] = start + np.arange(n, dtype=np.int64) * length
+    segments["length"] = length
+    segments["condition"] = condition
+
+    # Gravity, drift and noise, in every segment
+    gravity = rng.uniform(-1.0, 1.0, n).astype(np.float32)
+    slope = rng.uniform(-0.05, 0.05, n).astype(np.float32) / (length / fs)
+    wander = (rng.uniform(0.0, 0.05, (n, 1)) * np.sin(2 * np.pi * rng.uniform(0.01, 0.1, (n, 1)) * t
+                                                      + rng.uniform(0, 2 * np.pi, (n, 1)))).astype(np.float32)
+    x = gravity[:, None] + slope[:, None] * (t - t[0, -1] / 2) + wander
+    noise = rng.uniform(10.0, 120.0, n).astype(np.float32)
+    segments["gravity_g"] = gravity
+    segments["noise_lsb"] = noise
+
+    # The main oscillation: tremor, dyskinesia, or the stronger part of a mixture
+    mixture = condition == MIXTURE
+    primary_dysk = (condition == DYSKINESIA) | (mixture & (rng.random(n) < 0.5))
+    fm_depth = rng.uniform(0.0, 0.15, n)
+    freq = _band_freq(rng, np.where(primary_dysk, 5.0, 3.0), fm_depth)
+    amp = 10 ** rng.uniform(np.log10(0.005), np.log10(0.5), n)
+    motion = condition >= TREMOR
+    loud = motion & (rng.random(n) < SATURATING)
+    amp[loud] = rng.uniform(1.0, 2.5, int(loud.sum()))
+    voluntary = condition == VOLUNTARY
+    freq[voluntary] = rng.uniform(0.2, 1.5, int(voluntary.sum()))
+    fm_depth[voluntary] = 0.0
+    amp[voluntary] = rng.uniform(0.05, 0.5, int(voluntary.sum()))
+    amp[condition == REST] = 0.0
+    moving = amp > 0
+    if moving.any():
+        x[moving] += _oscillation(rng, t, freq[moving], amp[moving], fm_depth[moving])
+    segments["freq"] = np.where(moving, freq, 0.0)
+    segments["amp_g"] = amp
+
+    # The weaker part of a mixture, in the other band
+    if mixture.any():
+        k = int(mixture.sum())
+        depth = rng.uniform(0.0, 0.15, k)
+        second_freq = _band_freq(rng, np.where(primary_dysk[mixture], 3.0, 5.0), depth)
+        second_amp = amp[mixture] * rng.uniform(0.3, 0.8, k)
+        x[mixture] += _oscillation(rng, t, second_freq, second_amp, depth)
+        segments["second_freq"][mixture] = second_freq
+        segments["second_amp_g"][mixture] = second_amp
+
+    counts = x * np.float32(G_LSB) + rng.standard_normal((n, length), dtype=np.float32) * noise[:, None]
+    np.clip(np.rint(counts, out=counts), INT16_MIN, INT16_MAX, out=counts)
+    samples = counts.astype(np.int16)
+    segments["saturated"] = ((samples == INT16_MIN) | (samples == INT16_MAX)).any(axis=1)
+    segments["label"] = np.where(motion, np.where(primary_dysk, VERDICT_DYSKINESIA, VERDICT_TREMOR), VERDICT_NONE)
+    return samples.reshape(-1), segments
+
+
+def corpus(hours, seed=0, mix=DEFAULT_MIX, segment_windows=SEGMENT_WINDOWS, chunk=CHUNK_SEGMENTS):
+    """One continuous signal of about ``hours`` and its segments"""
+    rng = np.random.default_rng(seed)
+    length = segment_windows * FFT_SIZE
+    total = max(1, int(round(hours * 3600 * SAMPLE_RATE_HZ / length)))
+    parts, segments = [], []
+    for first in range(0, total, chunk):
+        samples, rows = generate(min(chunk, total - first), rng, mix, segment_windows, start=first * length)
+        parts.append(samples)
+        segments.append(rows)
+    return np.concatenate(parts), np.concatenate(segments)
+
+
+def segment_index(segments):
+    """Segment number of every sample of a signal made of ``segments``"""
+    return np.repeat(np.arange(len(segments)), segments["length"])
+
+
+def write_corpus(directory, recordings=4, minutes=30.0, seed=0, mix=DEFAULT_MIX):
+    """Write recordings in ``raw_archive`` format and a ``labels.csv`` of their segments; returns the CSV path"""
+    os.makedirs(directory, exist_ok=True)
+    rng = np.random.default_rng(seed)
+    length = SEGMENT_WINDOWS * FFT_SIZE
+    per_recording = max(1, int(round(minutes * 60 * SAMPLE_RATE_HZ / length)))
+    rows = []
+    for r in range(recordings):
+        name = f"synthetic{r}.raw"
+        path = os.path.join(directory, name)
+        for p in (path, index_path(path)):
+            if os.path.exists(p):
+                os.remove(p)
+        with RawArchiveWriter(path, durable=False) as writer:
+            ts = time.time()
+            for first in range(0, per_recording, CHUNK_SEGMENTS):
+                samples, segments = generate(min(CHUNK_SEGMENTS, per_recording - first), rng, mix, start=first * length)
+                writer.append(samples, ts if first == 0 else None)
+                for seg in segments:
+                    rows.append((name, round(seg["start"] / SAMPLE_RATE_HZ, 3),
+                                 round((seg["start"] + seg["length"]) / SAMPLE_RATE_HZ, 3),
+                                 LABELS[seg["label"]], CONDITIONS[seg["condition"]]))
+    labels = os.path.join(directory, "labels.csv")
+    with open(labels, "w", newline="") as f:
+        w = csv.writer(f)
+        w.writerow(("recording", "start", "end", "label", "condition"))
+        w.writerows(rows)
+    return labels
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Write a labelled synthetic accelerometer corpus")
+    parser.add_argument("directory")
+    parser.add_argument("--recordings", type=int, default=4)
+    parser.add_argument("--minutes", type=float, default=30.0, help="length of each recording")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--mix", type=float, nargs=len(CONDITIONS), default=DEFAULT_MIX,
+                        help=f"relative share of {', '.join(CONDITIONS)} segments")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    labels = write_corpus(args.directory, args.recordings, args.minutes, args.seed, args.mix)
+    print(f"{args.recordings} recordings of {args.minutes:g} min in {time.perf_counter() - start:.2f} s, "
+          f"labels in {labels}")
+
+
+if __name__ == "__main__":
+    main()
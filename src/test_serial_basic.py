@@ -1,6 +1,8 @@
 import serial
 import time
 
+from serial_reader import SerialLineReader
+
 # Replace with your actual serial port
 PORT = "/dev/cu.usbmodem11303"
 BAUD = 9600
@@ -10,14 +12,12 @@ try:
         print(f"✅ Connected to {PORT} at {BAUD} baud.")
         time.sleep(2)  # Allow time for STM32 to reboot if needed
 
+        reader = SerialLineReader(ser)
         while True:
-            if ser.in_waiting:
-                line = ser.readline().decode('utf-8', errors='ignore').strip()
-                if line:
-                    print(f"📄 {line}")
-            else:
-                # Optional: indicate waiting
-                time.sleep(0.1)
+            # Blocks up to the port timeout, then returns every complete line received
+            _, lines = reader.read_batch()
+            for line in lines:
+                print(f"📄 {line}")
 except serial.SerialException as e:
     print(f"❌ SerialException: {e}")
 except Exception as e: